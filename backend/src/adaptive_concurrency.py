@@ -0,0 +1,112 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import os
+import time
+import admission
+import observability
+
+### Constants
+ADAPTIVE_CONCURRENCY_ENABLED = os.environ.get("ADAPTIVE_CONCURRENCY_ENABLED", "1") == "1"
+CONCURRENCY_MIN = int(os.environ.get("CONCURRENCY_MIN", 2))  # Vision calls in flight never drop below this
+CONCURRENCY_MAX = int(os.environ.get("CONCURRENCY_MAX", 64))  # ...or grow above this
+CONCURRENCY_DECREASE_FACTOR = 0.5  # Limit multiplier on a 429, timeout or 5xx
+CONCURRENCY_LATENCY_TOLERANCE = 2.0  # Calls slower than this multiple of the baseline latency do not grow the limit
+CONCURRENCY_BASELINE_DRIFT = 0.02  # Share of each slower sample the baseline moves toward, so it follows lasting shifts
+
+concurrency_limit_changes_total = observability.register(
+    observability.Counter(
+        "concurrency_limit_changes_total",
+        "Changes of the adaptive vision call limit, by direction.",
+        ("direction",),
+    )
+)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on vision calls in flight, applied to an AdmissionQueue. Each call the API answers
+    without being much slower than the baseline latency raises the limit by 1/limit (about one
+    per round of calls), while the limit is in use. A 429, timeout or 5xx halves it, at most once
+    per round: failures of calls sent before the last cut are ignored, since they were sent at
+    the old limit.
+    """
+
+    def __init__(
+        self,
+        queue: admission.AdmissionQueue,
+        min_limit: int = CONCURRENCY_MIN,
+        max_limit: int = CONCURRENCY_MAX,
+        enabled: bool = ADAPTIVE_CONCURRENCY_ENABLED,
+    ):
+        self.queue = queue
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.enabled = enabled
+        self.limit = float(min(max(queue.max_in_flight, self.min_limit), self.max_limit))
+        self.baseline_latency = None
+        self.last_decrease_at = 0.0
+        if enabled:
+            queue.set_max_in_flight(int(self.limit))
+
+    def record(self, started_at: float, latency: float, failure: str = None) -> None:
+        """
+        Records the outcome of one vision call and adjusts the limit.
+
+        Parameter values:
+            - started_at<float> = time.perf_counter() when the call was sent.
+            - latency<float> = seconds the call took.
+            - failure<str or None> = failure class from `circuit_breaker.failure_kind`, or None
+              for a call the API answered.
+
+        Return value<None>
+        """
+
+        if not self.enabled:
+            return
+
+        # Multiplicative decrease, once per round of calls
+        if failure is not None:
+            if started_at < self.last_decrease_at:
+                return
+            self.last_decrease_at = time.perf_counter()
+            self.apply(max(self.min_limit, self.limit * CONCURRENCY_DECREASE_FACTOR), "down", failure=failure)
+            return
+
+        # Track the uncongested latency: the lowest seen, drifting slowly toward slower samples
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency += (latency - self.baseline_latency) * CONCURRENCY_BASELINE_DRIFT
+
+        # Additive increase while calls stay fast and the limit is actually what holds them back
+        if latency > self.baseline_latency * CONCURRENCY_LATENCY_TOLERANCE:
+            return
+        if self.queue.in_flight < self.queue.max_in_flight:
+            return
+        self.apply(min(self.max_limit, self.limit + 1.0 / self.limit), "up")
+
+    def apply(self, limit: float, direction: str, **fields) -> None:
+        # Store the new limit and resize the admission queue when its whole part changes (cuts are logged)
+        previous = int(self.limit)
+        self.limit = limit
+        if int(limit) == previous:
+            return
+        self.queue.set_max_in_flight(int(limit))
+        concurrency_limit_changes_total.inc(direction=direction)
+        if direction == "down":
+            observability.log("WARNING", "Vision concurrency limit cut", limit=int(limit), **fields)
+
+
+# Drives the limit of the process-wide admission queue
+concurrency_controller = AdaptiveConcurrencyLimit(admission.admission_queue)
+
+observability.register(
+    observability.CallbackGauge(
+        "vision_concurrency_limit",
+        "Vision calls admitted at once (the adaptive limit when enabled).",
+        (),
+        lambda: {(): concurrency_controller.queue.max_in_flight},
+    )
+)
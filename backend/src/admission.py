@@ -0,0 +1,161 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from collections import OrderedDict, deque
+import asyncio
+import contextvars
+import itertools
+import os
+import time
+import observability
+
+### Constants
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 16))  # Vision calls admitted at once per process
+PRIORITY_INTERACTIVE = "interactive"  # Single-label checks (/verify)
+PRIORITY_BATCH = "batch"  # /verify-batch and /jobs
+PRIORITY_BULK = "bulk"  # Batch API fallbacks and other background work
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BULK)  # Highest priority first
+SUBMITTER_HEADER = "X-Submitter-ID"  # Lets one caller's batches share a single fair turn
+
+# Priority class and submitter of the work running in the current context; set by the API
+# endpoints (and process_batch, for a batch without a submitter) and inherited by batch workers
+priority_var = contextvars.ContextVar("admission_priority", default=PRIORITY_BATCH)
+submitter_var = contextvars.ContextVar("admission_submitter", default=None)
+submitter_ids = itertools.count(1)
+
+admission_wait_seconds = observability.register(
+    observability.Histogram(
+        "admission_wait_seconds",
+        "Time vision calls waited in the admission queue, by priority class.",
+        ("priority",),
+    )
+)
+
+
+def new_submitter_id() -> str:
+    # Submitter ID for work that did not come with one, so each batch gets its own fair share
+    return f"batch-{next(submitter_ids)}"
+
+
+class AdmissionQueue:
+    """
+    Admits at most `max_in_flight` vision calls at a time. When a call finishes, the next one
+    admitted comes from the highest priority class that has waiters; within a class, submitters
+    take turns (one call each, round robin), so a 300-label batch cannot starve a 5-label one.
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT):
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight = 0
+        self.waiting = {priority: OrderedDict() for priority in PRIORITY_CLASSES}  # submitter -> deque of futures
+
+    def queue_depth(self, priority: str) -> int:
+        # Calls of one priority class waiting to be admitted
+        return sum(
+            1 for waiters in self.waiting[priority].values() for future in waiters if not future.done()
+        )
+
+    async def acquire(self, priority: str = None, submitter: str = None) -> None:
+        """
+        Waits until the calling vision request is admitted. Every `acquire` must be paired with
+        one `release`.
+
+        Parameter values:
+            - priority<str> = priority class (defaults to the context's `priority_var`).
+            - submitter<str> = submitter sharing its class fairly with others (defaults to the
+              context's `submitter_var`).
+
+        Return value<None>
+        """
+
+        priority = priority or priority_var.get()
+        if priority not in self.waiting:
+            priority = PRIORITY_BATCH
+        submitter = submitter or submitter_var.get()
+        queued_at = time.perf_counter()
+
+        # Admit straight away if there is room and nobody is queued ahead
+        if self.in_flight < self.max_in_flight and not any(self.queue_depth(p) for p in PRIORITY_CLASSES):
+            self.in_flight += 1
+            admission_wait_seconds.observe(0.0, priority=priority)
+            return
+
+        # Otherwise queue behind this submitter's earlier calls; release() hands the slot over
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[priority].setdefault(submitter, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled after being handed a slot: pass it on so it is not lost
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        admission_wait_seconds.observe(time.perf_counter() - queued_at, priority=priority)
+
+    def try_acquire(self) -> bool:
+        # Admit only if there is room right now and nobody is queued (optional calls such as hedges); pair with `release`
+        if self.in_flight < self.max_in_flight and not any(self.queue_depth(p) for p in PRIORITY_CLASSES):
+            self.in_flight += 1
+            return True
+        return False
+
+    def set_max_in_flight(self, max_in_flight: int) -> None:
+        """
+        Changes how many vision calls are admitted at once (see adaptive_concurrency.py). A higher
+        limit admits waiters straight away; after a lower one, finishing calls free their slots
+        until the calls in flight fit under it.
+
+        Parameter values:
+            - max_in_flight<int> = new limit (at least 1).
+
+        Return value<None>
+        """
+
+        self.max_in_flight = max(1, int(max_in_flight))
+        while self.in_flight < self.max_in_flight:
+            future = self.next_waiter()
+            if future is None:
+                break
+            self.in_flight += 1
+            future.set_result(None)
+
+    def next_waiter(self):
+        # Oldest call of the next submitter in turn, from the highest priority class with waiters
+        for priority in PRIORITY_CLASSES:
+            submitters = self.waiting[priority]
+            while submitters:
+                submitter, waiters = next(iter(submitters.items()))
+                future = waiters.popleft()
+                # This submitter's turn is used; it goes to the back of the line
+                if waiters:
+                    submitters.move_to_end(submitter)
+                else:
+                    del submitters[submitter]
+                if not future.done():
+                    return future
+        return None
+
+    def release(self) -> None:
+        # Hand the finished call's slot to the next waiter, or free it (always, while over a lowered limit)
+        if self.in_flight > self.max_in_flight:
+            self.in_flight -= 1
+            return
+        future = self.next_waiter()
+        if future is not None:
+            future.set_result(None)
+        else:
+            self.in_flight -= 1
+
+
+# Shared by every vision call in this process
+admission_queue = AdmissionQueue()
+
+observability.register(
+    observability.CallbackGauge(
+        "admission_queue_depth",
+        "Vision calls waiting in the admission queue, by priority class.",
+        ("priority",),
+        lambda: {(priority,): admission_queue.queue_depth(priority) for priority in PRIORITY_CLASSES},
+    )
+)
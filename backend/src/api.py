@@ -2,19 +2,68 @@
 # Copyright (c) 2026 Mark Biegel
 # LICENSE file for full license text.
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List
+import asyncio
 import json
+import time
+import adaptive_concurrency
+import admission
 import label_classifier
 import batch_processor
+import batch_checkpoints
+import bulk_verifier
+import circuit_breaker
+import deadlines
+import result_cache
+import job_store
+import multipart_stream
+import observability
+import openai_pool
+import shared_state
 import os
+import re
 import uvicorn
 
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
+JOB_EVENTS_KEEPALIVE_SECONDS = 15  # Idle interval after which the event stream sends a keep-alive
+BULK_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")  # Bulk IDs name folders, so no path characters
+STREAM_MAX_PENDING_IMAGES = 16  # Images a /verify-batch upload may send before applicationData
+API_WORKERS = int(os.environ.get("API_WORKERS", 1))  # Server processes; above 1, set SHARED_STATE_URL
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the OpenAI client when the server starts, with its connection pool sized to the
+    process-wide vision call limit, and closes it (and its pooled connections) when the server shuts down. Also opens
+    the shared state backend when several workers share limits and cache.
+    """
+
+    # Close a client created on first use before startup (e.g. by an import-time caller) so its pool is not leaked
+    if label_classifier.openai_client is not None:
+        await label_classifier.openai_client.close()
+    # Size the pool to the most vision calls the admission queue can let through at once
+    label_classifier.openai_client = openai_pool.create_openai_client(
+        adaptive_concurrency.CONCURRENCY_MAX if adaptive_concurrency.ADAPTIVE_CONCURRENCY_ENABLED else admission.ADMISSION_MAX_IN_FLIGHT
+    )
+
+    # Open the shared state now so a bad SHARED_STATE_URL fails at startup, not on the first label
+    if shared_state.get_backend() is None and API_WORKERS > 1:
+        observability.log(
+            "WARNING", "API_WORKERS is above 1 without SHARED_STATE_URL; each worker enforces its own limits"
+        )
+    try:
+        yield
+    finally:
+        await label_classifier.openai_client.close()
+
 
 # Initialize FastAPI app and configure CORS middleware to allow POST requests from the SvelteKit dev server
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[FRONTEND_URL],  # your SvelteKit dev server
@@ -22,19 +71,139 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Background job tasks are referenced here so they are not garbage collected mid-run
+running_job_tasks = set()
+running_bulk_tasks = {}  # bulk ID -> task of a Batch API run in progress
 
-@app.post("/verify-batch")
-async def verify_batch(
-    images: List[UploadFile] = File(...), applicationData: str = Form(...)
-):
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
     """
-    API endpoint to verify a batch of alcohol label images against provided application data.
-    Reads all uploaded images and application data, formats necessary fields, pairs them,
-    and runs batch verification. Returns a list of verification results.
+    Tags every request with a request ID (the caller's X-Request-ID, or a new one) so all logs
+    written while handling it, including from batch workers and background jobs it starts,
+    carry the same ID. Also records per-route latency for /metrics.
+    """
+
+    request_id = request.headers.get(observability.REQUEST_ID_HEADER) or observability.new_request_id()
+    observability.request_id_var.set(request_id)
+
+    start_time = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers[observability.REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        # Label by route template (e.g. /jobs/{job_id}) so IDs don't explode the series count
+        route = request.scope.get("route")
+        observability.http_request_seconds.observe(
+            time.perf_counter() - start_time,
+            route=route.path if route else "unmatched",
+            method=request.method,
+            status=status_code,
+        )
+
+
+def cache_counter_values() -> dict:
+    # Read hit/miss counters from both result caches for /metrics
+    values = {}
+    for cache_name, cache in (
+        ("verification", result_cache.verification_cache),
+        ("extraction", result_cache.extraction_cache),
+    ):
+        stats = cache.get_stats()
+        values[(cache_name, "memory_hit")] = stats["memory_hits"]
+        values[(cache_name, "disk_hit")] = stats["disk_hits"]
+        values[(cache_name, "miss")] = stats["misses"]
+    return values
+
+
+observability.register(
+    observability.CallbackCounter(
+        "result_cache_lookups_total",
+        "Result cache lookups by cache and outcome.",
+        ("cache", "result"),
+        cache_counter_values,
+    )
+)
+
+
+def format_application_data(app_data: dict) -> dict:
+    """
+    Combines the split amount/unit fields from the frontend into the single strings the
+    classifier compares against.
+
+    Parameter values:
+        - app_data<dict> = application data as sent by the frontend.
+
+    Return value<dict>:
+        - The same dictionary with 'alcohol_content' and 'net_contents' filled in.
+    """
+
+    # Combine fields into single strings for classifier
+    app_data["alcohol_content"] = (
+        f"{app_data['alcohol_content_amount']} {app_data['alcohol_content_format']}"
+    )
+    app_data["net_contents"] = (
+        f"{app_data['net_contents_amount']} {app_data['net_contents_unit']}"
+    )
+    return app_data
+
+
+def set_admission_class(request: Request, priority: str) -> None:
     """
+    Sets the admission queue priority class of the vision calls made for this request, and
+    their submitter: the caller's X-Submitter-ID header, or else the request ID, so every batch
+    takes fair turns with the others in its class.
 
-    # Log entry into batch endpoint and number of images to process
-    print(f"[INFO] At batch verify API endpoint - processing {len(images)} images")
+    Parameter values:
+        - request<Request> = incoming request.
+        - priority<str> = admission.PRIORITY_INTERACTIVE or admission.PRIORITY_BATCH.
+
+    Return value<None>
+    """
+
+    admission.priority_var.set(priority)
+    admission.submitter_var.set(request.headers.get(admission.SUBMITTER_HEADER) or observability.request_id_var.get())
+
+
+def request_deadline_seconds(request: Request, default: float = 0):
+    """
+    Reads the caller's time budget from the X-Request-Timeout header (seconds).
+
+    Parameter values:
+        - request<Request> = incoming request.
+        - default<float> = budget used when the header is absent (0 = no deadline).
+
+    Return value<float or None>:
+        - Seconds, or None for no deadline. Raises HTTPException(400) on an invalid header.
+    """
+
+    value = request.headers.get(deadlines.DEADLINE_HEADER)
+    if value is None:
+        return default or None
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {deadlines.DEADLINE_HEADER} header")
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail=f"{deadlines.DEADLINE_HEADER} must be positive")
+    return seconds
+
+
+async def read_image_app_pairs(images: List[UploadFile], applicationData: str) -> list:
+    """
+    Reads all uploaded images, parses and formats the application data list, and pairs them
+    for `batch_processor.process_batch`. Raises HTTPException(400) on malformed input.
+
+    Parameter values:
+        - images<List[UploadFile]> = uploaded label images.
+        - applicationData<str> = JSON list of application data, one entry per image.
+
+    Return value<list>:
+        - List of [image_bytes, application_data] pairs.
+    """
 
     # Parse application data JSON from form (expects a list of objects)
     try:
@@ -49,8 +218,7 @@ async def verify_batch(
             detail="Number of images must match number of application data entries",
         )
 
-    # Initialize list for results and image/application pairings
-    results = []
+    # Initialize list for image/application pairings
     image_app_pairing = []
 
     # Read each image and format its corresponding application data
@@ -64,47 +232,128 @@ async def verify_batch(
                 detail=f"verify_batch(): Failed to read in images from batch: {e}",
             )
 
-        # Combine fields into single strings for classifier
-        app_data_list[i]["alcohol_content"] = (
-            f"{app_data_list[i]['alcohol_content_amount']} {app_data_list[i]['alcohol_content_format']}"
-        )
-        app_data_list[i]["net_contents"] = (
-            f"{app_data_list[i]['net_contents_amount']} {app_data_list[i]['net_contents_unit']}"
-        )
+        # Append paired image and formatted application data
+        image_app_pairing.append([image_bytes, format_application_data(app_data_list[i])])
+
+    return image_app_pairing
 
-        # Append paired image and application data
-        image_app_pairing.append([image_bytes, app_data_list[i]])
 
-    # Process the batch using the asynchronous batch processor
+async def stream_image_app_items(request: Request):
+    """
+    Streams (index, image_bytes, application_data) items out of a /verify-batch upload as each
+    image part finishes arriving. When applicationData is sent before the images (as the
+    frontend does), every image is handed off immediately; up to STREAM_MAX_PENDING_IMAGES
+    images that arrive before applicationData are held until it is received.
+
+    Parameter values:
+        - request<Request> = multipart/form-data request with 'images' parts and one 'applicationData' part.
+
+    Yield value<tuple>:
+        - Tuple of (index<int>, image_bytes<bytes>, application_data<dict>).
+        - Raises HTTPException(400) on invalid JSON, mismatched image/application counts, or too
+          many images before applicationData. An image without an application is rejected as
+          soon as it arrives, so the batch stops before more labels are verified.
+    """
+
+    count_mismatch = HTTPException(
+        status_code=400,
+        detail="Number of images must match number of application data entries",
+    )
+    app_data_list = None
+    pending_images = []  # Images received before applicationData
+    image_count = 0
+
+    async for field_name, filename, data in multipart_stream.iter_multipart_parts(request):
+        # Parse application data JSON from form (expects a list of objects)
+        if field_name == "applicationData":
+            try:
+                app_data_list = [format_application_data(a) for a in json.loads(data)]
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise HTTPException(status_code=400, detail="Invalid applicationData JSON")
+
+            # Release any images that were waiting for their application data
+            if len(pending_images) > len(app_data_list):
+                raise count_mismatch
+            for index, image_bytes in pending_images:
+                yield index, image_bytes, app_data_list[index]
+            pending_images = []
+
+        elif field_name == "images":
+            index = image_count
+            image_count += 1
+            if app_data_list is None:
+                if len(pending_images) >= STREAM_MAX_PENDING_IMAGES:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Send applicationData before the images (at most {STREAM_MAX_PENDING_IMAGES} images may come first)",
+                    )
+                pending_images.append((index, data))
+            elif index >= len(app_data_list):
+                raise count_mismatch
+            else:
+                yield index, data, app_data_list[index]
+
+    # Validate that every application got an image
+    if app_data_list is None:
+        raise HTTPException(status_code=400, detail="Missing applicationData")
+    if image_count != len(app_data_list):
+        raise count_mismatch
+
+
+@app.post("/verify-batch")
+async def verify_batch(request: Request):
+    """
+    API endpoint to verify a batch of alcohol label images against provided application data.
+    Accepts multipart/form-data with 'images' files and an 'applicationData' JSON list. Images
+    are handed to the verification workers as soon as each one has been received, so memory
+    stays bounded by the labels in flight rather than the batch size. Returns a list of
+    verification results in upload order. With an X-Batch-ID header, each result is checkpointed
+    and resending the batch under the same ID only verifies the labels that had not finished.
+    """
+
+    # Log entry into batch endpoint
+    observability.log("INFO", "At batch verify API endpoint - streaming images")
+
+    # Process images as they arrive using the asynchronous batch processor; with an
+    # X-Request-Timeout header, labels not verified in time come back with an error result
+    deadline_seconds = request_deadline_seconds(request)
+    set_admission_class(request, admission.PRIORITY_BATCH)
     try:
-        results = await batch_processor.process_batch(
-            image_app_pairing, len(image_app_pairing)
+        results = await batch_processor.process_stream(
+            stream_image_app_items(request),
+            deadline_seconds=deadline_seconds,
+            batch_id=request.headers.get(batch_checkpoints.BATCH_ID_HEADER),
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(
-            f"[ERROR] verify_batch(): Failed to process image batch. Exiting with error: {e}"
-        )
+        observability.log("ERROR", "verify_batch(): Failed to process image batch", error=repr(e))
         raise HTTPException(status_code=500, detail="Batch processing failed")
 
     # Log completion and return results
-    print(f"[INFO] Batch processing complete: {len(results)} results")
+    observability.log("INFO", "Batch processing complete", results=len(results))
     return results
 
 
 @app.post("/verify")
-async def verify(image: UploadFile = File(...), applicationData: str = Form(...)):
+async def verify(request: Request, image: UploadFile = File(...), applicationData: str = Form(...)):
     """
     API endpoint to verify a single alcohol label image against provided application data.
     Reads the uploaded image and application data, formats necessary fields, and runs
     the label verification function. Returns verification results as a dictionary.
+    Rate-limited calls are retried until the deadline (X-Request-Timeout header, or
+    VERIFY_DEADLINE_SECONDS), after which the endpoint answers 504 instead of retrying further.
+    While the vision circuit breaker is open, it answers 503 with Retry-After straight away, and
+    it answers 503 when the vision call keeps timing out or failing with a 5xx or connection error.
     """
 
     # Log entry into the endpoint
-    print("[INFO] At Single verify API endpoint")
+    observability.log("INFO", "At Single verify API endpoint")
 
     # Read uploaded image bytes
     try:
-        image_bytes = await image.read()
+        with observability.time_stage("upload_read"):
+            image_bytes = await image.read()
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -118,29 +367,281 @@ async def verify(image: UploadFile = File(...), applicationData: str = Form(...)
         raise HTTPException(status_code=400, detail="Invalid applicationData JSON")
 
     # Combine fields into single strings for classifier
-    app_data["alcohol_content"] = (
-        f"{app_data['alcohol_content_amount']} {app_data['alcohol_content_format']}"
-    )
-    app_data["net_contents"] = (
-        f"{app_data['net_contents_amount']} {app_data['net_contents_unit']}"
-    )
+    app_data = format_application_data(app_data)
 
-    # Call label verification function and handle any errors
+    # Call label verification function and handle any errors; single checks are admitted ahead of batches
+    deadline_token = deadlines.start_deadline(request_deadline_seconds(request, deadlines.VERIFY_DEADLINE_SECONDS))
+    set_admission_class(request, admission.PRIORITY_INTERACTIVE)
     try:
-        print("[INFO] Starting processing...")
-        result = await label_classifier.verify_label(image_bytes, app_data)
-        print("Finished procesing")
+        observability.log("INFO", "Starting processing")
+        result = await batch_processor.verify_with_retry(image_bytes, app_data, batch_img_id=0)
+        if result is None:
+            raise ValueError("Vision reply could not be parsed")
+        observability.log("INFO", "Finished processing", status=result.get("overallStatus"))
+    except deadlines.DeadlineExceeded as e:
+        observability.log("WARNING", "verify(): Deadline exceeded", error=str(e))
+        raise HTTPException(status_code=504, detail="Verification did not finish before the deadline")
+    except circuit_breaker.CircuitOpenError as e:
+        observability.log("WARNING", "verify(): Vision API circuit open", error=str(e))
+        raise HTTPException(
+            status_code=503,
+            detail="Vision API is unavailable, try again later",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
     except Exception as e:
-        print(f"[INFO] verify(): Failed to process image. Exiting with error: {e}")
+        # Timeouts, 5xx and connection errors that outlasted their retries are the API's fault, not the label's
+        if circuit_breaker.failure_kind(e) is not None:
+            observability.log("WARNING", "verify(): Vision API unavailable", error=repr(e))
+            raise HTTPException(status_code=503, detail="Vision API is unavailable, try again later")
+        observability.log("ERROR", "verify(): Failed to process image", error=repr(e))
         raise HTTPException(status_code=500, detail="Image processing failed")
+    finally:
+        deadlines.deadline_var.reset(deadline_token)
 
     # Return verification results to client
     return result
 
 
+async def run_batch_job(job_id: str, image_app_pairing: list, batch_id: str = None) -> None:
+    """
+    Runs a batch job in the background, saving each label's result to the job store as soon
+    as it finishes so clients can poll or stream progress.
+
+    Parameter values:
+        - job_id<str> = job identifier from the job store.
+        - image_app_pairing<list> = list of [image_bytes, application_data] pairs.
+        - batch_id<str or None> = ID under which results are checkpointed.
+
+    Return value<None>
+    """
+
+    store = job_store.job_store
+
+    async def save_result(index: int, result: dict) -> None:
+        await store.record_result(job_id, index, result)
+
+    await store.set_status(job_id, job_store.JOB_STATUS_RUNNING)
+    try:
+        await batch_processor.process_batch(image_app_pairing, on_result=save_result, batch_id=batch_id)
+    except Exception as e:
+        observability.log("ERROR", "run_batch_job(): Job failed", job_id=job_id, error=repr(e))
+        await store.set_status(job_id, job_store.JOB_STATUS_FAILED, "Batch processing failed")
+        return
+
+    observability.log("INFO", "Job complete", job_id=job_id, results=len(image_app_pairing))
+    await store.set_status(job_id, job_store.JOB_STATUS_COMPLETE)
+
+
+@app.post("/jobs")
+async def create_job(
+    request: Request, images: List[UploadFile] = File(...), applicationData: str = Form(...)
+):
+    """
+    API endpoint to start verifying a batch of label images in the background. Accepts the same
+    form fields as /verify-batch but returns a job ID immediately instead of holding the
+    connection open; poll GET /jobs/{job_id} or stream GET /jobs/{job_id}/events for results.
+    Results are checkpointed under the X-Batch-ID header (or a hash of the batch contents), so
+    resubmitting a job interrupted by a restart only verifies the labels that had not finished.
+    """
+
+    # Log entry into job endpoint and number of images to process
+    observability.log("INFO", f"At create job API endpoint - queueing {len(images)} images")
+
+    # Read images and pair them with their formatted application data
+    with observability.time_stage("upload_read"):
+        image_app_pairing = await read_image_app_pairs(images, applicationData)
+
+    # Checkpoint under the caller's batch ID, or one derived from the contents so a plain resubmit resumes
+    batch_id = request.headers.get(batch_checkpoints.BATCH_ID_HEADER)
+    if batch_id is None and batch_checkpoints.checkpoint_store.enabled:
+        batch_id = await asyncio.to_thread(batch_checkpoints.make_batch_id, image_app_pairing)
+
+    # Register the job and start it without waiting for it to finish (the task inherits the admission class)
+    job_id = await job_store.job_store.create_job(len(image_app_pairing))
+    set_admission_class(request, admission.PRIORITY_BATCH)
+    task = asyncio.create_task(run_batch_job(job_id, image_app_pairing, batch_id))
+    running_job_tasks.add(task)
+    task.add_done_callback(running_job_tasks.discard)
+
+    return {"jobId": job_id, "status": job_store.JOB_STATUS_QUEUED, "total": len(image_app_pairing)}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    API endpoint returning a job's status, progress, and the results finished so far
+    (in input order, with null for labels still pending).
+    """
+
+    job = await job_store.job_store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_store.public_job_view(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, format: str = "sse"):
+    """
+    API endpoint streaming each label's result as soon as it finishes, as Server-Sent Events
+    (default) or NDJSON (?format=ndjson). Every event carries the label's index in the batch;
+    the stream ends with a final event holding the job status ("expired" if the job was removed
+    while the stream was open).
+    """
+
+    store = job_store.job_store
+    if await store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    def encode(event_type: str, payload: dict) -> str:
+        # Format one event for the requested wire format
+        if format == "ndjson":
+            return json.dumps({"event": event_type, **payload}) + "\n"
+        return f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
+
+    async def event_stream():
+        seen_count = 0
+        first_pass = True
+        while True:
+            # The job was removed after the retention window while the stream was open
+            job = await store.get_job(job_id)
+            if job is None:
+                yield encode("done", {"status": job_store.JOB_STATUS_EXPIRED, "error": "Job expired"})
+                return
+
+            # Send every result that finished since the last pass; send a keep-alive instead
+            # when nothing arrived so proxies don't drop an idle stream
+            new_indices = job["completed_order"][seen_count:]
+            for index in new_indices:
+                yield encode("result", {"index": index, "result": job["results"][index]})
+            if not new_indices and not first_pass:
+                yield "\n" if format == "ndjson" else ": keep-alive\n\n"
+            seen_count += len(new_indices)
+            first_pass = False
+
+            # Close the stream once the job is done and everything has been sent
+            if job["status"] in job_store.JOB_FINISHED_STATUSES:
+                yield encode(
+                    "done",
+                    {"status": job["status"], "total": job["total"], "error": job["error"]},
+                )
+                return
+
+            # Wait for the next result
+            await store.wait_for_update(job_id, seen_count, JOB_EVENTS_KEEPALIVE_SECONDS)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+
+async def run_bulk_job(bulk_id: str, source: str) -> None:
+    # Run a Batch API bulk verification in the background; failures stay resumable from the checkpoint
+    try:
+        await bulk_verifier.run_bulk(source, os.path.join(bulk_verifier.BULK_WORK_DIR, bulk_id))
+    except Exception as e:
+        observability.log("ERROR", "run_bulk_job(): Bulk run stopped", bulk_id=bulk_id, error=repr(e))
+    finally:
+        running_bulk_tasks.pop(bulk_id, None)
+
+
+@app.post("/bulk-jobs")
+async def create_bulk_job(request: Request):
+    """
+    API endpoint to verify a backlog of labels through the OpenAI Batch API (cheaper, results
+    within 24 hours). Takes JSON {"source": folder or manifest under BULK_SOURCE_ROOT} to start a
+    run, or {"bulkId": ...} to resume a stopped one; poll GET /bulk-jobs/{bulk_id} for progress.
+    """
+
+    # Bulk runs read files from the server, so they are off unless a source folder is configured
+    if not bulk_verifier.BULK_SOURCE_ROOT:
+        raise HTTPException(status_code=403, detail="Bulk mode is disabled (set BULK_SOURCE_ROOT)")
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    bulk_id = body.get("bulkId") or time.strftime("%Y%m%d-%H%M%S-") + observability.new_request_id()[:6]
+    if not BULK_ID_PATTERN.match(bulk_id):
+        raise HTTPException(status_code=400, detail="Invalid bulkId")
+    if bulk_id in running_bulk_tasks:
+        raise HTTPException(status_code=409, detail="Bulk run already in progress")
+
+    # A new run needs a source inside BULK_SOURCE_ROOT; a resumed one reads its checkpoint
+    work_dir = os.path.join(bulk_verifier.BULK_WORK_DIR, bulk_id)
+    source = body.get("source")
+    if bulk_verifier.load_state(work_dir) is None:
+        if not source:
+            raise HTTPException(status_code=404 if body.get("bulkId") else 400, detail="No such bulk run and no source given")
+        source_root = os.path.realpath(bulk_verifier.BULK_SOURCE_ROOT)
+        source = os.path.realpath(os.path.join(source_root, source))
+        if os.path.commonpath([source_root, source]) != source_root or not os.path.exists(source):
+            raise HTTPException(status_code=400, detail="Source must be an existing path under BULK_SOURCE_ROOT")
+        # Reject a manifest naming files outside BULK_SOURCE_ROOT before the run starts
+        try:
+            await asyncio.to_thread(bulk_verifier.load_bulk_items, source)
+        except (ValueError, OSError, KeyError, json.JSONDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid bulk source: {e}")
+
+    observability.log("INFO", "Starting bulk run", bulk_id=bulk_id, source=source)
+    running_bulk_tasks[bulk_id] = asyncio.create_task(run_bulk_job(bulk_id, source))
+    return {"bulkId": bulk_id, "running": True}
+
+
+@app.get("/bulk-jobs/{bulk_id}")
+async def get_bulk_job(bulk_id: str):
+    """
+    API endpoint returning a bulk run's checkpoint summary: status, label counts, token usage
+    and the status of each Batch API batch.
+    """
+
+    state = bulk_verifier.load_state(os.path.join(bulk_verifier.BULK_WORK_DIR, bulk_id)) if BULK_ID_PATTERN.match(bulk_id) else None
+    if state is None:
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    return {"bulkId": bulk_id, "running": bulk_id in running_bulk_tasks, **bulk_verifier.get_bulk_summary(state)}
+
+
+@app.get("/bulk-jobs/{bulk_id}/results")
+async def get_bulk_results(bulk_id: str):
+    """
+    API endpoint returning a finished bulk run's results in input order.
+    """
+
+    work_dir = os.path.join(bulk_verifier.BULK_WORK_DIR, bulk_id)
+    state = bulk_verifier.load_state(work_dir) if BULK_ID_PATTERN.match(bulk_id) else None
+    if state is None:
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    if state["status"] != bulk_verifier.BULK_STATUS_COMPLETE:
+        raise HTTPException(status_code=409, detail="Bulk run not complete")
+    with open(os.path.join(work_dir, bulk_verifier.BULK_RESULTS_FILE_NAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    API endpoint returning hit/miss counters for the verification result cache and the
+    per-image extraction cache, used to measure how many vision API calls are being saved.
+    """
+
+    return {
+        "verification": result_cache.verification_cache.get_stats(),
+        "extraction": result_cache.extraction_cache.get_stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    API endpoint exposing Prometheus metrics: per-stage and per-route latency histograms, Vision
+    API calls by outcome (including 429s and JSON parse failures), retries, tokens used, verified
+    labels by source, and result cache hits.
+    """
+
+    return PlainTextResponse(observability.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     ### Main
     # This main function is used to start the api from the deployed instance
 
     port = int(os.environ.get("PORT", 8000))  # NOTE: Railway dynimcally sets PORT
-    uvicorn.run("api:app", host="0.0.0.0", port=port, reload=False)
+    uvicorn.run("api:app", host="0.0.0.0", port=port, reload=False, workers=API_WORKERS)
@@ -0,0 +1,198 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import observability
+import result_cache
+
+### Constants
+BATCH_CHECKPOINT_DB_PATH = os.environ.get("BATCH_CHECKPOINT_DB_PATH", "")  # Empty string disables checkpoints
+BATCH_CHECKPOINT_TTL_SECONDS = float(os.environ.get("BATCH_CHECKPOINT_TTL_SECONDS", 7 * 24 * 3600))
+BATCH_CHECKPOINT_BUSY_TIMEOUT_SECONDS = 10.0
+BATCH_CHECKPOINT_TRIM_INTERVAL_SECONDS = 60.0  # How often expired checkpoints are deleted
+BATCH_ID_HEADER = "X-Batch-ID"  # Caller-chosen batch ID; resending it resumes the batch
+
+batch_items_resumed_total = observability.register(
+    observability.Counter(
+        "batch_items_resumed_total",
+        "Batch labels answered from a checkpoint instead of being verified again.",
+    )
+)
+
+
+def make_item_key(image_bytes: bytes, application_data: dict) -> str:
+    # Identity of a batch item; a checkpoint is only reused for the same image and application
+    return result_cache.make_cache_key(image_bytes, application_data)
+
+
+def make_batch_id(total_batch: list) -> str:
+    """
+    Derives a batch ID from the batch contents, so resubmitting the same batch after a restart
+    resumes it even when the caller does not send X-Batch-ID.
+
+    Parameter values:
+        - total_batch<list> = list of [image_bytes, application_data] pairs.
+
+    Return value<str>:
+        - SHA-256 hex digest over every item's key, in order.
+    """
+
+    digest = hashlib.sha256()
+    for image_bytes, application_data in total_batch:
+        digest.update(make_item_key(image_bytes, application_data).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class BatchCheckpointStore:
+    """
+    Durable per-label results of running batches, keyed by batch ID and item index, in a SQLite
+    table. Each result is written as soon as the label finishes, so a batch interrupted by a
+    crash or redeploy can be rerun and only verifies the labels that had not finished. Every
+    method blocks on SQLite, so async code calls them through `asyncio.to_thread`.
+    """
+
+    def __init__(self, db_path: str = BATCH_CHECKPOINT_DB_PATH, ttl_seconds: float = BATCH_CHECKPOINT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.last_trim = 0.0
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, timeout=BATCH_CHECKPOINT_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints "
+                "(batch_id TEXT, item_index INTEGER, item_key TEXT NOT NULL, result TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, PRIMARY KEY (batch_id, item_index))"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS checkpoints_stored ON checkpoints (stored_at)")
+            self.db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.db is not None
+
+    def load_batch(self, batch_id: str) -> dict:
+        """
+        Returns every unexpired checkpoint of a batch, in one query.
+
+        Parameter values:
+            - batch_id<str> = batch ID.
+
+        Return value<dict>:
+            - Dictionary of item index -> (item_key, result). Empty if nothing has finished (or
+              checkpoints are disabled).
+        """
+
+        if self.db is None:
+            return {}
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT item_index, item_key, result FROM checkpoints WHERE batch_id = ? AND stored_at >= ?",
+                (batch_id, time.time() - self.ttl_seconds),
+            ).fetchall()
+        return {index: (item_key, json.loads(result)) for index, item_key, result in rows}
+
+    def save(self, batch_id: str, index: int, item_key: str, result: dict) -> None:
+        """
+        Durably stores one finished batch item. Error results are not stored, so a rerun retries them.
+
+        Parameter values:
+            - batch_id<str> = batch ID.
+            - index<int> = item index in the batch.
+            - item_key<str> = key from `make_item_key`.
+            - result<dict> = verification result.
+
+        Return value<None>
+        """
+
+        if self.db is None or result.get("overallStatus") == "error":
+            return
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO checkpoints (batch_id, item_index, item_key, result, stored_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (batch_id, index, item_key, json.dumps(result), now),
+            )
+            # Expired checkpoints are deleted once per interval rather than on every save
+            if now - self.last_trim >= BATCH_CHECKPOINT_TRIM_INTERVAL_SECONDS:
+                self.last_trim = now
+                self.db.execute("DELETE FROM checkpoints WHERE stored_at < ?", (now - self.ttl_seconds,))
+            self.db.commit()
+
+    def clear(self, batch_id: str) -> None:
+        # Forget a batch's checkpoints (once it has finished, or to force it to run again)
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("DELETE FROM checkpoints WHERE batch_id = ?", (batch_id,))
+            self.db.commit()
+
+
+# Shared by every batch in this process
+checkpoint_store = BatchCheckpointStore()
+
+
+class BatchCheckpoint:
+    """
+    Checkpoint access for one run of a batch: `load` reads the batch's earlier results once,
+    `restore` is asked for every item before it is verified, `record` stores each result as it
+    finishes, and `finish` deletes the checkpoints once the whole batch is done. Item keys hash
+    the image, so they are only computed for items that have a checkpoint or a result to store,
+    and like the SQLite calls, off the event loop.
+    """
+
+    def __init__(self, batch_id: str, store: BatchCheckpointStore):
+        self.batch_id = batch_id
+        self.store = store
+        self.stored = {}
+        self.restored = 0
+
+    async def load(self) -> None:
+        # Read the results an earlier, interrupted run of this batch stored
+        self.stored = await asyncio.to_thread(self.store.load_batch, self.batch_id)
+
+    async def restore(self, index: int, image_bytes: bytes, application_data: dict):
+        # Result of this item from an earlier run of the batch, or None if it still has to be verified
+        if index not in self.stored:
+            return None
+        item_key, result = self.stored.pop(index)
+        if await asyncio.to_thread(make_item_key, image_bytes, application_data) != item_key:
+            return None
+        self.restored += 1
+        batch_items_resumed_total.inc()
+        return result
+
+    async def record(self, index: int, image_bytes: bytes, application_data: dict, result: dict) -> None:
+        await asyncio.to_thread(self.save_item, index, image_bytes, application_data, result)
+
+    def save_item(self, index: int, image_bytes: bytes, application_data: dict, result: dict) -> None:
+        # Hash the item and store its result (runs in a worker thread)
+        self.store.save(self.batch_id, index, make_item_key(image_bytes, application_data), result)
+
+    async def finish(self) -> None:
+        # The batch completed, so nothing is left to resume
+        await asyncio.to_thread(self.store.clear, self.batch_id)
+
+
+def open_checkpoint(batch_id: str):
+    """
+    Opens checkpointing for one run of a batch.
+
+    Parameter values:
+        - batch_id<str or None> = batch ID (caller's X-Batch-ID or `make_batch_id`).
+
+    Return value<BatchCheckpoint or None>:
+        - Checkpoint handle, or None without a batch ID or when BATCH_CHECKPOINT_DB_PATH is unset.
+    """
+
+    if batch_id is None or not checkpoint_store.enabled:
+        return None
+    return BatchCheckpoint(batch_id, checkpoint_store)
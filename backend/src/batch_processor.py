@@ -6,38 +6,84 @@ import asyncio
 import label_classifier
 import glob
 import json
-from openai import RateLimitError
+from openai import APIConnectionError, InternalServerError, RateLimitError
 import httpx
+import os
+import time
+import adaptive_concurrency
+import admission
+import batch_checkpoints
+import circuit_breaker
+import deadlines
+import near_duplicates
+import observability
+import rate_limiter
 
 ### Constants
-MAX_CONCURRENT_JOBS_NUM = 5  # Maxmimum concurrent jobs to run
-BATCH_DELAY_SECONDS = 4  # Pause between batches to stay under TPM limit
+# Maximum concurrent jobs per batch; the process-wide admission limit (adapted by
+# adaptive_concurrency.py) decides how many vision calls all batches send at once
+MAX_CONCURRENT_JOBS_NUM = int(os.environ.get("BATCH_MAX_CONCURRENT_JOBS", 5))
 MAX_RETRIES = 12  # Maxmimum number of retries if errors occur
+MAX_SERVER_ERROR_RETRIES = 2  # Retries after a timeout, 5xx or connection error (the SDK's own default)
+SERVER_ERROR_RETRY_SECONDS = 0.5  # Base wait before retrying one; grows with each attempt
 
+# Labels packed into one vision request (1 disables packing); see label_classifier.verify_labels_packed
+VISION_PACK_SIZE = int(os.environ.get("VISION_PACK_SIZE", 1))
+PACK_GROW_AFTER_SUCCESSES = 5  # Clean packed replies in a row before the pack size grows back by one
 
-async def verify_with_retry(image: bytes, app_data: dict, batch_img_id: int) -> dict:
+
+class AdaptivePackSize:
     """
-    Attempts to verify a label using `verify_label`, automatically retrying on rate limits
-    or HTTP errors, and handling JSON parsing errors.
+    Current number of labels per packed request. Starts at the configured maximum, halves
+    whenever a packed reply cannot be split into per-label results, and grows back by one after
+    PACK_GROW_AFTER_SUCCESSES clean packed replies in a row.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self.current = self.max_size
+        self.successes = 0
+
+    def record(self, packed_ok: bool) -> None:
+        if not packed_ok:
+            self.current = max(1, self.current // 2)
+            self.successes = 0
+            observability.log("WARNING", "Packed reply failed, reducing pack size", pack_size=self.current)
+            return
+        self.successes += 1
+        if self.successes >= PACK_GROW_AFTER_SUCCESSES and self.current < self.max_size:
+            self.current += 1
+            self.successes = 0
+
+
+async def run_with_retry(make_call, batch_img_id: int):
+    """
+    Awaits `make_call()`, automatically retrying on rate limits or HTTP errors, retrying
+    timeouts, 5xx and connection errors up to MAX_SERVER_ERROR_RETRIES times, and handling
+    JSON parsing errors. Shared by single-label and packed verification.
 
     Parameter values:
-        - image<bytes> = raw label image to verify.
-        - app_data<dict> = expected values from application/form for comparison.
+        - make_call<function> = zero-argument function returning a new awaitable for each attempt.
         - batch_img_id<int> = identifier for logging and tracking retry attempts.
 
-    Return value<dict or None>:
-        - Verification results dictionary returned by `verify_label`.
+    Return value<any>:
+        - Whatever the awaited call returns.
         - Returns None if a JSON parsing error occurs.
         - Raises Exception if all retry attempts fail due to rate limits or HTTP errors.
+        - Raises the last timeout, 5xx or connection error once its retries are used up.
+        - Raises deadlines.DeadlineExceeded as soon as the deadline (if any) leaves no time to retry.
+        - Raises circuit_breaker.CircuitOpenError without further retries once the circuit opens.
     """
 
     # Attempt verification up to MAX_RETRIES
+    server_errors = 0
     for attempt in range(MAX_RETRIES):
+        deadlines.check("verification attempt")
         try:
-            # Call verify_label function
-            output = await label_classifier.verify_label(image, app_data)
-            print(
-                f"[INFO] Batch Image ID: {batch_img_id} - No rate limit or JSON parsing issues"
+            # Call the verification function
+            output = await make_call()
+            observability.log(
+                "INFO", "Batch image verified - no rate limit or JSON parsing issues", attempts=attempt + 1
             )
             return output
 
@@ -49,94 +95,415 @@ async def verify_with_retry(image: bytes, app_data: dict, batch_img_id: int) ->
             if hasattr(e, "response") and "Retry-After" in e.response.headers:
                 wait_time += float(e.response.headers["Retry-After"])
 
-            # Log retry attempt and wait
-            print(
-                f"[WARNING] Batch Image ID {batch_img_id} - Rate limit hit, retrying in {wait_time:.1f}s (attempt {attempt + 1}/{MAX_RETRIES})"
+            # Give up now rather than wait past the deadline
+            time_left = deadlines.remaining()
+            if time_left is not None and wait_time >= time_left:
+                observability.log("WARNING", "Rate limit hit, no time left before the deadline", attempt=attempt + 1)
+                raise deadlines.DeadlineExceeded(f"Deadline exceeded after {attempt + 1} attempts")
+
+            # Log retry attempt and pause the shared limiter so all in-flight work backs off,
+            # not just this item; the next attempt waits inside the limiter
+            observability.log(
+                "WARNING",
+                f"Rate limit hit, retrying in {wait_time:.1f}s",
+                attempt=f"{attempt + 1}/{MAX_RETRIES}",
+            )
+            observability.verification_retries_total.inc()
+            rate_limiter.shared_limiter.pause(wait_time)
+
+        # Retry timeouts, 5xx and connection errors a few times; during an outage the circuit
+        # breaker opens and ends the retries with CircuitOpenError. Only this item waits.
+        except (APIConnectionError, InternalServerError) as e:
+            server_errors += 1
+            wait_time = SERVER_ERROR_RETRY_SECONDS * server_errors
+            time_left = deadlines.remaining()
+            if server_errors > MAX_SERVER_ERROR_RETRIES or (time_left is not None and wait_time >= time_left):
+                raise
+            observability.log(
+                "WARNING",
+                f"Vision API error, retrying in {wait_time:.1f}s",
+                attempt=f"{server_errors}/{MAX_SERVER_ERROR_RETRIES}",
+                error=repr(e),
             )
+            observability.verification_retries_total.inc()
             await asyncio.sleep(wait_time)
 
         # Handle JSON parsing errors without retrying
         except json.JSONDecodeError:
-            print(
-                f"[ERROR] Batch Image ID {batch_img_id} - JSON parse error - skipping this item"
-            )
+            observability.log("ERROR", "JSON parse error - skipping this item")
             return None  # or some sentinel value
 
     # Raise exception if all retry attempts fail
     raise Exception(
-        "verify_with_retry() - batch_processor.py: Verification failed unexpectedly"
+        f"run_with_retry() - batch_processor.py: Verification of batch image {batch_img_id} failed unexpectedly"
+    )
+
+
+async def verify_with_retry(image: bytes, app_data: dict, batch_img_id: int) -> dict:
+    """
+    Attempts to verify a label using `verify_label`, automatically retrying on rate limits
+    or HTTP errors, and handling JSON parsing errors.
+
+    Parameter values:
+        - image<bytes> = raw label image to verify.
+        - app_data<dict> = expected values from application/form for comparison.
+        - batch_img_id<int> = identifier for logging and tracking retry attempts.
+
+    Return value<dict or None>:
+        - Verification results dictionary returned by `verify_label`.
+        - Returns None if a JSON parsing error occurs.
+        - Raises Exception if all retry attempts fail due to rate limits or HTTP errors.
+    """
+
+    return await run_with_retry(
+        lambda: label_classifier.verify_label(image, app_data), batch_img_id
+    )
+
+
+async def verify_group_with_retry(images: list, app_data_list: list, batch_img_id: int) -> tuple:
+    """
+    Verifies a group of labels with one packed vision request using `verify_labels_packed`,
+    with the same retry handling as `verify_with_retry`.
+
+    Parameter values:
+        - images<list> = raw label images to verify.
+        - app_data_list<list> = expected values for each image, in the same order.
+        - batch_img_id<int> = identifier of the group's first label, for logging.
+
+    Return value<tuple>:
+        - Tuple of (results, packed_ok) as returned by `verify_labels_packed`; results are all
+          None if a JSON parsing error occurs.
+        - Raises Exception if all retry attempts fail due to rate limits or HTTP errors.
+    """
+
+    output = await run_with_retry(
+        lambda: label_classifier.verify_labels_packed(images, app_data_list), batch_img_id
+    )
+    if output is None:
+        return [None] * len(images), False
+    return output
+
+
+async def verify_duplicates_with_retry(images: list, app_data_list: list, batch_img_id: int) -> list:
+    """
+    Verifies a group of near-identical label images with one shared extraction using
+    `verify_near_duplicates`, with the same retry handling as `verify_with_retry`.
+
+    Parameter values:
+        - images<list> = raw label images of one near-duplicate group.
+        - app_data_list<list> = expected values for each image, in the same order.
+        - batch_img_id<int> = identifier of the group's first label, for logging.
+
+    Return value<list>:
+        - Verification results in input order; all None if a JSON parsing error occurs.
+        - Raises Exception if all retry attempts fail due to rate limits or HTTP errors.
+    """
+
+    output = await run_with_retry(
+        lambda: label_classifier.verify_near_duplicates(images, app_data_list), batch_img_id
     )
+    if output is None:
+        return [None] * len(images)
+    return output
+
+
+def sanitize_result(result) -> dict:
+    """
+    Converts an exception raised while verifying a single item into the standard error
+    result dictionary, passing through valid results unchanged.
+
+    Parameter values:
+        - result<dict or Exception> = value returned (or raised) by `verify_with_retry`.
+
+    Return value<dict>:
+        - The original result, or a sanitized dictionary with 'error' status if result is an Exception.
+    """
+
+    # Valid results pass through untouched
+    if not isinstance(result, Exception):
+        return result
+
+    # Convert exception into sanitized error dictionary
+    observability.log("WARNING", "Batch result has invalid data, sanitizing", error=repr(result))
+    if isinstance(result, deadlines.DeadlineExceeded):
+        summary = "Deadline exceeded"
+    elif isinstance(result, circuit_breaker.CircuitOpenError):
+        summary = "Vision API unavailable"
+    elif circuit_breaker.failure_kind(result) is not None:
+        summary = "Vision API error"  # Timeouts, 5xx or connection errors that outlasted their retries
+    else:
+        summary = "Processing failed"
+    sanitized = {
+        "overallStatus": "error",
+        "summary": summary,
+        "fields": [],
+    }
+    return sanitized
 
 
 async def process_batch(
     total_batch: list,
     max_concurrent_jobs: int = MAX_CONCURRENT_JOBS_NUM,
     show_print_statements: bool = False,
+    on_result=None,
+    pack_size: int = VISION_PACK_SIZE,
+    deadline_seconds: float = None,
+    group_duplicates: bool = near_duplicates.NEAR_DUPLICATE_ENABLED,
+    batch_id: str = None,
 ) -> list:
     """
-    Processes a list of label verification tasks in batches, handling concurrency and
-    retry logic, and sanitizes any exceptions in results.
+    Processes a list of label verification tasks with a sliding window of concurrent jobs,
+    handling retry logic, and sanitizes any exceptions in results. Results are returned in
+    the same order as total_batch. With pack_size above 1, labels are verified in packed groups
+    through `process_stream`. With group_duplicates, near-identical images are found first by
+    perceptual hash and each group is verified with one shared extraction. With a batch_id (and
+    BATCH_CHECKPOINT_DB_PATH set), each result is checkpointed as it finishes and labels already
+    checkpointed by an interrupted run of the same batch are not verified again.
 
     Parameter values:
         - total_batch<list> = list of tuples containing (image_bytes, application_data) for verification.
         - max_concurrent_jobs<int> = maximum number of verification tasks to run concurrently.
         - show_print_statements<bool> = whether to print progress/logging statements during processing.
+        - on_result<async function> = optional callback awaited as on_result(index, result) as soon as
+          each item finishes, in completion order (used to stream results from async jobs).
+        - pack_size<int> = maximum labels per vision request (1 sends one request per label).
+        - deadline_seconds<float or None> = time budget for the whole batch; labels not finished
+          by then get an 'error' result instead of being retried.
+        - group_duplicates<bool> = verify near-identical images with one extraction per group
+          (not combined with packing).
+        - batch_id<str or None> = ID under which results are checkpointed (see batch_checkpoints.py).
 
     Return value<list>:
         - List of verification results dictionaries for each item in total_batch.
         - Exceptions or invalid results are sanitized to dictionaries with 'error' status.
     """
 
-    # Initialize list to hold results from all batches
-    total_batch_results = []
+    # Every label shares the batch deadline; tasks started below inherit it from this context
+    deadline_token = deadlines.start_deadline(deadline_seconds)
+    # A batch without a submitter (e.g. from a script) takes its own turns in the admission queue
+    submitter_token = admission.submitter_var.set(admission.submitter_var.get() or admission.new_submitter_id())
+    try:
+        # Packed groups are formed by the stream workers
+        if pack_size > 1:
 
-    # Process total_batch in chunks of max_concurrent_jobs
-    for i in range(0, len(total_batch), max_concurrent_jobs):
-        # Initialize list for current batch results
-        batch_results = []
+            async def iterate_batch():
+                for i, item in enumerate(total_batch):
+                    yield i, item[0], item[1]
 
-        # Slice the current batch from total_batch
-        batch = total_batch[i : i + max_concurrent_jobs]
+            return await process_stream(
+                iterate_batch(), max_concurrent_jobs, show_print_statements, on_result, pack_size, deadline_seconds, batch_id
+            )
+
+        # Shared semaphore keeps exactly max_concurrent_jobs verifications in flight; as soon as
+        # any slot frees up the next waiting item starts, so one slow label never idles the rest
+        semaphore = asyncio.Semaphore(max_concurrent_jobs)
 
         # Print batch info if requested
         if show_print_statements:
-            print(
-                f"[INFO] Processing batch {i // max_concurrent_jobs + 1}, size: {len(batch)}"
+            observability.log(
+                "INFO", f"Processing {len(total_batch)} items with {max_concurrent_jobs} concurrent slots"
             )
 
-        # Run verify_with_retry concurrently for all items in the batch
-        batch_results = await asyncio.gather(
-            *(
-                verify_with_retry(item[0], item[1], batch_img_id=i)
-                for i, item in enumerate(batch)
-            ),
-            return_exceptions=True,
-        )
+        # Labels finished by an earlier, interrupted run of this batch are not verified again
+        total_batch_results = [None] * len(total_batch)
+        checkpoint = batch_checkpoints.open_checkpoint(batch_id)
+        if checkpoint is not None:
+            await checkpoint.load()
+            for index in sorted(checkpoint.stored):
+                if index >= len(total_batch):
+                    continue
+                total_batch_results[index] = await checkpoint.restore(index, *total_batch[index])
+                if total_batch_results[index] is not None and on_result is not None:
+                    await on_result(index, total_batch_results[index])
+        pending = [index for index, result in enumerate(total_batch_results) if result is None]
+
+        # Group copies of the same artwork so each group costs one vision call
+        if group_duplicates and len(pending) > 1:
+            groups = await near_duplicates.find_near_duplicate_groups([total_batch[i][0] for i in pending])
+            groups = [[pending[i] for i in group] for group in groups]
+        else:
+            groups = [[i] for i in pending]
+
+        async def run_group(indices: list) -> None:
+            # Tag this group's logs with its indices; each gathered task has its own context copy
+            observability.label_index_var.set(indices[0] if len(indices) == 1 else ",".join(map(str, indices)))
+
+            # Wait for a free slot, then verify the label (or near-duplicate group) while holding it
+            queued_at = time.perf_counter()
+            async with semaphore:
+                observability.stage_seconds.observe(time.perf_counter() - queued_at, stage="queue_wait")
+                if show_print_statements:
+                    observability.log("INFO", "Starting batch image")
+                try:
+                    if len(indices) == 1:
+                        item = total_batch[indices[0]]
+                        group_results = [await verify_with_retry(item[0], item[1], batch_img_id=indices[0])]
+                    else:
+                        group_results = await verify_duplicates_with_retry(
+                            [total_batch[i][0] for i in indices],
+                            [total_batch[i][1] for i in indices],
+                            batch_img_id=indices[0],
+                        )
+                except Exception as e:
+                    group_results = [e] * len(indices)
+
+            # Convert any exception into a sanitized error dictionary, checkpoint it and report each label right away
+            for index, result in zip(indices, group_results):
+                result = sanitize_result(result)
+                total_batch_results[index] = result
+                if checkpoint is not None:
+                    await checkpoint.record(index, *total_batch[index], result)
+                if on_result is not None:
+                    await on_result(index, result)
+
+        # Schedule every group up front; results are stored by input index
+        await asyncio.gather(*(run_group(indices) for indices in groups))
+
+        if checkpoint is not None:
+            if checkpoint.restored:
+                observability.log("INFO", "Batch resumed from checkpoint", batch_id=batch_id, restored=checkpoint.restored)
+            await checkpoint.finish()
+        return total_batch_results
+    finally:
+        deadlines.deadline_var.reset(deadline_token)
+        admission.submitter_var.reset(submitter_token)
+
+
+async def process_stream(
+    item_stream,
+    max_concurrent_jobs: int = MAX_CONCURRENT_JOBS_NUM,
+    show_print_statements: bool = False,
+    on_result=None,
+    pack_size: int = VISION_PACK_SIZE,
+    deadline_seconds: float = None,
+    batch_id: str = None,
+) -> list:
+    """
+    Processes label verification tasks pulled from an async iterator as they become available,
+    using a fixed pool of max_concurrent_jobs workers. The hand-off queue holds at most
+    max_concurrent_jobs items (per pack slot), so a fast producer (e.g. an upload being parsed)
+    is paused instead of buffering the whole batch; memory is bounded by the labels in flight.
+    With pack_size above 1, each worker takes up to the current adaptive pack size of waiting
+    labels and verifies them in one packed vision request.
+
+    Parameter values:
+        - item_stream<async iterator> = yields (index, image_bytes, application_data) tuples;
+          indices must be 0..N-1 and may arrive in any order.
+        - max_concurrent_jobs<int> = number of workers verifying labels concurrently.
+        - show_print_statements<bool> = whether to print progress/logging statements during processing.
+        - on_result<async function> = optional callback awaited as on_result(index, result) as soon as
+          each item finishes, in completion order.
+        - pack_size<int> = maximum labels per vision request (1 sends one request per label).
+        - deadline_seconds<float or None> = time budget for the whole batch; labels not finished
+          by then get an 'error' result instead of being retried.
+        - batch_id<str or None> = ID under which results are checkpointed; items already
+          checkpointed under it (for the same image and application) are not verified again.
 
-        # Clean results, converting any exceptions into sanitized error dictionaries
-        cleaned_results = []
-        for result in batch_results:
-            if isinstance(result, Exception):
-                print(
-                    f"[WARNING] batch_result has invalid data: {result}. Sanitizing invalid data...",
-                    end="",
-                )
-                cleaned_results.append(
-                    {
-                        "overallStatus": "error",
-                        "summary": "Processing failed",
-                        "fields": [],
-                    }
-                )
-                print("done")
-            else:
-                cleaned_results.append(result)
-
-        # Append cleaned batch results to total results
-        total_batch_results.extend(cleaned_results)
-
-    # Return combined results for all batches
-    return total_batch_results
+    Return value<list>:
+        - List of verification results dictionaries ordered by index.
+        - Exceptions or invalid results are sanitized to dictionaries with 'error' status.
+        - Re-raises any exception raised by item_stream after stopping the workers.
+    """
+
+    # Every label shares the batch deadline; tasks started below inherit it from this context
+    deadline_token = deadlines.start_deadline(deadline_seconds)
+    # A batch without a submitter (e.g. from a script) takes its own turns in the admission queue
+    submitter_token = admission.submitter_var.set(admission.submitter_var.get() or admission.new_submitter_id())
+    try:
+        # Bounded hand-off between the producer and the worker pool
+        queue = asyncio.Queue(maxsize=max_concurrent_jobs * max(1, pack_size))
+        pack = AdaptivePackSize(pack_size)
+        results = {}
+        checkpoint = batch_checkpoints.open_checkpoint(batch_id)
+        if checkpoint is not None:
+            await checkpoint.load()
+
+        async def produce() -> None:
+            # Feed items into the queue, waiting whenever every worker is busy; items finished by an
+            # earlier run of this batch are answered from the checkpoint instead. If the stream fails,
+            # the error propagates straight away and the workers are cancelled with items still queued
+            async for item in item_stream:
+                restored = await checkpoint.restore(*item) if checkpoint is not None else None
+                if restored is not None:
+                    results[item[0]] = restored
+                    if on_result is not None:
+                        await on_result(item[0], restored)
+                    continue
+                await queue.put((time.perf_counter(), item))
+            for _ in range(max_concurrent_jobs):
+                await queue.put(None)
+
+        async def work() -> None:
+            # Verify items until the producer signals the end of the stream
+            finished = False
+            while not finished:
+                item = await queue.get()
+                if item is None:
+                    return
+
+                # Take more waiting labels to fill a pack, without waiting for new ones to arrive
+                group = [item]
+                while len(group) < pack.current:
+                    try:
+                        item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if item is None:
+                        finished = True  # This worker's stop signal; finish the group first
+                        break
+                    group.append(item)
+
+                now = time.perf_counter()
+                for queued_at, _ in group:
+                    observability.stage_seconds.observe(now - queued_at, stage="queue_wait")
+                indices = [index for _, (index, _, _) in group]
+                observability.label_index_var.set(indices[0] if len(group) == 1 else ",".join(map(str, indices)))
+                if show_print_statements:
+                    observability.log("INFO", "Starting batch image")
+
+                # Verify a single label, or the whole group in one packed request
+                try:
+                    if len(group) == 1:
+                        _, (index, image_bytes, app_data) = group[0]
+                        group_results = [await verify_with_retry(image_bytes, app_data, batch_img_id=index)]
+                    else:
+                        group_results, packed_ok = await verify_group_with_retry(
+                            [image_bytes for _, (_, image_bytes, _) in group],
+                            [app_data for _, (_, _, app_data) in group],
+                            batch_img_id=indices[0],
+                        )
+                        pack.record(packed_ok)
+                except Exception as e:
+                    group_results = [e] * len(group)
+                observability.label_index_var.set(None)
+
+                for (_, (index, image_bytes, app_data)), result in zip(group, group_results):
+                    result = sanitize_result(result)
+                    results[index] = result
+                    if checkpoint is not None:
+                        await checkpoint.record(index, image_bytes, app_data, result)
+                    if on_result is not None:
+                        await on_result(index, result)
+                group = item = image_bytes = app_data = None  # Release the images as soon as they have been checkpointed
+
+        # Run producer and workers together; if the producer fails, stop the workers and re-raise
+        workers = [asyncio.create_task(work()) for _ in range(max_concurrent_jobs)]
+        try:
+            await produce()
+            await asyncio.gather(*workers)
+        except BaseException:
+            for worker in workers:
+                worker.cancel()
+            raise
+
+        if checkpoint is not None:
+            if checkpoint.restored:
+                observability.log("INFO", "Batch resumed from checkpoint", batch_id=batch_id, restored=checkpoint.restored)
+            await checkpoint.finish()
+        return [results[index] for index in sorted(results)]
+    finally:
+        deadlines.deadline_var.reset(deadline_token)
+        admission.submitter_var.reset(submitter_token)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,2200 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import argparse
+import asyncio
+import io
+import json
+import re
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from fastapi import FastAPI, File, Form, UploadFile
+from PIL import Image
+from typing import List
+import httpx
+import openai
+import label_classifier
+import batch_processor
+import rate_limiter
+import fake_openai_server
+import result_cache
+import image_preprocessor
+import local_ocr
+import bulk_compare
+import bulk_verifier
+import warning_matcher
+import near_duplicates
+import text_regions
+import hedging
+import adaptive_concurrency
+import admission
+import circuit_breaker
+import observability
+import openai_pool
+import api
+
+### Constants
+BENCH_BATCH_SIZE = 100  # Number of labels in the synthetic batch
+BENCH_FAST_LATENCY_SECONDS = 0.05  # Typical mocked vision call latency
+BENCH_SLOW_LATENCY_SECONDS = 0.6  # Latency of the occasional slow/retrying label
+BENCH_SLOW_FRACTION = 0.1  # Fraction of labels that take the slow path
+BENCH_RANDOM_SEED = 1234
+
+BENCH_FAKE_SERVER_PORT = 8101
+BENCH_LIMITER_RPM = 60  # Requests allowed per BENCH_LIMITER_PERIOD_SECONDS
+BENCH_LIMITER_TPM = 100000  # Tokens allowed per BENCH_LIMITER_PERIOD_SECONDS
+BENCH_LIMITER_PERIOD_SECONDS = 3.0  # Shortened "minute" so the benchmark runs quickly
+BENCH_LIMITER_BATCH_SIZE = 150
+BENCH_LIMITER_CONCURRENCY = 20
+BENCH_LIMITER_CLIENT_OVERESTIMATE = 3.0  # Client starts at this multiple of the server's budget (limits set above the tier)
+
+BENCH_CACHE_UNIQUE_LABELS = 20
+BENCH_CACHE_RESUBMISSIONS = 3  # Times each label is resent after its first submission
+
+BENCH_STREAM_IMAGE_COUNT = 200
+BENCH_STREAM_IMAGE_BYTES = 1024 * 1024  # Synthetic image size; real labels run 0.05-3 MB
+BENCH_STREAM_UPLOAD_CHUNK_BYTES = 64 * 1024
+BENCH_STREAM_VERIFY_SECONDS = 0.02
+BENCH_API_SERVER_PORT = 8102
+BENCH_MULTIPART_BOUNDARY = "benchboundary7f3a9c"
+
+BENCH_OCR_FAKE_VISION_LATENCY_SECONDS = 2.0  # Offline stand-in for a typical vision call
+
+BENCH_FAULT_LABELS = 2000
+BENCH_FAULT_CONCURRENCY = 50
+BENCH_FAULT_LATENCY_SECONDS = 0.2  # Lognormal mean; sigma BENCH_FAULT_LATENCY_SIGMA
+BENCH_FAULT_LATENCY_SIGMA = 0.5
+BENCH_FAULT_RATE_LIMIT_FRACTION = 0.002
+BENCH_FAULT_MALFORMED_FRACTION = 0.01
+BENCH_FAULT_TIMEOUT_FRACTION = 0.005
+BENCH_FAULT_CLIENT_TIMEOUT_SECONDS = 2.0
+BENCH_FAULT_RPM = 20000  # Budget large enough that injected faults, not the limiter, dominate
+BENCH_FAULT_TPM = 50000000
+
+BENCH_BULK_BATCH_SECONDS = 1.0  # Fake batch completion time
+BENCH_BULK_ERROR_FRACTION = 0.1  # Batch requests that fail and are retried with the live API
+BENCH_BULK_POLL_SECONDS = 0.2
+
+BENCH_POOL_BURST_SIZE = 20
+# Idle seconds between bursts, as between batches submitted from the front end; some are under
+# the default client's 5 s keep-alive and some over, so both clients reuse some connections
+BENCH_POOL_GAPS_SECONDS = (1, 8, 3, 15, 2, 6)
+
+BENCH_HEDGE_LABELS = 1000
+BENCH_HEDGE_CONCURRENCY = 20
+BENCH_HEDGE_LATENCY_SECONDS = 0.3  # Lognormal mean; sigma BENCH_HEDGE_LATENCY_SIGMA gives a long tail
+BENCH_HEDGE_LATENCY_SIGMA = 1.0
+BENCH_HEDGE_PERCENTILE = 90
+BENCH_HEDGE_MIN_DELAY_SECONDS = 0.1
+BENCH_HEDGE_MAX_FRACTION = 0.15
+
+BENCH_COMPARE_ROWS = 1000000
+BENCH_COMPARE_BRANDS = 2000  # Distinct brands; real backlogs repeat the same products many times
+BENCH_COMPARE_TYPO_FRACTION = 0.3  # Extracted values with a one-character OCR-style error
+BENCH_COMPARE_MATCH_FRACTION = 0.3  # Rows where the model already flagged a match
+BENCH_COMPARE_EMPTY_FRACTION = 0.02
+BENCH_COMPARE_CLASS_TYPES = (
+    "Straight Rye Whisky",
+    "Kentucky Straight Bourbon Whiskey",
+    "Vodka",
+    "London Dry Gin",
+    "Cabernet Sauvignon",
+    "India Pale Ale",
+    "Blended Scotch Whisky",
+    "Spiced Rum",
+)
+BENCH_COMPARE_ALCOHOL_CONTENTS = ("40%", "45 %", "90 Proof", "Alc. 40% by Vol.", "12.5% ALC/VOL", "5.2%", "46.5%")
+BENCH_COMPARE_NET_CONTENTS = ("750 mL", "750mL", "1 L", "1.75 L", "12 FL OZ", "355 mL", "50 mL")
+
+BENCH_WARNING_ROWS = 200000
+BENCH_WARNING_DISTINCT_TEXTS = 2000  # Distinct flagged warning texts the rows are drawn from
+BENCH_WARNING_DROP_MARKER_FRACTION = 0.3  # Texts where OCR also lost a "(n)" clause marker
+
+BENCH_MEASUREMENT_ROWS = 500000
+# (label text, application value) pairs that state the same thing in different units or formats
+BENCH_MEASUREMENT_EQUIVALENTS = (
+    ("net_contents", "75 cL", "750 mL"),
+    ("net_contents", "25.4 FL OZ", "750 mL"),
+    ("net_contents", "750ML", "750 mL"),
+    ("net_contents", "1 Liter", "1000 mL"),
+    ("net_contents", "16 fl oz", "1 pint"),
+    ("net_contents", "12 FL. OZ.", "355 mL"),
+    ("net_contents", "1.75 L", "1750 mL"),
+    ("alcohol_content", "90 Proof", "45 %"),  # Still a warning by design: the format differs
+    ("alcohol_content", "45% Alc./Vol. (90 Proof)", "45 %"),
+    ("alcohol_content", "Alc. 40% by Vol.", "40 %"),
+)
+# Pairs that really differ, to check they still fail
+BENCH_MEASUREMENT_MISMATCHES = (
+    ("net_contents", "700 mL", "750 mL"),
+    ("net_contents", "1 L", "750 mL"),
+    ("net_contents", "12 FL OZ", "750 mL"),
+    ("alcohol_content", "80 Proof", "45 %"),
+    ("alcohol_content", "90 Proof", "90 %"),
+    ("alcohol_content", "40%", "45 %"),
+)
+
+BENCH_PACK_SIZES = (1, 2, 3, 4)
+BENCH_PACK_LABELS = 48
+
+BENCH_NEAR_DUPLICATE_SCALES = (0.5, 0.75)  # Resized copies added per corpus image (one PNG, one JPEG)
+BENCH_NEAR_DUPLICATE_JPEG_QUALITY = 85
+
+BENCH_MULTI_WORKER_COUNT = 3  # uvicorn worker processes
+BENCH_MULTI_WORKER_PORT = 8103
+BENCH_MULTI_WORKER_LABELS = 48  # Concurrent /verify requests, sent twice (the second round should hit the cache)
+BENCH_MULTI_WORKER_RPM = 40  # Org-wide budget enforced by the fake server and configured in every worker
+BENCH_MULTI_WORKER_MAX_CONCURRENT = 5  # Shared vision call slots
+BENCH_MULTI_WORKER_LATENCY_SECONDS = 0.5
+BENCH_MULTI_WORKER_STARTUP_SECONDS = 30.0
+
+BENCH_AIMD_LABELS = 120
+BENCH_AIMD_LATENCY_SECONDS = 0.3
+BENCH_AIMD_BATCHES = 8  # Batches submitted at once, each with batch_processor's own worker count
+BENCH_AIMD_FIXED_CONCURRENCY = 5  # The fixed admission limit adaptive concurrency replaces...
+BENCH_AIMD_FIXED_HIGH_CONCURRENCY = 32  # ...and a fixed limit high enough for the headroom profile
+BENCH_AIMD_SERVER_CONCURRENCY = 12  # Requests in flight the "throttled" server accepts before answering 429
+BENCH_AIMD_RETRY_AFTER_SECONDS = 0.5
+BENCH_AIMD_OUTAGE_LABELS = 60
+BENCH_AIMD_CLIENT_TIMEOUT_SECONDS = 1.0  # Every call times out in the "outage" profile
+
+BENCH_CHECKPOINT_PORT = 8104
+BENCH_CHECKPOINT_LABELS = 40  # Labels in the /jobs batch that is interrupted and resubmitted
+BENCH_CHECKPOINT_KILL_FRACTION = 0.5  # The worker is killed once this share of the labels has finished
+BENCH_CHECKPOINT_LATENCY_SECONDS = 0.3
+BENCH_CHECKPOINT_POLL_SECONDS = 0.1
+
+BENCH_ADMISSION_MAX_IN_FLIGHT = 5
+BENCH_ADMISSION_LATENCY_SECONDS = 0.3
+BENCH_ADMISSION_LARGE_BATCHES = 6  # One submitter sends several batches at once...
+BENCH_ADMISSION_LARGE_BATCH = 40
+BENCH_ADMISSION_SMALL_BATCH = 24  # ...and another submitter one small batch, a second later
+BENCH_ADMISSION_BATCH_CONCURRENCY = 20
+BENCH_ADMISSION_INTERACTIVE = 30  # Single-label checks arriving while the batches run
+BENCH_ADMISSION_INTERACTIVE_INTERVAL_SECONDS = 0.2
+
+BENCH_PROMPT_MALFORMED_FRACTION = 0.05  # Free-text replies the fake server truncates
+BENCH_PROMPT_CONCURRENCY = 5
+
+BENCH_CORPUS_CONCURRENCY_LEVELS = (1, 5, 10, 20)
+BENCH_CORPUS_REPEAT = 3  # Copies of the corpus per run, for more latency samples
+BENCH_CORPUS_FAKE_LATENCY_SECONDS = 0.5
+BENCH_CORPUS_PERCENTILES = (50, 90, 95, 99)
+
+TESTS_FOLDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../tests")
+
+# Maps result field names to the keys used in tests/expected_results.json
+EXPECTED_RESULTS_FIELD_KEYS = {
+    "Brand Name": "brand_name",
+    "Class/Type": "class_type",
+    "Alcohol Content": "alcohol_content",
+    "Net Contents": "net_contents",
+    "Government Warning": "gov_warning",
+}
+
+BENCH_APP_DATA = {
+    label_classifier.BRAND_NAME_STR: "ABC",
+    label_classifier.CLASS_TYPE_STR: "Straight Rye Whisky",
+    label_classifier.ALC_CONTENT_STR: "45 %",
+    "net_contents_amount": "750",
+    "net_contents_unit": "mL",
+    label_classifier.NET_CONTENT_STR: "750 mL",
+}
+
+
+def make_skewed_latencies(
+    batch_size: int = BENCH_BATCH_SIZE,
+    fast_seconds: float = BENCH_FAST_LATENCY_SECONDS,
+    slow_seconds: float = BENCH_SLOW_LATENCY_SECONDS,
+    slow_fraction: float = BENCH_SLOW_FRACTION,
+    seed: int = BENCH_RANDOM_SEED,
+) -> list:
+    """
+    Builds a reproducible list of per-label latencies where most labels are fast and a
+    small fraction are slow, mimicking the long tail of real vision API calls.
+
+    Parameter values:
+        - batch_size<int> = number of latencies to generate.
+        - fast_seconds<float> = latency assigned to normal labels.
+        - slow_seconds<float> = latency assigned to slow labels.
+        - slow_fraction<float> = probability that a label is slow.
+        - seed<int> = random seed so runs are comparable.
+
+    Return value<list>:
+        - List of latencies in seconds, one per label.
+    """
+
+    rng = random.Random(seed)
+    return [
+        slow_seconds if rng.random() < slow_fraction else fast_seconds
+        for _ in range(batch_size)
+    ]
+
+
+def install_mock_verify_label(latencies: list):
+    """
+    Replaces `label_classifier.verify_label` with a coroutine that sleeps for the latency
+    stored in the application data, so no real API calls are made.
+
+    Parameter values:
+        - latencies<list> = per-label latencies; indexed through app_data["bench_index"].
+
+    Return value<function>:
+        - The original `verify_label` so the caller can restore it.
+    """
+
+    original_verify_label = label_classifier.verify_label
+
+    async def mock_verify_label(image_bytes, application_data, running_from_main=False):
+        await asyncio.sleep(latencies[application_data["bench_index"]])
+        return {
+            "overallStatus": "approved",
+            "summary": "All fields verified.",
+            "fields": [],
+            "bench_index": application_data["bench_index"],
+        }
+
+    label_classifier.verify_label = mock_verify_label
+    return original_verify_label
+
+
+async def process_batch_fixed_chunks(total_batch: list, max_concurrent_jobs: int) -> list:
+    """
+    Reference implementation of the previous fixed-chunk scheduler, where each chunk of
+    max_concurrent_jobs items must fully finish before the next chunk starts.
+
+    Parameter values:
+        - total_batch<list> = list of (image_bytes, application_data) pairs.
+        - max_concurrent_jobs<int> = chunk size.
+
+    Return value<list>:
+        - List of verification results in input order.
+    """
+
+    results = []
+    for i in range(0, len(total_batch), max_concurrent_jobs):
+        batch = total_batch[i : i + max_concurrent_jobs]
+        batch_results = await asyncio.gather(
+            *(
+                batch_processor.verify_with_retry(item[0], item[1], batch_img_id=i + j)
+                for j, item in enumerate(batch)
+            ),
+            return_exceptions=True,
+        )
+        results.extend(batch_processor.sanitize_result(r) for r in batch_results)
+    return results
+
+
+async def benchmark_scheduler(
+    batch_size: int = BENCH_BATCH_SIZE,
+    max_concurrent_jobs: int = batch_processor.MAX_CONCURRENT_JOBS_NUM,
+) -> dict:
+    """
+    Compares wall-clock time of the fixed-chunk scheduler against the sliding-window
+    scheduler in `batch_processor.process_batch` using a mocked `verify_label`.
+
+    Parameter values:
+        - batch_size<int> = number of labels in the synthetic batch.
+        - max_concurrent_jobs<int> = concurrency limit used by both schedulers.
+
+    Return value<dict>:
+        - Dictionary with wall-clock seconds for each scheduler, the speedup, and whether
+          results came back in input order.
+    """
+
+    # Build synthetic batch and install mock
+    latencies = make_skewed_latencies(batch_size)
+    original_verify_label = install_mock_verify_label(latencies)
+    total_batch = [[b"", {"bench_index": i}] for i in range(batch_size)]
+
+    # Time the old fixed-chunk scheduler
+    start = time.perf_counter()
+    await process_batch_fixed_chunks(total_batch, max_concurrent_jobs)
+    chunked_seconds = time.perf_counter() - start
+
+    # Time the sliding-window scheduler
+    start = time.perf_counter()
+    results = await batch_processor.process_batch(total_batch, max_concurrent_jobs)
+    sliding_seconds = time.perf_counter() - start
+
+    label_classifier.verify_label = original_verify_label
+    return {
+        "batch_size": batch_size,
+        "max_concurrent_jobs": max_concurrent_jobs,
+        "ideal_seconds": round(sum(latencies) / max_concurrent_jobs, 3),
+        "fixed_chunk_seconds": round(chunked_seconds, 3),
+        "sliding_window_seconds": round(sliding_seconds, 3),
+        "speedup": round(chunked_seconds / sliding_seconds, 2),
+        "results_in_order": [r["bench_index"] for r in results] == list(range(batch_size)),
+    }
+
+
+async def benchmark_rate_limiter(
+    batch_size: int = BENCH_LIMITER_BATCH_SIZE,
+    max_concurrent_jobs: int = BENCH_LIMITER_CONCURRENCY,
+) -> dict:
+    """
+    Drives `process_batch` at full concurrency against a local fake OpenAI server that
+    enforces RPM/TPM limits, and counts how many requests the server rejected with 429. The
+    client limiter starts with BENCH_LIMITER_CLIENT_OVERESTIMATE times the server's budget, as
+    when OPENAI_RPM_LIMIT/OPENAI_TPM_LIMIT are set above the account's tier, so only the
+    x-ratelimit-* headers can bring it down to the real budget. The batch runs once with the
+    headers ignored and once with them applied.
+
+    Parameter values:
+        - batch_size<int> = number of labels to verify.
+        - max_concurrent_jobs<int> = concurrency used by `process_batch`.
+
+    Return value<dict>:
+        - Per run: accepted/rate-limited request counts, throughput, and limiter wait time.
+    """
+
+    report = {
+        "batch_size": batch_size,
+        "max_concurrent_jobs": max_concurrent_jobs,
+        "server_rpm": BENCH_LIMITER_RPM,
+        "client_starting_rpm": int(BENCH_LIMITER_RPM * BENCH_LIMITER_CLIENT_OVERESTIMATE),
+    }
+    original_limiter = rate_limiter.shared_limiter
+    try:
+        for use_headers in (False, True):
+            # Fake server with a shortened rate-limit period; the client overestimates its budget
+            stop_server = use_fake_openai_server(
+                requests_per_minute=BENCH_LIMITER_RPM,
+                tokens_per_minute=BENCH_LIMITER_TPM,
+                period_seconds=BENCH_LIMITER_PERIOD_SECONDS,
+            )
+            rate_limiter.shared_limiter = rate_limiter.RateLimiter(
+                int(BENCH_LIMITER_RPM * BENCH_LIMITER_CLIENT_OVERESTIMATE),
+                int(BENCH_LIMITER_TPM * BENCH_LIMITER_CLIENT_OVERESTIMATE),
+                BENCH_LIMITER_PERIOD_SECONDS,
+            )
+            if not use_headers:
+                rate_limiter.shared_limiter.update_from_headers = lambda headers: None
+
+            # Run the batch with unique images so the result cache never short-circuits a call
+            total_batch = [
+                [f"fake-image-{use_headers}-{i}".encode(), dict(BENCH_APP_DATA)] for i in range(batch_size)
+            ]
+            start = time.perf_counter()
+            await batch_processor.process_batch(total_batch, max_concurrent_jobs)
+            elapsed = time.perf_counter() - start
+
+            stats = stop_server.app.state.stats
+            stop_server()
+            report["header_corrected" if use_headers else "headers_ignored"] = {
+                "accepted_requests": stats["accepted"],
+                "rate_limited_requests": stats["rate_limited"],
+                "rate_limited_fraction": round(
+                    stats["rate_limited"] / max(stats["accepted"] + stats["rate_limited"], 1), 4
+                ),
+                "elapsed_seconds": round(elapsed, 3),
+                "requests_per_period": round(batch_size / elapsed * BENCH_LIMITER_PERIOD_SECONDS, 1),
+                "limiter_wait_seconds": round(rate_limiter.shared_limiter.total_wait_seconds, 3),
+            }
+    finally:
+        rate_limiter.shared_limiter = original_limiter
+
+    return report
+
+
+def use_fake_openai_server(
+    port: int = BENCH_FAKE_SERVER_PORT, client_timeout: float = None, **server_options
+):
+    """
+    Starts a fake OpenAI server and points `label_classifier.openai_client` at it, built like the
+    API's client (no SDK retries, so every 429 reaches `batch_processor`).
+
+    Parameter values:
+        - port<int> = local port for the fake server.
+        - client_timeout<float> = request timeout for the client (None keeps the SDK default).
+        - server_options<dict> = keyword arguments passed to `fake_openai_server.create_app`.
+
+    Return value<function>:
+        - Zero-argument function that stops the server and restores the original client.
+    """
+
+    fake_app = fake_openai_server.create_app(**server_options)
+    stop_fake_server = fake_openai_server.run_in_background(fake_app, port)
+    original_client = label_classifier.openai_client
+    client_options = {} if client_timeout is None else {"timeout": client_timeout}
+    label_classifier.openai_client = openai_pool.create_openai_client(
+        BENCH_FAULT_CONCURRENCY, api_key="fake", base_url=f"http://127.0.0.1:{port}/v1", **client_options
+    )
+
+    def stop():
+        label_classifier.openai_client = original_client
+        stop_fake_server()
+
+    stop.app = fake_app
+    return stop
+
+
+async def benchmark_result_cache(
+    unique_labels: int = BENCH_CACHE_UNIQUE_LABELS,
+    resubmissions: int = BENCH_CACHE_RESUBMISSIONS,
+) -> dict:
+    """
+    Sends each of `unique_labels` labels once, then resends every one `resubmissions` times
+    with cosmetically different application data, and reports the cache hit rate and the
+    latency of cold calls versus cache hits.
+
+    Parameter values:
+        - unique_labels<int> = number of distinct (image, application) pairs.
+        - resubmissions<int> = number of repeat submissions of each pair.
+
+    Return value<dict>:
+        - Dictionary with API call count, cache stats, and mean cold/hit latency in milliseconds.
+    """
+
+    stop_server = use_fake_openai_server()
+    result_cache.verification_cache = result_cache.ResultCache()
+    images = [f"fake-image-{i}".encode() for i in range(unique_labels)]
+
+    # Cold pass: every label misses and calls the API
+    start = time.perf_counter()
+    for image in images:
+        await label_classifier.verify_label(image, dict(BENCH_APP_DATA))
+    cold_ms = (time.perf_counter() - start) * 1000 / unique_labels
+
+    # Resubmissions with different casing/whitespace in the application should all hit
+    resubmitted_app_data = {
+        key: f"  {value.upper()} " if isinstance(value, str) else value
+        for key, value in BENCH_APP_DATA.items()
+    }
+    start = time.perf_counter()
+    for _ in range(resubmissions):
+        for image in images:
+            await label_classifier.verify_label(image, dict(resubmitted_app_data))
+    hit_ms = (time.perf_counter() - start) * 1000 / (unique_labels * resubmissions)
+
+    api_calls = stop_server.app.state.stats["accepted"]
+    stop_server()
+
+    return {
+        "submissions": unique_labels * (resubmissions + 1),
+        "api_calls": api_calls,
+        "cache": result_cache.verification_cache.get_stats(),
+        "cold_mean_ms": round(cold_ms, 3),
+        "hit_mean_ms": round(hit_ms, 3),
+    }
+
+
+async def benchmark_extraction_reuse(variant_count: int = 5) -> dict:
+    """
+    Verifies one image against several edited application variants in extract-only mode and
+    counts the API calls made; only the first extraction should reach the API.
+
+    Parameter values:
+        - variant_count<int> = number of application variants to verify.
+
+    Return value<dict>:
+        - Dictionary with the number of verifications, API calls, and per-variant statuses.
+    """
+
+    stop_server = use_fake_openai_server()
+    original_mode = label_classifier.EXTRACTION_MODE
+    label_classifier.EXTRACTION_MODE = label_classifier.EXTRACTION_MODE_EXTRACT_ONLY
+    result_cache.verification_cache = result_cache.ResultCache()
+    result_cache.extraction_cache = result_cache.ResultCache(table="extractions")
+
+    # Each variant fixes a "typo" in the brand name, like a reviewer editing the application
+    variants = [
+        {**BENCH_APP_DATA, label_classifier.BRAND_NAME_STR: f"ABC {i}"}
+        for i in range(variant_count)
+    ]
+    results = await label_classifier.verify_label_variants(b"fake-image", variants)
+
+    # A later single /verify of another edited application also reuses the extraction
+    await label_classifier.verify_label(
+        b"fake-image", {**BENCH_APP_DATA, label_classifier.BRAND_NAME_STR: "ABD"}
+    )
+
+    api_calls = stop_server.app.state.stats["accepted"]
+    stop_server()
+    label_classifier.EXTRACTION_MODE = original_mode
+
+    return {
+        "verifications": variant_count + 1,
+        "api_calls": api_calls,
+        "statuses": [r["overallStatus"] for r in results],
+    }
+
+
+def load_test_corpus(tests_folder_path: str = TESTS_FOLDER_PATH) -> list:
+    """
+    Loads every labelled example from tests/: the image, its application, and the expected
+    per-field outcome from tests/expected_results.json.
+
+    Parameter values:
+        - tests_folder_path<str> = path to the tests folder.
+
+    Return value<list>:
+        - List of dicts with 'name', 'image_bytes', 'app_data' and 'expected' keys, sorted by name.
+    """
+
+    with open(os.path.join(tests_folder_path, "expected_results.json"), "r", encoding="utf-8") as f:
+        expected_results = json.load(f)
+
+    corpus = []
+    for name, entry in sorted(expected_results.items()):
+        image_path = os.path.join(tests_folder_path, "test_images", name + entry["image_type"])
+        app_path = os.path.join(tests_folder_path, "applications", name + ".json")
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+        with open(app_path, "r", encoding="utf-8") as f:
+            app_data = json.load(f)
+        corpus.append(
+            {
+                "name": name,
+                "image_bytes": image_bytes,
+                "app_data": app_data,
+                "expected": entry["expected_values"],
+            }
+        )
+    return corpus
+
+
+def score_accuracy(corpus: list, results: list) -> dict:
+    """
+    Scores verification results against tests/expected_results.json. A field counts as correct
+    when it passed and was expected to, or did not pass and was expected not to.
+
+    Parameter values:
+        - corpus<list> = output of `load_test_corpus`.
+        - results<list> = verification results in the same order as corpus.
+
+    Return value<dict>:
+        - Per-field accuracy, overall accuracy, and the names of misclassified labels per field.
+    """
+
+    correct = {key: 0 for key in EXPECTED_RESULTS_FIELD_KEYS.values()}
+    misses = {key: [] for key in EXPECTED_RESULTS_FIELD_KEYS.values()}
+    for example, result in zip(corpus, results):
+        statuses = {f["field"]: f["status"] for f in (result or {}).get("fields", [])}
+        for field_name, key in EXPECTED_RESULTS_FIELD_KEYS.items():
+            if (statuses.get(field_name) == "pass") == example["expected"][key]:
+                correct[key] += 1
+            else:
+                misses[key].append(example["name"])
+
+    total = len(corpus) * len(correct)
+    return {
+        "per_field": {key: round(count / len(corpus), 4) for key, count in correct.items()},
+        "overall": round(sum(correct.values()) / total, 4) if total else 0.0,
+        "misclassified": misses,
+    }
+
+
+async def benchmark_preprocessing_accuracy() -> dict:
+    """
+    Runs the tests/ corpus through the live vision API with image preprocessing off and then on,
+    and reports per-field accuracy against tests/expected_results.json alongside the bytes and
+    estimated image tokens saved. Requires a real OPENAI_API_KEY.
+
+    Return value<dict>:
+        - Accuracy for each run plus preprocessing totals.
+    """
+
+    corpus = load_test_corpus()
+    total_batch = [[example["image_bytes"], example["app_data"]] for example in corpus]
+    report = {}
+
+    for enabled in (False, True):
+        # Fresh caches so the second run really calls the API
+        result_cache.verification_cache = result_cache.ResultCache()
+        result_cache.extraction_cache = result_cache.ResultCache(table="extractions")
+        image_preprocessor.PREPROCESS_ENABLED = enabled
+
+        results = await batch_processor.process_batch(total_batch)
+        report["preprocessed" if enabled else "original"] = score_accuracy(corpus, results)
+
+    report["preprocessing"] = image_preprocessor.get_preprocess_stats()
+    return report
+
+
+def percentile(values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of numbers.
+
+    Parameter values:
+        - values<list> = samples (any order).
+        - pct<float> = percentile between 0 and 100.
+
+    Return value<float>:
+        - The sample at that rank, or 0.0 for an empty list.
+    """
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+async def run_timed_batch(total_batch: list, max_concurrent_jobs: int) -> tuple:
+    """
+    Runs a batch through `batch_processor.process_batch`, timing each label from when it gets
+    a concurrency slot until its result (retries included).
+
+    Parameter values:
+        - total_batch<list> = [image_bytes, application_data] pairs.
+        - max_concurrent_jobs<int> = concurrency level to run at.
+
+    Return value<tuple>:
+        - Tuple of (results, latencies, elapsed_seconds).
+    """
+
+    latencies = []
+    original_verify_with_retry = batch_processor.verify_with_retry
+
+    async def timed_verify_with_retry(image: bytes, app_data: dict, batch_img_id: int) -> dict:
+        start = time.perf_counter()
+        try:
+            return await original_verify_with_retry(image, app_data, batch_img_id)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    batch_processor.verify_with_retry = timed_verify_with_retry
+    start = time.perf_counter()
+    try:
+        results = await batch_processor.process_batch(total_batch, max_concurrent_jobs=max_concurrent_jobs)
+    finally:
+        batch_processor.verify_with_retry = original_verify_with_retry
+    return results, latencies, time.perf_counter() - start
+
+
+async def run_corpus_at_concurrency(
+    corpus: list, max_concurrent_jobs: int, use_cache: bool = False
+) -> dict:
+    """
+    Runs the corpus once through `batch_processor.process_batch` and measures it. Each label's
+    latency is timed from when it gets a concurrency slot until its result (retries included).
+
+    Parameter values:
+        - corpus<list> = output of `load_test_corpus`, possibly repeated.
+        - max_concurrent_jobs<int> = concurrency level to run at.
+        - use_cache<bool> = keep the result caches on; off measures every label's full cost.
+
+    Return value<dict>:
+        - Latency percentiles, throughput, bytes uploaded, tokens consumed, errors, and accuracy.
+    """
+
+    # Start from empty caches and counters so runs are comparable
+    cache_size = result_cache.CACHE_MEMORY_MAX_ENTRIES if use_cache else 0
+    result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=cache_size, db_path="")
+    result_cache.extraction_cache = result_cache.ResultCache(memory_max_entries=cache_size, db_path="", table="extractions")
+    label_classifier.reset_vision_usage_stats()
+    image_preprocessor.reset_preprocess_stats()
+    rate_limiter.shared_limiter = rate_limiter.RateLimiter()
+
+    # Time every label through the same retry path the API uses
+    total_batch = [[example["image_bytes"], dict(example["app_data"])] for example in corpus]
+    results, latencies, elapsed = await run_timed_batch(total_batch, max_concurrent_jobs)
+
+    usage = label_classifier.get_vision_usage_stats()
+    return {
+        "concurrency": max_concurrent_jobs,
+        "labels": len(corpus),
+        "elapsed_seconds": round(elapsed, 3),
+        "labels_per_minute": round(len(corpus) / elapsed * 60, 1),
+        "latency_seconds": {
+            **{f"p{pct}": round(percentile(latencies, pct), 3) for pct in BENCH_CORPUS_PERCENTILES},
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+        "api_requests": usage["requests"],
+        "bytes_uploaded": usage["image_bytes"],
+        "tokens": {
+            "prompt": usage["prompt_tokens"],
+            "completion": usage["completion_tokens"],
+            "total": usage["total_tokens"],
+        },
+        "preprocessing": image_preprocessor.get_preprocess_stats(),
+        "limiter_wait_seconds": round(rate_limiter.shared_limiter.total_wait_seconds, 3),
+        "errors": sum(1 for r in results if r is None or r.get("overallStatus") == "error"),
+        "accuracy": score_accuracy(corpus, results),
+    }
+
+
+async def benchmark_corpus(
+    concurrency_levels: tuple = BENCH_CORPUS_CONCURRENCY_LEVELS,
+    repeat: int = BENCH_CORPUS_REPEAT,
+    live: bool = False,
+    use_cache: bool = False,
+    recordings_path: str = "",
+) -> dict:
+    """
+    Benchmarks the full verification pipeline on tests/test_images at several concurrency
+    levels, against the fake OpenAI server (default) or the real API. The report is plain JSON
+    so runs before and after a change to concurrency, caching, or preprocessing can be diffed.
+    Offline, accuracy is only meaningful when replaying replies recorded from the real API;
+    unrecorded images get a fixed empty extraction.
+
+    Parameter values:
+        - concurrency_levels<tuple> = concurrency levels to run, one full pass each.
+        - repeat<int> = copies of the corpus per pass.
+        - live<bool> = True to call the real OpenAI API (uses quota).
+        - use_cache<bool> = keep the result caches on during each pass.
+        - recordings_path<str> = fake server recordings to replay (see fake_openai_server.py).
+
+    Return value<dict>:
+        - Run settings plus one entry per concurrency level from `run_corpus_at_concurrency`.
+    """
+
+    corpus = load_test_corpus() * repeat
+    stop_server = None if live else use_fake_openai_server(
+        latency_seconds=BENCH_CORPUS_FAKE_LATENCY_SECONDS, recordings_path=recordings_path
+    )
+    original_limiter = rate_limiter.shared_limiter
+
+    runs = []
+    try:
+        for level in concurrency_levels:
+            runs.append(await run_corpus_at_concurrency(corpus, level, use_cache))
+    finally:
+        rate_limiter.shared_limiter = original_limiter
+        if stop_server is not None:
+            stop_server()
+
+    return {
+        "backend": "live" if live else "fake",
+        "fake_latency_seconds": None if live else BENCH_CORPUS_FAKE_LATENCY_SECONDS,
+        "recordings": None if live else recordings_path or None,
+        "corpus_labels": len(corpus) // repeat,
+        "repeat": repeat,
+        "use_cache": use_cache,
+        "preprocess_enabled": image_preprocessor.PREPROCESS_ENABLED,
+        "local_ocr_enabled": local_ocr.LOCAL_OCR_ENABLED and local_ocr.is_ocr_available(),
+        "runs": runs,
+    }
+
+
+async def benchmark_prompt_format(live: bool = False) -> dict:
+    """
+    Runs the test corpus twice per mode, once against each label's application and once against
+    an edited copy of it (as when a reviewer corrects a field). The modes are the original
+    message layout (no system message; the image, then the expected values and instructions as
+    one text) with free-text JSON replies, and the current layout with free-text replies and with
+    structured outputs. Against the fake server, free-text replies are truncated at
+    BENCH_PROMPT_MALFORMED_FRACTION and prompt caching follows OpenAI's rules (see
+    fake_openai_server.py).
+
+    Parameter values:
+        - live<bool> = True to call the real OpenAI API (uses quota).
+
+    Return value<dict>:
+        - Per mode: vision requests, prompt tokens, cached prompt tokens and their share, and
+          replies that failed to parse and their rate.
+    """
+
+    corpus = load_test_corpus()
+    original_structured = label_classifier.VISION_STRUCTURED_OUTPUTS
+    original_limiter = rate_limiter.shared_limiter
+    build_vision_request = label_classifier.build_vision_request
+
+    def edited(app_data: dict) -> dict:
+        return {**app_data, label_classifier.BRAND_NAME_STR: app_data[label_classifier.BRAND_NAME_STR] + " Reserve"}
+
+    async def build_original_order_request(image_bytes, instructions: str, prompt: str, response_format: dict) -> tuple:
+        # The layout before the reordering: one user message with the image first, then the expected
+        # values (which the old prompt listed right after its opening line) and the instructions
+        body, upload_size = await build_vision_request(image_bytes, instructions, prompt, response_format)
+        image_parts = body["messages"][1]["content"][:-1] if prompt else body["messages"][1]["content"]
+        text = f"{prompt}\n\n{instructions}" if prompt else instructions
+        body["messages"] = [{"role": "user", "content": image_parts + [{"type": "text", "text": text}]}]
+        return body, upload_size
+
+    report = {"backend": "live" if live else "fake", "labels": len(corpus)}
+    try:
+        for mode, structured, request_builder in (
+            ("original_order", False, build_original_order_request),
+            ("free_text", False, build_vision_request),
+            ("structured", True, build_vision_request),
+        ):
+            stop_server = None if live else use_fake_openai_server(
+                latency_seconds=BENCH_CORPUS_FAKE_LATENCY_SECONDS, malformed_fraction=BENCH_PROMPT_MALFORMED_FRACTION
+            )
+            label_classifier.VISION_STRUCTURED_OUTPUTS = structured
+            label_classifier.build_vision_request = request_builder
+            result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+            result_cache.extraction_cache = result_cache.ResultCache(memory_max_entries=0, db_path="", table="extractions")
+            rate_limiter.shared_limiter = rate_limiter.RateLimiter()
+            label_classifier.reset_vision_usage_stats()
+            try:
+                for make_app_data in (dict, edited):
+                    await batch_processor.process_batch(
+                        [[example["image_bytes"], make_app_data(example["app_data"])] for example in corpus],
+                        max_concurrent_jobs=BENCH_PROMPT_CONCURRENCY,
+                    )
+            finally:
+                if stop_server is not None:
+                    stop_server()
+
+            usage = label_classifier.get_vision_usage_stats()
+            replies = usage["requests"]
+            report[mode] = {
+                "vision_requests": replies,
+                "prompt_tokens": usage["prompt_tokens"],
+                "cached_tokens": usage["cached_tokens"],
+                "cached_share": round(usage["cached_tokens"] / usage["prompt_tokens"], 3) if usage["prompt_tokens"] else 0.0,
+                "parse_failures": usage["parse_failures"],
+                "parse_failure_rate": round(usage["parse_failures"] / replies, 3) if replies else 0.0,
+            }
+    finally:
+        label_classifier.VISION_STRUCTURED_OUTPUTS = original_structured
+        label_classifier.build_vision_request = build_vision_request
+        rate_limiter.shared_limiter = original_limiter
+
+    return report
+
+
+async def benchmark_fault_injection(
+    label_count: int = BENCH_FAULT_LABELS,
+    max_concurrent_jobs: int = BENCH_FAULT_CONCURRENCY,
+) -> dict:
+    """
+    Stress-tests `batch_processor` against the fake OpenAI server with a long-tailed latency
+    distribution and injected 429s, malformed JSON replies, and hung requests, and reports the
+    throughput reached and how each failure surfaced in the results.
+
+    Parameter values:
+        - label_count<int> = number of distinct labels to verify.
+        - max_concurrent_jobs<int> = concurrency level.
+
+    Return value<dict>:
+        - Throughput, the fake server's outcome counters, and result counts by overall status.
+    """
+
+    stop_server = use_fake_openai_server(
+        client_timeout=BENCH_FAULT_CLIENT_TIMEOUT_SECONDS,
+        requests_per_minute=BENCH_FAULT_RPM,
+        tokens_per_minute=BENCH_FAULT_TPM,
+        latency_seconds=BENCH_FAULT_LATENCY_SECONDS,
+        latency_distribution="lognormal",
+        latency_spread=BENCH_FAULT_LATENCY_SIGMA,
+        rate_limit_fraction=BENCH_FAULT_RATE_LIMIT_FRACTION,
+        retry_after_seconds=0.5,
+        malformed_fraction=BENCH_FAULT_MALFORMED_FRACTION,
+        timeout_fraction=BENCH_FAULT_TIMEOUT_FRACTION,
+        timeout_seconds=BENCH_FAULT_CLIENT_TIMEOUT_SECONDS * 2,
+        seed=BENCH_RANDOM_SEED,
+    )
+    result_cache.verification_cache = result_cache.ResultCache(db_path="")
+    original_limiter = rate_limiter.shared_limiter
+    rate_limiter.shared_limiter = rate_limiter.RateLimiter(BENCH_FAULT_RPM, BENCH_FAULT_TPM)
+
+    # Distinct images so nothing is served from the cache
+    total_batch = [[f"fault-image-{i}".encode(), dict(BENCH_APP_DATA)] for i in range(label_count)]
+    start = time.perf_counter()
+    try:
+        results = await batch_processor.process_batch(total_batch, max_concurrent_jobs=max_concurrent_jobs)
+    finally:
+        elapsed = time.perf_counter() - start
+        server_stats = dict(stop_server.app.state.stats)
+        rate_limiter.shared_limiter = original_limiter
+        stop_server()
+
+    statuses = {}
+    for result in results:
+        status = result["overallStatus"] if result else "none"
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        "labels": label_count,
+        "concurrency": max_concurrent_jobs,
+        "elapsed_seconds": round(elapsed, 3),
+        "labels_per_minute": round(label_count / elapsed * 60, 1),
+        "server": server_stats,
+        "result_statuses": statuses,
+    }
+
+
+async def benchmark_packing(
+    pack_sizes: tuple = BENCH_PACK_SIZES, label_count: int = BENCH_PACK_LABELS
+) -> dict:
+    """
+    Verifies the tests/ corpus (repeated to label_count labels) with each pack size against the
+    fake OpenAI server and reports vision requests and tokens per label. Token counts use the
+    fake server's estimate (prompt characters plus a fixed cost per image).
+
+    Parameter values:
+        - pack_sizes<tuple> = labels per vision request to compare.
+        - label_count<int> = labels verified per pack size.
+
+    Return value<dict>:
+        - One entry per pack size with requests, tokens, and elapsed time per label.
+    """
+
+    corpus = load_test_corpus()
+    total_batch = [
+        [corpus[i % len(corpus)]["image_bytes"], dict(corpus[i % len(corpus)]["app_data"])]
+        for i in range(label_count)
+    ]
+    stop_server = use_fake_openai_server()
+
+    report = {}
+    try:
+        for pack_size in pack_sizes:
+            # Caches off so every label is sent
+            result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+            label_classifier.reset_vision_usage_stats()
+
+            start = time.perf_counter()
+            results = await batch_processor.process_batch(total_batch, pack_size=pack_size)
+            elapsed = time.perf_counter() - start
+
+            usage = label_classifier.get_vision_usage_stats()
+            report[f"k{pack_size}"] = {
+                "requests_per_label": round(usage["requests"] / label_count, 3),
+                "prompt_tokens_per_label": round(usage["prompt_tokens"] / label_count, 1),
+                "total_tokens_per_label": round(usage["total_tokens"] / label_count, 1),
+                "seconds_per_label": round(elapsed / label_count, 4),
+                "errors": sum(1 for r in results if r is None or r["overallStatus"] == "error"),
+            }
+    finally:
+        stop_server()
+
+    return report
+
+
+def make_resized_copy(image_bytes: bytes, scale: float, image_format: str) -> bytes:
+    # Same artwork re-exported at another size and format, as vendors often resubmit it
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=BENCH_NEAR_DUPLICATE_JPEG_QUALITY)
+    return output.getvalue()
+
+
+async def benchmark_near_duplicates(scales: tuple = BENCH_NEAR_DUPLICATE_SCALES) -> dict:
+    """
+    Verifies the tests/ corpus plus resized PNG and JPEG copies of every image against the fake
+    OpenAI server, with near-duplicate grouping off and on, and reports vision requests, groups
+    found, and hashing time.
+
+    Parameter values:
+        - scales<tuple> = resize factor of each added copy; even positions are saved as PNG, odd as JPEG.
+
+    Return value<dict>:
+        - Labels, vision requests with and without grouping, and the grouping stats.
+    """
+
+    corpus = load_test_corpus()
+    total_batch = []
+    for entry in corpus:
+        total_batch.append([entry["image_bytes"], dict(entry["app_data"])])
+        for i, scale in enumerate(scales):
+            copy_bytes = make_resized_copy(entry["image_bytes"], scale, "PNG" if i % 2 == 0 else "JPEG")
+            total_batch.append([copy_bytes, dict(entry["app_data"])])
+    stop_server = use_fake_openai_server()
+
+    report = {"labels": len(total_batch)}
+    try:
+        for group_duplicates in (False, True):
+            # Caches off so every label is sent
+            result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+            label_classifier.reset_vision_usage_stats()
+            near_duplicates.reset_near_duplicate_stats()
+
+            start = time.perf_counter()
+            results = await batch_processor.process_batch(
+                total_batch, pack_size=1, group_duplicates=group_duplicates
+            )
+            elapsed = time.perf_counter() - start
+
+            report["grouped" if group_duplicates else "ungrouped"] = {
+                "vision_requests": label_classifier.get_vision_usage_stats()["requests"],
+                "elapsed_seconds": round(elapsed, 3),
+                "errors": sum(1 for r in results if r is None or r["overallStatus"] == "error"),
+            }
+        report["grouping"] = near_duplicates.get_near_duplicate_stats()
+    finally:
+        stop_server()
+
+    return report
+
+
+async def benchmark_text_regions(live: bool = False) -> dict:
+    """
+    Plans the text regions of every tests/ label and reports the layout chosen, the estimated
+    image tokens of the whole (preprocessed) image and of what is sent instead, and the planning
+    time. The corpus is then verified with text regions off and on, against the fake OpenAI
+    server or, with `live`, the real API, where per-field accuracy and prompt tokens are
+    reported for both runs.
+
+    Parameter values:
+        - live<bool> = True to call the real OpenAI API (uses quota).
+
+    Return value<dict>:
+        - Per-label plans, token totals and the share saved, planning time, and each run's results.
+    """
+
+    corpus = load_test_corpus()
+    report = {"backend": "live" if live else "fake", "labels": {}}
+    planning_seconds = []
+    for example in corpus:
+        start = time.perf_counter()
+        _, plan = text_regions.plan_text_regions(example["image_bytes"])
+        planning_seconds.append(time.perf_counter() - start)
+        report["labels"][example["name"]] = {
+            "layout": plan["layout"],
+            "tokens_whole": plan["tokens_whole"],
+            "tokens_sent": plan.get("tokens_out", plan["tokens_whole"]),
+        }
+
+    tokens_whole = sum(label["tokens_whole"] for label in report["labels"].values())
+    tokens_sent = sum(label["tokens_sent"] for label in report["labels"].values())
+    report["image_tokens_whole"] = tokens_whole
+    report["image_tokens_sent"] = tokens_sent
+    report["image_tokens_saved_share"] = round(1 - tokens_sent / tokens_whole, 3)
+    report["planning_ms_mean"] = round(1000 * sum(planning_seconds) / len(planning_seconds), 1)
+    report["planning_ms_max"] = round(1000 * max(planning_seconds), 1)
+
+    original_enabled = text_regions.TEXT_REGIONS_ENABLED
+    stop_server = None if live else use_fake_openai_server()
+    try:
+        for enabled in (False, True):
+            # Caches off so every label is sent
+            text_regions.TEXT_REGIONS_ENABLED = enabled
+            result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+            result_cache.extraction_cache = result_cache.ResultCache(memory_max_entries=0, db_path="", table="extractions")
+            label_classifier.reset_vision_usage_stats()
+
+            start = time.perf_counter()
+            results = await batch_processor.process_batch(
+                [[example["image_bytes"], dict(example["app_data"])] for example in corpus]
+            )
+            usage = label_classifier.get_vision_usage_stats()
+            run_report = {
+                "elapsed_seconds": round(time.perf_counter() - start, 3),
+                "image_bytes_uploaded": usage["image_bytes"],
+                "errors": sum(1 for r in results if r is None or r["overallStatus"] == "error"),
+            }
+            if live:
+                run_report["prompt_tokens"] = usage["prompt_tokens"]
+                run_report["accuracy"] = score_accuracy(corpus, results)
+            report["text_regions" if enabled else "whole_images"] = run_report
+    finally:
+        text_regions.TEXT_REGIONS_ENABLED = original_enabled
+        if stop_server is not None:
+            stop_server()
+
+    return report
+
+
+async def start_api_workers(worker_count: int, port: int, env: dict):
+    """
+    Starts the API with several uvicorn worker processes and waits until it answers.
+
+    Parameter values:
+        - worker_count<int> = uvicorn worker processes.
+        - port<int> = local port to listen on.
+        - env<dict> = environment variables added to the current environment.
+
+    Return value<function>:
+        - Function that stops the workers; stop(kill=True) kills them instead, like a crash.
+    """
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(worker_count), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    def stop(kill: bool = False):
+        if kill:
+            server.kill()
+        else:
+            server.terminate()
+        server.wait()
+
+    # Poll until a worker accepts requests
+    deadline = time.monotonic() + BENCH_MULTI_WORKER_STARTUP_SECONDS
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(f"http://127.0.0.1:{port}/cache/stats")
+                return stop
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    stop()
+    raise RuntimeError("API workers did not start")
+
+
+async def benchmark_multi_worker(
+    worker_count: int = BENCH_MULTI_WORKER_COUNT, label_count: int = BENCH_MULTI_WORKER_LABELS
+) -> dict:
+    """
+    Runs the API with several uvicorn workers against one fake OpenAI server whose budget every
+    worker is configured with, once with each worker on its own and once sharing limits and
+    cache through a SQLite SHARED_STATE_URL. Sends label_count concurrent /verify requests, then
+    the same requests again.
+
+    Parameter values:
+        - worker_count<int> = uvicorn worker processes.
+        - label_count<int> = distinct labels sent per round.
+
+    Return value<dict>:
+        - Per mode: requests the fake server accepted and rejected with 429, most vision calls in
+          flight at once, time per round, failed requests, and vision calls made for the repeated round.
+    """
+
+    app_data = json.dumps(
+        {
+            **BENCH_APP_DATA,
+            "alcohol_content_amount": "45",
+            "alcohol_content_format": "%",
+        }
+    )
+    temp_dir = tempfile.mkdtemp(prefix="bench_shared_state_")
+    report = {"workers": worker_count, "labels": label_count, "budget_rpm": BENCH_MULTI_WORKER_RPM}
+    try:
+        for mode, shared_url in (("per_worker", ""), ("shared", f"sqlite:///{os.path.join(temp_dir, 'shared.db')}")):
+            stop_server = use_fake_openai_server(
+                requests_per_minute=BENCH_MULTI_WORKER_RPM, latency_seconds=BENCH_MULTI_WORKER_LATENCY_SECONDS
+            )
+            stats = stop_server.app.state.stats
+            stop_workers = await start_api_workers(
+                worker_count,
+                BENCH_MULTI_WORKER_PORT,
+                {
+                    "OPENAI_API_KEY": "fake",
+                    "OPENAI_BASE_URL": f"http://127.0.0.1:{BENCH_FAKE_SERVER_PORT}/v1",
+                    "OPENAI_RPM_LIMIT": str(BENCH_MULTI_WORKER_RPM),
+                    "SHARED_STATE_URL": shared_url,
+                    "SHARED_MAX_CONCURRENT_REQUESTS": str(BENCH_MULTI_WORKER_MAX_CONCURRENT),
+                    "LOCAL_OCR_ENABLED": "0",
+                },
+            )
+
+            async def send_round(client) -> tuple:
+                # One /verify request per label, all at once; a fresh connection each so they spread over the workers
+                async def send(i: int) -> int:
+                    response = await client.post(
+                        f"http://127.0.0.1:{BENCH_MULTI_WORKER_PORT}/verify",
+                        files={"image": (f"label-{i}.png", f"multi-worker-image-{i}".encode())},
+                        data={"applicationData": app_data},
+                        headers={"Connection": "close"},
+                    )
+                    return response.status_code
+
+                start = time.perf_counter()
+                status_codes = await asyncio.gather(*(send(i) for i in range(label_count)))
+                return time.perf_counter() - start, sum(1 for code in status_codes if code != 200)
+
+            try:
+                async with httpx.AsyncClient(timeout=None) as client:
+                    first_seconds, first_failed = await send_round(client)
+                    accepted_first = stats["accepted"]
+                    second_seconds, second_failed = await send_round(client)
+            finally:
+                stop_workers()
+                stop_server()
+
+            report[mode] = {
+                "accepted": accepted_first,
+                "rate_limited": stats["rate_limited"],
+                "max_in_flight": stats["max_in_flight"],
+                "first_round_seconds": round(first_seconds, 2),
+                "failed": first_failed + second_failed,
+                "repeat_round_vision_calls": stats["accepted"] - accepted_first,
+                "repeat_round_seconds": round(second_seconds, 2),
+            }
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return report
+
+
+async def benchmark_adaptive_concurrency() -> dict:
+    """
+    Runs BENCH_AIMD_BATCHES concurrent batches against the fake OpenAI server under three load
+    profiles. Each batch keeps batch_processor's own worker count; only the admission limit
+    differs between modes: fixed (adaptive limit and circuit breaker off), or adaptive with the
+    circuit breaker on. The profiles are:
+        - headroom: no limits, so only concurrency bounds throughput.
+        - throttled: the server answers 429 once BENCH_AIMD_SERVER_CONCURRENCY calls are in flight.
+        - outage: every call hangs past the client timeout.
+
+    Return value<dict>:
+        - Per profile and mode: time for all batches, 429s, most calls in flight at once, calls
+          sent, labels failed fast by the circuit breaker, labels failed by API errors after
+          their retries, labels given a verdict, and the final admission limit.
+    """
+
+    original_queue = admission.admission_queue
+    original_controller = adaptive_concurrency.concurrency_controller
+    original_breaker = circuit_breaker.vision_breaker
+    original_limiter = rate_limiter.shared_limiter
+    profiles = {
+        "headroom": ({}, BENCH_AIMD_LABELS, None),
+        "throttled": (
+            {"concurrency_limit": BENCH_AIMD_SERVER_CONCURRENCY, "retry_after_seconds": BENCH_AIMD_RETRY_AFTER_SECONDS},
+            BENCH_AIMD_LABELS,
+            None,
+        ),
+        "outage": (
+            {"timeout_fraction": 1.0, "timeout_seconds": BENCH_AIMD_CLIENT_TIMEOUT_SECONDS * 3},
+            BENCH_AIMD_OUTAGE_LABELS,
+            BENCH_AIMD_CLIENT_TIMEOUT_SECONDS,
+        ),
+    }
+    modes = {
+        "fixed": (BENCH_AIMD_FIXED_CONCURRENCY, False),
+        "fixed_high": (BENCH_AIMD_FIXED_HIGH_CONCURRENCY, False),
+        "adaptive": (BENCH_AIMD_FIXED_HIGH_CONCURRENCY, True),
+    }
+
+    report = {}
+    try:
+        for profile, (server_options, label_count, client_timeout) in profiles.items():
+            report[profile] = {}
+            for mode, (admission_limit, adaptive) in modes.items():
+                stop_server = use_fake_openai_server(
+                    client_timeout=client_timeout,
+                    requests_per_minute=10**6,
+                    tokens_per_minute=10**9,
+                    latency_seconds=BENCH_AIMD_LATENCY_SECONDS,
+                    **server_options,
+                )
+                stats = stop_server.app.state.stats
+
+                # Fresh limits per run; caches off so every label is sent
+                result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+                rate_limiter.shared_limiter = rate_limiter.RateLimiter(10**6, 10**9)
+                # (the adaptive limit starts where the admission queue does by default)
+                admission.admission_queue = admission.AdmissionQueue(
+                    admission.ADMISSION_MAX_IN_FLIGHT if adaptive else admission_limit
+                )
+                adaptive_concurrency.concurrency_controller = adaptive_concurrency.AdaptiveConcurrencyLimit(
+                    admission.admission_queue, max_limit=BENCH_AIMD_FIXED_HIGH_CONCURRENCY, enabled=adaptive
+                )
+                circuit_breaker.vision_breaker = circuit_breaker.CircuitBreaker(enabled=adaptive)
+
+                batches = [
+                    [[f"aimd-{profile}-{mode}-{i}".encode(), dict(BENCH_APP_DATA)] for i in range(first, label_count, BENCH_AIMD_BATCHES)]
+                    for first in range(BENCH_AIMD_BATCHES)
+                ]
+                start = time.perf_counter()
+                try:
+                    batch_results = await asyncio.gather(*(batch_processor.process_batch(batch) for batch in batches))
+                finally:
+                    stop_server()
+                results = [result for batch_result in batch_results for result in batch_result]
+
+                report[profile][mode] = {
+                    "seconds": round(time.perf_counter() - start, 2),
+                    "rate_limited": stats["rate_limited"] + stats["concurrency_limited"],
+                    "max_in_flight": stats["max_in_flight"],
+                    "calls_sent": stats["accepted"],
+                    "failed_fast": sum(1 for r in results if r.get("summary") == "Vision API unavailable"),
+                    "api_errors": sum(1 for r in results if r.get("summary") == "Vision API error"),
+                    "verdicts": sum(1 for r in results if r.get("overallStatus") != "error"),
+                    "final_limit": admission.admission_queue.max_in_flight,
+                }
+    finally:
+        admission.admission_queue = original_queue
+        adaptive_concurrency.concurrency_controller = original_controller
+        circuit_breaker.vision_breaker = original_breaker
+        rate_limiter.shared_limiter = original_limiter
+
+    return report
+
+
+async def benchmark_checkpoints(label_count: int = BENCH_CHECKPOINT_LABELS) -> dict:
+    """
+    Crash test for batch checkpoints: submits a /jobs batch to a single API worker, kills the
+    worker once part of the batch has finished, starts a new worker and resubmits the same batch
+    under the same X-Batch-ID. Run once without checkpoints and once with a SQLite
+    BATCH_CHECKPOINT_DB_PATH.
+
+    Parameter values:
+        - label_count<int> = labels in the batch.
+
+    Return value<dict>:
+        - Per mode: vision calls before the kill, vision calls for the resubmitted batch, calls
+          repeated for labels that had already been verified, and time for the resubmitted batch.
+    """
+
+    app_data = {**BENCH_APP_DATA, "alcohol_content_amount": "45", "alcohol_content_format": "%"}
+    files = [("images", (f"label-{i}.png", f"checkpoint-image-{i}".encode())) for i in range(label_count)]
+    form = {"applicationData": json.dumps([app_data] * label_count)}
+    base_url = f"http://127.0.0.1:{BENCH_CHECKPOINT_PORT}"
+    temp_dir = tempfile.mkdtemp(prefix="bench_checkpoints_")
+    report = {"labels": label_count}
+    try:
+        for mode, db_path in (("without_checkpoints", ""), ("with_checkpoints", os.path.join(temp_dir, "checkpoints.db"))):
+            stop_server = use_fake_openai_server(
+                requests_per_minute=10**6, tokens_per_minute=10**9, latency_seconds=BENCH_CHECKPOINT_LATENCY_SECONDS
+            )
+            stats = stop_server.app.state.stats
+            worker_env = {
+                "OPENAI_API_KEY": "fake",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{BENCH_FAKE_SERVER_PORT}/v1",
+                "BATCH_CHECKPOINT_DB_PATH": db_path,
+                "RESULT_CACHE_DB_PATH": "",
+                "SHARED_STATE_URL": "",
+                "LOCAL_OCR_ENABLED": "0",
+            }
+
+            async def run_job(client) -> dict:
+                # Submit the batch and poll it until it finishes (or the worker goes away)
+                response = await client.post(
+                    f"{base_url}/jobs", files=files, data=form, headers={"X-Batch-ID": "bench-checkpoint-batch"}
+                )
+                job_id = response.json()["jobId"]
+                while True:
+                    job = (await client.get(f"{base_url}/jobs/{job_id}")).json()
+                    if job["status"] in ("complete", "failed"):
+                        return job
+                    await asyncio.sleep(BENCH_CHECKPOINT_POLL_SECONDS)
+
+            try:
+                async with httpx.AsyncClient(timeout=None) as client:
+                    # First run: kill the worker once enough labels have finished
+                    stop_workers = await start_api_workers(1, BENCH_CHECKPOINT_PORT, worker_env)
+                    first_run = asyncio.create_task(run_job(client))
+                    while stats["accepted"] < label_count * BENCH_CHECKPOINT_KILL_FRACTION and not first_run.done():
+                        await asyncio.sleep(BENCH_CHECKPOINT_POLL_SECONDS / 5)
+                    stop_workers(kill=True)
+                    first_run.cancel()
+                    await asyncio.gather(first_run, return_exceptions=True)
+                    calls_before_kill = stats["accepted"]
+
+                    # Second run: a fresh worker gets the same batch under the same batch ID
+                    stop_workers = await start_api_workers(1, BENCH_CHECKPOINT_PORT, worker_env)
+                    start = time.perf_counter()
+                    job = await run_job(client)
+                    rerun_seconds = time.perf_counter() - start
+                    stop_workers()
+            finally:
+                stop_server()
+
+            report[mode] = {
+                "vision_calls_before_kill": calls_before_kill,
+                "vision_calls_after_restart": stats["accepted"] - calls_before_kill,
+                "repeated_vision_calls": stats["accepted"] - label_count,
+                "rerun_seconds": round(rerun_seconds, 2),
+                "rerun_status": job["status"],
+                "rerun_completed": job["completed"],
+            }
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return report
+
+
+async def benchmark_admission(prioritized: tuple = (False, True)) -> dict:
+    """
+    Load test for the admission queue: one submitter's several batches and another submitter's
+    small batch run against the fake OpenAI server while single-label checks arrive at a steady
+    pace. Run once
+    with every call in one first-come-first-served class and once with priority classes and
+    per-submitter turns.
+
+    Parameter values:
+        - prioritized<tuple> = modes to run (False = first come first served, True = priorities).
+
+    Return value<dict>:
+        - Per mode: single-check latency percentiles and each submitter's completion time.
+    """
+
+    original_queue = admission.admission_queue
+    original_limiter = rate_limiter.shared_limiter
+    stop_server = use_fake_openai_server(
+        requests_per_minute=10**6, tokens_per_minute=10**9, latency_seconds=BENCH_ADMISSION_LATENCY_SECONDS
+    )
+    rate_limiter.shared_limiter = rate_limiter.RateLimiter(10**6, 10**9)
+
+    def make_batch(name: str, size: int) -> list:
+        return [[f"admission-{name}-{i}".encode(), dict(BENCH_APP_DATA)] for i in range(size)]
+
+    report = {}
+    try:
+        for with_priorities in prioritized:
+            # Caches off so every label is sent
+            result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+            admission.admission_queue = admission.AdmissionQueue(BENCH_ADMISSION_MAX_IN_FLIGHT)
+            mode = "prioritized" if with_priorities else "fifo"
+            start = time.perf_counter()
+
+            def set_class(priority: str, submitter: str) -> None:
+                # First come first served: one class and one submitter for everything
+                admission.priority_var.set(priority if with_priorities else admission.PRIORITY_BATCH)
+                admission.submitter_var.set(submitter if with_priorities else "everyone")
+
+            async def run_check(i: int) -> float:
+                await asyncio.sleep(1.0 + i * BENCH_ADMISSION_INTERACTIVE_INTERVAL_SECONDS)
+                set_class(admission.PRIORITY_INTERACTIVE, f"agent-{i}")
+                check_start = time.perf_counter()
+                await batch_processor.verify_with_retry(
+                    f"admission-{mode}-check-{i}".encode(), dict(BENCH_APP_DATA), batch_img_id=i
+                )
+                return time.perf_counter() - check_start
+
+            async def run_batch(name: str, size: int, delay: float) -> float:
+                # Batches named "<submitter>-<n>" share the submitter's turns
+                await asyncio.sleep(delay)
+                set_class(admission.PRIORITY_BATCH, name.split("-")[0])
+                await batch_processor.process_batch(
+                    make_batch(f"{mode}-{name}", size), max_concurrent_jobs=BENCH_ADMISSION_BATCH_CONCURRENCY
+                )
+                return time.perf_counter() - start
+
+            async def run_large_submitter() -> float:
+                await asyncio.gather(
+                    *(run_batch(f"large-{b}", BENCH_ADMISSION_LARGE_BATCH, 0.0) for b in range(BENCH_ADMISSION_LARGE_BATCHES))
+                )
+                return time.perf_counter() - start
+
+            large_seconds, small_seconds, *check_latencies = await asyncio.gather(
+                run_large_submitter(),
+                run_batch("small", BENCH_ADMISSION_SMALL_BATCH, 1.0),
+                *(run_check(i) for i in range(BENCH_ADMISSION_INTERACTIVE)),
+            )
+            report[mode] = {
+                "interactive_p50_seconds": round(percentile(check_latencies, 50), 3),
+                "interactive_p95_seconds": round(percentile(check_latencies, 95), 3),
+                "interactive_max_seconds": round(max(check_latencies), 3),
+                "small_submitter_done_seconds": round(small_seconds - 1.0, 2),
+                "large_submitter_done_seconds": round(large_seconds, 2),
+            }
+    finally:
+        admission.admission_queue = original_queue
+        rate_limiter.shared_limiter = original_limiter
+        stop_server()
+
+    return report
+
+
+async def benchmark_connection_pool(
+    burst_size: int = BENCH_POOL_BURST_SIZE,
+    gaps_seconds: tuple = BENCH_POOL_GAPS_SECONDS,
+) -> dict:
+    """
+    Sends bursts of concurrent chat requests to the fake OpenAI server with idle gaps between
+    them, as batches arriving from the front end do, and compares connection churn for the client
+    used before the pool was tuned (a plain `AsyncOpenAI` with the SDK's default limits and httpx's
+    5 s keep-alive) against the tuned pool from `openai_pool.create_openai_client`. Connects are
+    local here, so connect time understates the TLS handshakes saved against the real API.
+
+    Parameter values:
+        - burst_size<int> = concurrent requests per burst (also the tuned pool's concurrency).
+        - gaps_seconds<tuple> = idle time before each burst after the first.
+
+    Return value<dict>:
+        - Per client: connections opened, total time spent connecting, and request latency percentiles.
+    """
+
+    stop_server = fake_openai_server.run_in_background(
+        fake_openai_server.create_app(requests_per_minute=1000000, tokens_per_minute=10**9),
+        BENCH_FAKE_SERVER_PORT,
+        # The server keeps idle connections as long as the tuned client does, so the client's keep-alive is what is measured
+        keepalive_seconds=openai_pool.OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    base_url = f"http://127.0.0.1:{BENCH_FAKE_SERVER_PORT}/v1"
+    # The default client's transport is only swapped for an instrumented one with the same limits, so connections are counted
+    default_limits = openai.DEFAULT_CONNECTION_LIMITS
+    clients = {
+        "default_client": lambda: openai.AsyncOpenAI(
+            api_key="fake",
+            base_url=base_url,
+            http_client=openai.DefaultAsyncHttpxClient(transport=openai_pool.InstrumentedTransport(limits=default_limits)),
+        ),
+        "tuned": lambda: openai_pool.create_openai_client(burst_size, api_key="fake", base_url=base_url),
+    }
+    keepalive_expiry = {
+        "default_client": default_limits.keepalive_expiry,
+        "tuned": openai_pool.OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+    }
+    report = {}
+    try:
+        for name, make_client in clients.items():
+            client = make_client()
+            opened_before = sum(openai_pool.connections_opened_total.values.values())
+            connect_series = observability.stage_seconds.series.get(("openai_connect",), [0.0, 0])
+            connect_seconds_before = connect_series[-2]
+
+            async def timed_request() -> float:
+                start = time.perf_counter()
+                await client.chat.completions.create(
+                    model=label_classifier.VISION_MODEL,
+                    max_tokens=16,
+                    messages=[{"role": "user", "content": "ping"}],
+                )
+                return time.perf_counter() - start
+
+            latencies = []
+            for gap_seconds in (0, *gaps_seconds):
+                await asyncio.sleep(gap_seconds)
+                latencies.extend(await asyncio.gather(*(timed_request() for _ in range(burst_size))))
+            await client.close()
+
+            connect_series = observability.stage_seconds.series.get(("openai_connect",), [0.0, 0])
+            report[name] = {
+                "keepalive_expiry_seconds": keepalive_expiry[name],
+                "requests": len(latencies),
+                "connections_opened": int(sum(openai_pool.connections_opened_total.values.values()) - opened_before),
+                "connect_seconds_total": round(connect_series[-2] - connect_seconds_before, 4),
+                "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            }
+    finally:
+        stop_server()
+
+    return report
+
+
+async def benchmark_hedging(label_count: int = BENCH_HEDGE_LABELS) -> dict:
+    """
+    Verifies synthetic labels against a fake server with long-tailed (lognormal) latency, with
+    hedging off and then on, and compares per-label latency percentiles and the extra requests sent.
+
+    Parameter values:
+        - label_count<int> = labels verified per run.
+
+    Return value<dict>:
+        - Per run: latency percentiles, requests sent to the server, and hedges by outcome.
+    """
+
+    original_enabled = hedging.VISION_HEDGE_ENABLED
+    original_policy = hedging.hedge_policy
+    report = {}
+    try:
+        for name, enabled in (("no_hedging", False), ("hedging", True)):
+            # Fresh caches, limiter and policy per run; distinct images so nothing is cached
+            result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+            rate_limiter.shared_limiter = rate_limiter.RateLimiter(BENCH_FAULT_RPM, BENCH_FAULT_TPM)
+            hedging.VISION_HEDGE_ENABLED = enabled
+            hedging.hedge_policy = hedging.HedgePolicy(
+                BENCH_HEDGE_PERCENTILE, BENCH_HEDGE_MIN_DELAY_SECONDS, BENCH_HEDGE_MAX_FRACTION
+            )
+            hedges_before = dict(hedging.vision_hedges_total.values)
+            total_batch = [[f"hedge-image-{i}".encode(), dict(BENCH_APP_DATA)] for i in range(label_count)]
+
+            stop_server = use_fake_openai_server(
+                requests_per_minute=BENCH_FAULT_RPM,
+                tokens_per_minute=BENCH_FAULT_TPM,
+                latency_seconds=BENCH_HEDGE_LATENCY_SECONDS,
+                latency_distribution="lognormal",
+                latency_spread=BENCH_HEDGE_LATENCY_SIGMA,
+                seed=BENCH_RANDOM_SEED,
+            )
+            try:
+                results, latencies, elapsed = await run_timed_batch(total_batch, BENCH_HEDGE_CONCURRENCY)
+                server_requests = stop_server.app.state.stats["accepted"]
+            finally:
+                stop_server()
+
+            report[name] = {
+                "labels": label_count,
+                "elapsed_seconds": round(elapsed, 3),
+                "latency_seconds": {
+                    **{f"p{pct}": round(percentile(latencies, pct), 3) for pct in BENCH_CORPUS_PERCENTILES},
+                    "max": round(max(latencies), 3),
+                },
+                "server_requests": server_requests,
+                "extra_request_fraction": round(server_requests / label_count - 1, 3),
+                "hedges": {
+                    key[0]: int(value - hedges_before.get(key, 0))
+                    for key, value in hedging.vision_hedges_total.values.items()
+                    if value - hedges_before.get(key, 0)
+                },
+                "errors": sum(1 for r in results if r is None or r.get("overallStatus") == "error"),
+            }
+    finally:
+        hedging.VISION_HEDGE_ENABLED = original_enabled
+        hedging.hedge_policy = original_policy
+
+    return report
+
+
+async def benchmark_bulk(
+    batch_seconds: float = BENCH_BULK_BATCH_SECONDS, error_fraction: float = BENCH_BULK_ERROR_FRACTION
+) -> dict:
+    """
+    Runs tests/ through the Batch API bulk mode against the fake server's batch endpoint,
+    with a fraction of batch requests failing so the live-API fallback is exercised too.
+
+    Parameter values:
+        - batch_seconds<float> = simulated time from batch submission to completion.
+        - error_fraction<float> = fraction of batch requests reported as failed.
+
+    Return value<dict>:
+        - Labels verified, how many needed the live API, batch tokens per label, and wall time.
+    """
+
+    # Caches off so every label goes into the batch
+    result_cache.verification_cache = result_cache.ResultCache(memory_max_entries=0, db_path="")
+    stop_server = use_fake_openai_server(batch_seconds=batch_seconds, batch_error_fraction=error_fraction, seed=BENCH_RANDOM_SEED)
+    work_dir = os.path.join(tempfile.mkdtemp(), "bulk")
+    try:
+        start = time.perf_counter()
+        summary = await bulk_verifier.run_bulk(TESTS_FOLDER_PATH, work_dir, poll_interval=BENCH_BULK_POLL_SECONDS)
+        elapsed = time.perf_counter() - start
+        stats = stop_server.app.state.stats
+    finally:
+        stop_server()
+        shutil.rmtree(os.path.dirname(work_dir), ignore_errors=True)
+
+    return {
+        "labels": summary["total"],
+        "verified": summary["verified"],
+        "batch_requests": stats["batch_requests"],
+        "batch_errors": stats["batch_errors"],
+        "live_requests": stats["accepted"],
+        "batch_tokens_per_label": round(summary["usage"]["total_tokens"] / summary["total"], 1),
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+
+def add_typo(text: str, rng: random.Random) -> str:
+    # One substituted, dropped or doubled character, like a misread glyph
+    if not text:
+        return text
+    i = rng.randrange(len(text))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return text[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") + text[i + 1 :]
+    if kind == 1:
+        return text[:i] + text[i + 1 :]
+    return text[:i] + text[i] + text[i:]
+
+
+def make_compare_rows(row_count: int, seed: int = BENCH_RANDOM_SEED) -> tuple:
+    """
+    Builds synthetic (extracted, application) rows shaped like stored verification history:
+    a few thousand products repeated many times, some OCR-style typos, some model-flagged matches
+    and some missing values.
+
+    Parameter values:
+        - row_count<int> = rows to build.
+        - seed<int> = random seed.
+
+    Return value<tuple>:
+        - Tuple of (extracted_rows, application_rows).
+    """
+
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(300)]
+    brands = [f"{rng.choice(words).title()} {rng.choice(words).title()}" for _ in range(BENCH_COMPARE_BRANDS)]
+    warning_texts = [label_classifier.GOV_WARNING_STR_MAIN_BODY] + [
+        add_typo(label_classifier.GOV_WARNING_STR, rng) for _ in range(20)
+    ] + [label_classifier.GOV_WARNING_STR[: rng.randint(60, 200)] for _ in range(10)]
+
+    def observed(value: str, choices: tuple = None) -> str:
+        # What the model read: usually the value, sometimes a typo, another value, or nothing
+        roll = rng.random()
+        if roll < BENCH_COMPARE_EMPTY_FRACTION:
+            return ""
+        if roll < BENCH_COMPARE_TYPO_FRACTION:
+            return add_typo(value, rng) if choices is None or rng.random() < 0.5 else rng.choice(choices)
+        return value
+
+    extracted_rows = []
+    application_rows = []
+    for _ in range(row_count):
+        application = {
+            label_classifier.BRAND_NAME_STR: rng.choice(brands),
+            label_classifier.CLASS_TYPE_STR: rng.choice(BENCH_COMPARE_CLASS_TYPES),
+            label_classifier.ALC_CONTENT_STR: rng.choice(BENCH_COMPARE_ALCOHOL_CONTENTS),
+            label_classifier.NET_CONTENT_STR: rng.choice(BENCH_COMPARE_NET_CONTENTS),
+        }
+        extracted_rows.append(
+            {
+                label_classifier.BRAND_NAME_STR: observed(application[label_classifier.BRAND_NAME_STR]),
+                label_classifier.CLASS_TYPE_STR: observed(
+                    application[label_classifier.CLASS_TYPE_STR], BENCH_COMPARE_CLASS_TYPES
+                ),
+                label_classifier.ALC_CONTENT_STR: observed(
+                    application[label_classifier.ALC_CONTENT_STR], BENCH_COMPARE_ALCOHOL_CONTENTS
+                ),
+                label_classifier.NET_CONTENT_STR: observed(
+                    application[label_classifier.NET_CONTENT_STR], BENCH_COMPARE_NET_CONTENTS
+                ),
+                label_classifier.BRAND_NAME_MATCH_STR: rng.random() < BENCH_COMPARE_MATCH_FRACTION,
+                label_classifier.CLASS_TYPE_NAME_MATCH_STR: rng.random() < BENCH_COMPARE_MATCH_FRACTION,
+                label_classifier.ALC_CONTENT_MATCH_STR: rng.random() < BENCH_COMPARE_MATCH_FRACTION,
+                label_classifier.NET_CONTENT_MATCH_STR: rng.random() < BENCH_COMPARE_MATCH_FRACTION,
+                label_classifier.GOV_WARN_PRESENT_MATCH_STR: rng.random() >= BENCH_COMPARE_EMPTY_FRACTION,
+                label_classifier.GOV_WARN_CAPS_MATCH_STR: rng.random() >= BENCH_COMPARE_EMPTY_FRACTION,
+                label_classifier.GOV_WARN_TEXT_STR: rng.choice(warning_texts),
+                label_classifier.GOV_WARN_MATCH_STR: rng.random() < BENCH_COMPARE_MATCH_FRACTION,
+            }
+        )
+        application_rows.append(application)
+
+    return extracted_rows, application_rows
+
+
+def benchmark_bulk_compare(row_count: int = BENCH_COMPARE_ROWS) -> dict:
+    """
+    Re-scores synthetic verification history with `compare_extracted_fields` one row at a time
+    and with `bulk_compare.compare_columns`, and checks both give identical statuses.
+
+    Parameter values:
+        - row_count<int> = rows to re-score.
+
+    Return value<dict>:
+        - Seconds and rows per second for each approach (column time includes splitting rows
+          into columns), the speedup, and mismatched rows (should be 0).
+    """
+
+    extracted_rows, application_rows = make_compare_rows(row_count)
+
+    # One row at a time, as re-scoring is done today
+    start = time.perf_counter()
+    scalar_results = [
+        label_classifier.compare_extracted_fields(extracted, application)
+        for extracted, application in zip(extracted_rows, application_rows)
+    ]
+    scalar_seconds = time.perf_counter() - start
+
+    # All rows at once: split into columns, then compare
+    start = time.perf_counter()
+    extracted_columns, expected_columns = bulk_compare.rows_to_columns(extracted_rows, application_rows)
+    split_seconds = time.perf_counter() - start
+    columns = bulk_compare.compare_columns(extracted_columns, expected_columns)
+    column_seconds = time.perf_counter() - start
+
+    # Every field status and note, and the overall status, must match
+    mismatches = 0
+    for i, result in enumerate(scalar_results):
+        same = result["overallStatus"] == columns["overallStatus"][i] and all(
+            (field["status"], field["note"]) == columns[field["field"]][i] for field in result["fields"]
+        )
+        mismatches += not same
+
+    return {
+        "rows": row_count,
+        "scalar_seconds": round(scalar_seconds, 3),
+        "column_seconds": round(column_seconds, 3),
+        "column_split_seconds": round(split_seconds, 3),
+        "scalar_rows_per_second": round(row_count / scalar_seconds),
+        "column_rows_per_second": round(row_count / column_seconds),
+        "speedup": round(scalar_seconds / column_seconds, 2),
+        "mismatched_rows": mismatches,
+    }
+
+
+def make_flagged_warnings(text_count: int, seed: int = BENCH_RANDOM_SEED) -> list:
+    """
+    Builds warning texts that each differ from the required statement by one known word (a typo
+    or a dropped word), some also missing a clause marker, like OCR output that gets flagged.
+
+    Parameter values:
+        - text_count<int> = texts to build.
+        - seed<int> = random seed.
+
+    Return value<list>:
+        - List of (warning_text, changed_word) tuples.
+    """
+
+    rng = random.Random(seed)
+    words = label_classifier.GOV_WARNING_STR.split()
+    texts = []
+    for _ in range(text_count):
+        changed = list(words)
+        i = rng.randrange(2, len(words))
+        while changed[i].startswith("("):
+            i = rng.randrange(2, len(words))
+        changed_word = changed[i]
+        if rng.random() < 0.5:
+            changed[i] = add_typo(changed_word, rng)
+        else:
+            del changed[i]
+        if rng.random() < BENCH_WARNING_DROP_MARKER_FRACTION:
+            changed = [word for word in changed if word != rng.choice(("(1)", "(2)"))]
+        texts.append((" ".join(changed), changed_word.upper()))
+    return texts
+
+
+def benchmark_warning_matcher(row_count: int = BENCH_WARNING_ROWS) -> dict:
+    """
+    Re-scores flagged government warnings the old way (upper-case the statement and run one
+    `fuzz.ratio` per row) and with `label_classifier.government_warning_matcher` (each distinct
+    text scored once against the preprocessed statement, plus clause-level diagnostics), and checks
+    how often the diagnostics name the word that was actually changed.
+
+    Parameter values:
+        - row_count<int> = warning rows to re-score.
+
+    Return value<dict>:
+        - Seconds for each approach (the matcher's with and without diagnostics), the scoring
+          speedup, whether the scores agree, and how precisely the differences were located.
+    """
+
+    rng = random.Random(BENCH_RANDOM_SEED)
+    flagged = make_flagged_warnings(BENCH_WARNING_DISTINCT_TEXTS)
+    rows = [rng.choice(flagged) for _ in range(row_count)]
+    texts = [text for text, _ in rows]
+
+    # One full-statement ratio per row, as check_government_warning used to do
+    start = time.perf_counter()
+    legacy_scores = [
+        warning_matcher.fuzz.ratio(text.upper(), label_classifier.GOV_WARNING_STR.upper()) for text in texts
+    ]
+    legacy_seconds = time.perf_counter() - start
+
+    # Batched scores plus diagnostics for every flagged row
+    matcher = warning_matcher.WarningMatcher(label_classifier.GOV_WARNING_STR)
+    start = time.perf_counter()
+    scores = matcher.similarities(texts)
+    scoring_seconds = time.perf_counter() - start
+    diagnostics = [matcher.diagnose(text) for text in texts]
+    matcher_seconds = time.perf_counter() - start
+
+    # A difference is located when one of the reported spans contains the changed word
+    located = 0
+    for (_, changed_word), diagnosis in zip(flagged, (matcher.diagnose(text) for text, _ in flagged)):
+        located += any(
+            changed_word in difference["expected"].split() for difference in diagnosis["differences"]
+        )
+    differences_per_text = sum(len(matcher.diagnose(text)["differences"]) for text, _ in flagged) / len(flagged)
+
+    return {
+        "rows": row_count,
+        "distinct_texts": len(flagged),
+        "legacy_seconds": round(legacy_seconds, 3),
+        "matcher_scoring_seconds": round(scoring_seconds, 3),
+        "matcher_seconds": round(matcher_seconds, 3),
+        "scoring_speedup": round(legacy_seconds / scoring_seconds, 2),
+        "scores_identical": scores == legacy_scores,
+        "diagnosed_rows": len(diagnostics),
+        "changed_word_located_fraction": round(located / len(flagged), 3),
+        "differences_per_text": round(differences_per_text, 2),
+    }
+
+
+def legacy_compare_alcohol_content(extracted: str, expected: str) -> tuple:
+    # Previous compare_alcohol_content after its empty/match checks: first numbers, proof by substring
+    ext_nums = re.findall(r"\d+\.?\d*", extracted)
+    exp_nums = re.findall(r"\d+\.?\d*", expected)
+    if not ext_nums or not exp_nums:
+        return ("fail", "Could not parse alcohol content")
+    ext_num = float(ext_nums[0])
+    exp_num = float(exp_nums[0])
+    if ext_num == exp_num:
+        if ("proof" in extracted.lower()) != ("proof" in expected.lower()):
+            return ("warning", "Percentage matches but format differs")
+        return ("pass", None)
+    if abs(ext_num - exp_num) <= label_classifier.COMPARE_ALC_CONTENT_DIFF_RATIO:
+        return ("warning", "Minor difference detected")
+    return ("fail", "Alcohol content mismatch")
+
+
+def legacy_compare_net_contents(extracted: str, expected: str) -> tuple:
+    # Previous compare_net_contents after its empty/match checks: numbers and unit text compared as strings
+    ext_nums = re.findall(r"\d+\.?\d*", extracted)
+    exp_nums = re.findall(r"\d+\.?\d*", expected)
+    if not ext_nums or not exp_nums:
+        return ("fail", "Could not parse net contents")
+    if ext_nums[0] != exp_nums[0]:
+        return ("fail", "Volume mismatch")
+    if re.sub(r"[\d\.\s]", "", extracted).strip().lower() != re.sub(r"[\d\.\s]", "", expected).strip().lower():
+        return ("fail", "Unit mismatch")
+    return ("pass", None)
+
+
+def benchmark_measurements(row_count: int = BENCH_MEASUREMENT_ROWS) -> dict:
+    """
+    Compares alcohol content and net contents with the previous per-call regex comparators and
+    with the cached measurement parser: time over many rows, and how the two grade values that
+    are equivalent in other units (should pass) and values that really differ (should fail).
+
+    Parameter values:
+        - row_count<int> = comparisons to time.
+
+    Return value<dict>:
+        - Seconds for each approach, the speedup, and fails on equivalent and mismatched pairs.
+    """
+
+    legacy = {
+        "alcohol_content": legacy_compare_alcohol_content,
+        "net_contents": legacy_compare_net_contents,
+    }
+    current = {
+        "alcohol_content": lambda extracted, expected: label_classifier.compare_alcohol_content(extracted, False, expected),
+        "net_contents": lambda extracted, expected: label_classifier.compare_net_contents(extracted, False, expected),
+    }
+    rng = random.Random(BENCH_RANDOM_SEED)
+    pairs = BENCH_MEASUREMENT_EQUIVALENTS + BENCH_MEASUREMENT_MISMATCHES
+    rows = [rng.choice(pairs) for _ in range(row_count)]
+
+    report = {"rows": row_count}
+    for name, comparators in (("legacy", legacy), ("parser", current)):
+        start = time.perf_counter()
+        for field, extracted, expected in rows:
+            comparators[field](extracted, expected)
+        report[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+        report[f"{name}_statuses"] = {
+            "equivalent_not_passed": [
+                f"{extracted} vs {expected}: {comparators[field](extracted, expected)[0]}"
+                for field, extracted, expected in BENCH_MEASUREMENT_EQUIVALENTS
+                if comparators[field](extracted, expected)[0] != "pass"
+            ],
+            "mismatches_not_failed": [
+                f"{extracted} vs {expected}: {comparators[field](extracted, expected)[0]}"
+                for field, extracted, expected in BENCH_MEASUREMENT_MISMATCHES
+                if comparators[field](extracted, expected)[0] != "fail"
+            ],
+        }
+    report["speedup"] = round(report["legacy_seconds"] / report["parser_seconds"], 2)
+
+    return report
+
+
+async def benchmark_local_ocr(live: bool = False) -> dict:
+    """
+    Runs the tests/ corpus through `verify_label` with the local OCR tier off and then on, and
+    reports the fraction of labels resolved locally and the latency saved. Offline, vision calls
+    go to the fake OpenAI server with a fixed latency; with `live` they use the real API and
+    per-field accuracy is scored for both runs. Requires the Tesseract binary for the OCR tier.
+
+    Parameter values:
+        - live<bool> = True to call the real OpenAI API (uses quota).
+
+    Return value<dict>:
+        - Mean latency per label for each run, the OCR tier counters, and accuracy when live.
+    """
+
+    # Nothing to compare without Tesseract; every label would take the vision path in both runs
+    if not local_ocr.is_ocr_available():
+        return {"ocr_available": False}
+
+    corpus = load_test_corpus()
+    stop_server = None if live else use_fake_openai_server(
+        latency_seconds=BENCH_OCR_FAKE_VISION_LATENCY_SECONDS
+    )
+    report = {"ocr_available": True}
+    original_enabled = local_ocr.LOCAL_OCR_ENABLED
+
+    try:
+        for enabled in (False, True):
+            # Fresh caches so both runs do the full work
+            result_cache.verification_cache = result_cache.ResultCache()
+            result_cache.extraction_cache = result_cache.ResultCache(table="extractions")
+            local_ocr.LOCAL_OCR_ENABLED = enabled
+
+            # Labels run one at a time so per-label latency is not hidden by concurrency
+            results = []
+            start = time.perf_counter()
+            for example in corpus:
+                results.append(await label_classifier.verify_label(example["image_bytes"], dict(example["app_data"])))
+            mean_seconds = (time.perf_counter() - start) / len(corpus)
+
+            run_report = {"mean_seconds_per_label": round(mean_seconds, 3)}
+            if live:
+                run_report["accuracy"] = score_accuracy(corpus, results)
+            report["ocr_tier" if enabled else "vision_only"] = run_report
+    finally:
+        local_ocr.LOCAL_OCR_ENABLED = original_enabled
+        if stop_server is not None:
+            stop_server()
+
+    report["ocr_stats"] = local_ocr.get_ocr_stats()
+    report["seconds_saved_per_label"] = round(
+        report["vision_only"]["mean_seconds_per_label"] - report["ocr_tier"]["mean_seconds_per_label"], 3
+    )
+    return report
+
+
+async def legacy_buffered_verify_batch(
+    images: List[UploadFile] = File(...), applicationData: str = Form(...)
+):
+    # Previous /verify-batch behaviour: read every image into memory, then process the batch
+    image_app_pairing = await api.read_image_app_pairs(images, applicationData)
+    return await batch_processor.process_batch(image_app_pairing, len(image_app_pairing))
+
+
+async def generate_multipart_body(image_count: int, image_bytes: int):
+    """
+    Lazily generates a /verify-batch multipart body (applicationData first, then images) so the
+    client never holds more than one chunk in memory.
+
+    Parameter values:
+        - image_count<int> = number of images in the upload.
+        - image_bytes<int> = size of each synthetic image.
+
+    Yield value<bytes>:
+        - Consecutive chunks of the request body.
+    """
+
+    boundary = BENCH_MULTIPART_BOUNDARY.encode()
+    app_data_list = [
+        {
+            **BENCH_APP_DATA,
+            "alcohol_content_amount": 45,
+            "alcohol_content_format": "%",
+            "bench_index": i,
+        }
+        for i in range(image_count)
+    ]
+    yield (
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="applicationData"\r\n\r\n'
+        + json.dumps(app_data_list).encode()
+        + b"\r\n"
+    )
+
+    for i in range(image_count):
+        yield (
+            b"--" + boundary + b"\r\n"
+            + f'Content-Disposition: form-data; name="images"; filename="{i}.png"\r\n'.encode()
+            + b"Content-Type: image/png\r\n\r\n"
+        )
+        for offset in range(0, image_bytes, BENCH_STREAM_UPLOAD_CHUNK_BYTES):
+            yield bytes([i % 256]) * min(BENCH_STREAM_UPLOAD_CHUNK_BYTES, image_bytes - offset)
+        yield b"\r\n"
+
+    yield b"--" + boundary + b"--\r\n"
+
+
+async def benchmark_streaming_memory(
+    image_count: int = BENCH_STREAM_IMAGE_COUNT,
+    image_bytes: int = BENCH_STREAM_IMAGE_BYTES,
+) -> dict:
+    """
+    Uploads the same batch to the previous buffered /verify-batch implementation and to the
+    streaming one, with a mocked `verify_label`, and compares the peak Python heap of each.
+
+    Parameter values:
+        - image_count<int> = number of images in the batch.
+        - image_bytes<int> = size of each synthetic image.
+
+    Return value<dict>:
+        - Peak traced memory in MB and wall-clock seconds for each implementation.
+    """
+
+    # Mock verification so only ingestion and scheduling are measured
+    original_verify_label = install_mock_verify_label([BENCH_STREAM_VERIFY_SECONDS] * image_count)
+
+    bench_app = FastAPI()
+    bench_app.post("/verify-batch-buffered")(legacy_buffered_verify_batch)
+    bench_app.post("/verify-batch")(api.verify_batch)
+    stop_server = fake_openai_server.run_in_background(bench_app, BENCH_API_SERVER_PORT)
+
+    report = {"image_count": image_count, "image_mb": round(image_bytes / 2**20, 2)}
+    async with httpx.AsyncClient(timeout=None) as client:
+        for name, path in (("buffered", "/verify-batch-buffered"), ("streaming", "/verify-batch")):
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = await client.post(
+                f"http://127.0.0.1:{BENCH_API_SERVER_PORT}{path}",
+                content=generate_multipart_body(image_count, image_bytes),
+                headers={
+                    "Content-Type": f"multipart/form-data; boundary={BENCH_MULTIPART_BOUNDARY}"
+                },
+            )
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results = response.json()
+            report[name] = {
+                "status_code": response.status_code,
+                "peak_mb": round(peak / 2**20, 1),
+                "elapsed_seconds": round(elapsed, 3),
+                "results_in_order": [r["bench_index"] for r in results] == list(range(image_count)),
+            }
+
+    stop_server()
+    label_classifier.verify_label = original_verify_label
+    return report
+
+
+if __name__ == "__main__":
+    """
+        ABOUT main:
+            This main function is used for benchmarking during development
+            The intent is to not use it in any deployed setting or aspect
+    """
+
+    parser = argparse.ArgumentParser(description="Backend benchmarks")
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help="also run accuracy checks against the real OpenAI API (uses quota)",
+    )
+    parser.add_argument(
+        "--corpus",
+        action="store_true",
+        help="only run the tests/test_images pipeline benchmark (fake server unless --live)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=list(BENCH_CORPUS_CONCURRENCY_LEVELS),
+        help="concurrency levels for the corpus benchmark",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=BENCH_CORPUS_REPEAT, help="copies of the corpus per pass"
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="keep the result caches on in the corpus benchmark"
+    )
+    parser.add_argument(
+        "--recordings", default="", help="replay these fake server recordings in the corpus benchmark"
+    )
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    async def run_all() -> dict:
+        # Run every benchmark on one event loop so shared asyncio primitives stay valid
+        corpus_report = await benchmark_corpus(
+            tuple(args.concurrency),
+            args.repeat,
+            live=args.live,
+            use_cache=args.cache,
+            recordings_path=args.recordings,
+        )
+        if args.corpus:
+            return {"corpus": corpus_report}
+
+        report = {
+            "scheduler": await benchmark_scheduler(),
+            "rate_limiter": await benchmark_rate_limiter(),
+            "result_cache": await benchmark_result_cache(),
+            "extraction_reuse": await benchmark_extraction_reuse(),
+            "streaming_memory": await benchmark_streaming_memory(),
+            "fault_injection": await benchmark_fault_injection(),
+            "prompt_format": await benchmark_prompt_format(live=args.live),
+            "text_regions": await benchmark_text_regions(live=args.live),
+            "packing": await benchmark_packing(),
+            "near_duplicates": await benchmark_near_duplicates(),
+            "bulk": await benchmark_bulk(),
+            "connection_pool": await benchmark_connection_pool(),
+            "multi_worker": await benchmark_multi_worker(),
+            "admission": await benchmark_admission(),
+            "checkpoints": await benchmark_checkpoints(),
+            "adaptive_concurrency": await benchmark_adaptive_concurrency(),
+            "hedging": await benchmark_hedging(),
+            "bulk_compare": benchmark_bulk_compare(),
+            "warning_matcher": benchmark_warning_matcher(),
+            "measurements": benchmark_measurements(),
+            "local_ocr": await benchmark_local_ocr(live=args.live),
+            "corpus": corpus_report,
+        }
+        if args.live:
+            report["preprocessing_accuracy"] = await benchmark_preprocessing_accuracy()
+        return report
+
+    report = asyncio.run(run_all())
+    report["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report_json)
+    print(report_json)
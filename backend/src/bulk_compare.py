@@ -0,0 +1,249 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from rapidfuzz import fuzz, process
+import itertools
+import numpy as np
+import label_classifier
+
+### Constants
+# Field names, in the order compare_extracted_fields reports them
+BRAND_FIELD_STR = "Brand Name"
+CLASS_TYPE_FIELD_STR = "Class/Type"
+ALC_CONTENT_FIELD_STR = "Alcohol Content"
+NET_CONTENT_FIELD_STR = "Net Contents"
+GOV_WARN_FIELD_STR = "Government Warning"
+FIELD_STATUSES = ("pass", "warning", "fail")
+
+# Extraction keys read per field, and the application key each one is compared against
+EXTRACTED_COLUMN_KEYS = (
+    (label_classifier.BRAND_NAME_STR, ""),
+    (label_classifier.BRAND_NAME_MATCH_STR, False),
+    (label_classifier.CLASS_TYPE_STR, ""),
+    (label_classifier.CLASS_TYPE_NAME_MATCH_STR, False),
+    (label_classifier.ALC_CONTENT_STR, ""),
+    (label_classifier.ALC_CONTENT_MATCH_STR, False),
+    (label_classifier.NET_CONTENT_STR, ""),
+    (label_classifier.NET_CONTENT_MATCH_STR, False),
+    (label_classifier.GOV_WARN_PRESENT_MATCH_STR, False),
+    (label_classifier.GOV_WARN_CAPS_MATCH_STR, False),
+    (label_classifier.GOV_WARN_TEXT_STR, ""),
+    (label_classifier.GOV_WARN_MATCH_STR, False),
+)
+EXPECTED_COLUMN_KEYS = (
+    label_classifier.BRAND_NAME_STR,
+    label_classifier.CLASS_TYPE_STR,
+    label_classifier.ALC_CONTENT_STR,
+    label_classifier.NET_CONTENT_STR,
+)
+
+
+def pair_scores(scorer, pairs: list) -> list:
+    """
+    Scores aligned (a, b) pairs with rapidfuzz's parallel `cpdist`.
+
+    Parameter values:
+        - scorer<function> = rapidfuzz scorer, e.g. `fuzz.ratio`.
+        - pairs<list> = (a, b) string pairs.
+
+    Return value<list>:
+        - One score per pair (the same float the scorer returns for it).
+    """
+
+    if not pairs:
+        return []
+
+    # float64 so scores (and the rounded percentages in notes) match the scalar scorer exactly
+    scores = process.cpdist(
+        [a for a, _ in pairs],
+        [b for _, b in pairs],
+        scorer=scorer,
+        dtype=np.float64,
+        workers=-1,
+    )
+    return scores.tolist()
+
+
+def broadcast(compare_unique, *columns) -> list:
+    """
+    Runs `compare_unique` once per distinct row of `columns` and spreads the results back to every
+    row, like numpy's unique/inverse. Stored history repeats the same products many times, so
+    most rows are duplicates.
+
+    Parameter values:
+        - compare_unique<function> = takes a list of distinct row tuples, returns one result per tuple.
+        - columns<list> = aligned input columns.
+
+    Return value<list>:
+        - One result per row.
+    """
+
+    keys = list(zip(*columns))
+    unique_keys = list(dict.fromkeys(keys))
+    table = dict(zip(unique_keys, compare_unique(unique_keys)))
+    return [table[key] for key in keys]
+
+
+def compare_brand_names(keys: list) -> list:
+    # label_classifier.compare_brand_name over distinct (extracted, matches, expected) rows
+    results = [None] * len(keys)
+    pending = []
+
+    # Cheap checks first; only rows that need a similarity score are collected
+    for i, (extracted, matches, expected) in enumerate(keys):
+        results[i] = label_classifier.screen_brand_name(extracted, matches, expected)
+        if results[i] is None:
+            pending.append((i, (extracted.lower().strip(), expected.lower().strip())))
+
+    # Score the remaining pairs at once, then apply the thresholds
+    scores = pair_scores(fuzz.ratio, [pair for _, pair in pending])
+    for (i, _), similarity in zip(pending, scores):
+        results[i] = label_classifier.grade_brand_name(similarity)
+
+    return results
+
+
+def compare_class_types(keys: list) -> list:
+    # label_classifier.compare_class_type over distinct (extracted, matches, expected) rows
+    results = [None] * len(keys)
+    pending = []
+
+    # Cheap checks first; only rows that need a similarity score are collected
+    for i, (extracted, matches, expected) in enumerate(keys):
+        results[i] = label_classifier.screen_class_type(extracted, matches, expected)
+        if results[i] is None:
+            pending.append((i, (extracted.lower().strip(), expected.lower().strip())))
+
+    # Full and partial similarity for the remaining pairs, then the threshold
+    pairs = [pair for _, pair in pending]
+    similarities = pair_scores(fuzz.ratio, pairs)
+    partials = pair_scores(fuzz.partial_ratio, pairs)
+    for (i, _), similarity, partial in zip(pending, similarities, partials):
+        results[i] = label_classifier.grade_class_type(max(similarity, partial))
+
+    return results
+
+
+def compare_alcohol_contents(keys: list) -> list:
+    # label_classifier.compare_alcohol_content over distinct (extracted, matches, expected) rows;
+    # the measurement parser behind it caches each distinct string
+    return [label_classifier.compare_alcohol_content(*key) for key in keys]
+
+
+def compare_net_contents_values(keys: list) -> list:
+    # label_classifier.compare_net_contents over distinct (extracted, matches, expected) rows
+    return [label_classifier.compare_net_contents(*key) for key in keys]
+
+
+def check_government_warnings(keys: list) -> list:
+    # label_classifier.check_government_warning over distinct (present, all_caps, text, matches) rows
+    results = [None] * len(keys)
+    pending = []
+
+    # Cheap checks first; only rows that need a similarity score are collected
+    for i, (present, all_caps, text, matches) in enumerate(keys):
+        results[i] = label_classifier.screen_government_warning(present, all_caps, text, matches)
+        if results[i] is None:
+            pending.append((i, text))
+
+    # Score the remaining texts against the required statement at once, then grade them
+    texts = [text for _, text in pending]
+    similarities = label_classifier.government_warning_matcher.similarities(texts)
+    for (i, text), similarity in zip(pending, similarities):
+        results[i] = label_classifier.grade_government_warning(text, similarity)
+
+    return results
+
+
+def overall_statuses(field_columns: list) -> list:
+    # Same rule as compare_extracted_fields: any fail rejects, any warning needs review
+    overall_by_statuses = {
+        statuses: "rejected" if "fail" in statuses else ("review" if "warning" in statuses else "approved")
+        for statuses in itertools.product(FIELD_STATUSES, repeat=len(field_columns))
+    }
+    status_columns = [[status for status, _ in column] for column in field_columns]
+    return [overall_by_statuses[statuses] for statuses in zip(*status_columns)]
+
+
+def compare_columns(extracted: dict, expected: dict) -> dict:
+    """
+    Re-scores many extractions against their applications at once, e.g. to see how a threshold
+    change in label_classifier would have affected historical results. Gives the same field
+    statuses, notes and overall status as calling `label_classifier.compare_extracted_fields`
+    per row. Each distinct input is compared once, similarity scores come from rapidfuzz's
+    parallel `cpdist`, and alcohol/net contents strings are parsed once each by the cached
+    measurement parser.
+
+    Parameter values:
+        - extracted<dict> = column (list) per extraction key, e.g. extracted["brand_name"][i]; match
+          flags are compared by truthiness.
+        - expected<dict> = column per application key ("brand_name", "class_type",
+          "alcohol_content", "net_contents"), aligned with `extracted`.
+
+    Return value<dict>:
+        - Dictionary with a (status, note) list per field name ("Brand Name", "Class/Type",
+          "Alcohol Content", "Net Contents", "Government Warning") and an "overallStatus" list.
+    """
+
+    # Only truthiness of the match flags matters, and bools keep them hashable
+    def flags(key: str) -> list:
+        return [bool(value) for value in extracted[key]]
+
+    columns = {
+        BRAND_FIELD_STR: broadcast(
+            compare_brand_names,
+            extracted[label_classifier.BRAND_NAME_STR],
+            flags(label_classifier.BRAND_NAME_MATCH_STR),
+            expected[label_classifier.BRAND_NAME_STR],
+        ),
+        CLASS_TYPE_FIELD_STR: broadcast(
+            compare_class_types,
+            extracted[label_classifier.CLASS_TYPE_STR],
+            flags(label_classifier.CLASS_TYPE_NAME_MATCH_STR),
+            expected[label_classifier.CLASS_TYPE_STR],
+        ),
+        ALC_CONTENT_FIELD_STR: broadcast(
+            compare_alcohol_contents,
+            extracted[label_classifier.ALC_CONTENT_STR],
+            flags(label_classifier.ALC_CONTENT_MATCH_STR),
+            expected[label_classifier.ALC_CONTENT_STR],
+        ),
+        NET_CONTENT_FIELD_STR: broadcast(
+            compare_net_contents_values,
+            extracted[label_classifier.NET_CONTENT_STR],
+            flags(label_classifier.NET_CONTENT_MATCH_STR),
+            expected[label_classifier.NET_CONTENT_STR],
+        ),
+        GOV_WARN_FIELD_STR: broadcast(
+            check_government_warnings,
+            flags(label_classifier.GOV_WARN_PRESENT_MATCH_STR),
+            flags(label_classifier.GOV_WARN_CAPS_MATCH_STR),
+            extracted[label_classifier.GOV_WARN_TEXT_STR],
+            flags(label_classifier.GOV_WARN_MATCH_STR),
+        ),
+    }
+    columns["overallStatus"] = overall_statuses(list(columns.values()))
+
+    return columns
+
+
+def rows_to_columns(extracted_rows: list, application_rows: list) -> tuple:
+    """
+    Splits extraction and application dictionaries (as stored per label) into the columns
+    `compare_columns` takes, using the same defaults as `compare_extracted_fields` for missing keys.
+
+    Parameter values:
+        - extracted_rows<list> = extraction dictionaries.
+        - application_rows<list> = application data dictionaries, aligned with extracted_rows.
+
+    Return value<tuple>:
+        - Tuple of (extracted_columns, expected_columns).
+    """
+
+    if len(extracted_rows) != len(application_rows):
+        raise ValueError("extracted_rows and application_rows must be the same length")
+
+    extracted = {key: [row.get(key, default) for row in extracted_rows] for key, default in EXTRACTED_COLUMN_KEYS}
+    expected = {key: [row.get(key, "") for row in application_rows] for key in EXPECTED_COLUMN_KEYS}
+    return extracted, expected
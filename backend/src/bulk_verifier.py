@@ -0,0 +1,564 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+import admission
+import batch_processor
+import label_classifier
+import observability
+import result_cache
+
+### Constants
+BULK_WORK_DIR = os.environ.get("BULK_WORK_DIR", "bulk_runs")  # Each run keeps its checkpoint in a subfolder
+BULK_SOURCE_ROOT = os.environ.get("BULK_SOURCE_ROOT", "")  # /bulk-jobs only reads sources under this folder ('' = disabled)
+BULK_POLL_INTERVAL_SECONDS = float(os.environ.get("BULK_POLL_INTERVAL_SECONDS", 60))
+BULK_RETRY_FAILED_ONLINE = os.environ.get("BULK_RETRY_FAILED_ONLINE", "1") == "1"
+BULK_PREPARE_CONCURRENCY = 8  # Images preprocessed at once while writing the batch files
+
+# Batch API limits: one completion window, and at most 50,000 requests / 200 MB per input file
+BULK_COMPLETION_WINDOW = "24h"
+BULK_ENDPOINT = "/v1/chat/completions"
+BULK_MAX_REQUESTS_PER_FILE = 50000
+BULK_MAX_FILE_BYTES = int(os.environ.get("BULK_MAX_FILE_BYTES", 190 * 1024 * 1024))
+
+BULK_STATE_FILE_NAME = "state.json"
+BULK_RESULTS_FILE_NAME = "results.json"
+BULK_IMAGE_DIR_NAMES = ("test_images", "images")
+BULK_APPLICATION_DIR_NAME = "applications"
+
+BULK_STATUS_PREPARING = "preparing"
+BULK_STATUS_SUBMITTED = "submitted"
+BULK_STATUS_COMPLETE = "complete"
+BATCH_FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def format_bulk_application(app_data: dict) -> dict:
+    # Fill the combined alcohol content / net contents strings when only the split fields are given
+    if "alcohol_content" not in app_data and "alcohol_content_amount" in app_data:
+        app_data["alcohol_content"] = f"{app_data['alcohol_content_amount']} {app_data.get('alcohol_content_format', '')}".strip()
+    if "net_contents" not in app_data and "net_contents_amount" in app_data:
+        app_data["net_contents"] = f"{app_data['net_contents_amount']} {app_data.get('net_contents_unit', '')}".strip()
+    return app_data
+
+
+def resolve_source_path(path: str, source_root: str) -> str:
+    """
+    Resolves a file named by a bulk source (following symlinks and "..") and checks that it stays
+    inside the source root, so a manifest cannot make the server read arbitrary files.
+
+    Parameter values:
+        - path<str> = image or application path from the source.
+        - source_root<str> = folder every path must resolve into ('' = no restriction).
+
+    Return value<str>:
+        - Resolved absolute path.
+        - Raises ValueError if the path resolves outside source_root.
+    """
+
+    resolved = os.path.realpath(path)
+    if source_root:
+        root = os.path.realpath(source_root)
+        if os.path.commonpath([root, resolved]) != root:
+            raise ValueError(f"Bulk source path is outside BULK_SOURCE_ROOT: {path}")
+    return resolved
+
+
+def load_bulk_items(source: str, source_root: str = BULK_SOURCE_ROOT) -> list:
+    """
+    Lists the image/application pairs of a bulk run. The source is either a folder laid out like
+    tests/ (an images or test_images folder and an applications folder, paired by file name
+    without extension) or a JSON / JSONL manifest of {"id", "image", "application"} entries,
+    where image is a path and application is a path or an inline object. Relative paths in a
+    manifest are resolved against the manifest's folder. Every path must resolve inside source_root.
+
+    Parameter values:
+        - source<str> = folder or manifest path.
+        - source_root<str> = folder all images and applications must be in ('' = no restriction,
+          for runs started from the command line).
+
+    Return value<list>:
+        - List of {"id", "image_path", "app_data"} dictionaries in a stable order.
+        - Raises ValueError if the source is missing, empty, has duplicate IDs, or names a file
+          outside source_root.
+    """
+
+    items = []
+    if os.path.isdir(source):
+        # Pair images with applications by file name without extension
+        image_dir = next(
+            (os.path.join(source, name) for name in BULK_IMAGE_DIR_NAMES if os.path.isdir(os.path.join(source, name))),
+            None,
+        )
+        if image_dir is None:
+            raise ValueError(f"No {' or '.join(BULK_IMAGE_DIR_NAMES)} folder in {source}")
+        image_paths = {
+            os.path.splitext(os.path.basename(path))[0]: path
+            for path in glob.glob(os.path.join(image_dir, "*"))
+            if os.path.isfile(path)
+        }
+        for app_path in sorted(glob.glob(os.path.join(source, BULK_APPLICATION_DIR_NAME, "*.json"))):
+            item_id = os.path.splitext(os.path.basename(app_path))[0]
+            if item_id not in image_paths:
+                observability.log("WARNING", "Application has no matching image, skipping", application=app_path)
+                continue
+            with open(resolve_source_path(app_path, source_root), "r", encoding="utf-8") as f:
+                app_data = json.load(f)
+            items.append(
+                {"id": item_id, "image_path": resolve_source_path(image_paths[item_id], source_root), "app_data": app_data}
+            )
+
+    elif os.path.isfile(source):
+        # Manifest: a JSON list, or one JSON object per line
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, "r", encoding="utf-8") as f:
+            text = f.read()
+        if source.endswith(".jsonl"):
+            entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            entries = json.loads(text)
+        for position, entry in enumerate(entries):
+            application = entry["application"]
+            if isinstance(application, str):
+                with open(resolve_source_path(os.path.join(base_dir, application), source_root), "r", encoding="utf-8") as f:
+                    application = json.load(f)
+            items.append(
+                {
+                    "id": str(entry.get("id", position)),
+                    "image_path": resolve_source_path(os.path.join(base_dir, entry["image"]), source_root),
+                    "app_data": application,
+                }
+            )
+    else:
+        raise ValueError(f"Bulk source not found: {source}")
+
+    if not items:
+        raise ValueError(f"No image/application pairs found in {source}")
+    if len({item["id"] for item in items}) != len(items):
+        raise ValueError(f"Duplicate item IDs in {source}")
+
+    for item in items:
+        item["app_data"] = format_bulk_application(item["app_data"])
+    return items
+
+
+def load_state(work_dir: str):
+    # Checkpoint of a run, or None if the run has not started
+    path = os.path.join(work_dir, BULK_STATE_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(work_dir: str, state: dict) -> None:
+    # Write to a temporary file and rename, so a crash never leaves a half-written checkpoint
+    state["updated_at"] = time.time()
+    path = os.path.join(work_dir, BULK_STATE_FILE_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+async def prepare_batches(state: dict, work_dir: str) -> None:
+    """
+    Writes the Batch API input files. Labels already in the result cache (or resolved by local
+    OCR) are answered straight away and left out; every other label becomes one chat-completions
+    request with the same body `extract_fields_with_vision` sends, using the item ID as custom_id.
+    Files are split to stay under the Batch API's per-file request and size limits.
+
+    Parameter values:
+        - state<dict> = run checkpoint; its 'results' and 'batches' are filled in.
+        - work_dir<str> = folder the input files are written to.
+
+    Return value<None>
+    """
+
+    pending_ids = [item_id for item_id in state["order"] if item_id not in state["results"]]
+    batches = []
+    batch_file = None
+
+    def start_batch_file():
+        # Open the next input file
+        input_path = os.path.join(work_dir, f"input_{len(batches) + 1:03d}.jsonl")
+        batches.append({"input_path": input_path, "custom_ids": [], "bytes": 0, "status": None})
+        return open(input_path, "w", encoding="utf-8")
+
+    async def build_line(item_id: str):
+        # Read the image, skip the API if the label is already resolved, else build its request line
+        item = state["items"][item_id]
+        with open(item["image_path"], "rb") as f:
+            image_bytes = f.read()
+        cache_key, result, source = await label_classifier.resolve_without_vision(image_bytes, item["app_data"])
+        item["cache_key"] = cache_key
+        if result is not None:
+            observability.labels_verified_total.inc(source=source, status=result.get("overallStatus", ""))
+            return item_id, result, None
+        prompt = label_classifier.build_extraction_prompt(item["app_data"])
+        body, _ = await label_classifier.build_vision_request(
+            image_bytes, label_classifier.EXTRACTION_INSTRUCTIONS, prompt, label_classifier.EXTRACTION_RESPONSE_FORMAT
+        )
+        line = {"custom_id": item_id, "method": "POST", "url": BULK_ENDPOINT, "body": body}
+        return item_id, None, json.dumps(line) + "\n"
+
+    try:
+        # Build lines a few at a time (images are preprocessed in a thread pool) and append them in order
+        for start in range(0, len(pending_ids), BULK_PREPARE_CONCURRENCY):
+            window = pending_ids[start : start + BULK_PREPARE_CONCURRENCY]
+            for item_id, result, line in await asyncio.gather(*(build_line(item_id) for item_id in window)):
+                if result is not None:
+                    state["results"][item_id] = result
+                    continue
+                line_bytes = len(line.encode("utf-8"))
+                if (
+                    batch_file is None
+                    or len(batches[-1]["custom_ids"]) >= BULK_MAX_REQUESTS_PER_FILE
+                    or batches[-1]["bytes"] + line_bytes > BULK_MAX_FILE_BYTES
+                ):
+                    if batch_file is not None:
+                        batch_file.close()
+                    batch_file = start_batch_file()
+                batch_file.write(line)
+                batches[-1]["custom_ids"].append(item_id)
+                batches[-1]["bytes"] += line_bytes
+    finally:
+        if batch_file is not None:
+            batch_file.close()
+
+    state["batches"] = batches
+    observability.log(
+        "INFO",
+        "Bulk input prepared",
+        labels=len(pending_ids),
+        resolved_without_api=len(state["results"]),
+        batch_files=len(batches),
+    )
+
+
+async def submit_batches(state: dict, work_dir: str, client) -> None:
+    """
+    Uploads each input file and creates its batch, checkpointing after every call so a resumed
+    run never uploads or submits the same file twice.
+
+    Parameter values:
+        - state<dict> = run checkpoint.
+        - work_dir<str> = run folder holding the checkpoint.
+        - client<AsyncOpenAI> = OpenAI client (pointed at the fake server in tests).
+
+    Return value<None>
+    """
+
+    for batch in state["batches"]:
+        if batch.get("input_file_id") is None:
+            with open(batch["input_path"], "rb") as f:
+                uploaded = await client.files.create(file=f, purpose="batch")
+            batch["input_file_id"] = uploaded.id
+            save_state(work_dir, state)
+
+        if batch.get("batch_id") is None:
+            created = await client.batches.create(
+                input_file_id=batch["input_file_id"],
+                endpoint=BULK_ENDPOINT,
+                completion_window=BULK_COMPLETION_WINDOW,
+                metadata={"run": os.path.basename(os.path.abspath(work_dir))},
+            )
+            batch["batch_id"] = created.id
+            batch["status"] = created.status
+            save_state(work_dir, state)
+            observability.log("INFO", "Batch submitted", batch_id=created.id, labels=len(batch["custom_ids"]))
+
+
+async def poll_batches(state: dict, work_dir: str, client, poll_interval: float) -> None:
+    """
+    Polls every submitted batch until it reaches a final status (completed, failed, expired or
+    cancelled), checkpointing status and progress counts on every pass.
+
+    Parameter values:
+        - state<dict> = run checkpoint.
+        - work_dir<str> = run folder holding the checkpoint.
+        - client<AsyncOpenAI> = OpenAI client.
+        - poll_interval<float> = seconds between polls.
+
+    Return value<None>
+    """
+
+    while True:
+        for batch in state["batches"]:
+            if batch["status"] in BATCH_FINISHED_STATUSES:
+                continue
+            remote = await client.batches.retrieve(batch["batch_id"])
+            batch["status"] = remote.status
+            batch["output_file_id"] = remote.output_file_id
+            batch["error_file_id"] = remote.error_file_id
+            if remote.request_counts is not None:
+                batch["request_counts"] = remote.request_counts.model_dump()
+        save_state(work_dir, state)
+
+        if all(batch["status"] in BATCH_FINISHED_STATUSES for batch in state["batches"]):
+            return
+        await asyncio.sleep(poll_interval)
+
+
+def parse_batch_output_line(line: dict) -> tuple:
+    """
+    Reads one line of a batch output file.
+
+    Parameter values:
+        - line<dict> = parsed output line ({"custom_id", "response": {"status_code", "body"}, "error"}).
+
+    Return value<tuple>:
+        - Tuple of (custom_id, extracted, usage) where extracted is None if the request failed
+          or its reply was not valid JSON.
+    """
+
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    usage = body.get("usage") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return line.get("custom_id"), None, usage
+    try:
+        extracted = label_classifier.parse_vision_reply(body["choices"][0]["message"]["content"])
+    except (KeyError, IndexError, TypeError, json.JSONDecodeError):
+        return line.get("custom_id"), None, usage
+    if not isinstance(extracted, dict):
+        return line.get("custom_id"), None, usage
+    return line.get("custom_id"), extracted, usage
+
+
+async def collect_batch(state: dict, batch: dict, client) -> None:
+    """
+    Downloads a finished batch's output, runs each extraction through the same comparison and
+    aggregation as `verify_label`, and caches the results. Labels with no usable output
+    (failed requests, invalid JSON, or an expired or failed batch) are added to 'failed_ids'.
+
+    Parameter values:
+        - state<dict> = run checkpoint.
+        - batch<dict> = finished batch entry from state['batches'].
+        - client<AsyncOpenAI> = OpenAI client.
+
+    Return value<None>
+    """
+
+    answered = set()
+    if batch.get("output_file_id"):
+        output = await client.files.content(batch["output_file_id"])
+        for raw_line in output.text.splitlines():
+            if not raw_line.strip():
+                continue
+            custom_id, extracted, usage = parse_batch_output_line(json.loads(raw_line))
+            for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                state["usage"][kind] += usage.get(kind) or 0
+            if extracted is None or custom_id not in state["items"]:
+                continue
+
+            # Same comparison and aggregation as verify_label; cached so live requests reuse it
+            item = state["items"][custom_id]
+            with observability.time_stage("comparison"):
+                result = label_classifier.compare_extracted_fields(extracted, item["app_data"])
+            result_cache.verification_cache.set(item["cache_key"], result)
+            observability.labels_verified_total.inc(source="bulk", status=result.get("overallStatus", ""))
+            state["results"][custom_id] = result
+            answered.add(custom_id)
+
+    failed_ids = [custom_id for custom_id in batch["custom_ids"] if custom_id not in answered]
+    state["failed_ids"].extend(failed_ids)
+    batch["collected"] = True
+    observability.log(
+        "INFO",
+        "Batch collected",
+        batch_id=batch["batch_id"],
+        status=batch["status"],
+        verified=len(answered),
+        failed=len(failed_ids),
+    )
+
+
+async def retry_failed_online(state: dict) -> None:
+    # Verify labels the batches could not answer through the live API, with the usual retries
+    failed_ids = list(state["failed_ids"])
+    total_batch = []
+    for item_id in failed_ids:
+        item = state["items"][item_id]
+        with open(item["image_path"], "rb") as f:
+            total_batch.append([f.read(), item["app_data"]])
+    observability.log("INFO", "Retrying failed bulk labels with the live API", labels=len(failed_ids))
+
+    # Background work; live /verify and batch requests are admitted first
+    priority_token = admission.priority_var.set(admission.PRIORITY_BULK)
+    try:
+        results = await batch_processor.process_batch(total_batch)
+    finally:
+        admission.priority_var.reset(priority_token)
+    for item_id, result in zip(failed_ids, results):
+        if result is not None and result.get("overallStatus") != "error":
+            state["results"][item_id] = result
+            state["failed_ids"].remove(item_id)
+
+
+def write_results(state: dict, work_dir: str) -> str:
+    # Final results in input order; labels that could not be verified get the standard error result
+    output = [
+        {
+            "id": item_id,
+            "image": state["items"][item_id]["image_path"],
+            "result": state["results"][item_id]
+            if item_id in state["results"]
+            else batch_processor.sanitize_result(Exception("Bulk verification failed")),
+        }
+        for item_id in state["order"]
+    ]
+    path = os.path.join(work_dir, BULK_RESULTS_FILE_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    return path
+
+
+def get_bulk_summary(state: dict) -> dict:
+    """
+    Summarizes a run's checkpoint for status checks.
+
+    Parameter values:
+        - state<dict> = run checkpoint.
+
+    Return value<dict>:
+        - Status, label counts, token usage and the status of each batch.
+    """
+
+    return {
+        "status": state["status"],
+        "source": state["source"],
+        "total": len(state["order"]),
+        "verified": len(state["results"]),
+        "failed": len(state["failed_ids"]),
+        "usage": state["usage"],
+        "batches": [
+            {
+                "batchId": batch.get("batch_id"),
+                "status": batch.get("status"),
+                "labels": len(batch["custom_ids"]),
+                "requestCounts": batch.get("request_counts"),
+            }
+            for batch in state["batches"]
+        ],
+        "error": state.get("error"),
+    }
+
+
+async def run_bulk(
+    source: str,
+    work_dir: str,
+    poll_interval: float = BULK_POLL_INTERVAL_SECONDS,
+    retry_online: bool = BULK_RETRY_FAILED_ONLINE,
+    client=None,
+) -> dict:
+    """
+    Verifies a large backlog of labels through the OpenAI Batch API, which costs less than live
+    requests and does not use the live RPM/TPM budget, at the price of results arriving within
+    24 hours instead of seconds. Every step is checkpointed in work_dir/state.json, so calling
+    this again with the same work_dir resumes where the previous run stopped (the source is
+    only read on the first call). Results are written to work_dir/results.json in input order.
+
+    Parameter values:
+        - source<str> = folder or manifest of image/application pairs (see `load_bulk_items`).
+        - work_dir<str> = run folder for the checkpoint, batch input files and results.
+        - poll_interval<float> = seconds between batch status checks.
+        - retry_online<bool> = verify labels the batches could not answer through the live API.
+        - client<AsyncOpenAI or None> = OpenAI client; defaults to the classifier's client.
+
+    Return value<dict>:
+        - Summary from `get_bulk_summary`, plus the results file path once complete.
+    """
+
+    client = client or label_classifier.get_openai_client()
+    os.makedirs(work_dir, exist_ok=True)
+
+    # Start a new run, or pick up the checkpoint of an interrupted one
+    state = load_state(work_dir)
+    if state is None:
+        items = load_bulk_items(source)
+        state = {
+            "source": source,
+            "created_at": time.time(),
+            "status": BULK_STATUS_PREPARING,
+            "order": [item["id"] for item in items],
+            "items": {item["id"]: {"image_path": item["image_path"], "app_data": item["app_data"]} for item in items},
+            "results": {},
+            "failed_ids": [],
+            "batches": [],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            "error": None,
+        }
+        save_state(work_dir, state)
+    elif state["status"] == BULK_STATUS_COMPLETE:
+        return {**get_bulk_summary(state), "results_path": os.path.join(work_dir, BULK_RESULTS_FILE_NAME)}
+    else:
+        observability.log("INFO", "Resuming bulk run", work_dir=work_dir, status=state["status"])
+
+    try:
+        # Input files are rewritten from scratch if the previous run stopped while preparing them
+        if state["status"] == BULK_STATUS_PREPARING:
+            await prepare_batches(state, work_dir)
+            state["status"] = BULK_STATUS_SUBMITTED
+            save_state(work_dir, state)
+
+        await submit_batches(state, work_dir, client)
+        await poll_batches(state, work_dir, client, poll_interval)
+
+        for batch in state["batches"]:
+            if not batch.get("collected"):
+                await collect_batch(state, batch, client)
+                save_state(work_dir, state)
+
+        if retry_online and state["failed_ids"]:
+            await retry_failed_online(state)
+
+        state["status"] = BULK_STATUS_COMPLETE
+        results_path = write_results(state, work_dir)
+        save_state(work_dir, state)
+    except Exception as e:
+        # Leave the checkpoint resumable; only the error is recorded
+        state["error"] = repr(e)
+        save_state(work_dir, state)
+        raise
+
+    observability.log(
+        "INFO",
+        "Bulk run complete",
+        verified=len(state["results"]),
+        failed=len(state["failed_ids"]),
+        total_tokens=state["usage"]["total_tokens"],
+    )
+    return {**get_bulk_summary(state), "results_path": results_path}
+
+
+if __name__ == "__main__":
+    ### Main
+    # Verifies a backlog of labels through the OpenAI Batch API, e.g.
+    #   python bulk_verifier.py --source ../../tests --work-dir bulk_runs/nightly
+    # Running the same command again resumes the run from its checkpoint. Point
+    # OPENAI_BASE_URL at fake_openai_server.py to try it without using quota.
+
+    parser = argparse.ArgumentParser(description="Verify labels in bulk with the OpenAI Batch API.")
+    parser.add_argument("--source", help="folder laid out like tests/, or a JSON/JSONL manifest")
+    parser.add_argument("--work-dir", help="run folder (checkpoint, batch files, results); reused to resume")
+    parser.add_argument("--poll-interval", type=float, default=BULK_POLL_INTERVAL_SECONDS, help="seconds between status checks")
+    parser.add_argument("--no-online-retry", action="store_true", help="leave labels the batches could not answer as errors")
+    parser.add_argument("--status", action="store_true", help="print the run's checkpoint summary and exit")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or os.path.join(BULK_WORK_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    if args.status:
+        state = load_state(work_dir)
+        print(json.dumps(get_bulk_summary(state) if state else {"error": "No run in " + work_dir}, indent=2))
+    elif args.source is None and load_state(work_dir) is None:
+        parser.error("--source is required to start a new run")
+    else:
+        summary = asyncio.run(
+            run_bulk(args.source, work_dir, args.poll_interval, retry_online=not args.no_online_retry)
+        )
+        print(json.dumps(summary, indent=2))
@@ -0,0 +1,172 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+import httpx
+import os
+import time
+import observability
+
+### Constants
+CIRCUIT_BREAKER_ENABLED = os.environ.get("CIRCUIT_BREAKER_ENABLED", "1") == "1"
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 10))  # Failed calls in a row that open the circuit
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", 30))  # How long calls fail fast before a probe is let through
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+FAILURE_RATE_LIMITED = "rate_limited"
+FAILURE_TIMEOUT = "timeout"
+FAILURE_UNAVAILABLE = "unavailable"  # 5xx replies and connection errors
+
+circuit_transitions_total = observability.register(
+    observability.Counter(
+        "circuit_breaker_transitions_total",
+        "Vision circuit breaker state changes, by new state.",
+        ("state",),
+    )
+)
+circuit_rejections_total = observability.register(
+    observability.Counter(
+        "circuit_breaker_rejections_total",
+        "Vision calls failed fast because the circuit was open.",
+    )
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a vision call while the circuit is open. It is never retried.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def failure_kind(error: Exception):
+    # Failure class of a vision call error that points at an overloaded or unavailable API, else None
+    if isinstance(error, RateLimitError):
+        return FAILURE_RATE_LIMITED
+    if isinstance(error, (APITimeoutError, httpx.TimeoutException)):
+        return FAILURE_TIMEOUT
+    if isinstance(error, (InternalServerError, APIConnectionError, httpx.TransportError)):
+        return FAILURE_UNAVAILABLE
+    return None
+
+
+class CircuitBreaker:
+    """
+    Stops sending vision calls during a sustained outage. After `failure_threshold` calls in a
+    row fail with a timeout, 5xx or connection error, the circuit opens and every call fails
+    fast with CircuitOpenError for `open_seconds`. Then one probe call is let through (half
+    open): if the API answers it the circuit closes, otherwise it opens again. A 429 is not an
+    outage, so it neither counts toward the threshold nor resets the count; the rate limiter and
+    the adaptive concurrency limit back off from it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        enabled: bool = CIRCUIT_BREAKER_ENABLED,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.enabled = enabled
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = None
+
+    def check(self) -> None:
+        """
+        Called before each vision call; raises CircuitOpenError if the call must not be sent.
+
+        Return value<None>:
+            - Raises CircuitOpenError while the circuit is open, and in the half-open state for
+              every call but the probe.
+        """
+
+        if not self.enabled or self.state == CIRCUIT_CLOSED:
+            return
+        now = time.monotonic()
+
+        # Once the open period is over, let one probe through (another if the last one never reported back)
+        if self.state == CIRCUIT_OPEN and now - self.opened_at >= self.open_seconds:
+            self.transition(CIRCUIT_HALF_OPEN)
+        if self.state == CIRCUIT_HALF_OPEN and (
+            self.probe_started_at is None or now - self.probe_started_at >= self.open_seconds
+        ):
+            self.probe_started_at = now
+            return
+
+        circuit_rejections_total.inc()
+        retry_after = max(0.0, self.opened_at + self.open_seconds - now) or self.open_seconds
+        raise CircuitOpenError(f"Vision API circuit is {self.state}", retry_after)
+
+    def reject_if_open(self) -> None:
+        # Fail a call that passed `check` but waited (e.g. for admission) while the circuit opened
+        if self.enabled and self.state == CIRCUIT_OPEN:
+            circuit_rejections_total.inc()
+            raise CircuitOpenError(
+                "Vision API circuit opened while waiting", max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+            )
+
+    def record(self, failure: str = None) -> None:
+        """
+        Records the outcome of a vision call that was sent.
+
+        Parameter values:
+            - failure<str or None> = failure class from `failure_kind`, or None for a call the
+              API answered. FAILURE_RATE_LIMITED never opens the circuit.
+
+        Return value<None>
+        """
+
+        # A 429 shows the API is up but over budget; only a probe's answer changes anything
+        if failure == FAILURE_RATE_LIMITED:
+            if self.state == CIRCUIT_HALF_OPEN:
+                self.consecutive_failures = 0
+                self.transition(CIRCUIT_CLOSED)
+            return
+
+        if failure is None:
+            self.consecutive_failures = 0
+            if self.state != CIRCUIT_CLOSED:
+                self.transition(CIRCUIT_CLOSED)
+            return
+
+        self.consecutive_failures += 1
+        if self.state == CIRCUIT_HALF_OPEN or (
+            self.state == CIRCUIT_CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.transition(CIRCUIT_OPEN)
+
+    def transition(self, state: str) -> None:
+        # Change state, logging it since open circuits fail whole batches fast
+        self.state = state
+        self.probe_started_at = None
+        circuit_transitions_total.inc(state=state)
+        observability.log(
+            "WARNING" if state == CIRCUIT_OPEN else "INFO",
+            "Vision circuit breaker state changed",
+            state=state,
+            consecutive_failures=self.consecutive_failures,
+        )
+
+
+# Shared by every vision call in this process
+vision_breaker = CircuitBreaker()
+
+observability.register(
+    observability.CallbackGauge(
+        "circuit_breaker_open",
+        "1 while the vision circuit breaker is open or half open, else 0.",
+        (),
+        lambda: {(): 0 if vision_breaker.state == CIRCUIT_CLOSED else 1},
+    )
+)
@@ -0,0 +1,80 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import asyncio
+import contextvars
+import os
+import time
+
+### Constants
+DEADLINE_HEADER = "X-Request-Timeout"  # Seconds the caller is willing to wait, e.g. "10"
+VERIFY_DEADLINE_SECONDS = float(os.environ.get("VERIFY_DEADLINE_SECONDS", 0))  # Default for /verify (0 = none)
+
+# Absolute deadline (time.monotonic()) of the work in this context; asyncio tasks inherit it,
+# so batch workers and the vision calls they make all see the deadline of the request
+deadline_var = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when the work for a request cannot finish before its deadline. It is never retried.
+    """
+
+
+def start_deadline(seconds):
+    """
+    Sets a deadline `seconds` from now for the current context, unless an earlier one is
+    already set. Reset it with `deadline_var.reset(token)` when the work is done.
+
+    Parameter values:
+        - seconds<float or None> = time budget; None or 0 leaves the current deadline unchanged.
+
+    Return value<contextvars.Token>:
+        - Token for `deadline_var.reset`.
+    """
+
+    deadline = deadline_var.get()
+    if seconds and seconds > 0:
+        new_deadline = time.monotonic() + seconds
+        deadline = new_deadline if deadline is None else min(deadline, new_deadline)
+    return deadline_var.set(deadline)
+
+
+def remaining():
+    # Seconds left before the deadline, or None when there is no deadline
+    deadline = deadline_var.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check(stage: str) -> None:
+    # Fail fast once the deadline has passed
+    time_left = remaining()
+    if time_left is not None and time_left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+async def wait_within_deadline(awaitable, stage: str):
+    """
+    Awaits `awaitable`, cancelling it and raising DeadlineExceeded if the deadline passes first.
+
+    Parameter values:
+        - awaitable<awaitable> = work to wait for.
+        - stage<str> = name used in the error message.
+
+    Return value<any>:
+        - Whatever the awaitable returns.
+    """
+
+    time_left = remaining()
+    if time_left is None:
+        return await awaitable
+    if time_left <= 0:
+        # Close the coroutine without running it
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+    try:
+        return await asyncio.wait_for(awaitable, time_left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Deadline exceeded during {stage}")
@@ -0,0 +1,708 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, Response
+import asyncio
+import base64
+import hashlib
+import httpx
+import json
+import math
+import os
+import random
+import threading
+import time
+import uvicorn
+import rate_limiter
+import result_cache
+
+### Constants
+FAKE_RPM_LIMIT = int(os.environ.get("FAKE_OPENAI_RPM", 500))
+FAKE_TPM_LIMIT = int(os.environ.get("FAKE_OPENAI_TPM", 200000))
+FAKE_PERIOD_SECONDS = float(os.environ.get("FAKE_OPENAI_PERIOD_SECONDS", 60))
+FAKE_LATENCY_SECONDS = float(os.environ.get("FAKE_OPENAI_LATENCY_SECONDS", 0.05))
+FAKE_COMPLETION_TOKENS = 150
+FAKE_LOW_DETAIL_IMAGE_TOKENS = 85  # "low" detail images cost a flat 85 tokens, whatever their size
+
+# Prompt caching, modelled on OpenAI's: a request whose leading messages repeat an earlier
+# request's (within FAKE_PROMPT_CACHE_SECONDS) has that prefix reported as cached_tokens,
+# once the prefix reaches FAKE_PROMPT_CACHE_MIN_TOKENS, in FAKE_PROMPT_CACHE_INCREMENT steps
+FAKE_PROMPT_CACHE_SECONDS = float(os.environ.get("FAKE_OPENAI_PROMPT_CACHE_SECONDS", 300))
+FAKE_PROMPT_CACHE_MIN_TOKENS = 1024
+FAKE_PROMPT_CACHE_INCREMENT = 128
+
+# Latency distribution: "fixed", "uniform" (latency +/- spread seconds) or "lognormal"
+# (mean latency, spread is sigma; gives the long tail real vision calls have)
+FAKE_LATENCY_DISTRIBUTION = os.environ.get("FAKE_OPENAI_LATENCY_DISTRIBUTION", "fixed")
+FAKE_LATENCY_SPREAD = float(os.environ.get("FAKE_OPENAI_LATENCY_SPREAD", 0.0))
+
+# Fault injection: fraction of accepted requests that get each failure
+FAKE_RATE_LIMIT_FRACTION = float(os.environ.get("FAKE_OPENAI_RATE_LIMIT_FRACTION", 0.0))
+FAKE_RETRY_AFTER_SECONDS = float(os.environ.get("FAKE_OPENAI_RETRY_AFTER_SECONDS", 1.0))
+FAKE_MALFORMED_FRACTION = float(os.environ.get("FAKE_OPENAI_MALFORMED_FRACTION", 0.0))
+FAKE_TIMEOUT_FRACTION = float(os.environ.get("FAKE_OPENAI_TIMEOUT_FRACTION", 0.0))
+FAKE_TIMEOUT_SECONDS = float(os.environ.get("FAKE_OPENAI_TIMEOUT_SECONDS", 30.0))  # Hang time of a "timed out" request
+FAKE_SERVER_ERROR_FRACTION = float(os.environ.get("FAKE_OPENAI_SERVER_ERROR_FRACTION", 0.0))  # 503s, e.g. 1.0 for an outage
+FAKE_CONCURRENCY_LIMIT = int(os.environ.get("FAKE_OPENAI_CONCURRENCY_LIMIT", 0))  # 429 requests beyond this many in flight (0 = no limit)
+
+# Record/replay: replies are looked up by uploaded image hash (and prompt hash) in this JSON file.
+# Setting an upstream URL switches to record mode, proxying to the real API and saving its replies.
+FAKE_RECORDINGS_PATH = os.environ.get("FAKE_OPENAI_RECORDINGS", "")
+FAKE_RECORD_UPSTREAM_URL = os.environ.get("FAKE_OPENAI_RECORD_UPSTREAM", "")  # e.g. https://api.openai.com/v1
+FAKE_RANDOM_SEED = os.environ.get("FAKE_OPENAI_SEED")
+FAKE_KEEPALIVE_SECONDS = float(os.environ.get("FAKE_OPENAI_KEEPALIVE_SECONDS", 5))  # Idle connection lifetime (uvicorn's default)
+
+# Batch API: seconds a batch takes from submission to completion, and the fraction of its
+# requests that fail (reported in the error file, as the real API does)
+FAKE_BATCH_SECONDS = float(os.environ.get("FAKE_OPENAI_BATCH_SECONDS", 1.0))
+FAKE_BATCH_ERROR_FRACTION = float(os.environ.get("FAKE_OPENAI_BATCH_ERROR_FRACTION", 0.0))
+
+FAKE_EXTRACTION = {
+    "brand_name": "",
+    "brand_name_matches": False,
+    "class_type": "",
+    "class_type_matches": False,
+    "alcohol_content": "",
+    "alcohol_content_matches": False,
+    "net_contents": "",
+    "net_contents_matches": False,
+    "government_warning_present": False,
+    "government_warning_all_caps": False,
+    "government_warning_text": "",
+    "government_warning_matches": False,
+}
+
+
+def count_request_tokens(body: dict) -> tuple:
+    """
+    Estimates the prompt tokens of a chat-completions request the same way the limiter
+    does, and returns the amount charged against the TPM budget (prompt + max_tokens).
+
+    Parameter values:
+        - body<dict> = parsed chat-completions request body.
+
+    Return value<tuple>:
+        - Tuple of (prompt_tokens, charged_tokens).
+    """
+
+    # A JSON-schema response format counts toward the prompt, like the messages
+    text = json.dumps(body["response_format"]) if body.get("response_format") else ""
+    image_count = 0
+    low_detail_count = 0
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            text += content
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                text += part.get("text", "")
+            elif part.get("type") == "image_url" and part.get("image_url", {}).get("detail") == "low":
+                low_detail_count += 1
+            elif part.get("type") == "image_url":
+                image_count += 1
+
+    max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or 0
+    charged = rate_limiter.estimate_request_tokens(text, max_tokens, image_count)
+    charged += low_detail_count * FAKE_LOW_DETAIL_IMAGE_TOKENS
+    return charged - max_tokens, charged
+
+
+def prompt_prefixes(body: dict) -> list:
+    """
+    Lists the cacheable prefixes of a chat-completions request: the response format, then each
+    message part in order (text by its length, images as ESTIMATED_IMAGE_TOKENS or, at low
+    detail, FAKE_LOW_DETAIL_IMAGE_TOKENS), with the
+    running token estimate and a hash identifying everything up to that point.
+
+    Parameter values:
+        - body<dict> = parsed chat-completions request body.
+
+    Return value<list>:
+        - List of (prefix_tokens<int>, prefix_hash<str>) tuples, shortest first.
+    """
+
+    digest = hashlib.sha256()
+    tokens = 0
+    prefixes = []
+
+    def add(part_text: str, part_tokens: int) -> None:
+        nonlocal tokens
+        digest.update(part_text.encode("utf-8"))
+        tokens += part_tokens
+        prefixes.append((tokens, digest.copy().hexdigest()))
+
+    if body.get("response_format"):
+        schema_text = json.dumps(body["response_format"], sort_keys=True)
+        add(schema_text, len(schema_text) // rate_limiter.CHARS_PER_TOKEN)
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        parts = [{"type": "text", "text": content}] if isinstance(content, str) else content
+        for part in parts:
+            if part.get("type") == "image_url":
+                image_url = part.get("image_url", {})
+                low_detail = image_url.get("detail") == "low"
+                add(image_url.get("url", ""), FAKE_LOW_DETAIL_IMAGE_TOKENS if low_detail else rate_limiter.ESTIMATED_IMAGE_TOKENS)
+            else:
+                add(message.get("role", "") + part.get("text", ""), len(part.get("text", "")) // rate_limiter.CHARS_PER_TOKEN)
+    return prefixes
+
+
+def request_replay_key(body: dict) -> tuple:
+    """
+    Identifies a chat-completions request for record/replay by the SHA-256 of each inline image
+    (as uploaded, i.e. after preprocessing) and of its prompt text. Low-detail images are overviews
+    sent next to a label's text crop (see text_regions.py), so only high-detail images count as labels.
+
+    Parameter values:
+        - body<dict> = parsed chat-completions request body.
+
+    Return value<tuple>:
+        - Tuple of (image_hashes<list>, prompt_hash<str>), images in request order.
+    """
+
+    image_hashes = []
+    text = ""
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            text += content
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                text += part.get("text", "")
+            elif part.get("type") == "image_url" and part.get("image_url", {}).get("detail") != "low":
+                # Data URLs look like data:<mime>;base64,<payload>
+                url = part.get("image_url", {}).get("url", "")
+                if url.startswith("data:") and "," in url:
+                    image_hashes.append(result_cache.hash_image(base64.b64decode(url.split(",", 1)[1])))
+
+    return image_hashes, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_recordings(path: str) -> dict:
+    """
+    Loads recorded replies saved by record mode.
+
+    Parameter values:
+        - path<str> = JSON file of recordings ('' for none).
+
+    Return value<dict>:
+        - Dictionary mapping image hash to {prompt hash: {"content": str, "usage": dict}}.
+    """
+
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_prompt_independent(recording: dict) -> bool:
+    # Extract-only replies carry no "*_matches" judgements, so they hold for any application
+    try:
+        reply = json.loads(recording["content"].replace("```json", "").replace("```", ""))
+    except (json.JSONDecodeError, KeyError, AttributeError):
+        return False
+    return isinstance(reply, dict) and not any(key.endswith("_matches") for key in reply)
+
+
+def find_recording(recordings: dict, image_hash: str, prompt_hash: str):
+    """
+    Finds the recorded reply for a request: the exact image and prompt if recorded, otherwise
+    an extract-only reply recorded for the same image. Replies that judged matches against an
+    application are never reused for a different prompt, since their verdicts would be wrong.
+
+    Parameter values:
+        - recordings<dict> = output of `load_recordings`.
+        - image_hash<str> = hash of the uploaded image.
+        - prompt_hash<str> = hash of the prompt text.
+
+    Return value<dict or None>:
+        - Recorded {"content", "usage"} entry, or None if no usable reply was recorded.
+    """
+
+    by_prompt = recordings.get(image_hash)
+    if not by_prompt:
+        return None
+    if prompt_hash in by_prompt:
+        return by_prompt[prompt_hash]
+    return next((recording for recording in by_prompt.values() if is_prompt_independent(recording)), None)
+
+
+def make_latency_sampler(distribution: str, latency_seconds: float, spread: float, rng: random.Random):
+    """
+    Builds a function returning simulated processing times.
+
+    Parameter values:
+        - distribution<str> = 'fixed', 'uniform', or 'lognormal'.
+        - latency_seconds<float> = mean latency.
+        - spread<float> = half-width in seconds for 'uniform'; sigma for 'lognormal'.
+        - rng<random.Random> = random source (seed it for repeatable runs).
+
+    Return value<function>:
+        - Zero-argument function returning a latency in seconds.
+    """
+
+    if distribution == "uniform":
+        return lambda: max(0.0, rng.uniform(latency_seconds - spread, latency_seconds + spread))
+    if distribution == "lognormal" and latency_seconds > 0:
+        # Pick mu so the distribution's mean equals latency_seconds
+        mu = math.log(latency_seconds) - spread**2 / 2
+        return lambda: rng.lognormvariate(mu, spread)
+    return lambda: latency_seconds
+
+
+def chat_completion_body(body: dict, content: str, usage: dict, completion_id: str) -> dict:
+    # Chat-completions response body in the same shape as the real API's
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage,
+    }
+
+
+def create_app(
+    requests_per_minute: int = FAKE_RPM_LIMIT,
+    tokens_per_minute: int = FAKE_TPM_LIMIT,
+    period_seconds: float = FAKE_PERIOD_SECONDS,
+    latency_seconds: float = FAKE_LATENCY_SECONDS,
+    latency_distribution: str = FAKE_LATENCY_DISTRIBUTION,
+    latency_spread: float = FAKE_LATENCY_SPREAD,
+    rate_limit_fraction: float = FAKE_RATE_LIMIT_FRACTION,
+    retry_after_seconds: float = FAKE_RETRY_AFTER_SECONDS,
+    malformed_fraction: float = FAKE_MALFORMED_FRACTION,
+    timeout_fraction: float = FAKE_TIMEOUT_FRACTION,
+    timeout_seconds: float = FAKE_TIMEOUT_SECONDS,
+    server_error_fraction: float = FAKE_SERVER_ERROR_FRACTION,
+    concurrency_limit: int = FAKE_CONCURRENCY_LIMIT,
+    recordings_path: str = FAKE_RECORDINGS_PATH,
+    record_upstream_url: str = FAKE_RECORD_UPSTREAM_URL,
+    seed=FAKE_RANDOM_SEED,
+    batch_seconds: float = FAKE_BATCH_SECONDS,
+    batch_error_fraction: float = FAKE_BATCH_ERROR_FRACTION,
+) -> FastAPI:
+    """
+    Builds a local stand-in for the OpenAI chat-completions endpoint that enforces RPM/TPM
+    limits, returns 429s with Retry-After when they are exceeded, and sends the same
+    x-ratelimit-* headers as the real API. Replies are replayed from recordings by image hash
+    (a fixed empty extraction when the image was never recorded; an indexed array of them for
+    packed multi-image requests), with simulated latency and optional injected 429s, 503s,
+    malformed JSON, and hung requests. Usage reports cached prompt tokens for repeated prefixes.
+    Also serves the Batch API (/v1/files and /v1/batches), answering each chat-completions line
+    the same way after batch_seconds.
+
+    Parameter values:
+        - requests_per_minute<int> = request budget per period.
+        - tokens_per_minute<int> = token budget per period.
+        - period_seconds<float> = length of the budget period (shorten to speed up load tests).
+        - latency_seconds<float> = mean simulated processing time per successful request.
+        - latency_distribution<str> = 'fixed', 'uniform', or 'lognormal'.
+        - latency_spread<float> = half-width (uniform) or sigma (lognormal) of the latency.
+        - rate_limit_fraction<float> = fraction of requests answered with a 429 regardless of budget.
+        - retry_after_seconds<float> = Retry-After sent with injected 429s.
+        - malformed_fraction<float> = fraction of replies whose content is truncated, invalid JSON
+          (free-text replies only; replies constrained by a JSON schema always parse).
+        - timeout_fraction<float> = fraction of requests that hang for timeout_seconds before replying.
+        - timeout_seconds<float> = how long a hung request hangs.
+        - server_error_fraction<float> = fraction of requests answered with a 503; can be changed
+          while the server runs through `app.state.server_error_fraction` (to stage an outage).
+        - concurrency_limit<int> = requests arriving while this many are in flight get a 429
+          (0 for no limit), like an API that throttles by concurrency.
+        - recordings_path<str> = JSON file of recorded replies ('' for none).
+        - record_upstream_url<str> = real API base URL; when set, requests are proxied there and
+          successful replies are saved to recordings_path.
+        - seed<int or None> = random seed for latency and fault injection.
+        - batch_seconds<float> = time from batch submission to completion.
+        - batch_error_fraction<float> = fraction of batch requests reported as failed in the error file.
+
+    Return value<FastAPI>:
+        - FastAPI app; `app.state.stats` counts requests by outcome (and the most in flight at
+          once); uploaded files and batches are kept in `app.state.files` and `app.state.batches`.
+    """
+
+    fake_app = FastAPI()
+    request_bucket = rate_limiter.TokenBucket(requests_per_minute, period_seconds)
+    token_bucket = rate_limiter.TokenBucket(tokens_per_minute, period_seconds)
+    rng = random.Random(None if seed is None else int(seed))
+    sample_latency = make_latency_sampler(latency_distribution, latency_seconds, latency_spread, rng)
+    recordings = load_recordings(recordings_path)
+    fake_app.state.recordings = recordings
+    fake_app.state.stats = {
+        "accepted": 0,
+        "rate_limited": 0,
+        "injected_rate_limited": 0,
+        "malformed": 0,
+        "timed_out": 0,
+        "replayed": 0,
+        "unrecorded": 0,
+        "recorded": 0,
+        "batches": 0,
+        "batch_requests": 0,
+        "batch_errors": 0,
+        "in_flight": 0,
+        "max_in_flight": 0,
+        "server_errors": 0,
+        "concurrency_limited": 0,
+    }
+    fake_app.state.server_error_fraction = server_error_fraction
+    prompt_cache = {}  # prefix hash -> time last sent
+    fake_app.state.files = {}  # file id -> {"object": file object, "content": bytes}
+    fake_app.state.batches = {}  # batch id -> batch object
+    batch_tasks = set()  # Keeps background batch runs referenced until they finish
+
+    def rate_limit_headers() -> dict:
+        # Mirror OpenAI's header names; reset is the time until each bucket is full again
+        request_bucket.refill()
+        token_bucket.refill()
+        return {
+            rate_limiter.HEADER_LIMIT_REQUESTS: str(int(request_bucket.capacity)),
+            rate_limiter.HEADER_LIMIT_TOKENS: str(int(token_bucket.capacity)),
+            rate_limiter.HEADER_REMAINING_REQUESTS: str(max(int(request_bucket.available), 0)),
+            rate_limiter.HEADER_REMAINING_TOKENS: str(max(int(token_bucket.available), 0)),
+            rate_limiter.HEADER_RESET_REQUESTS: f"{request_bucket.seconds_until(request_bucket.capacity):.3f}s",
+            rate_limiter.HEADER_RESET_TOKENS: f"{token_bucket.seconds_until(token_bucket.capacity):.3f}s",
+        }
+
+    def rate_limited_response(retry_after: float) -> JSONResponse:
+        # 429 with the same headers and error body shape as the real API
+        headers = rate_limit_headers()
+        headers["retry-after"] = f"{retry_after:.3f}"
+        return JSONResponse(
+            status_code=429,
+            headers=headers,
+            content={
+                "error": {
+                    "message": "Rate limit reached",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }
+            },
+        )
+
+    def cached_prompt_tokens(body: dict) -> int:
+        # Longest prefix sent before (and still cached), rounded down to the caching increment
+        now = time.monotonic()
+        cached = 0
+        for tokens, prefix_hash in prompt_prefixes(body):
+            if now - prompt_cache.get(prefix_hash, -math.inf) <= FAKE_PROMPT_CACHE_SECONDS:
+                cached = tokens
+            prompt_cache[prefix_hash] = now
+        if cached < FAKE_PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        return cached // FAKE_PROMPT_CACHE_INCREMENT * FAKE_PROMPT_CACHE_INCREMENT
+
+    def build_reply(body: dict, prompt_tokens: int) -> tuple:
+        # Replay the recorded reply for each image, or the empty extraction if there is none
+        image_hashes, prompt_hash = request_replay_key(body)
+        schema_constrained = (body.get("response_format") or {}).get("type") == "json_schema"
+        replies = []
+        for image_hash in image_hashes or [""]:
+            recording = find_recording(recordings, image_hash, prompt_hash)
+            if recording:
+                fake_app.state.stats["replayed"] += 1
+                replies.append(recording)
+            else:
+                fake_app.state.stats["unrecorded"] += 1
+                replies.append({"content": json.dumps(FAKE_EXTRACTION), "usage": None})
+
+        # Packed requests (several images) get an indexed JSON array of per-label objects,
+        # wrapped in {"labels": [...]} when a JSON schema is requested (its root must be an object)
+        if len(replies) == 1:
+            content = replies[0]["content"]
+            usage = replies[0].get("usage")
+        else:
+            labels = [
+                {"label_index": number, **json.loads(reply["content"].replace("```json", "").replace("```", ""))}
+                for number, reply in enumerate(replies, start=1)
+            ]
+            content = json.dumps({"labels": labels} if schema_constrained else labels)
+            usage = None
+        cached_tokens = cached_prompt_tokens(body)
+        if not usage:
+            completion_tokens = FAKE_COMPLETION_TOKENS * len(replies)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)},
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+
+        # Truncated content, as when the model stops mid-object; structured outputs always
+        # follow their schema, so schema-constrained replies are never malformed
+        if rng.random() < malformed_fraction and not schema_constrained:
+            fake_app.state.stats["malformed"] += 1
+            content = content[: len(content) // 2]
+
+        return content, usage
+
+    async def record_from_upstream(request: Request, body: dict) -> JSONResponse:
+        # Forward the request to the real API with the caller's key and save a successful reply
+        async with httpx.AsyncClient(timeout=timeout_seconds) as client:
+            upstream = await client.post(
+                record_upstream_url.rstrip("/") + "/chat/completions",
+                json=body,
+                headers={"authorization": request.headers.get("authorization", "")},
+            )
+        reply = upstream.json()
+        # Only single-label replies are recorded; packed requests are replayed from them per image
+        image_hashes, prompt_hash = request_replay_key(body)
+        if upstream.status_code == 200 and len(image_hashes) == 1:
+            recordings.setdefault(image_hashes[0], {})[prompt_hash] = {
+                "content": reply["choices"][0]["message"]["content"],
+                "usage": reply.get("usage"),
+            }
+            fake_app.state.stats["recorded"] += 1
+            if recordings_path:
+                with open(recordings_path, "w", encoding="utf-8") as f:
+                    json.dump(recordings, f, indent=2)
+        # Pass the real rate-limit headers through so the backend's limiter stays accurate
+        headers = {
+            name: value
+            for name, value in upstream.headers.items()
+            if name.startswith("x-ratelimit-") or name == "retry-after"
+        }
+        return JSONResponse(status_code=upstream.status_code, headers=headers, content=reply)
+
+    @fake_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if record_upstream_url:
+            return await record_from_upstream(request, body)
+
+        prompt_tokens, charged_tokens = count_request_tokens(body)
+
+        # Reject with 429 when either budget is exhausted
+        retry_after = max(
+            request_bucket.seconds_until(1), token_bucket.seconds_until(charged_tokens)
+        )
+        if retry_after > 0:
+            fake_app.state.stats["rate_limited"] += 1
+            return rate_limited_response(retry_after)
+
+        # Injected 429, as seen when other clients share the organization's budget
+        if rng.random() < rate_limit_fraction:
+            fake_app.state.stats["injected_rate_limited"] += 1
+            return rate_limited_response(retry_after_seconds)
+
+        # 429 once too many requests are in flight
+        if concurrency_limit and fake_app.state.stats["in_flight"] >= concurrency_limit:
+            fake_app.state.stats["concurrency_limited"] += 1
+            return rate_limited_response(retry_after_seconds)
+
+        # Injected 503, as during an outage
+        if rng.random() < fake_app.state.server_error_fraction:
+            fake_app.state.stats["server_errors"] += 1
+            return JSONResponse(
+                status_code=503,
+                content={"error": {"message": "The server is overloaded.", "type": "server_error", "code": None}},
+            )
+
+        request_bucket.consume(1)
+        token_bucket.consume(charged_tokens)
+        fake_app.state.stats["accepted"] += 1
+
+        # Simulate model processing time; hung requests outlast the client's timeout
+        fake_app.state.stats["in_flight"] += 1
+        fake_app.state.stats["max_in_flight"] = max(fake_app.state.stats["max_in_flight"], fake_app.state.stats["in_flight"])
+        try:
+            if rng.random() < timeout_fraction:
+                fake_app.state.stats["timed_out"] += 1
+                await asyncio.sleep(timeout_seconds)
+            else:
+                await asyncio.sleep(sample_latency())
+        finally:
+            fake_app.state.stats["in_flight"] -= 1
+
+        # Recorded (or empty) extraction for each image, possibly truncated by fault injection
+        content, usage = build_reply(body, prompt_tokens)
+        return JSONResponse(
+            headers=rate_limit_headers(),
+            content=chat_completion_body(body, content, usage, f"chatcmpl-fake-{fake_app.state.stats['accepted']}"),
+        )
+
+    @fake_app.post("/v1/files")
+    async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+        # Keep uploaded batch input files in memory
+        content = await file.read()
+        file_object = make_file_object(content, file.filename or "upload.jsonl", purpose)
+        fake_app.state.files[file_object["id"]] = {"object": file_object, "content": content}
+        return file_object
+
+    @fake_app.get("/v1/files/{file_id}")
+    async def get_file(file_id: str):
+        if file_id not in fake_app.state.files:
+            raise HTTPException(status_code=404, detail="No such file")
+        return fake_app.state.files[file_id]["object"]
+
+    @fake_app.get("/v1/files/{file_id}/content")
+    async def get_file_content(file_id: str):
+        if file_id not in fake_app.state.files:
+            raise HTTPException(status_code=404, detail="No such file")
+        return Response(content=fake_app.state.files[file_id]["content"], media_type="application/octet-stream")
+
+    def make_file_object(content: bytes, filename: str, purpose: str) -> dict:
+        # File object in the same shape as the real API's
+        return {
+            "id": f"file-fake-{len(fake_app.state.files) + 1}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def store_output_file(lines: list, filename: str):
+        # Save batch output/error lines as a JSONL file and return its ID (None when empty)
+        if not lines:
+            return None
+        content = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        file_object = make_file_object(content, filename, "batch_output")
+        fake_app.state.files[file_object["id"]] = {"object": file_object, "content": content}
+        return file_object["id"]
+
+    async def run_batch(batch: dict) -> None:
+        # Answer every line of the input file after the simulated batch time
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        await asyncio.sleep(batch_seconds)
+
+        input_lines = fake_app.state.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        output_lines = []
+        error_lines = []
+        for line_number, line in enumerate(input_lines, start=1):
+            if not line.strip():
+                continue
+            request_line = json.loads(line)
+            line_id = f"batch_req_fake_{batch['id']}_{line_number}"
+            fake_app.state.stats["batch_requests"] += 1
+            if request_line.get("url") != batch["endpoint"] or rng.random() < batch_error_fraction:
+                fake_app.state.stats["batch_errors"] += 1
+                error_lines.append(
+                    {
+                        "id": line_id,
+                        "custom_id": request_line.get("custom_id"),
+                        "response": None,
+                        "error": {"code": "server_error", "message": "The request could not be completed"},
+                    }
+                )
+                continue
+            body = request_line["body"]
+            content, usage = build_reply(body, count_request_tokens(body)[0])
+            output_lines.append(
+                {
+                    "id": line_id,
+                    "custom_id": request_line.get("custom_id"),
+                    "response": {
+                        "status_code": 200,
+                        "request_id": line_id,
+                        "body": chat_completion_body(body, content, usage, f"chatcmpl-{line_id}"),
+                    },
+                    "error": None,
+                }
+            )
+
+        batch["output_file_id"] = store_output_file(output_lines, f"{batch['id']}_output.jsonl")
+        batch["error_file_id"] = store_output_file(error_lines, f"{batch['id']}_error.jsonl")
+        batch["request_counts"] = {
+            "total": len(output_lines) + len(error_lines),
+            "completed": len(output_lines),
+            "failed": len(error_lines),
+        }
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    @fake_app.post("/v1/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        if body.get("input_file_id") not in fake_app.state.files:
+            raise HTTPException(status_code=400, detail="No such input file")
+
+        fake_app.state.stats["batches"] += 1
+        batch_id = f"batch_fake_{fake_app.state.stats['batches']}"
+        now = int(time.time())
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get("endpoint"),
+            "errors": None,
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": now,
+            "in_progress_at": None,
+            "expires_at": now + 24 * 3600,
+            "completed_at": None,
+            "failed_at": None,
+            "expired_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": body.get("metadata"),
+        }
+        fake_app.state.batches[batch_id] = batch
+        task = asyncio.create_task(run_batch(batch))
+        batch_tasks.add(task)
+        task.add_done_callback(batch_tasks.discard)
+        return batch
+
+    @fake_app.get("/v1/batches/{batch_id}")
+    async def get_batch(batch_id: str):
+        if batch_id not in fake_app.state.batches:
+            raise HTTPException(status_code=404, detail="No such batch")
+        return fake_app.state.batches[batch_id]
+
+    return fake_app
+
+
+def run_in_background(fake_app: FastAPI, port: int, keepalive_seconds: float = FAKE_KEEPALIVE_SECONDS):
+    """
+    Starts a fake server on localhost in a daemon thread and waits until it accepts requests.
+
+    Parameter values:
+        - fake_app<FastAPI> = app returned by `create_app`.
+        - port<int> = local port to listen on.
+        - keepalive_seconds<float> = seconds the server keeps an idle connection open.
+
+    Return value<function>:
+        - Zero-argument function that stops the server and waits until the port is released.
+    """
+
+    server = uvicorn.Server(
+        uvicorn.Config(fake_app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=keepalive_seconds)
+    )
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        server_thread.join()
+
+    return stop
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    ### Main
+    # Runs the fake OpenAI server standalone; point the backend at it with
+    # OPENAI_BASE_URL=http://127.0.0.1:<port>/v1. Behaviour is configured with the
+    # FAKE_OPENAI_* environment variables above; to record replies from the real API, set
+    # FAKE_OPENAI_RECORD_UPSTREAM=https://api.openai.com/v1 and FAKE_OPENAI_RECORDINGS=<file>
+    # and keep the real OPENAI_API_KEY in the backend's environment
+
+    port = int(os.environ.get("FAKE_OPENAI_PORT", 8100))
+    uvicorn.run("fake_openai_server:app", host="127.0.0.1", port=port, reload=False, timeout_keep_alive=FAKE_KEEPALIVE_SECONDS)
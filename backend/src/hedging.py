@@ -0,0 +1,179 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from collections import deque
+import asyncio
+import math
+import os
+import threading
+import time
+import admission
+import deadlines
+import observability
+import rate_limiter
+import shared_state
+
+### Constants
+VISION_HEDGE_ENABLED = os.environ.get("VISION_HEDGE_ENABLED", "0") == "1"
+VISION_HEDGE_PERCENTILE = float(os.environ.get("VISION_HEDGE_PERCENTILE", 95))  # Hedge calls slower than this percentile
+VISION_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("VISION_HEDGE_MIN_DELAY_SECONDS", 2.0))  # Never hedge sooner
+VISION_HEDGE_MAX_FRACTION = float(os.environ.get("VISION_HEDGE_MAX_FRACTION", 0.05))  # Hedges per vision call, at most
+VISION_HEDGE_MIN_SAMPLES = 20  # Latencies needed before the percentile is trusted
+VISION_HEDGE_WINDOW = 500  # Recent call latencies the percentile is taken over
+
+vision_hedges_total = observability.register(
+    observability.Counter(
+        "vision_hedges_total",
+        "Hedged vision calls: sent, won by the hedge, won by the original, or skipped for lack of budget.",
+        ("outcome",),
+    )
+)
+
+
+class HedgePolicy:
+    """
+    Decides when a slow vision call gets a duplicate ("hedge"): after the call has run longer
+    than a percentile of recent call latencies, provided hedges stay under a fraction of all
+    calls and the admission queue, the shared vision call slots and the shared rate limiter all
+    have room right now.
+    """
+
+    def __init__(
+        self,
+        percentile: float = VISION_HEDGE_PERCENTILE,
+        min_delay_seconds: float = VISION_HEDGE_MIN_DELAY_SECONDS,
+        max_fraction: float = VISION_HEDGE_MAX_FRACTION,
+    ):
+        self.percentile = percentile
+        self.min_delay_seconds = min_delay_seconds
+        self.max_fraction = max_fraction
+        self.latencies = deque(maxlen=VISION_HEDGE_WINDOW)
+        self.calls = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def record_latency(self, seconds: float) -> None:
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def hedge_delay(self):
+        # Seconds to wait before hedging, or None until enough latencies have been seen
+        with self.lock:
+            if len(self.latencies) < VISION_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(self.percentile / 100 * len(ordered)))
+        return max(self.min_delay_seconds, ordered[rank - 1])
+
+    def allow_hedge(self) -> bool:
+        # Keep hedges under max_fraction of calls
+        with self.lock:
+            if self.hedges + 1 > self.max_fraction * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+
+hedge_policy = HedgePolicy()
+
+
+async def hedged_call(make_call, estimated_tokens: int, policy: HedgePolicy = None):
+    """
+    Awaits `make_call()`; if hedging is enabled and the call is slower than the policy's delay,
+    sends a duplicate and returns whichever succeeds first, cancelling the other. The duplicate
+    takes its own admission slot, shared vision call slot and rate limiter budget, only if all
+    three are free immediately; otherwise the hedge is skipped. Each call's own latency is recorded
+    so the percentile tracks the API's current behaviour.
+
+    Parameter values:
+        - make_call<function> = zero-argument function returning a new awaitable request.
+        - estimated_tokens<int> = token estimate reserved from the limiter for the duplicate.
+        - policy<HedgePolicy> = hedging policy (defaults to the shared one).
+
+    Return value<any>:
+        - Result of the first call to succeed.
+        - Raises the first call's exception if both fail.
+    """
+
+    policy = policy or hedge_policy
+
+    async def timed_call():
+        start = time.perf_counter()
+        result = await make_call()
+        policy.record_latency(time.perf_counter() - start)
+        return result
+
+    with policy.lock:
+        policy.calls += 1
+    if not VISION_HEDGE_ENABLED:
+        return await timed_call()
+
+    primary = asyncio.create_task(timed_call())
+    tasks = [primary]
+    try:
+        # Hedge only if the call is slow and a duplicate could still finish before the deadline
+        delay = policy.hedge_delay()
+        time_left = deadlines.remaining()
+        if delay is None or (time_left is not None and delay >= time_left):
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        slot_token = await try_reserve_hedge(policy, estimated_tokens)
+        if slot_token is False:
+            vision_hedges_total.inc(outcome="skipped")
+            return await primary
+
+        vision_hedges_total.inc(outcome="sent")
+        observability.log("INFO", "Vision call is slow, sending a hedged duplicate", after_seconds=round(delay, 2))
+        hedge = asyncio.create_task(timed_call())
+        tasks.append(hedge)
+
+        # The duplicate holds its admission and shared slots until it finishes or is cancelled
+        def release_hedge_slots(_):
+            shared_state.release_slot(slot_token)
+            admission.admission_queue.release()
+
+        hedge.add_done_callback(release_hedge_slots)
+
+        # First success wins; if one call fails, keep waiting for the other
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    vision_hedges_total.inc(outcome="hedge_won" if task is hedge else "original_won")
+                    return task.result()
+                first_error = first_error or task.exception()
+        raise first_error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def try_reserve_hedge(policy: HedgePolicy, estimated_tokens: int):
+    """
+    Takes what a hedged duplicate needs without waiting for any of it: a share of the policy's
+    hedge budget, an admission slot, a shared vision call slot and rate limiter budget. Anything
+    taken is given back if a later step has no room.
+
+    Parameter values:
+        - policy<HedgePolicy> = hedging policy.
+        - estimated_tokens<int> = token estimate reserved from the limiter for the duplicate.
+
+    Return value<str, None or bool>:
+        - Shared slot token to release when the duplicate finishes (None in single-process
+          mode), or False if the hedge has to be skipped.
+    """
+
+    if not policy.allow_hedge() or not admission.admission_queue.try_acquire():
+        return False
+    taken, slot_token = await shared_state.try_acquire_slot()
+    if taken and await rate_limiter.shared_limiter.try_acquire(estimated_tokens):
+        return slot_token
+    shared_state.release_slot(slot_token)
+    admission.admission_queue.release()
+    return False
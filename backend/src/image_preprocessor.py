@@ -0,0 +1,273 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+import asyncio
+import io
+import math
+import os
+import threading
+import observability
+
+### Constants
+PREPROCESS_ENABLED = os.environ.get("IMAGE_PREPROCESS_ENABLED", "1") == "1"
+PREPROCESS_WORKERS = int(os.environ.get("IMAGE_PREPROCESS_WORKERS", 4))
+PREPROCESS_OUTPUT_FORMAT = os.environ.get("IMAGE_PREPROCESS_FORMAT", "JPEG")  # JPEG or WEBP
+PREPROCESS_QUALITY = int(os.environ.get("IMAGE_PREPROCESS_QUALITY", 85))
+# Largest extra shrink allowed to drop a row/column of 512px tiles (0 keeps the model's own resolution).
+# Off until `benchmarks.py --live` shows the small government-warning print still reads correctly.
+PREPROCESS_TILE_SHRINK_TOLERANCE = float(os.environ.get("IMAGE_TILE_SHRINK_TOLERANCE", 0))
+
+# OpenAI "high" detail resizes to fit in 2048x2048, then so the short side is at most 768px.
+# Sending anything larger only costs upload bytes; the model never sees the extra pixels.
+VISION_MAX_LONG_SIDE = 2048
+VISION_MAX_SHORT_SIDE = 768
+VISION_TILE_SIZE = 512
+VISION_BASE_TOKENS = 85
+VISION_TOKENS_PER_TILE = 170
+
+IMAGE_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+
+preprocess_executor = ThreadPoolExecutor(
+    max_workers=PREPROCESS_WORKERS, thread_name_prefix="image-preprocess"
+)
+preprocess_stats_lock = threading.Lock()
+preprocess_stats = {"images": 0, "bytes_in": 0, "bytes_out": 0, "tokens_in": 0, "tokens_out": 0}
+
+
+def detect_image_format(image_bytes: bytes) -> str:
+    """
+    Detects the real image format from the file signature rather than trusting the upload.
+
+    Parameter values:
+        - image_bytes<bytes> = raw image bytes.
+
+    Return value<str>:
+        - 'PNG', 'JPEG', 'WEBP', 'GIF', or '' if the format is not recognized.
+    """
+
+    if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if image_bytes.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "WEBP"
+    if image_bytes[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    return ""
+
+
+def vision_target_size(width: int, height: int) -> tuple:
+    """
+    Computes the resolution OpenAI's high-detail mode actually uses for an image.
+
+    Parameter values:
+        - width<int> = original width in pixels.
+        - height<int> = original height in pixels.
+
+    Return value<tuple>:
+        - Tuple of (width, height) after fitting in VISION_MAX_LONG_SIDE and VISION_MAX_SHORT_SIDE.
+    """
+
+    scale = min(
+        1.0,
+        VISION_MAX_LONG_SIDE / max(width, height),
+        VISION_MAX_SHORT_SIDE / min(width, height),
+    )
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def tile_count(width: int, height: int) -> int:
+    # Number of 512px tiles the model splits an image of this size into
+    return math.ceil(width / VISION_TILE_SIZE) * math.ceil(height / VISION_TILE_SIZE)
+
+
+def tile_aligned_size(width: int, height: int, tolerance: float = PREPROCESS_TILE_SHRINK_TOLERANCE) -> tuple:
+    """
+    Computes the upload resolution: the model's effective resolution, shrunk a little further
+    when that lets one side land exactly on a 512px tile boundary and saves a row or column of tiles.
+
+    Parameter values:
+        - width<int> = original width in pixels.
+        - height<int> = original height in pixels.
+        - tolerance<float> = largest fraction the image may shrink beyond the model's resolution.
+
+    Return value<tuple>:
+        - Tuple of (width, height) to resize to.
+    """
+
+    target_width, target_height = vision_target_size(width, height)
+    best_size = (target_width, target_height)
+
+    # Try snapping each side down to its nearest tile boundary
+    for side in (target_width, target_height):
+        boundary = (side - 1) // VISION_TILE_SIZE * VISION_TILE_SIZE
+        if boundary <= 0:
+            continue
+        scale = boundary / side
+        if scale < 1 - tolerance:
+            continue
+        candidate = (max(1, math.floor(target_width * scale)), max(1, math.floor(target_height * scale)))
+        if tile_count(*candidate) < tile_count(*best_size):
+            best_size = candidate
+
+    return best_size
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """
+    Estimates the high-detail image token cost: a base cost plus a cost per 512px tile.
+
+    Parameter values:
+        - width<int> = image width in pixels as uploaded.
+        - height<int> = image height in pixels as uploaded.
+
+    Return value<int>:
+        - Estimated image tokens.
+    """
+
+    return VISION_BASE_TOKENS + VISION_TOKENS_PER_TILE * tile_count(*vision_target_size(width, height))
+
+
+def flatten_to_rgb(image: Image.Image) -> Image.Image:
+    # Flatten transparency onto white so labels keep their contrast in JPEG
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def preprocess_image(image_bytes: bytes) -> tuple:
+    """
+    Downscales an image to the vision model's effective resolution, strips metadata, and
+    re-encodes it compactly. Keeps the original bytes when re-encoding would not make them smaller.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image uploaded from frontend.
+
+    Return value<tuple>:
+        - Tuple of (image_bytes, mime_type, report) where report lists bytes and estimated tokens
+          before and after preprocessing.
+    """
+
+    source_format = detect_image_format(image_bytes)
+    source_mime = IMAGE_MIME_TYPES.get(source_format, "image/jpeg")
+
+    # Decode the image; anything Pillow cannot read is sent untouched
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()  # Image.open only reads the header; decode now so corrupt pixel data is caught here
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        observability.log("WARNING", "preprocess_image(): Could not decode image, sending original", error=e)
+        report = {"format": source_format, "bytes_in": len(image_bytes), "bytes_out": len(image_bytes)}
+        return image_bytes, source_mime, report
+
+    original_size = image.size
+    image = flatten_to_rgb(image)
+
+    # Downscale to the resolution the model uses anyway (snapped to tile boundaries within the tolerance)
+    target_size = tile_aligned_size(*original_size)
+    if target_size != original_size:
+        image = image.resize(target_size, Image.LANCZOS)
+
+    # Re-encode without metadata
+    output = io.BytesIO()
+    image.save(output, format=PREPROCESS_OUTPUT_FORMAT, quality=PREPROCESS_QUALITY, optimize=True)
+    processed_bytes = output.getvalue()
+
+    tokens_in = estimate_image_tokens(*original_size)
+    tokens_out = estimate_image_tokens(*target_size)
+
+    # Keep the original when re-encoding saves neither bytes nor tokens
+    if len(processed_bytes) >= len(image_bytes) and tokens_out >= tokens_in and source_format:
+        processed_bytes, mime_type, target_size, tokens_out = image_bytes, source_mime, original_size, tokens_in
+    else:
+        mime_type = IMAGE_MIME_TYPES[PREPROCESS_OUTPUT_FORMAT.upper()]
+
+    report = {
+        "format": source_format,
+        "original_size": list(original_size),
+        "processed_size": list(target_size),
+        "bytes_in": len(image_bytes),
+        "bytes_out": len(processed_bytes),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+    }
+    return processed_bytes, mime_type, report
+
+
+def record_preprocess_report(report: dict) -> None:
+    # Accumulate per-image savings into the process-wide totals
+    with preprocess_stats_lock:
+        preprocess_stats["images"] += 1
+        for key in ("bytes_in", "bytes_out", "tokens_in", "tokens_out"):
+            preprocess_stats[key] += report.get(key, 0)
+
+
+async def prepare_image_for_vision(image_bytes: bytes) -> tuple:
+    """
+    Runs `preprocess_image` in the preprocessing thread pool so decoding and resizing don't
+    block the event loop, and logs the bytes and estimated tokens saved.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image uploaded from frontend.
+
+    Return value<tuple>:
+        - Tuple of (image_bytes, mime_type) ready to be base64-encoded for the Vision API.
+    """
+
+    # Preprocessing disabled; still send the correct MIME type
+    if not PREPROCESS_ENABLED:
+        source_format = detect_image_format(image_bytes)
+        return image_bytes, IMAGE_MIME_TYPES.get(source_format, "image/jpeg")
+
+    loop = asyncio.get_running_loop()
+    processed_bytes, mime_type, report = await loop.run_in_executor(
+        preprocess_executor, preprocess_image, image_bytes
+    )
+    record_preprocess_report(report)
+
+    observability.log(
+        "INFO",
+        "Image preprocessed",
+        format=report.get("format") or "unknown",
+        bytes_in=report["bytes_in"],
+        bytes_out=report["bytes_out"],
+        tokens_saved=report.get("tokens_in", 0) - report.get("tokens_out", 0),
+    )
+    return processed_bytes, mime_type
+
+
+def reset_preprocess_stats() -> None:
+    # Zero the process-wide totals (used between benchmark runs)
+    with preprocess_stats_lock:
+        for key in preprocess_stats:
+            preprocess_stats[key] = 0
+
+
+def get_preprocess_stats() -> dict:
+    """
+    Returns cumulative preprocessing totals for this process.
+
+    Return value<dict>:
+        - Image count, bytes and estimated tokens before and after, and the totals saved.
+    """
+
+    with preprocess_stats_lock:
+        return {
+            **preprocess_stats,
+            "bytes_saved": preprocess_stats["bytes_in"] - preprocess_stats["bytes_out"],
+            "tokens_saved": preprocess_stats["tokens_in"] - preprocess_stats["tokens_out"],
+        }
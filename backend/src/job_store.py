@@ -0,0 +1,163 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from abc import ABC, abstractmethod
+import asyncio
+import os
+import time
+import uuid
+
+### Constants
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETE = "complete"
+JOB_STATUS_FAILED = "failed"
+JOB_FINISHED_STATUSES = (JOB_STATUS_COMPLETE, JOB_STATUS_FAILED)
+JOB_STATUS_EXPIRED = "expired"  # Reported to event streams whose job was removed after the retention window
+
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 24 * 3600))
+JOB_POLL_INTERVAL_SECONDS = 0.5  # Used by stores that cannot push updates
+
+
+class JobStore(ABC):
+    """
+    Interface for batch job storage. A job holds its status, the per-label results in input
+    order, and the order in which labels finished so results can be streamed as they arrive.
+    Subclass this to keep jobs somewhere other than process memory.
+    """
+
+    @abstractmethod
+    async def create_job(self, total: int) -> str:
+        ...
+
+    @abstractmethod
+    async def get_job(self, job_id: str):
+        ...
+
+    @abstractmethod
+    async def set_status(self, job_id: str, status: str, error: str = None) -> None:
+        ...
+
+    @abstractmethod
+    async def record_result(self, job_id: str, index: int, result: dict) -> None:
+        ...
+
+    async def wait_for_update(self, job_id: str, seen_count: int, timeout: float) -> None:
+        """
+        Waits until the job has more than `seen_count` finished labels, finishes, is removed, or
+        `timeout` passes. The default implementation polls; stores that can push updates should
+        override it. Never raises for an unknown or expired job.
+
+        Parameter values:
+            - job_id<str> = job identifier.
+            - seen_count<int> = number of finished labels the caller has already seen.
+            - timeout<float> = maximum seconds to wait.
+
+        Return value<None>
+        """
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = await self.get_job(job_id)
+            if job is None or len(job["completed_order"]) > seen_count or job["status"] in JOB_FINISHED_STATUSES:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Default job store keeping jobs in process memory. Jobs are lost on restart and are removed
+    JOB_RETENTION_SECONDS after they were created.
+    """
+
+    def __init__(self, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self.jobs = {}
+        self.update_events = {}
+
+    async def create_job(self, total: int) -> str:
+        self.expire_old_jobs()
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = {
+            "jobId": job_id,
+            "status": JOB_STATUS_QUEUED,
+            "total": total,
+            "completed": 0,
+            "createdAt": time.time(),
+            "error": None,
+            "results": [None] * total,
+            "completed_order": [],
+        }
+        self.update_events[job_id] = asyncio.Event()
+        return job_id
+
+    async def get_job(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def set_status(self, job_id: str, status: str, error: str = None) -> None:
+        job = self.jobs[job_id]
+        job["status"] = status
+        job["error"] = error
+        self.notify(job_id)
+
+    async def record_result(self, job_id: str, index: int, result: dict) -> None:
+        job = self.jobs[job_id]
+        job["results"][index] = result
+        job["completed_order"].append(index)
+        job["completed"] = len(job["completed_order"])
+        self.notify(job_id)
+
+    async def wait_for_update(self, job_id: str, seen_count: int, timeout: float) -> None:
+        job = self.jobs.get(job_id)
+        update_event = self.update_events.get(job_id)
+        if job is None or update_event is None:
+            return
+        if len(job["completed_order"]) > seen_count or job["status"] in JOB_FINISHED_STATUSES:
+            return
+        try:
+            await asyncio.wait_for(update_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def notify(self, job_id: str) -> None:
+        # Wake every waiter, then arm a fresh event for the next update
+        self.update_events[job_id].set()
+        self.update_events[job_id] = asyncio.Event()
+
+    def expire_old_jobs(self) -> None:
+        # Drop finished jobs past the retention window
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job["createdAt"] < cutoff and job["status"] in JOB_FINISHED_STATUSES
+        ]:
+            del self.jobs[job_id]
+            self.update_events.pop(job_id).set()  # Wake any stream still waiting on the job
+
+
+def public_job_view(job: dict) -> dict:
+    """
+    Builds the client-facing view of a job: progress plus the results finished so far, in input
+    order, with None for labels that are still pending.
+
+    Parameter values:
+        - job<dict> = job record from a JobStore.
+
+    Return value<dict>:
+        - Dictionary safe to return from the API.
+    """
+
+    return {
+        "jobId": job["jobId"],
+        "status": job["status"],
+        "total": job["total"],
+        "completed": job["completed"],
+        "error": job["error"],
+        "results": job["results"],
+    }
+
+
+# Job store used by the API; replace with another JobStore implementation to share jobs between processes
+job_store = InMemoryJobStore()
@@ -6,14 +6,29 @@ import asyncio
 import os
 import base64
 import json
-import re
-from openai import AsyncOpenAI, RateLimitError
+from openai import APIConnectionError, InternalServerError, RateLimitError
 from rapidfuzz import fuzz
 from dotenv import load_dotenv
+import time
 import traceback
+import adaptive_concurrency
+import admission
+import circuit_breaker
+import deadlines
+import hedging
+import local_ocr
+import measurements
+import observability
+import openai_pool
+import rate_limiter
+import result_cache
+import shared_state
+import text_regions
+import warning_matcher
 
 load_dotenv()
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Created on first use by get_openai_client; the API's lifespan sets one sized to the batch concurrency
+openai_client = None
 
 ### Constants
 BRAND_NAME_STR = "brand_name"
@@ -32,10 +47,38 @@ GOV_WARN_MATCH_STR = "government_warning_matches"
 
 DEFAULT_PROMPT_BOOL_STR = "True/False"
 
+VISION_MODEL = "gpt-4o-mini"
+VISION_MAX_TOKENS = 300  # Per label; packed requests allow this much per label they carry
+PACKED_LABEL_INDEX_STR = "label_index"
+
+# Running totals of what has been sent to the Vision API; read by benchmarks and reports
+vision_usage_stats = {
+    "requests": 0,
+    "image_bytes": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+    "completion_tokens": 0,
+    "total_tokens": 0,
+    "parse_failures": 0,
+}
+
+# Replies are constrained to a strict JSON schema (structured outputs), so they always parse;
+# 0 falls back to free-text JSON replies
+VISION_STRUCTURED_OUTPUTS = os.environ.get("VISION_STRUCTURED_OUTPUTS", "1") == "1"
+PACKED_LABELS_STR = "labels"  # Key of the array of per-label objects in a packed reply
+
+# "compare" asks the model to judge matches against the application (one call per application);
+# "extract_only" asks only for what is printed on the label, cached per image hash, and compares locally
+EXTRACTION_MODE_COMPARE = "compare"
+EXTRACTION_MODE_EXTRACT_ONLY = "extract_only"
+EXTRACTION_MODE = os.environ.get("LABEL_EXTRACTION_MODE", EXTRACTION_MODE_COMPARE)
+
 COMPARE_BRAND_NAME_MISMATCH_RATIO = 0.85
 COMPARE_BRAND_NAME_MORE_SIMILAR_RATIO = 0.90
 COMPARE_BRAND_NAME_LESS_SIMILAR_RATIO = 0.75
 COMPARE_ALC_CONTENT_DIFF_RATIO = 0.5
+COMPARE_ALC_CONTENT_MATCH_TOLERANCE = 0.05  # ABV points still treated as equal (label rounding)
+COMPARE_NET_CONTENTS_TOLERANCE_RATIO = 0.005  # Relative volume difference treated as equal (25.4 fl oz = 750 mL)
 CLOSE_BUT_DIFFERENT_SCORE = 80
 
 OVERALL_PASS_SCORE = 100
@@ -50,6 +93,9 @@ GOV_WARNING_STR_MAIN_BODY = (
 
 GOV_WARNING_STR = "GOVERNMENT WARNING: " + GOV_WARNING_STR_MAIN_BODY
 
+# Normalized and split into clauses once; reused by every warning check
+government_warning_matcher = warning_matcher.WarningMatcher(GOV_WARNING_STR)
+
 DEFAULT_EXTRACTED_FIELDS = {
     BRAND_NAME_STR: "",
     BRAND_NAME_MATCH_STR: False,
@@ -65,43 +111,26 @@ DEFAULT_EXTRACTED_FIELDS = {
     GOV_WARN_MATCH_STR: False,
 }
 
+DEFAULT_RAW_EXTRACTED_FIELDS = {
+    BRAND_NAME_STR: "",
+    CLASS_TYPE_STR: "",
+    ALC_CONTENT_STR: "",
+    NET_CONTENT_STR: "",
+    GOV_WARN_PRESENT_MATCH_STR: False,
+    GOV_WARN_CAPS_MATCH_STR: False,
+    GOV_WARN_TEXT_STR: "",
+}
 
-async def extract_fields_with_vision(image_bytes: bytes, expected_values: dict) -> dict:
-    """
-    Extracts key alcohol label fields from an image using the OpenAI Vision API and compares them
-    to expected values. Returns a JSON-like dictionary with extracted field values and boolean
-    flags indicating matches. Handles missing fields, formatting variations, and propagates rate limit errors.
-
-    Parameter values:
-        - image_bytes<byte> = label image from front end.
-        - expected_values<dict> = values from user-uploaded application to match against extracted values.
-
-    Return value<dict>:
-        - A dictionary in proper format with necessary fields to display on front end.
-        - Returns empty dictionaries if json.JSONDecodeError or other exceptions occur.
-    """
-
-    # Initializing result var
-    result_text = "If you see this, a major error has occurred with result_text var"
-
-    # Initialize expected value vars
-    expected_brand_name = expected_values[BRAND_NAME_STR]
-    expected_class_type = expected_values[CLASS_TYPE_STR]
-    expected_alcohol_content = expected_values[ALC_CONTENT_STR]
-    expected_net_content = expected_values[NET_CONTENT_STR]
-
-    # Convert image from bytes to encoded values for input into OpenAI Vision API
-    base64_image = base64.b64encode(image_bytes).decode("utf-8")
-
-    # OpenAI Vision API Prompt
-    prompt = f"""You are a U.S. TTB alcohol label compliance expert.
+# Static instructions, sent as the system message ahead of the images and the per-request expected
+# values, so every request of a mode starts with the same prefix the API can cache
+EXTRACTION_INSTRUCTIONS = f"""You are a U.S. TTB alcohol label compliance expert.
 
-        Extract the following information from this alcohol beverage label and determine if extracted values match the expected values:
+        Extract the following information from the alcohol beverage label image and determine if extracted values match the expected values given after the image:
 
-        Brand Name → expected: {expected_brand_name}. NOTE: Additional nouns like "Brewery" may not necessarily be part of the brand name.
-        Class/Type → expected: {expected_class_type}. NOTE: Additional descriptor words may not necessarily be part of the class/type, but the expected value must be a word in the image.
-        Alcohol Content → expected: {expected_alcohol_content}. Make sure to search for this numerical value in image.
-        Net Contents → expected: {expected_net_content}. NOTE: Field could vary in wording/formatting and still be correct (i.e "1 Pint, 0.9 FL. OZ." = "1 0.9 Pint Fl oz")
+        Brand Name. NOTE: Additional nouns like "Brewery" may not necessarily be part of the brand name.
+        Class/Type. NOTE: Additional descriptor words may not necessarily be part of the class/type, but the expected value must be a word in the image.
+        Alcohol Content. Make sure to search for the expected numerical value in the image.
+        Net Contents. NOTE: Field could vary in wording/formatting and still be correct (i.e "1 Pint, 0.9 FL. OZ." = "1 0.9 Pint Fl oz")
 
         Government Warning must:
         - MUST contain "GOVERNMENT WARNING:" exact and in ALL CAPS
@@ -129,65 +158,508 @@ async def extract_fields_with_vision(image_bytes: bytes, expected_values: dict)
         If a field is not visible, use empty string.
     """
 
-    # Send prompt and iamge to OpenAI Vision API for processing
-    try:
-        response = await openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            max_tokens=300,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                                "detail": "high",
-                            },
+PACKED_EXTRACTION_INSTRUCTIONS = f"""You are a U.S. TTB alcohol label compliance expert.
+
+        You are given several alcohol beverage labels, each image preceded by "Label N:", followed by each label's expected values.
+        For each label, extract the following information and determine if extracted values match that label's expected values:
+
+        Brand Name. NOTE: Additional nouns like "Brewery" may not necessarily be part of the brand name.
+        Class/Type. NOTE: Additional descriptor words may not necessarily be part of the class/type, but the expected value must be a word in the image.
+        Alcohol Content. Make sure to search for the expected numerical value in the image.
+        Net Contents. NOTE: Field could vary in wording/formatting and still be correct (i.e "1 Pint, 0.9 FL. OZ." = "1 0.9 Pint Fl oz")
+
+        Government Warning must:
+        - MUST contain "GOVERNMENT WARNING:" exact and in ALL CAPS
+        - MUST contain exact text: {GOV_WARNING_STR_MAIN_BODY}
+
+        Ignore capitalization differences EXCEPT for "GOVERNMENT WARNING:" which must be exact.
+
+        Respond with ONLY valid JSON holding one object per label, in label order:
+
+        {{
+            "{PACKED_LABELS_STR}": [
+                {{
+                    "{PACKED_LABEL_INDEX_STR}": 1,
+                    "{BRAND_NAME_STR}": "",
+                    "{BRAND_NAME_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+                    "{CLASS_TYPE_STR}": "",
+                    "{CLASS_TYPE_NAME_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+                    "{ALC_CONTENT_STR}": "",
+                    "{ALC_CONTENT_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+                    "{NET_CONTENT_STR}": "",
+                    "{NET_CONTENT_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+                    "{GOV_WARN_PRESENT_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+                    "{GOV_WARN_CAPS_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+                    "{GOV_WARN_TEXT_STR}": "",
+                    "{GOV_WARN_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR}
+                }}
+            ]
+        }}
+
+        If a field is not visible, use empty string.
+    """
+
+RAW_EXTRACTION_INSTRUCTIONS = f"""You are a U.S. TTB alcohol label compliance expert.
+
+        Extract the following information from the alcohol beverage label image exactly as it is printed:
+
+        Brand Name. NOTE: Additional nouns like "Brewery" may not necessarily be part of the brand name.
+        Class/Type. NOTE: The designation of the product, e.g. "Straight Rye Whisky" or "India Pale Ale".
+        Alcohol Content. NOTE: Include the number and its unit or format (e.g. "45% Alc./Vol.", "90 Proof").
+        Net Contents. NOTE: Include the number and its unit (e.g. "750 mL", "1 Pint, 0.9 FL. OZ.").
+
+        Government Warning:
+        - Whether a government warning statement is present
+        - Whether the heading "GOVERNMENT WARNING:" is printed in ALL CAPS
+        - The full warning text exactly as printed, including the heading
+
+        Do not correct spelling, casing or punctuation. Respond with ONLY valid JSON:
+
+        {{
+            "{BRAND_NAME_STR}": "",
+            "{CLASS_TYPE_STR}": "",
+            "{ALC_CONTENT_STR}": "",
+            "{NET_CONTENT_STR}": "",
+            "{GOV_WARN_PRESENT_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+            "{GOV_WARN_CAPS_MATCH_STR}": {DEFAULT_PROMPT_BOOL_STR},
+            "{GOV_WARN_TEXT_STR}": ""
+        }}
+
+        If a field is not visible, use empty string.
+    """
+
+
+def get_openai_client():
+    # The shared OpenAI client, created on first use so importing this module opens no connection pool
+    global openai_client
+    if openai_client is None:
+        openai_client = openai_pool.create_openai_client()
+    return openai_client
+
+
+def make_response_format(name: str, fields: dict, packed: bool = False) -> dict:
+    """
+    Builds a strict JSON-schema response format (structured outputs) for a reply holding the
+    given fields: strings for string defaults, booleans for boolean ones, all required.
+
+    Parameter values:
+        - name<str> = schema name sent to the API.
+        - fields<dict> = field names and default values, e.g. DEFAULT_EXTRACTED_FIELDS.
+        - packed<bool> = wrap the object in a "labels" array with a label_index per entry.
+
+    Return value<dict>:
+        - Value for the request's `response_format`.
+    """
+
+    properties = {key: {"type": "boolean" if isinstance(value, bool) else "string"} for key, value in fields.items()}
+    if packed:
+        properties = {PACKED_LABEL_INDEX_STR: {"type": "integer"}, **properties}
+    schema = {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+    # Structured outputs need an object at the root, so packed labels are wrapped in one
+    if packed:
+        schema = {
+            "type": "object",
+            "properties": {PACKED_LABELS_STR: {"type": "array", "items": schema}},
+            "required": [PACKED_LABELS_STR],
+            "additionalProperties": False,
+        }
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+EXTRACTION_RESPONSE_FORMAT = make_response_format("label_extraction", DEFAULT_EXTRACTED_FIELDS)
+PACKED_EXTRACTION_RESPONSE_FORMAT = make_response_format("packed_label_extraction", DEFAULT_EXTRACTED_FIELDS, packed=True)
+RAW_EXTRACTION_RESPONSE_FORMAT = make_response_format("raw_label_extraction", DEFAULT_RAW_EXTRACTED_FIELDS)
+
+
+async def build_vision_request(image_bytes, instructions: str, prompt: str, response_format: dict) -> tuple:
+    """
+    Builds the chat-completions request body for one or more label images. Shared by live
+    requests and the Batch API bulk mode (`bulk_verifier`), so both send the same thing. The
+    static instructions come first (as the system message) and the per-request text last, after
+    the images, so requests share the longest possible cacheable prefix. With several images,
+    each is preceded by a "Label N" marker so the prompt can refer to them by number. A label
+    cropped to its print (`text_regions`) is sent as a low-detail overview and a high-detail close-up.
+
+    Parameter values:
+        - image_bytes<bytes or list> = label image, or a list of images for one request.
+        - instructions<str> = static instructions describing the JSON to return.
+        - prompt<str> = per-request text, e.g. the expected values ('' for none).
+        - response_format<dict> = JSON schema the reply must follow (sent when VISION_STRUCTURED_OUTPUTS is on).
+
+    Return value<tuple>:
+        - Tuple of (body<dict>, upload_size<int>) where upload_size is the total image bytes sent.
+    """
+
+    images = image_bytes if isinstance(image_bytes, list) else [image_bytes]
+
+    # Downscale/re-encode (or crop to the print) off the event loop, then convert to encoded values for the OpenAI Vision API
+    with observability.time_stage("preprocess"):
+        prepared_labels = await asyncio.gather(*(text_regions.prepare_label_images(image) for image in images))
+    content = []
+    with observability.time_stage("base64_encode"):
+        for label_number, label_parts in enumerate(prepared_labels, start=1):
+            if len(images) > 1:
+                content.append({"type": "text", "text": f"Label {label_number}:"})
+            for upload_bytes, mime_type, detail in label_parts:
+                if detail == "high" and len(label_parts) > 1:
+                    content.append({"type": "text", "text": text_regions.CLOSE_UP_TEXT})
+                base64_image = base64.b64encode(upload_bytes).decode("utf-8")
+                content.append(
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{mime_type};base64,{base64_image}",
+                            "detail": detail,
                         },
-                        {"type": "text", "text": prompt},
-                    ],
-                }
-            ],
+                    }
+                )
+    if prompt:
+        content.append({"type": "text", "text": prompt})
+
+    body = {
+        "model": VISION_MODEL,
+        "max_tokens": VISION_MAX_TOKENS * len(images),
+        "messages": [{"role": "system", "content": instructions}, {"role": "user", "content": content}],
+    }
+    if VISION_STRUCTURED_OUTPUTS:
+        body["response_format"] = response_format
+    return body, sum(len(part[0]) for label_parts in prepared_labels for part in label_parts)
+
+
+def parse_vision_reply(result_text: str):
+    # Parse a reply (raises json.JSONDecodeError); a refusal has no content, and free-text replies
+    # (VISION_STRUCTURED_OUTPUTS off, or recorded before it) may be wrapped in markdown code fences
+    if not result_text:
+        raise json.JSONDecodeError("Empty or refused reply", "", 0)
+    result_text = result_text.replace("```json", "").replace("```", "").strip()
+    return json.loads(result_text)
+
+
+async def request_vision_json(image_bytes, instructions: str, prompt: str, response_format: dict, default_fields):
+    """
+    Sends one or more label images and a prompt to the OpenAI Vision API through the admission
+    queue and the shared rate limiter and parses the JSON reply. Shared by every extraction mode.
+
+    Parameter values:
+        - image_bytes<bytes or list> = label image from front end, or a list of images for one request.
+        - instructions<str> = static instructions describing the JSON to return.
+        - prompt<str> = per-request text, e.g. the expected values.
+        - response_format<dict> = JSON schema the reply must follow.
+        - default_fields<dict or None> = value returned when the reply cannot be parsed.
+
+    Return value<dict or list>:
+        - Parsed JSON reply, or default_fields if the reply is not valid JSON.
+        - Raises RateLimitError and the API's timeout, 5xx and connection errors so callers can
+          handle retry logic, deadlines.DeadlineExceeded when the request's deadline passes,
+          circuit_breaker.CircuitOpenError during an outage, and any other error of the call.
+    """
+
+    # Fail fast during an outage instead of queueing for a call that would fail anyway
+    circuit_breaker.vision_breaker.check()
+
+    # Build the request first so image preprocessing does not hold an admission slot
+    image_count = len(image_bytes) if isinstance(image_bytes, list) else 1
+    body, upload_size = await build_vision_request(image_bytes, instructions, prompt, response_format)
+
+    # Wait for admission: interactive checks go ahead of batch work, and batches take turns
+    await deadlines.wait_within_deadline(admission.admission_queue.acquire(), "admission_wait")
+    try:
+        circuit_breaker.vision_breaker.reject_if_open()
+        return await send_vision_request(body, upload_size, instructions + prompt, image_count, default_fields)
+    finally:
+        admission.admission_queue.release()
+
+
+async def send_vision_request(body: dict, upload_size: int, prompt: str, image_count: int, default_fields):
+    """
+    Sends a request built by `build_vision_request` once it holds a shared vision call slot (with
+    several workers) and the shared rate limiter allows it, and parses the JSON reply.
+
+    Parameter values:
+        - body<dict> = chat-completions request body.
+        - upload_size<int> = bytes of image data in the body, for usage stats.
+        - prompt<str> = text in the body (instructions and per-request text), for the token estimate.
+        - image_count<int> = images in the body.
+        - default_fields<dict or None> = value returned when the reply cannot be parsed.
+
+    Return value<dict or list>:
+        - Same as `request_vision_json`.
+    """
+
+    # Initializing result var
+    result_text = "If you see this, a major error has occurred with result_text var"
+
+    # With several API workers, first wait for one of the vision call slots they share, so budget
+    # reserved below is spent straight away instead of ageing while the slot is awaited
+    with observability.time_stage("shared_slot_wait"):
+        slot_token = await deadlines.wait_within_deadline(shared_state.acquire_slot(), "shared_slot_wait")
+
+    # Wait for room in the shared RPM/TPM budget before sending anything
+    estimated_tokens = rate_limiter.estimate_request_tokens(prompt, body["max_tokens"], image_count)
+    # (never past the request's deadline; the slot is given back if the wait ends early)
+    try:
+        with observability.time_stage("rate_limit_wait"):
+            await deadlines.wait_within_deadline(
+                rate_limiter.shared_limiter.acquire(estimated_tokens), "rate_limit_wait"
+            )
+    except BaseException:
+        shared_state.release_slot(slot_token)
+        raise
+
+    # Send prompt and image to OpenAI Vision API for processing; a slow call may be hedged
+    # with a duplicate (see hedging.py), and the call is abandoned when the deadline passes
+    client = get_openai_client()
+    try:
+        request_started = time.perf_counter()
+        raw_response = await deadlines.wait_within_deadline(
+            hedging.hedged_call(
+                lambda: client.chat.completions.with_raw_response.create(
+                    **body, timeout=openai_pool.request_timeout(client, image_count)
+                ),
+                estimated_tokens,
+            ),
+            "openai_request",
         )
 
+        # Keep the shared limiter in sync with the server's view of our budget
+        observability.stage_seconds.observe(time.perf_counter() - request_started, stage="openai_request")
+        record_vision_outcome(request_started)
+        rate_limiter.shared_limiter.update_from_headers(raw_response.headers)
+        response = raw_response.parse()
+        vision_usage_stats["requests"] += 1
+        vision_usage_stats["image_bytes"] += upload_size
+        if response.usage:
+            rate_limiter.shared_limiter.settle(
+                estimated_tokens, response.usage.total_tokens
+            )
+            # Prompt tokens served from the API's prompt cache (a repeated prefix)
+            prompt_details = getattr(response.usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(prompt_details, "cached_tokens", 0) or 0
+            vision_usage_stats["prompt_tokens"] += response.usage.prompt_tokens
+            vision_usage_stats["cached_tokens"] += cached_tokens
+            vision_usage_stats["completion_tokens"] += response.usage.completion_tokens
+            vision_usage_stats["total_tokens"] += response.usage.total_tokens
+            observability.vision_tokens_total.inc(response.usage.prompt_tokens, kind="prompt")
+            observability.vision_tokens_total.inc(cached_tokens, kind="cached")
+            observability.vision_tokens_total.inc(response.usage.completion_tokens, kind="completion")
+
         # Process response into standard json format
-        result_text = response.choices[0].message.content
-        result_text = result_text.replace("```json", "").replace("```", "").strip()
-        extracted = json.loads(result_text)
+        with observability.time_stage("json_parse"):
+            result_text = response.choices[0].message.content
+            extracted = parse_vision_reply(result_text)
+        observability.vision_requests_total.inc(outcome="ok")
         return extracted
 
     # Raises error to bubble up to previous function call to handle retry logic if rate limit is reached
-    except RateLimitError:
+    # Pauses the shared limiter first so every other caller also backs off
+    except RateLimitError as e:
+        observability.vision_requests_total.inc(outcome="rate_limited")
+        rate_limiter.shared_limiter.update_from_headers(e.response.headers)
+        record_vision_outcome(request_started, e)
         raise
 
     # Raises JSON decoding error if result is not in the correct format
     except json.JSONDecodeError as e:
-        print(f"[ERROR] Vision API JSON parse error: {e}\nRaw response: {result_text}")
-        return DEFAULT_EXTRACTED_FIELDS
+        observability.vision_requests_total.inc(outcome="json_error")
+        vision_usage_stats["parse_failures"] += 1
+        observability.log("ERROR", "Vision API JSON parse error", error=e, raw_response=json.dumps(result_text))
+        return default_fields
+
+    # Raises deadline errors so the caller stops instead of retrying
+    except deadlines.DeadlineExceeded:
+        observability.vision_requests_total.inc(outcome="deadline_exceeded")
+        raise
+
+    # Raises timeouts, 5xx and connection errors so the caller can retry them and the circuit
+    # breaker sees the outage; they say nothing about the label, so they never become a verdict
+    except (APIConnectionError, InternalServerError) as e:
+        observability.vision_requests_total.inc(outcome="unavailable")
+        observability.log("WARNING", "Vision API unavailable", error=repr(e))
+        record_vision_outcome(request_started, e)
+        raise
 
     # Raises other errors that are not expected errors
     except Exception as e:
-        print(f"[ERROR] Vision API error: {e}")
+        observability.vision_requests_total.inc(outcome="error")
+        observability.log("ERROR", "Vision API error", error=repr(e))
         traceback.print_exc()
-        return DEFAULT_EXTRACTED_FIELDS
+        record_vision_outcome(request_started, e)
+        raise
 
+    finally:
+        shared_state.release_slot(slot_token)
 
-def compare_brand_name(extracted: str, matches: bool, expected: str) -> tuple:
+
+def record_vision_outcome(request_started: float, error: Exception = None) -> None:
+    # Feed a sent vision call's outcome to the circuit breaker and the adaptive concurrency limit;
+    # errors that say nothing about the API's health (e.g. a rejected image) are left out
+    failure = None if error is None else circuit_breaker.failure_kind(error)
+    if error is not None and failure is None:
+        return
+    circuit_breaker.vision_breaker.record(failure)
+    adaptive_concurrency.concurrency_controller.record(request_started, time.perf_counter() - request_started, failure)
+
+
+def build_extraction_prompt(expected_values: dict) -> str:
     """
-    Compares an extracted brand name against the expected value and returns a status and message.
-    Returns 'pass', 'fail', or 'warning' based on exact match or similarity thresholds, handling
-    missing values and minor differences.
+    Builds the per-request part of the prompt that asks the model to extract the label fields
+    and judge them against one application's expected values; it follows the image, after the
+    static EXTRACTION_INSTRUCTIONS. Used by `extract_fields_with_vision` and by the Batch API
+    bulk mode.
+
+    Parameter values:
+        - expected_values<dict> = values from user-uploaded application to match against extracted values.
+
+    Return value<str>:
+        - Prompt text.
+    """
+
+    # Expected values, the only part of the prompt that changes between applications
+    prompt = f"""Expected values:
+
+        Brand Name → expected: {expected_values[BRAND_NAME_STR]}
+        Class/Type → expected: {expected_values[CLASS_TYPE_STR]}
+        Alcohol Content → expected: {expected_values[ALC_CONTENT_STR]}
+        Net Contents → expected: {expected_values[NET_CONTENT_STR]}
+    """
+    return prompt
+
+
+async def extract_fields_with_vision(image_bytes: bytes, expected_values: dict) -> dict:
+    """
+    Extracts key alcohol label fields from an image using the OpenAI Vision API and compares them
+    to expected values. Returns a JSON-like dictionary with extracted field values and boolean
+    flags indicating matches. Handles missing fields, formatting variations, and propagates rate limit errors.
+
+    Parameter values:
+        - image_bytes<byte> = label image from front end.
+        - expected_values<dict> = values from user-uploaded application to match against extracted values.
+
+    Return value<dict>:
+        - A dictionary in proper format with necessary fields to display on front end.
+        - Returns empty dictionaries if the reply is not valid JSON; API errors are raised.
+    """
+
+    # Send prompt and image to OpenAI Vision API for processing
+    prompt = build_extraction_prompt(expected_values)
+    return await request_vision_json(
+        image_bytes, EXTRACTION_INSTRUCTIONS, prompt, EXTRACTION_RESPONSE_FORMAT, DEFAULT_EXTRACTED_FIELDS
+    )
+
+
+async def extract_fields_with_vision_packed(image_bytes_list: list, expected_values_list: list):
+    """
+    Extracts and matches the fields of several labels in a single Vision API request. The
+    instructions and government warning text are sent once for the whole group instead of once
+    per label, which raises throughput under a requests-per-minute cap.
+
+    Parameter values:
+        - image_bytes_list<list> = label images, in order.
+        - expected_values_list<list> = application data for each image, in the same order.
+
+    Return value<list or None>:
+        - List of extraction dictionaries in input order (same shape as `extract_fields_with_vision`),
+          or None if the reply was missing, malformed, or did not cover every label exactly once.
+        - Raises RateLimitError and other API errors so callers can handle retry logic.
+    """
+
+    # Per-label expected values, numbered to match the "Label N" markers before each image
+    expected_lines = "\n".join(
+        f"""        Label {number}: Brand Name → {expected[BRAND_NAME_STR]}; Class/Type → {expected[CLASS_TYPE_STR]}; """
+        f"""Alcohol Content → {expected[ALC_CONTENT_STR]}; Net Contents → {expected[NET_CONTENT_STR]}"""
+        for number, expected in enumerate(expected_values_list, start=1)
+    )
+    prompt = f"""Expected values for the {len(image_bytes_list)} labels above:
+{expected_lines}
+    """
+
+    # Send prompt and images to OpenAI Vision API for processing
+    reply = await request_vision_json(
+        image_bytes_list, PACKED_EXTRACTION_INSTRUCTIONS, prompt, PACKED_EXTRACTION_RESPONSE_FORMAT, None
+    )
+    return split_packed_reply(reply, len(image_bytes_list))
+
+
+def split_packed_reply(reply, label_count: int):
+    """
+    Splits a packed reply into per-label extractions, checking that every label is present
+    exactly once with every expected field.
+
+    Parameter values:
+        - reply<list or dict or None> = parsed JSON reply (a bare array, or an object wrapping one).
+        - label_count<int> = number of labels sent in the request.
+
+    Return value<list or None>:
+        - List of extraction dictionaries ordered by label, or None if the reply is unusable.
+    """
+
+    # Accept the {"labels": [...]} wrapper (structured outputs) as well as a bare array
+    if isinstance(reply, dict):
+        reply = next((value for value in reply.values() if isinstance(value, list)), None)
+    if not isinstance(reply, list) or len(reply) != label_count:
+        return None
+
+    extractions = [None] * label_count
+    for position, entry in enumerate(reply):
+        if not isinstance(entry, dict) or not set(DEFAULT_EXTRACTED_FIELDS) <= set(entry):
+            return None
+        try:
+            index = int(entry.get(PACKED_LABEL_INDEX_STR, position + 1)) - 1
+        except (TypeError, ValueError):
+            return None
+        if not 0 <= index < label_count or extractions[index] is not None:
+            return None
+        extractions[index] = {key: entry[key] for key in DEFAULT_EXTRACTED_FIELDS}
+
+    return extractions
+
+
+async def extract_raw_fields_with_vision(image_bytes: bytes) -> dict:
+    """
+    Extracts key alcohol label fields exactly as printed on the label using the OpenAI Vision API,
+    without reference to any application. The result is cached per image hash, so the same image
+    can be compared against any number of application variants for a single API call.
+
+    Parameter values:
+        - image_bytes<byte> = label image from front end.
+
+    Return value<dict>:
+        - A dictionary of extracted field values (no *_matches flags).
+        - Returns DEFAULT_RAW_EXTRACTED_FIELDS if the reply is not valid JSON; API errors are raised.
+    """
+
+    # Reuse a previous extraction of the same image
+    image_hash = result_cache.hash_image(image_bytes)
+    cached_extraction = await result_cache.extraction_cache.get_async(image_hash)
+    if cached_extraction is not None:
+        return cached_extraction
+
+    # Send the image to OpenAI Vision API for processing (the instructions need nothing per request)
+    extracted = await request_vision_json(
+        image_bytes, RAW_EXTRACTION_INSTRUCTIONS, "", RAW_EXTRACTION_RESPONSE_FORMAT, DEFAULT_RAW_EXTRACTED_FIELDS
+    )
+
+    # Cache successful extractions only
+    if extracted is not DEFAULT_RAW_EXTRACTED_FIELDS:
+        result_cache.extraction_cache.set(image_hash, extracted)
+
+    return extracted
+
+
+def screen_brand_name(extracted: str, matches: bool, expected: str):
+    """
+    Runs the brand name checks that need no similarity score: missing values, the model's match
+    flag, an exact match after normalization, and a length difference too large to be a match.
 
     Parameter values:
         - extracted<str> = brand name extracted from label.
         - matches<bool> = precomputed match flag from automated extraction.
         - expected<str> = expected brand name provided by user or application.
 
-    Return value<tuple>:
-        - Tuple containing a status string ('pass', 'fail', 'warning') and an optional message
-          explaining mismatches or differences.
-        - Returns 'fail' with a message if extracted value is missing, or 'pass' if expected value is empty.
+    Return value<tuple or None>:
+        - (status, message) tuple when these checks decide the result, or None when the
+          similarity score is needed (see `grade_brand_name`).
     """
 
     # If extracted empty, no brand name was extracted
@@ -218,8 +690,19 @@ def compare_brand_name(extracted: str, matches: bool, expected: str) -> tuple:
             f'Brand name mismatch: found "{extracted}", expected "{expected}"',
         )
 
-    # Compute fuzzy similarity between normalized strings
-    similarity = fuzz.ratio(ext_norm, exp_norm)
+    return None
+
+
+def grade_brand_name(similarity: float) -> tuple:
+    """
+    Turns the similarity of two brand names that passed `screen_brand_name` into a status.
+
+    Parameter values:
+        - similarity<float> = fuzz.ratio of the normalized extracted and expected names.
+
+    Return value<tuple>:
+        - Tuple containing a status string ('fail', 'warning') and a message.
+    """
 
     # Similar enough to pass with minor differences
     if similarity >= COMPARE_BRAND_NAME_MORE_SIMILAR_RATIO:
@@ -236,16 +719,16 @@ def compare_brand_name(extracted: str, matches: bool, expected: str) -> tuple:
     return ("fail", "Brand name mismatch")
 
 
-def compare_class_type(extracted: str, matches: bool, expected: str) -> tuple:
+def compare_brand_name(extracted: str, matches: bool, expected: str) -> tuple:
     """
-    Compares an extracted class/type against the expected value and returns a status and message.
-    Returns 'pass', 'fail', or 'warning' based on exact, partial, or similarity-based matches,
-    handling missing values and minor differences.
+    Compares an extracted brand name against the expected value and returns a status and message.
+    Returns 'pass', 'fail', or 'warning' based on exact match or similarity thresholds, handling
+    missing values and minor differences.
 
     Parameter values:
-        - extracted<str> = class/type extracted from label.
+        - extracted<str> = brand name extracted from label.
         - matches<bool> = precomputed match flag from automated extraction.
-        - expected<str> = expected class/type provided by user or application.
+        - expected<str> = expected brand name provided by user or application.
 
     Return value<tuple>:
         - Tuple containing a status string ('pass', 'fail', 'warning') and an optional message
@@ -253,6 +736,29 @@ def compare_class_type(extracted: str, matches: bool, expected: str) -> tuple:
         - Returns 'fail' with a message if extracted value is missing, or 'pass' if expected value is empty.
     """
 
+    screened = screen_brand_name(extracted, matches, expected)
+    if screened is not None:
+        return screened
+
+    # Compute fuzzy similarity between normalized strings
+    return grade_brand_name(fuzz.ratio(extracted.lower().strip(), expected.lower().strip()))
+
+
+def screen_class_type(extracted: str, matches: bool, expected: str):
+    """
+    Runs the class/type checks that need no similarity score: missing values, the model's match
+    flag, an exact match after normalization, and one value containing the other.
+
+    Parameter values:
+        - extracted<str> = class/type extracted from label.
+        - matches<bool> = precomputed match flag from automated extraction.
+        - expected<str> = expected class/type provided by user or application.
+
+    Return value<tuple or None>:
+        - (status, message) tuple when these checks decide the result, or None when the
+          similarity score is needed (see `grade_class_type`).
+    """
+
     # If extracted empty, no class/type was extracted
     if not extracted:
         return ("fail", "Class/type not found on label")
@@ -277,27 +783,63 @@ def compare_class_type(extracted: str, matches: bool, expected: str) -> tuple:
     if ext_norm in exp_norm or exp_norm in ext_norm:
         return ("warning", "Partial match — verify full class/type on label")
 
-    # Compute fuzzy similarity and partial similarity
-    similarity = fuzz.ratio(ext_norm, exp_norm)
-    partial = fuzz.partial_ratio(ext_norm, exp_norm)
-    best = max(similarity, partial)
+    return None
+
+
+def grade_class_type(similarity: float) -> tuple:
+    """
+    Turns the similarity of two class/type values that passed `screen_class_type` into a status.
+
+    Parameter values:
+        - similarity<float> = best of fuzz.ratio and fuzz.partial_ratio of the normalized values.
+
+    Return value<tuple>:
+        - Tuple containing a status string ('fail', 'warning') and a message.
+    """
 
     # Close match but minor differences detected
-    if best >= CLOSE_BUT_DIFFERENT_SCORE:
+    if similarity >= CLOSE_BUT_DIFFERENT_SCORE:
         return (
             "warning",
-            f"Close match but difference detected (similarity: {round(best, 1)}%)",
+            f"Close match but difference detected (similarity: {round(similarity, 1)}%)",
         )
 
     # Default fail case for class/type mismatch
     return ("fail", "Class/type mismatch")
 
 
+def compare_class_type(extracted: str, matches: bool, expected: str) -> tuple:
+    """
+    Compares an extracted class/type against the expected value and returns a status and message.
+    Returns 'pass', 'fail', or 'warning' based on exact, partial, or similarity-based matches,
+    handling missing values and minor differences.
+
+    Parameter values:
+        - extracted<str> = class/type extracted from label.
+        - matches<bool> = precomputed match flag from automated extraction.
+        - expected<str> = expected class/type provided by user or application.
+
+    Return value<tuple>:
+        - Tuple containing a status string ('pass', 'fail', 'warning') and an optional message
+          explaining mismatches or differences.
+        - Returns 'fail' with a message if extracted value is missing, or 'pass' if expected value is empty.
+    """
+
+    screened = screen_class_type(extracted, matches, expected)
+    if screened is not None:
+        return screened
+
+    # Best of full and partial fuzzy similarity
+    ext_norm = extracted.lower().strip()
+    exp_norm = expected.lower().strip()
+    return grade_class_type(max(fuzz.ratio(ext_norm, exp_norm), fuzz.partial_ratio(ext_norm, exp_norm)))
+
+
 def compare_alcohol_content(extracted: str, matches: bool, expected: str) -> tuple:
     """
     Compares an extracted alcohol content against the expected value and returns a status and message.
     Returns 'pass', 'fail', or 'warning' based on exact, numeric, or format-based matches, handling
-    missing values and minor differences.
+    missing values and minor differences. Proof is converted to alcohol by volume (half the proof).
 
     Parameter values:
         - extracted<str> = alcohol content extracted from label.
@@ -322,31 +864,27 @@ def compare_alcohol_content(extracted: str, matches: bool, expected: str) -> tup
     if matches:
         return ("pass", None)
 
-    # Extract numeric values from extracted and expected strings
-    ext_nums = re.findall(r"\d+\.?\d*", extracted)
-    exp_nums = re.findall(r"\d+\.?\d*", expected)
+    # Parse both values to alcohol by volume, converting proof (cached per distinct string)
+    ext_parsed = measurements.parse_measurement(extracted)
+    exp_parsed = measurements.parse_measurement(expected)
 
-    # Fail if numeric values cannot be parsed
-    if not ext_nums or not exp_nums:
+    # Fail if alcohol content cannot be parsed
+    if ext_parsed["abv"] is None or exp_parsed["abv"] is None:
         return ("fail", "Could not parse alcohol content")
 
-    # Convert first numeric value to float for comparison
-    ext_num = float(ext_nums[0])
-    exp_num = float(exp_nums[0])
+    # Difference in percentage points of alcohol by volume
+    abv_difference = abs(ext_parsed["abv"] - exp_parsed["abv"])
 
-    # Exact numeric match
-    if ext_num == exp_num:
+    # Same alcohol content
+    if abv_difference <= COMPARE_ALC_CONTENT_MATCH_TOLERANCE:
         # Check for difference in format (e.g., percentage vs proof)
-        ext_has_proof = "proof" in extracted.lower()
-        exp_has_proof = "proof" in expected.lower()
-
-        if ext_has_proof != exp_has_proof:
+        if ext_parsed["abv_format"] != exp_parsed["abv_format"]:
             return ("warning", "Percentage matches but format differs")
 
         return ("pass", None)
 
     # Minor numeric difference within allowed ratio
-    if abs(ext_num - exp_num) <= COMPARE_ALC_CONTENT_DIFF_RATIO:
+    if abv_difference <= COMPARE_ALC_CONTENT_DIFF_RATIO:
         return ("warning", "Minor difference detected")
 
     # Default fail case for alcohol content mismatch
@@ -357,7 +895,8 @@ def compare_net_contents(extracted: str, matches: bool, expected: str) -> tuple:
     """
     Compares extracted net contents against the expected value and returns a status and message.
     Returns 'pass' or 'fail' based on numeric and unit matches, handling missing values and
-    minor differences.
+    minor differences. Volumes are converted to millilitres, so equivalent values in other units
+    (e.g. "75 cL", "25.4 FL OZ" for "750 mL") pass.
 
     Parameter values:
         - extracted<str> = net contents extracted from label.
@@ -382,30 +921,118 @@ def compare_net_contents(extracted: str, matches: bool, expected: str) -> tuple:
     if matches:
         return ("pass", None)
 
-    # Extract numeric values from extracted and expected strings
-    ext_nums = re.findall(r"\d+\.?\d*", extracted)
-    exp_nums = re.findall(r"\d+\.?\d*", expected)
+    # Parse both values, converting volumes to millilitres (cached per distinct string)
+    ext_parsed = measurements.parse_measurement(extracted)
+    exp_parsed = measurements.parse_measurement(expected)
 
     # Fail if numeric values cannot be parsed
-    if not ext_nums or not exp_nums:
+    if ext_parsed["first_number"] is None or exp_parsed["first_number"] is None:
         return ("fail", "Could not parse net contents")
 
-    # Fail if numeric volumes do not match
-    if ext_nums[0] != exp_nums[0]:
+    # Both have units: compare volumes, so "75 cL" or "25.4 FL OZ" match "750 mL"
+    if ext_parsed["volume_ml"] is not None and exp_parsed["volume_ml"] is not None:
+        if measurements.volumes_match(
+            ext_parsed["volume_ml"], exp_parsed["volume_ml"], COMPARE_NET_CONTENTS_TOLERANCE_RATIO
+        ):
+            return ("pass", None)
         return ("fail", "Volume mismatch")
 
-    # Extract units by removing numbers, dots, and whitespace
-    ext_unit = re.sub(r"[\d\.\s]", "", extracted).strip().lower()
-    exp_unit = re.sub(r"[\d\.\s]", "", expected).strip().lower()
+    # Fail if numeric volumes do not match
+    if float(ext_parsed["first_number"]) != float(exp_parsed["first_number"]):
+        return ("fail", "Volume mismatch")
 
-    # Fail if units do not match
-    if ext_unit != exp_unit:
+    # Fail if only one side gives a unit
+    if ext_parsed["volume_unit"] != exp_parsed["volume_unit"]:
         return ("fail", "Unit mismatch")
 
     # Pass if both numeric values and units match
     return ("pass", None)
 
 
+def grade_government_warning(warning_text: str, similarity: float) -> tuple:
+    """
+    Turns the similarity of an extracted warning to the required statement into a status, and for
+    anything short of an exact match, names the clauses and words that differ.
+
+    Parameter values:
+        - warning_text<str> = text of the government warning extracted from the label.
+        - similarity<float> = `government_warning_matcher.similarity(warning_text)`.
+
+    Return value<tuple>:
+        - Tuple containing a status string ('pass', 'fail', 'warning') and an optional message.
+    """
+
+    # Exact match case
+    if similarity == OVERALL_PASS_SCORE:
+        return ("pass", None)
+
+    # Where the text differs, clause by clause (cached per distinct text)
+    differences = warning_matcher.describe_differences(
+        government_warning_matcher.diagnose(warning_text)["differences"]
+    )
+    detail = f". Differences: {differences}" if differences else ""
+
+    # Very close match with minor OCR artifacts
+    if similarity >= OVERALL_SIMILAR_SCORE:
+        return (
+            "warning",
+            f"Warning statement is very close but not exact (similarity: {round(similarity, 1)}%). May be an OCR artifact{detail}",
+        )
+
+    # Notable differences detected; requires manual review
+    if similarity >= CLOSE_BUT_DIFFERENT_SCORE:
+        return (
+            "warning",
+            f"Warning statement has notable differences (similarity: {round(similarity, 1)}%). Manual review required{detail}",
+        )
+
+    # Default fail case for warning text mismatch
+    return (
+        "fail",
+        f"Warning statement does not match required text (similarity: {round(similarity, 1)}%){detail}",
+    )
+
+
+def screen_government_warning(
+    warning_present: bool,
+    warning_all_caps: bool,
+    warning_text: str,
+    warning_matches: list,
+):
+    """
+    Runs the government warning checks that need no similarity score: presence, capitalization,
+    an exact match of the statement, and a missing text.
+
+    Parameter values:
+        - warning_present<bool> = True if a government warning is detected on the label.
+        - warning_all_caps<bool> = True if "GOVERNMENT WARNING:" is in all capitals.
+        - warning_text<str> = text of the government warning extracted from the label.
+        - warning_matches<list> = list indicating if warning text matches expected segments.
+
+    Return value<tuple or None>:
+        - (status, message) tuple when these checks decide the result, or None when the
+          similarity score is needed (see `grade_government_warning`).
+    """
+
+    # Fail if government warning is not present
+    if not warning_present:
+        return ("fail", "Government warning statement not found on label")
+
+    # Fail if "GOVERNMENT WARNING:" is not in all capital letters
+    if not warning_all_caps:
+        return ("fail", '"GOVERNMENT WARNING:" must be in all capitals')
+
+    # Overrule algorithm-based classification if all conditions indicate a perfect match
+    if warning_text == GOV_WARNING_STR_MAIN_BODY and warning_matches:
+        return ("pass", None)
+
+    # Pass if no text to compare (fallback)
+    if not warning_text:
+        return ("pass", None)
+
+    return None
+
+
 def check_government_warning(
     warning_present: bool,
     warning_all_caps: bool,
@@ -429,62 +1056,112 @@ def check_government_warning(
         - Returns 'fail' if warning is missing, incorrectly capitalized, or text does not match expected.
     """
 
-    # Fail if government warning is not present
-    if not warning_present:
-        return ("fail", "Government warning statement not found on label")
+    screened = screen_government_warning(warning_present, warning_all_caps, warning_text, warning_matches)
+    if screened is not None:
+        return screened
 
-    # Fail if "GOVERNMENT WARNING:" is not in all capital letters
-    if not warning_all_caps:
-        return ("fail", '"GOVERNMENT WARNING:" must be in all capitals')
+    # Fuzzy match the actual warning text
+    return grade_government_warning(warning_text, government_warning_matcher.similarity(warning_text))
 
-    # Overrule algorithm-based classification if all conditions indicate a perfect match
-    if (
-        warning_all_caps
-        and warning_text == GOV_WARNING_STR_MAIN_BODY
-        and warning_matches
-    ):
-        return ("pass", None)
 
-    # Fuzzy match the actual warning text if text is present
-    if warning_text:
-        expected = GOV_WARNING_STR.upper()
-        extracted = warning_text.upper()
+def get_vision_usage_stats() -> dict:
+    """
+    Returns the number of successful Vision API calls and the image bytes and tokens they used.
 
-        # Compute similarity between extracted and expected text
-        similarity = fuzz.ratio(extracted, expected)
+    Return value<dict>:
+        - Copy of the running totals.
+    """
 
-        # Exact match case
-        if similarity == OVERALL_PASS_SCORE:
-            return ("pass", None)
+    return dict(vision_usage_stats)
 
-        # Very close match with minor OCR artifacts
-        if similarity >= OVERALL_SIMILAR_SCORE:
-            return (
-                "warning",
-                f"Warning statement is very close but not exact (similarity: {round(similarity, 1)}%). May be an OCR artifact",
-            )
 
-        # Notable differences detected; requires manual review
-        if similarity >= CLOSE_BUT_DIFFERENT_SCORE:
-            return (
-                "warning",
-                f"Warning statement has notable differences (similarity: {round(similarity, 1)}%). Manual review required",
-            )
+def reset_vision_usage_stats() -> None:
+    # Zero the running totals (used between benchmark runs)
+    for key in vision_usage_stats:
+        vision_usage_stats[key] = 0
 
-        # Default fail case for warning text mismatch
-        return (
-            "fail",
-            f"Warning statement does not match required text (similarity: {round(similarity, 1)}%)",
-        )
 
-    # Pass if no text to compare (fallback)
-    return ("pass", None)
+async def verify_label_locally(image_bytes: bytes, application_data: dict):
+    """
+    Verifies a label with local OCR only. The result is accepted only when Tesseract is
+    confident and every field passes; anything else returns None so the caller falls back to
+    the Vision API, which keeps warnings and rejections on the more accurate path.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image uploaded from frontend.
+        - application_data<dict> = expected field values provided by user/application form.
+
+    Return value<dict or None>:
+        - Verification results dictionary, or None if the label needs the Vision API.
+    """
+
+    # Run Tesseract in the OCR process pool; None means OCR is disabled or unavailable
+    start_time = time.perf_counter()
+    ocr_output = await local_ocr.ocr_label(image_bytes)
+    if ocr_output is None:
+        return None
+    ocr_text, ocr_confidence, ocr_lines = ocr_output
+    ocr_seconds = time.perf_counter() - start_time
+
+    # Low-confidence OCR is not trusted for any field
+    if ocr_confidence < local_ocr.LOCAL_OCR_MIN_CONFIDENCE:
+        local_ocr.record_ocr_outcome("low_confidence", ocr_seconds)
+        return None
+
+    # Read the fields without the application, then compare with the same comparators used for vision extractions
+    extracted = local_ocr.extract_fields_from_ocr_text(ocr_text, ocr_lines, GOV_WARNING_STR)
+    result = compare_extracted_fields(extracted, application_data)
+    if any(field["status"] != "pass" for field in result["fields"]):
+        local_ocr.record_ocr_outcome("fell_back", ocr_seconds)
+        return None
+
+    local_ocr.record_ocr_outcome("resolved_locally", ocr_seconds)
+    observability.log(
+        "INFO",
+        "Label resolved by local OCR",
+        ocr_ms=round(ocr_seconds * 1000),
+        confidence=round(ocr_confidence, 1),
+    )
+    return result
+
+
+async def resolve_without_vision(image_bytes: bytes, application_data: dict) -> tuple:
+    """
+    Looks for a result that needs no Vision API call: a cached result for the same image and
+    expected values, then the local OCR tier (whose results are cached too).
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image uploaded from frontend.
+        - application_data<dict> = expected field values provided by user/application form.
+
+    Return value<tuple>:
+        - Tuple of (cache_key, result, source) where result is None if the label needs the
+          Vision API, and source is 'cache' or 'local_ocr'.
+    """
+
+    # Return a previously computed result for the same image and expected values
+    with observability.time_stage("cache_lookup"):
+        cache_key = result_cache.make_cache_key(image_bytes, application_data)
+        cached_result = await result_cache.verification_cache.get_async(cache_key)
+    if cached_result is not None:
+        return cache_key, cached_result, "cache"
+
+    # Try the local OCR tier first; easy labels never reach the Vision API
+    with observability.time_stage("local_ocr"):
+        local_result = await verify_label_locally(image_bytes, application_data)
+    if local_result is not None:
+        result_cache.verification_cache.set(cache_key, local_result)
+        return cache_key, local_result, "local_ocr"
+
+    return cache_key, None, None
 
 
 async def verify_label(image_bytes, application_data, running_from_main=False) -> dict:
     """
     Main label verification function using base comparison algorithms and the OpenAI Vision API.
     Compares extracted label fields against expected application data and returns detailed results.
+    Results are cached by image hash and normalized expected values, so resubmissions skip the API.
+    Labels that local OCR can fully verify are resolved without calling the API at all.
 
     Parameter values:
         - image_bytes<bytes> = raw label image uploaded from frontend.
@@ -496,19 +1173,201 @@ async def verify_label(image_bytes, application_data, running_from_main=False) -
           and per-field verification results including status and notes.
     """
 
+    start_time = time.perf_counter()
+
+    # Cached and locally verifiable labels never reach the Vision API
+    if running_from_main:
+        cache_key, result, source = asyncio.run(resolve_without_vision(image_bytes, application_data))
+    else:
+        cache_key, result, source = await resolve_without_vision(image_bytes, application_data)
+    if result is not None:
+        record_verification(source, result, start_time)
+        return result
+
     # Extract fields from image using Vision API
     # Use asyncio.run if called from main, otherwise await the async function
     if running_from_main:
-        extracted = asyncio.run(
-            extract_fields_with_vision(image_bytes, application_data)
-        )
+        return asyncio.run(verify_with_vision(image_bytes, application_data, cache_key, start_time))
+    return await verify_with_vision(image_bytes, application_data, cache_key, start_time)
+
+
+async def verify_with_vision(image_bytes: bytes, application_data: dict, cache_key: str, start_time: float) -> dict:
+    """
+    Verifies a label with a single Vision API extraction (the path `verify_label` takes after
+    the cache and local OCR), then compares and caches the result.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image uploaded from frontend.
+        - application_data<dict> = expected field values provided by user/application form.
+        - cache_key<str> = verification cache key from `resolve_without_vision`.
+        - start_time<float> = time.perf_counter() when verification of this label began.
+
+    Return value<dict>:
+        - Verification results dictionary.
+    """
+
+    if EXTRACTION_MODE == EXTRACTION_MODE_EXTRACT_ONLY:
+        extraction = extract_raw_fields_with_vision(image_bytes)
+        default_fields = DEFAULT_RAW_EXTRACTED_FIELDS
     else:
-        extracted = await extract_fields_with_vision(image_bytes, application_data)
+        extraction = extract_fields_with_vision(image_bytes, application_data)
+        default_fields = DEFAULT_EXTRACTED_FIELDS
+
+    with observability.time_stage("vision_extraction"):
+        extracted = await extraction
+
+    # Compare extracted fields against the application
+    with observability.time_stage("comparison"):
+        result = compare_extracted_fields(extracted, application_data)
+
+    # Cache the result unless the extraction failed and fell back to the defaults
+    if extracted is not default_fields:
+        result_cache.verification_cache.set(cache_key, result)
+
+    record_verification("vision", result, start_time)
+    return result
+
+
+async def verify_labels_packed(image_bytes_list: list, application_data_list: list) -> list:
+    """
+    Verifies a group of labels with one packed Vision API request. Labels answered by the cache
+    or local OCR are left out of the request. If the packed reply cannot be split into one
+    valid extraction per label, each remaining label is verified on its own with `verify_with_vision`.
+    Packing only applies in "compare" extraction mode; in "extract_only" mode each label goes
+    through `verify_with_vision`, whose per-image extraction cache already avoids repeat calls.
+
+    Parameter values:
+        - image_bytes_list<list> = raw label images.
+        - application_data_list<list> = expected field values for each image, in the same order.
+
+    Return value<tuple>:
+        - Tuple of (results, packed_ok) where results are verification dictionaries in input
+          order and packed_ok is False if the packed request had to fall back to single calls.
+        - Raises RateLimitError so callers can handle retry logic.
+    """
+
+    start_time = time.perf_counter()
+    results = [None] * len(image_bytes_list)
+
+    # Resolve what we can without the API
+    pending = []
+    for i, (image_bytes, application_data) in enumerate(zip(image_bytes_list, application_data_list)):
+        cache_key, result, source = await resolve_without_vision(image_bytes, application_data)
+        if result is not None:
+            record_verification(source, result, start_time)
+            results[i] = result
+        else:
+            pending.append((i, cache_key))
+
+    # A single remaining label (or extract-only mode) gains nothing from packing
+    if len(pending) <= 1 or EXTRACTION_MODE == EXTRACTION_MODE_EXTRACT_ONLY:
+        for i, cache_key in pending:
+            results[i] = await verify_with_vision(image_bytes_list[i], application_data_list[i], cache_key, start_time)
+        return results, True
+
+    # One request for every remaining label
+    with observability.time_stage("vision_extraction"):
+        extractions = await extract_fields_with_vision_packed(
+            [image_bytes_list[i] for i, _ in pending],
+            [application_data_list[i] for i, _ in pending],
+        )
+
+    # Fall back to one request per label when the packed reply is unusable
+    if extractions is None:
+        observability.vision_requests_total.inc(outcome="packed_fallback")
+        observability.log("WARNING", "Packed reply could not be split, verifying labels individually", labels=len(pending))
+        for i, cache_key in pending:
+            results[i] = await verify_with_vision(image_bytes_list[i], application_data_list[i], cache_key, start_time)
+        return results, False
+
+    # Compare and cache each label's extraction
+    for (i, cache_key), extracted in zip(pending, extractions):
+        with observability.time_stage("comparison"):
+            result = compare_extracted_fields(extracted, application_data_list[i])
+        result_cache.verification_cache.set(cache_key, result)
+        record_verification("vision", result, start_time)
+        results[i] = result
+
+    return results, True
+
+
+async def verify_near_duplicates(image_bytes_list: list, application_data_list: list) -> list:
+    """
+    Verifies copies of the same label artwork (e.g. one design exported at several resolutions,
+    grouped by `near_duplicates`) with a single raw Vision API extraction of the largest copy,
+    compared against each copy's own application. Copies answered by the cache or local OCR are
+    left out; a single remaining copy is verified normally.
+
+    Parameter values:
+        - image_bytes_list<list> = raw label images of one near-duplicate group.
+        - application_data_list<list> = expected field values for each image, in the same order.
+
+    Return value<list>:
+        - Verification results dictionaries in input order.
+        - Raises RateLimitError so callers can handle retry logic.
+    """
+
+    start_time = time.perf_counter()
+    results = [None] * len(image_bytes_list)
+
+    # Resolve what we can without the API
+    pending = []
+    for i, (image_bytes, application_data) in enumerate(zip(image_bytes_list, application_data_list)):
+        cache_key, result, source = await resolve_without_vision(image_bytes, application_data)
+        if result is not None:
+            record_verification(source, result, start_time)
+            results[i] = result
+        else:
+            pending.append((i, cache_key))
+
+    # A single remaining copy gains nothing from sharing an extraction
+    if len(pending) <= 1:
+        for i, cache_key in pending:
+            results[i] = await verify_with_vision(image_bytes_list[i], application_data_list[i], cache_key, start_time)
+        return results
+
+    # One application-independent extraction from the largest (most detailed) copy
+    representative = max(pending, key=lambda item: len(image_bytes_list[item[0]]))[0]
+    with observability.time_stage("vision_extraction"):
+        extracted = await extract_raw_fields_with_vision(image_bytes_list[representative])
+
+    # Compare it against every copy's application
+    for i, cache_key in pending:
+        with observability.time_stage("comparison"):
+            result = compare_extracted_fields(extracted, application_data_list[i])
+        if extracted is not DEFAULT_RAW_EXTRACTED_FIELDS:
+            result_cache.verification_cache.set(cache_key, result)
+        record_verification("vision" if i == representative else "near_duplicate", result, start_time)
+        results[i] = result
+
+    return results
+
+
+def record_verification(source: str, result: dict, start_time: float) -> None:
+    # Count the verified label by how it was resolved and record its end-to-end latency
+    observability.labels_verified_total.inc(source=source, status=result.get("overallStatus", ""))
+    observability.stage_seconds.observe(time.perf_counter() - start_time, stage="verify_label")
+
+
+def compare_extracted_fields(extracted: dict, application_data: dict) -> dict:
+    """
+    Runs every field comparator on an extraction against one application's expected values and
+    aggregates the overall status. Makes no API calls, so it can be run against any number of
+    application variants for the same extraction.
+
+    Parameter values:
+        - extracted<dict> = fields returned by `extract_fields_with_vision` or `extract_raw_fields_with_vision`.
+        - application_data<dict> = expected field values provided by user/application form.
+
+    Return value<dict>:
+        - Dictionary containing overall status ('approved', 'review', 'rejected'), summary,
+          and per-field verification results including status and notes.
+    """
 
     # Compare Brand Name field
     brand_status, brand_note = compare_brand_name(
         extracted.get(BRAND_NAME_STR, ""),
-        extracted.get("brand_name_matches", False),
+        extracted.get(BRAND_NAME_MATCH_STR, False),
         application_data.get(BRAND_NAME_STR, ""),
     )
 
@@ -599,6 +1458,27 @@ async def verify_label(image_bytes, application_data, running_from_main=False) -
     }
 
 
+async def verify_label_variants(image_bytes: bytes, application_data_list: list) -> list:
+    """
+    Verifies one label image against several versions of its application (e.g. after a reviewer
+    fixes a typo) using a single raw extraction. Once the image has been extracted, re-verifying
+    any edited application costs zero API calls.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image uploaded from frontend.
+        - application_data_list<list> = list of expected field value dictionaries.
+
+    Return value<list>:
+        - List of verification results dictionaries, one per application variant.
+    """
+
+    extracted = await extract_raw_fields_with_vision(image_bytes)
+    return [
+        compare_extracted_fields(extracted, application_data)
+        for application_data in application_data_list
+    ]
+
+
 if __name__ == "__main__":
     """
         ABOUT main:
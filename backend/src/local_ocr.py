@@ -0,0 +1,266 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from rapidfuzz import fuzz
+import asyncio
+import io
+import os
+import re
+import threading
+import observability
+
+### Constants
+# Off until `benchmarks.py --live` (with Tesseract installed) shows its resolved labels are accurate
+LOCAL_OCR_ENABLED = os.environ.get("LOCAL_OCR_ENABLED", "0") == "1"
+LOCAL_OCR_WORKERS = int(os.environ.get("LOCAL_OCR_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+LOCAL_OCR_MIN_CONFIDENCE = float(os.environ.get("LOCAL_OCR_MIN_CONFIDENCE", 80))  # Mean Tesseract word confidence
+LOCAL_OCR_MIN_SIDE = 1200  # Small labels are upscaled to this short side before OCR
+
+# Field patterns for OCR text; numbers are captured so they can be matched to the application
+ALCOHOL_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(%\s*(?:alc\.?\s*/?\s*vol\.?|abv|alcohol\s+by\s+volume)?|proof)",
+    re.IGNORECASE,
+)
+NET_CONTENTS_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(ml|cl|l|liters?|litres?|fl\.?\s*oz\.?|oz\.?|pints?|gal(?:lons?)?)\b",
+    re.IGNORECASE,
+)
+GOV_WARNING_HEADING_PATTERN = re.compile(r"government\s+warning\s*:?", re.IGNORECASE)
+# Words naming a beverage class or type; the first line containing one is read as the class/type
+CLASS_TYPE_PATTERN = re.compile(
+    r"\b(whiske?y|bourbon|scotch|rye|vodka|gin|rum|tequila|mezcal|brandy|cognac|liqueur|"
+    r"wine|champagne|sparkling|cabernet|merlot|chardonnay|pinot|sauvignon|riesling|zinfandel|"
+    r"ros[eé]|beer|ale|ipa|lager|pilsner|stout|porter|cider|seltzer|spirits?)\b",
+    re.IGNORECASE,
+)
+
+ocr_executor = None
+ocr_available = None  # None until the Tesseract binary has been probed
+ocr_stats_lock = threading.Lock()
+ocr_stats = {
+    "labels": 0,
+    "resolved_locally": 0,
+    "fell_back": 0,
+    "low_confidence": 0,
+    "ocr_seconds": 0.0,
+}
+
+
+def run_tesseract(image_bytes: bytes) -> tuple:
+    """
+    Runs Tesseract on a label image. Executed in a worker process, so it only uses picklable
+    arguments and return values.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image.
+
+    Return value<tuple>:
+        - Tuple of (text<str>, mean_confidence<float>, lines<list>) where confidence is 0-100 over
+          recognized words and lines lists (line_text, mean_word_height) in reading order.
+    """
+
+    import pytesseract
+
+    # Grayscale and upscale small labels; Tesseract is much more accurate on larger glyphs
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))).convert("L")
+    short_side = min(image.size)
+    if short_side < LOCAL_OCR_MIN_SIDE:
+        scale = LOCAL_OCR_MIN_SIDE / short_side
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    words = []
+    confidences = []
+    lines = {}  # (block, paragraph, line) -> ([words], [word heights]), in reading order
+    for i, word in enumerate(data["text"]):
+        if not word.strip() or float(data["conf"][i]) < 0:
+            continue
+        words.append(word)
+        confidences.append(float(data["conf"][i]))
+        line_words, line_heights = lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), ([], []))
+        line_words.append(word)
+        line_heights.append(data["height"][i])
+
+    text = " ".join(words)
+    mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    line_list = [(" ".join(line_words), sum(heights) / len(heights)) for line_words, heights in lines.values()]
+    return text, mean_confidence, line_list
+
+
+def is_ocr_available() -> bool:
+    """
+    Checks once whether pytesseract and the Tesseract binary are installed; the local tier is
+    skipped entirely when they are not.
+
+    Return value<bool>:
+        - True if OCR can run in this environment.
+    """
+
+    global ocr_available
+    if ocr_available is None:
+        try:
+            import pytesseract
+
+            pytesseract.get_tesseract_version()
+            ocr_available = True
+        except Exception as e:
+            observability.log("WARNING", "Local OCR disabled, Tesseract not available", error=e)
+            ocr_available = False
+    return ocr_available
+
+
+def find_brand_name(lines: list) -> str:
+    """
+    Reads the brand name as the line set in the largest type, which is how labels display it.
+    The application is not consulted, so a pass means the brand really is the label's headline.
+
+    Parameter values:
+        - lines<list> = (line_text, mean_word_height) tuples from `run_tesseract`.
+
+    Return value<str>:
+        - Text of the tallest line, or an empty string if there are no lines.
+    """
+
+    lines = [(text, height) for text, height in lines if re.search(r"[A-Za-z]{2}", text)]
+    if not lines:
+        return ""
+    return max(lines, key=lambda line: line[1])[0]
+
+
+def find_class_type(lines: list) -> str:
+    # First line (in reading order) naming a beverage class or type, else an empty string
+    return next((text for text, _ in lines if CLASS_TYPE_PATTERN.search(text)), "")
+
+
+def find_measurement(ocr_text: str, pattern: re.Pattern) -> str:
+    """
+    Finds the one measurement of a kind (alcohol content, net contents) printed on the label.
+
+    Parameter values:
+        - ocr_text<str> = full OCR text of the label.
+        - pattern<re.Pattern> = compiled pattern capturing (number, unit).
+
+    Return value<str>:
+        - Measurement text such as "45% Alc./Vol." or "750 mL". Empty when none is found, or when
+          several different numbers are, since the label is then ambiguous without the vision API.
+    """
+
+    matches = list(pattern.finditer(ocr_text))
+    # A proof statement restates the percentage (proof = 2 x ABV), so it only counts when no percentage is printed
+    percent_matches = [match for match in matches if "%" in match.group(2)]
+    if percent_matches:
+        matches = percent_matches
+    if len({float(match.group(1)) for match in matches}) != 1:
+        return ""
+    return matches[0].group(0)
+
+
+def find_government_warning(ocr_text: str, canonical_warning: str) -> dict:
+    """
+    Locates the government warning in OCR text and extracts the span that best aligns with the
+    canonical statement.
+
+    Parameter values:
+        - ocr_text<str> = full OCR text of the label.
+        - canonical_warning<str> = required warning text including the "GOVERNMENT WARNING:" heading.
+
+    Return value<dict>:
+        - Dictionary with the same government warning keys as the vision extraction.
+    """
+
+    heading = GOV_WARNING_HEADING_PATTERN.search(ocr_text)
+    if not heading:
+        return {
+            "government_warning_present": False,
+            "government_warning_all_caps": False,
+            "government_warning_text": "",
+        }
+
+    # Align the canonical statement against the text from the heading onwards
+    tail = ocr_text[heading.start() :]
+    alignment = fuzz.partial_ratio_alignment(canonical_warning.upper(), tail.upper())
+    warning_text = tail[alignment.dest_start : alignment.dest_end] if alignment else tail
+    return {
+        "government_warning_present": True,
+        "government_warning_all_caps": heading.group(0).split(":")[0].strip().isupper(),
+        "government_warning_text": warning_text,
+    }
+
+
+def extract_fields_from_ocr_text(ocr_text: str, lines: list, canonical_warning: str) -> dict:
+    """
+    Builds an extraction in the same shape as `extract_raw_fields_with_vision` from OCR output.
+    Like the vision extraction, it reads the label without looking at the application, so the
+    comparison that follows is an independent check.
+
+    Parameter values:
+        - ocr_text<str> = full OCR text of the label.
+        - lines<list> = (line_text, mean_word_height) tuples from `run_tesseract`.
+        - canonical_warning<str> = required warning text including the "GOVERNMENT WARNING:" heading.
+
+    Return value<dict>:
+        - Dictionary of extracted field values (empty strings for fields OCR could not find).
+    """
+
+    ocr_text = " ".join(ocr_text.split())
+    return {
+        "brand_name": find_brand_name(lines),
+        "class_type": find_class_type(lines),
+        "alcohol_content": find_measurement(ocr_text, ALCOHOL_PATTERN),
+        "net_contents": find_measurement(ocr_text, NET_CONTENTS_PATTERN),
+        **find_government_warning(ocr_text, canonical_warning),
+    }
+
+
+async def ocr_label(image_bytes: bytes) -> tuple:
+    """
+    Runs Tesseract on a label in the OCR process pool.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image.
+
+    Return value<tuple or None>:
+        - Tuple of (text, mean_confidence, lines) from `run_tesseract`, or None if OCR is disabled,
+          unavailable, or failed.
+    """
+
+    global ocr_executor
+    if not LOCAL_OCR_ENABLED or not is_ocr_available():
+        return None
+    if ocr_executor is None:
+        ocr_executor = ProcessPoolExecutor(max_workers=LOCAL_OCR_WORKERS)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(ocr_executor, run_tesseract, image_bytes)
+    except Exception as e:
+        observability.log("WARNING", "ocr_label(): Local OCR failed, falling back to vision API", error=e)
+        return None
+
+
+def record_ocr_outcome(key: str, ocr_seconds: float) -> None:
+    # Count how each label was handled by the local tier
+    with ocr_stats_lock:
+        ocr_stats["labels"] += 1
+        ocr_stats[key] += 1
+        ocr_stats["ocr_seconds"] += ocr_seconds
+
+
+def get_ocr_stats() -> dict:
+    """
+    Returns counters for the local OCR tier.
+
+    Return value<dict>:
+        - Label counts by outcome, the fraction resolved locally, and mean OCR time per label.
+    """
+
+    with ocr_stats_lock:
+        labels = ocr_stats["labels"]
+        return {
+            **ocr_stats,
+            "resolved_fraction": round(ocr_stats["resolved_locally"] / labels, 4) if labels else 0.0,
+            "mean_ocr_seconds": round(ocr_stats["ocr_seconds"] / labels, 4) if labels else 0.0,
+        }
@@ -0,0 +1,110 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import functools
+import re
+
+### Constants
+MEASUREMENT_CACHE_SIZE = 65536  # Distinct strings whose parse is kept (values repeat across labels)
+
+# Millilitres per unit; ounces, pints, quarts and gallons are US liquid measures
+VOLUME_UNIT_ML = {
+    "ml": 1.0,
+    "cl": 10.0,
+    "dl": 100.0,
+    "l": 1000.0,
+    "fl oz": 29.5735295625,
+    "pint": 473.176473,
+    "quart": 946.352946,
+    "gallon": 3785.411784,
+}
+
+# Spellings of each unit, longest first so "fl oz" wins over "oz" and "ml" over "l"
+VOLUME_UNIT_SPELLINGS = (
+    (r"fl\.?\s*oz\.?|fluid\s+ounces?|ounces?|oz\.?", "fl oz"),
+    (r"millilit(?:er|re)s?|ml", "ml"),
+    (r"centilit(?:er|re)s?|cl", "cl"),
+    (r"decilit(?:er|re)s?|dl", "dl"),
+    (r"lit(?:er|re)s?|ltr|l", "l"),
+    (r"pints?|pt\.?", "pint"),
+    (r"quarts?|qt\.?", "quart"),
+    (r"gallons?|gal\.?", "gallon"),
+)
+
+# One grammar for every measurement on a label: a number followed by a volume unit, a percent
+# sign (alcohol by volume) or "proof"
+MEASUREMENT_PATTERN = re.compile(
+    r"(?P<number>\d+(?:\.\d+)?|\.\d+)\s*(?:"
+    r"(?P<percent>%|percent\b|pct\b)"
+    r"|(?P<proof>proof\b)"
+    + "".join(f"|(?P<unit{i}>(?:{spelling})(?![a-z]))" for i, (spelling, _) in enumerate(VOLUME_UNIT_SPELLINGS))
+    + r")?",
+    re.IGNORECASE,
+)
+
+ALCOHOL_FORMAT_PERCENT = "percent"
+ALCOHOL_FORMAT_PROOF = "proof"
+PROOF_PER_ABV = 2.0  # US proof is twice the percentage of alcohol by volume
+
+
+@functools.lru_cache(maxsize=MEASUREMENT_CACHE_SIZE)
+def parse_measurement(text: str) -> dict:
+    """
+    Parses the alcohol content and volume in a label or application string, e.g.
+    "45% Alc./Vol. (90 Proof)" or "75 cL". Cached per distinct string.
+
+    Parameter values:
+        - text<str> = text to parse.
+
+    Return value<dict>:
+        - "abv": alcohol by volume in percent, from the first percentage (or, if there is none,
+          the first proof value halved); a bare number counts as a percentage. None if no number.
+        - "abv_format": 'percent' or 'proof', whichever the ABV was read from.
+        - "volume_ml": first volume converted to millilitres, or None if no number has a unit.
+        - "volume_unit": canonical unit the volume was written in ('ml', 'l', 'fl oz', ...).
+        - "first_number": first number as written, or None.
+    """
+
+    parsed = {
+        "abv": None,
+        "abv_format": None,
+        "volume_ml": None,
+        "volume_unit": None,
+        "first_number": None,
+    }
+    proof = None
+    bare_number = None
+    for match in MEASUREMENT_PATTERN.finditer(text):
+        number = float(match.group("number"))
+        if parsed["first_number"] is None:
+            parsed["first_number"] = match.group("number")
+
+        if match.group("percent"):
+            if parsed["abv_format"] != ALCOHOL_FORMAT_PERCENT:
+                parsed["abv"] = number
+                parsed["abv_format"] = ALCOHOL_FORMAT_PERCENT
+        elif match.group("proof"):
+            proof = number if proof is None else proof
+        elif match.lastgroup and match.lastgroup.startswith("unit"):
+            if parsed["volume_ml"] is None:
+                unit = VOLUME_UNIT_SPELLINGS[int(match.lastgroup[len("unit") :])][1]
+                parsed["volume_ml"] = number * VOLUME_UNIT_ML[unit]
+                parsed["volume_unit"] = unit
+        elif bare_number is None:
+            bare_number = number
+
+    # A percentage wins over proof; a lone number is read as a percentage
+    if parsed["abv_format"] is None and proof is not None:
+        parsed["abv"] = proof / PROOF_PER_ABV
+        parsed["abv_format"] = ALCOHOL_FORMAT_PROOF
+    elif parsed["abv_format"] is None and bare_number is not None:
+        parsed["abv"] = bare_number
+        parsed["abv_format"] = ALCOHOL_FORMAT_PERCENT
+
+    return parsed
+
+
+def volumes_match(volume_ml: float, other_ml: float, tolerance_ratio: float) -> bool:
+    # Equal within a relative tolerance, so "25.4 fl oz" (751.2 mL) matches "750 mL"
+    return abs(volume_ml - other_ml) <= tolerance_ratio * max(volume_ml, other_ml)
@@ -0,0 +1,88 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+import time
+import observability
+
+
+async def iter_multipart_parts(request: Request):
+    """
+    Parses a multipart/form-data request body as it arrives and yields each part as soon as
+    its last byte has been received, instead of buffering the whole form first. Only the part
+    currently being received is held in memory.
+
+    Parameter values:
+        - request<Request> = incoming FastAPI request with a multipart/form-data body.
+
+    Yield value<tuple>:
+        - Tuple of (field_name<str>, filename<str or None>, data<bytes>) for each form part.
+        - Raises HTTPException(400) if the request is not multipart/form-data.
+    """
+
+    # Pull the boundary out of the Content-Type header
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data request")
+
+    # State for the part currently being parsed; finished parts wait in `completed_parts`
+    # until the generator yields them
+    current = {"headers": {}, "header_field": b"", "header_value": b"", "data": bytearray()}
+    completed_parts = []
+
+    def on_part_begin():
+        current["headers"] = {}
+        current["data"] = bytearray()
+
+    def on_header_field(data, start, end):
+        current["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        current["header_value"] += data[start:end]
+
+    def on_header_end():
+        current["headers"][current["header_field"].lower()] = current["header_value"]
+        current["header_field"] = b""
+        current["header_value"] = b""
+
+    def on_part_data(data, start, end):
+        current["data"] += data[start:end]
+
+    def on_part_end():
+        _, disposition = parse_options_header(current["headers"].get(b"content-disposition"))
+        field_name = disposition.get(b"name", b"").decode("utf-8")
+        filename = disposition.get(b"filename")
+        completed_parts.append(
+            (field_name, filename.decode("utf-8") if filename else None, bytes(current["data"]))
+        )
+        current["data"] = bytearray()
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    # Feed the body to the parser chunk by chunk, handing off parts as they complete. Each
+    # part's read time runs from when the consumer asked for it until it was complete.
+    part_requested_at = time.perf_counter()
+    async for chunk in request.stream():
+        parser.write(chunk)
+        while completed_parts:
+            observability.stage_seconds.observe(time.perf_counter() - part_requested_at, stage="multipart_read")
+            yield completed_parts.pop(0)
+            part_requested_at = time.perf_counter()
+    parser.finalize()
+    while completed_parts:
+        observability.stage_seconds.observe(time.perf_counter() - part_requested_at, stage="multipart_read")
+        yield completed_parts.pop(0)
+        part_requested_at = time.perf_counter()
@@ -0,0 +1,188 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+import asyncio
+import io
+import math
+import os
+import threading
+import time
+import numpy as np
+import observability
+
+### Constants
+NEAR_DUPLICATE_ENABLED = os.environ.get("NEAR_DUPLICATE_ENABLED", "0") == "1"
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", 8))  # Differing hash bits (of 64)
+NEAR_DUPLICATE_WORKERS = int(os.environ.get("NEAR_DUPLICATE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+PHASH_SAMPLE_SIDE = 32  # Images are reduced to 32x32 grayscale before the DCT
+PHASH_HASH_SIDE = 8  # The 8x8 lowest frequencies make the 64-bit hash
+
+# Orthonormal DCT-II basis for the sample size, computed once per process
+DCT_MATRIX = np.array(
+    [
+        [
+            math.sqrt((1 if k == 0 else 2) / PHASH_SAMPLE_SIDE)
+            * math.cos(math.pi * (2 * n + 1) * k / (2 * PHASH_SAMPLE_SIDE))
+            for n in range(PHASH_SAMPLE_SIDE)
+        ]
+        for k in range(PHASH_SAMPLE_SIDE)
+    ]
+)
+
+hash_executor = None
+near_duplicate_calls_saved_total = observability.register(
+    observability.Counter(
+        "near_duplicate_calls_saved_total",
+        "Vision calls saved by verifying near-identical labels in a batch with one extraction.",
+    )
+)
+near_duplicate_stats_lock = threading.Lock()
+near_duplicate_stats = {"batches": 0, "images": 0, "groups": 0, "calls_saved": 0, "hash_seconds": 0.0}
+
+
+def perceptual_hash(image_bytes: bytes):
+    """
+    64-bit DCT perceptual hash of an image. Copies of the same artwork at other resolutions or in
+    other formats hash to the same or nearly the same bits. Executed in a worker process, so it
+    only uses picklable arguments and return values.
+
+    Parameter values:
+        - image_bytes<bytes> = raw image bytes.
+
+    Return value<int or None>:
+        - Hash as an integer, or None if the image cannot be decoded.
+    """
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # JPEGs can be decoded straight at a reduced size; the hash only needs 32x32
+        image.draft("L", (PHASH_SAMPLE_SIDE * 4, PHASH_SAMPLE_SIDE * 4))
+        image = ImageOps.exif_transpose(image).convert("L")
+    except Exception:
+        return None
+
+    # Low frequencies of a small grayscale copy, thresholded at their median (DC term excluded)
+    pixels = np.asarray(image.resize((PHASH_SAMPLE_SIDE, PHASH_SAMPLE_SIDE), Image.LANCZOS), dtype=np.float64)
+    frequencies = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:PHASH_HASH_SIDE, :PHASH_HASH_SIDE].flatten()
+    bits = frequencies > np.median(frequencies[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    # Number of differing bits between two hashes
+    return bin(hash_a ^ hash_b).count("1")
+
+
+async def hash_images(image_bytes_list: list) -> list:
+    """
+    Computes perceptual hashes for a batch of images in the hashing process pool.
+
+    Parameter values:
+        - image_bytes_list<list> = raw images.
+
+    Return value<list>:
+        - Hash per image (None where the image could not be decoded).
+    """
+
+    global hash_executor
+    if hash_executor is None:
+        hash_executor = ProcessPoolExecutor(max_workers=NEAR_DUPLICATE_WORKERS)
+
+    loop = asyncio.get_running_loop()
+    return list(
+        await asyncio.gather(
+            *(loop.run_in_executor(hash_executor, perceptual_hash, image_bytes) for image_bytes in image_bytes_list)
+        )
+    )
+
+
+def group_near_duplicates(hashes: list, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE) -> list:
+    """
+    Groups images whose hashes are within max_distance bits of the group's first image.
+
+    Parameter values:
+        - hashes<list> = hash per image (None never groups).
+        - max_distance<int> = largest Hamming distance still counted as the same artwork.
+
+    Return value<list>:
+        - Groups as lists of indices, in order of each group's first index; every index appears
+          in exactly one group.
+    """
+
+    groups = []
+    representatives = []  # (hash, group) for every group that has a hash
+    for index, image_hash in enumerate(hashes):
+        if image_hash is not None:
+            group = next(
+                (group for other, group in representatives if hamming_distance(image_hash, other) <= max_distance),
+                None,
+            )
+            if group is not None:
+                group.append(index)
+                continue
+        group = [index]
+        groups.append(group)
+        if image_hash is not None:
+            representatives.append((image_hash, group))
+    return groups
+
+
+async def find_near_duplicate_groups(image_bytes_list: list, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE) -> list:
+    """
+    Hashes a batch of images and groups the near-identical ones, recording how many vision calls
+    the grouping saves.
+
+    Parameter values:
+        - image_bytes_list<list> = raw images.
+        - max_distance<int> = largest Hamming distance still counted as the same artwork.
+
+    Return value<list>:
+        - Groups as lists of indices (see `group_near_duplicates`).
+    """
+
+    start = time.perf_counter()
+    hashes = await hash_images(image_bytes_list)
+    hash_seconds = time.perf_counter() - start
+    observability.stage_seconds.observe(hash_seconds, stage="perceptual_hash")
+    groups = group_near_duplicates(hashes, max_distance)
+    calls_saved = len(image_bytes_list) - len(groups)
+
+    with near_duplicate_stats_lock:
+        near_duplicate_stats["batches"] += 1
+        near_duplicate_stats["images"] += len(image_bytes_list)
+        near_duplicate_stats["groups"] += sum(1 for group in groups if len(group) > 1)
+        near_duplicate_stats["calls_saved"] += calls_saved
+        near_duplicate_stats["hash_seconds"] += hash_seconds
+    near_duplicate_calls_saved_total.inc(calls_saved)
+
+    if calls_saved:
+        observability.log(
+            "INFO",
+            "Near-duplicate labels grouped",
+            groups=[group for group in groups if len(group) > 1],
+            calls_saved=calls_saved,
+        )
+    return groups
+
+
+def reset_near_duplicate_stats() -> None:
+    # Zero the process-wide totals (used between benchmark runs)
+    with near_duplicate_stats_lock:
+        for key in near_duplicate_stats:
+            near_duplicate_stats[key] = 0
+
+
+def get_near_duplicate_stats() -> dict:
+    """
+    Returns cumulative near-duplicate grouping totals for this process.
+
+    Return value<dict>:
+        - Batches and images hashed, groups of more than one image found, vision calls saved,
+          and time spent hashing.
+    """
+
+    with near_duplicate_stats_lock:
+        return {**near_duplicate_stats, "hash_seconds": round(near_duplicate_stats["hash_seconds"], 3)}
@@ -0,0 +1,241 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+### Constants
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "text" ([INFO] message key=value) or "json"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Seconds; covers fast cache hits through slow, retried vision calls
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Request context; asyncio tasks copy it when created, so batch workers and background jobs
+# log with the ID of the request that started them
+request_id_var = contextvars.ContextVar("request_id", default=None)
+label_index_var = contextvars.ContextVar("label_index", default=None)
+
+
+def new_request_id() -> str:
+    # Short random ID used when the caller did not send one
+    return uuid.uuid4().hex[:16]
+
+
+def log(level: str, message: str, **fields) -> None:
+    """
+    Prints a log line tagged with the current request ID and label index (when set), plus any
+    extra fields, as text or JSON depending on LOG_FORMAT.
+
+    Parameter values:
+        - level<str> = 'INFO', 'WARNING', or 'ERROR'.
+        - message<str> = human-readable message.
+        - fields<dict> = extra key/value pairs to include.
+
+    Return value<None>
+    """
+
+    context = {"request_id": request_id_var.get(), "label": label_index_var.get()}
+    fields = {key: value for key, value in {**context, **fields}.items() if value is not None}
+
+    if LOG_FORMAT == "json":
+        print(json.dumps({"level": level, "message": message, **fields}, default=str), flush=True)
+    else:
+        suffix = "".join(f" {key}={value}" for key, value in fields.items())
+        print(f"[{level}] {message}{suffix}", flush=True)
+
+
+def format_labels(label_names: tuple, label_values: tuple) -> str:
+    # Prometheus label set, e.g. {stage="openai_request"}
+    if not label_names:
+        return ""
+    pairs = []
+    for name, value in zip(label_names, label_values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels, rendered in the Prometheus text format.
+    """
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class CallbackCounter(Counter):
+    """
+    Counter whose values are read from another component's own stats when rendered
+    (e.g. cache hit counts kept by ResultCache).
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, callback):
+        super().__init__(name, help_text, label_names)
+        self.callback = callback  # Returns {label_values_tuple: value}
+
+    def render(self) -> list:
+        self.values = dict(self.callback())
+        return super().render()
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down (e.g. requests in flight), rendered in the Prometheus text format.
+    """
+
+    metric_type = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self.lock:
+            self.values[key] = value
+
+
+class CallbackGauge(Gauge):
+    """
+    Gauge whose values are read from another component when rendered (e.g. open connections
+    in an HTTP connection pool).
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, callback):
+        super().__init__(name, help_text, label_names)
+        self.callback = callback  # Returns {label_values_tuple: value}
+
+    def render(self) -> list:
+        self.values = dict(self.callback())
+        return super().render()
+
+
+class Histogram:
+    """
+    Cumulative histogram with optional labels, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self.lock:
+            series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                for upper_bound, count in zip(self.buckets, series):
+                    labels = format_labels(self.label_names + ("le",), key + (upper_bound,))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = format_labels(self.label_names + ("le",), key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+# Every metric exposed on /metrics
+registry = []
+
+
+def register(metric):
+    # Add a metric to the /metrics output and return it
+    registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+
+    Return value<str>:
+        - Metrics text for the /metrics endpoint.
+    """
+
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = register(
+    Histogram(
+        "label_verification_stage_seconds",
+        "Time spent in each stage of label verification.",
+        ("stage",),
+    )
+)
+http_request_seconds = register(
+    Histogram(
+        "http_request_seconds",
+        "HTTP request latency by route, method and status code.",
+        ("route", "method", "status"),
+    )
+)
+vision_requests_total = register(
+    Counter("vision_requests_total", "Vision API calls by outcome.", ("outcome",))
+)
+verification_retries_total = register(
+    Counter("verification_retries_total", "Verification attempts retried after a rate limit or HTTP error.")
+)
+vision_tokens_total = register(
+    Counter("vision_tokens_total", "Tokens reported by the Vision API.", ("kind",))
+)
+labels_verified_total = register(
+    Counter("labels_verified_total", "Verified labels by how they were resolved and overall status.", ("source", "status"))
+)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """
+    Times the enclosed block and records it in the per-stage latency histogram. Works inside
+    both sync and async code (`with observability.time_stage("openai_request"):`).
+
+    Parameter values:
+        - stage<str> = stage name used as the 'stage' label.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
@@ -0,0 +1,185 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
+import importlib.util
+import os
+import time
+import weakref
+import observability
+
+### Constants
+# Connection pool; 0 sizes it from the concurrency passed to create_openai_client
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", 0))
+OPENAI_CONNECTIONS_PER_WORKER = 2  # Headroom for overlapping batches, jobs and single /verify calls
+OPENAI_DEFAULT_CONCURRENCY = 5  # Pool size for scripts; the API sizes it from the admission limit
+OPENAI_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY_SECONDS", 120))  # httpx default is 5
+OPENAI_SDK_MAX_RETRIES = 0  # Retries are batch_processor.run_with_retry's job (the SDK default is 2)
+OPENAI_HTTP2 = os.environ.get("OPENAI_HTTP2", "0") == "1"  # Needs the h2 package (pip install httpx[http2])
+
+# Timeouts in seconds; the read timeout is per label, so packed requests get proportionally more
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_CONNECT_TIMEOUT_SECONDS", 5))
+OPENAI_READ_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_READ_TIMEOUT_SECONDS", 60))
+OPENAI_WRITE_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_WRITE_TIMEOUT_SECONDS", 30))
+OPENAI_POOL_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_POOL_TIMEOUT_SECONDS", 30))  # Wait for a free connection
+
+# httpcore trace events that make up opening a connection
+CONNECT_TRACE_EVENTS = ("connection.connect_tcp", "connection.start_tls")
+
+# Transports of every live client, read by the pool gauges when /metrics is rendered
+active_transports = weakref.WeakSet()
+
+
+def pool_connection_counts() -> dict:
+    # Open connections across all clients, split into busy and idle
+    counts = {("active",): 0, ("idle",): 0}
+    for transport in list(active_transports):
+        pool = getattr(transport, "_pool", None)
+        for connection in getattr(pool, "connections", []):
+            counts[("idle",) if connection.is_idle() else ("active",)] += 1
+    return counts
+
+
+pool_connections = observability.register(
+    observability.CallbackGauge(
+        "openai_http_connections",
+        "Open connections in the OpenAI HTTP pool by state.",
+        ("state",),
+        pool_connection_counts,
+    )
+)
+requests_in_flight = observability.register(
+    observability.Gauge("openai_http_requests_in_flight", "OpenAI HTTP requests waiting for response headers.")
+)
+connections_opened_total = observability.register(
+    observability.Counter("openai_http_connections_opened_total", "New connections opened to the OpenAI API.")
+)
+pool_timeouts_total = observability.register(
+    observability.Counter("openai_http_pool_timeouts_total", "Requests that gave up waiting for a free pooled connection.")
+)
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    httpx transport that records pool metrics: requests in flight, new connections and the
+    time spent opening them (the "openai_connect" stage), and pool timeouts.
+    """
+
+    def __init__(self, **transport_options):
+        super().__init__(**transport_options)
+        active_transports.add(self)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = {}
+
+        async def trace(event_name: str, info: dict) -> None:
+            # httpcore reports '<step>.started' / '<step>.complete' for each part of a request
+            step, _, phase = event_name.rpartition(".")
+            if step not in CONNECT_TRACE_EVENTS:
+                return
+            if phase == "started":
+                started[step] = time.perf_counter()
+            elif phase == "complete" and step in started:
+                observability.stage_seconds.observe(time.perf_counter() - started[step], stage="openai_connect")
+                if step == "connection.connect_tcp":
+                    connections_opened_total.inc()
+
+        request.extensions["trace"] = trace
+        requests_in_flight.inc()
+        try:
+            return await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            pool_timeouts_total.inc()
+            raise
+        finally:
+            requests_in_flight.dec()
+
+
+def http2_available() -> bool:
+    # HTTP/2 support in httpx comes from the optional h2 package
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_openai_client(
+    concurrency: int = OPENAI_DEFAULT_CONCURRENCY,
+    http2: bool = OPENAI_HTTP2,
+    keepalive_expiry: float = OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+    **client_options,
+) -> AsyncOpenAI:
+    """
+    Builds the AsyncOpenAI client with a connection pool sized to the vision call concurrency, long
+    keep-alive so connections survive the gaps between bursts, explicit timeouts, no SDK retries,
+    optional HTTP/2, and pool metrics on /metrics.
+
+    Parameter values:
+        - concurrency<int> = most vision calls in flight at once (the admission limit's ceiling).
+        - http2<bool> = use HTTP/2 if the h2 package is installed (falls back to HTTP/1.1 otherwise).
+        - keepalive_expiry<float> = seconds an idle connection is kept open.
+        - client_options<dict> = extra AsyncOpenAI arguments (api_key, base_url, max_retries, timeout).
+
+    Return value<AsyncOpenAI>:
+        - Client; close it with `await client.close()`.
+    """
+
+    if http2 and not http2_available():
+        observability.log("WARNING", "OPENAI_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+
+    # Keep every connection the pool may open alive, so bursts reuse them instead of reconnecting
+    max_connections = OPENAI_MAX_CONNECTIONS or concurrency * OPENAI_CONNECTIONS_PER_WORKER
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    client_options.setdefault(
+        "timeout",
+        httpx.Timeout(
+            OPENAI_READ_TIMEOUT_SECONDS,
+            connect=OPENAI_CONNECT_TIMEOUT_SECONDS,
+            write=OPENAI_WRITE_TIMEOUT_SECONDS,
+            pool=OPENAI_POOL_TIMEOUT_SECONDS,
+        ),
+    )
+    client_options.setdefault("api_key", os.getenv("OPENAI_API_KEY"))
+    # No SDK retries: 429s, 5xx and timeouts must reach the rate limiter, the adaptive limit, the
+    # circuit breaker and batch_processor's retry loop on the first failure, not after hidden retries
+    client_options.setdefault("max_retries", OPENAI_SDK_MAX_RETRIES)
+
+    http_client = DefaultAsyncHttpxClient(
+        transport=InstrumentedTransport(limits=limits, http2=http2),
+        timeout=client_options["timeout"],
+    )
+    observability.log(
+        "INFO",
+        "OpenAI client created",
+        max_connections=max_connections,
+        keepalive_expiry=keepalive_expiry,
+        http2=http2,
+    )
+    return AsyncOpenAI(http_client=http_client, **client_options)
+
+
+def request_timeout(client: AsyncOpenAI, image_count: int):
+    """
+    Per-call timeout for a vision request: the client's timeout with the read timeout scaled by
+    the number of labels in the request, since packed requests take longer to answer.
+
+    Parameter values:
+        - client<AsyncOpenAI> = client the request is sent with.
+        - image_count<int> = label images in the request.
+
+    Return value<httpx.Timeout or float>:
+        - Timeout to pass as `timeout=` to the request.
+    """
+
+    timeout = client.timeout
+    if not isinstance(timeout, httpx.Timeout):
+        return timeout * image_count if isinstance(timeout, (int, float)) else timeout
+    if timeout.read is None:
+        return timeout
+    return httpx.Timeout(
+        timeout.read * image_count, connect=timeout.connect, write=timeout.write, pool=timeout.pool
+    )
@@ -0,0 +1,307 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import asyncio
+import os
+import re
+import time
+import shared_state
+
+### Constants
+DEFAULT_REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_RPM_LIMIT", 500))
+DEFAULT_TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TPM_LIMIT", 200000))
+RATE_LIMIT_PERIOD_SECONDS = 60.0  # Window the RPM/TPM budgets are expressed over
+
+ESTIMATED_IMAGE_TOKENS = 1200  # Conservative token estimate for one high-detail label image
+CHARS_PER_TOKEN = 4  # Rough characters-per-token ratio used for prompt estimates
+
+HEADER_LIMIT_REQUESTS = "x-ratelimit-limit-requests"
+HEADER_LIMIT_TOKENS = "x-ratelimit-limit-tokens"
+HEADER_REMAINING_REQUESTS = "x-ratelimit-remaining-requests"
+HEADER_REMAINING_TOKENS = "x-ratelimit-remaining-tokens"
+HEADER_RESET_REQUESTS = "x-ratelimit-reset-requests"
+HEADER_RESET_TOKENS = "x-ratelimit-reset-tokens"
+HEADER_RETRY_AFTER = "retry-after"
+
+# Matches OpenAI reset durations such as "1s", "6m0s", "20ms" or "1h2m3.5s"
+RESET_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+RESET_UNIT_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset_duration(value: str) -> float:
+    """
+    Converts an OpenAI rate-limit reset header value into seconds.
+
+    Parameter values:
+        - value<str> = header value such as "1s", "6m0s", "20ms" or a bare number of seconds.
+
+    Return value<float>:
+        - Number of seconds until the budget resets. Returns 0.0 if the value cannot be parsed.
+    """
+
+    if not value:
+        return 0.0
+
+    # Bare numbers (e.g. Retry-After) are already seconds
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    # Sum every "<number><unit>" component of the duration
+    return sum(
+        float(amount) * RESET_UNIT_SECONDS[unit]
+        for amount, unit in RESET_DURATION_PATTERN.findall(value)
+    )
+
+
+def estimate_request_tokens(prompt: str, max_tokens: int, image_count: int = 1) -> int:
+    """
+    Estimates how many tokens a vision request will count against the tokens-per-minute
+    budget. OpenAI charges max_tokens up front, so it is included in the estimate.
+
+    Parameter values:
+        - prompt<str> = text portion of the request.
+        - max_tokens<int> = completion token cap sent with the request.
+        - image_count<int> = number of images attached to the request.
+
+    Return value<int>:
+        - Estimated token cost of the request.
+    """
+
+    return len(prompt) // CHARS_PER_TOKEN + image_count * ESTIMATED_IMAGE_TOKENS + max_tokens
+
+
+class TokenBucket:
+    """
+    Continuously refilling token bucket holding `capacity` units that refill completely
+    over `period_seconds`.
+    """
+
+    def __init__(self, capacity: float, period_seconds: float = RATE_LIMIT_PERIOD_SECONDS):
+        self.capacity = float(capacity)
+        self.period_seconds = period_seconds
+        self.available = float(capacity)
+        self.updated_at = time.monotonic()
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period_seconds
+
+    def refill(self) -> None:
+        # Add units earned since the last update, never exceeding capacity
+        now = time.monotonic()
+        self.available = min(
+            self.capacity,
+            self.available + (now - self.updated_at) * self.refill_per_second,
+        )
+        self.updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        # Time needed before `amount` units are available (amount is capped at capacity)
+        self.refill()
+        deficit = min(amount, self.capacity) - self.available
+        return max(deficit, 0.0) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        self.refill()
+        self.available -= amount
+
+    def sync(self, remaining: float, limit: float = None, reset_seconds: float = 0.0) -> None:
+        # Trust the server's view when it reports less budget than we think we have
+        self.refill()
+        if limit:
+            self.capacity = float(limit)
+        self.available = min(self.available, float(remaining))
+
+        # The server refills (limit - remaining) units over reset_seconds; adopt its refill rate
+        missing = self.capacity - float(remaining)
+        if reset_seconds > 0 and missing > 0:
+            self.period_seconds = reset_seconds * self.capacity / missing
+
+
+class RateLimiter:
+    """
+    Process-wide pacing for OpenAI requests. Budgets both requests-per-minute and
+    tokens-per-minute, waits before sending instead of reacting to 429s, and corrects
+    its budget from the x-ratelimit-* headers returned with every response. When a shared
+    state backend is configured (SHARED_STATE_URL), the budget and pauses live there and
+    are shared by every API worker; the local buckets then only track the budget's size.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+        period_seconds: float = RATE_LIMIT_PERIOD_SECONDS,
+        shared: bool = bool(shared_state.SHARED_STATE_URL),
+        name: str = "openai",
+    ):
+        self.requests = TokenBucket(requests_per_minute, period_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, period_seconds)
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+        self.total_wait_seconds = 0.0
+        self.shared = shared
+        self.name = name
+
+    def reserve(self, estimated_tokens: int) -> float:
+        """
+        Reserves one request and `estimated_tokens` tokens if they fit in the budget right now.
+
+        Parameter values:
+            - estimated_tokens<int> = estimated token cost of the request about to be sent.
+
+        Return value<float>:
+            - 0.0 if the budget was reserved, otherwise seconds to wait before it could be.
+        """
+
+        # Budget shared by every worker
+        backend = shared_state.get_backend() if self.shared else None
+        if backend is not None:
+            local_wait = self.paused_until - time.monotonic()
+            if local_wait > 0:
+                return local_wait
+            return backend.take_budget(
+                self.name,
+                {
+                    "requests": (self.requests.capacity, self.requests.period_seconds, 1),
+                    "tokens": (self.tokens.capacity, self.tokens.period_seconds, estimated_tokens),
+                },
+            )
+
+        # Budget of this process only
+        wait_time = max(
+            self.paused_until - time.monotonic(),
+            self.requests.seconds_until(1),
+            self.tokens.seconds_until(estimated_tokens),
+        )
+        if wait_time > 0:
+            return wait_time
+        self.requests.consume(1)
+        self.tokens.consume(estimated_tokens)
+        return 0.0
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        """
+        Waits until one request and `estimated_tokens` tokens fit in the budget, then reserves them.
+        Callers are served in arrival order so no request starves.
+
+        Parameter values:
+            - estimated_tokens<int> = estimated token cost of the request about to be sent.
+
+        Return value<None>
+        """
+
+        async with self.lock:
+            while True:
+                wait_time = await self.reserve_off_loop(estimated_tokens)
+                if wait_time <= 0:
+                    break
+                self.total_wait_seconds += wait_time
+                await asyncio.sleep(wait_time)
+
+    async def reserve_off_loop(self, estimated_tokens: int) -> float:
+        # `reserve` in a worker thread when the budget is shared, since the backend call blocks on I/O
+        if self.shared and shared_state.get_backend() is not None:
+            return await asyncio.to_thread(self.reserve, estimated_tokens)
+        return self.reserve(estimated_tokens)
+
+    async def try_acquire(self, estimated_tokens: int) -> bool:
+        """
+        Reserves one request and `estimated_tokens` tokens only if they are available right now
+        and no caller is already waiting, so optional extra requests (hedges) never delay or
+        overtake regular ones.
+
+        Parameter values:
+            - estimated_tokens<int> = estimated token cost of the request about to be sent.
+
+        Return value<bool>:
+            - True if the budget was reserved.
+        """
+
+        if self.lock.locked():
+            return False
+        return await self.reserve_off_loop(estimated_tokens) <= 0
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """
+        Charges any tokens a request used beyond its estimate once the real usage is known.
+        Over-estimates are not refunded because the API counts max_tokens up front.
+
+        Parameter values:
+            - estimated_tokens<int> = tokens reserved by `acquire`.
+            - actual_tokens<int> = tokens reported in the response usage.
+
+        Return value<None>
+        """
+
+        if actual_tokens <= estimated_tokens:
+            return
+        backend = shared_state.get_backend() if self.shared else None
+        if backend is not None:
+            shared_state.submit_write(
+                backend.adjust_budget, self.name, "tokens", self.tokens.capacity, self.tokens.period_seconds,
+                consumed=actual_tokens - estimated_tokens,
+            )
+        else:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+    def update_from_headers(self, headers) -> None:
+        """
+        Updates the budget and refill rate from the x-ratelimit-* headers of an OpenAI
+        response. On a 429, also pauses every caller until the server's Retry-After has passed.
+
+        Parameter values:
+            - headers<Mapping> = response headers (case-insensitive mapping, e.g. httpx.Headers).
+
+        Return value<None>
+        """
+
+        if headers is None:
+            return
+
+        # Sync each bucket with the server's remaining budget (and the shared copy, if any)
+        backend = shared_state.get_backend() if self.shared else None
+        for bucket_name, bucket, remaining_key, limit_key, reset_key in (
+            ("requests", self.requests, HEADER_REMAINING_REQUESTS, HEADER_LIMIT_REQUESTS, HEADER_RESET_REQUESTS),
+            ("tokens", self.tokens, HEADER_REMAINING_TOKENS, HEADER_LIMIT_TOKENS, HEADER_RESET_TOKENS),
+        ):
+            remaining = headers.get(remaining_key)
+            if remaining is None:
+                continue
+            try:
+                limit = float(headers.get(limit_key)) if headers.get(limit_key) else None
+                reset_seconds = parse_reset_duration(headers.get(reset_key))
+                bucket.sync(float(remaining), limit, reset_seconds)
+            except ValueError:
+                continue
+            if backend is not None:
+                shared_state.submit_write(
+                    backend.adjust_budget, self.name, bucket_name, bucket.capacity, bucket.period_seconds,
+                    remaining=float(remaining),
+                )
+
+        # Server explicitly asked us to back off
+        if headers.get(HEADER_RETRY_AFTER):
+            self.pause(parse_reset_duration(headers.get(HEADER_RETRY_AFTER)))
+
+    def pause(self, seconds: float) -> None:
+        """
+        Blocks all callers of `acquire` (in every worker, when the budget is shared) for at least `seconds`.
+
+        Parameter values:
+            - seconds<float> = how long to pause.
+
+        Return value<None>
+        """
+
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        backend = shared_state.get_backend() if self.shared else None
+        if backend is not None:
+            shared_state.submit_write(backend.pause, self.name, seconds)
+
+
+# Shared by every /verify and /verify-batch call in this process (and across workers with SHARED_STATE_URL)
+shared_limiter = RateLimiter()
@@ -0,0 +1,258 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import shared_state
+
+### Constants
+CACHE_MEMORY_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_SIZE", 1024))
+CACHE_DB_PATH = os.environ.get("RESULT_CACHE_DB_PATH", "")  # Empty string disables the disk tier
+CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+CACHE_DISK_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_DISK_MAX_ENTRIES", 100000))
+CACHE_DISK_TRIM_INTERVAL_SECONDS = 60.0  # How often expired and excess disk rows are dropped
+
+# Expected values that change the verification result; everything else in the application is ignored
+CACHE_KEY_FIELDS = ("brand_name", "class_type", "alcohol_content", "net_contents")
+
+
+def hash_image(image_bytes: bytes) -> str:
+    """
+    Returns the SHA-256 hex digest of raw image bytes.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image.
+
+    Return value<str>:
+        - 64-character hex digest.
+    """
+
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def normalize_expected_value(value) -> str:
+    """
+    Normalizes an expected application value so cosmetic differences (case, surrounding or
+    repeated whitespace, int vs str) map to the same cache key.
+
+    Parameter values:
+        - value<any> = expected value from the application data.
+
+    Return value<str>:
+        - Normalized string.
+    """
+
+    return " ".join(str(value if value is not None else "").lower().split())
+
+
+def make_cache_key(image_bytes: bytes, application_data: dict, image_hash: str = None) -> str:
+    """
+    Builds a content-addressed cache key from the image hash and the normalized expected values.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image.
+        - application_data<dict> = expected values from the application.
+        - image_hash<str> = precomputed SHA-256 of image_bytes, if already known.
+
+    Return value<str>:
+        - SHA-256 hex digest identifying this (image, application) pair.
+    """
+
+    expected = [normalize_expected_value(application_data.get(f, "")) for f in CACHE_KEY_FIELDS]
+    key_material = json.dumps([image_hash or hash_image(image_bytes), expected])
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of verification results: an in-memory LRU in front of an optional
+    SQLite table with TTL and size-based eviction. Values are JSON-serializable dicts. With
+    `shared`, the second tier is the shared state backend (SHARED_STATE_URL) instead, so every
+    API worker sees results stored by the others. Disk and shared tier I/O runs off the event
+    loop: `get_async` reads in a worker thread and `set` hands the write to `submit_write`.
+    """
+
+    def __init__(
+        self,
+        memory_max_entries: int = CACHE_MEMORY_MAX_ENTRIES,
+        db_path: str = CACHE_DB_PATH,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        disk_max_entries: int = CACHE_DISK_MAX_ENTRIES,
+        table: str = "results",
+        shared: bool = bool(shared_state.SHARED_STATE_URL),
+    ):
+        self.table = table
+        self.shared = shared
+        self.memory_max_entries = memory_max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self.memory = OrderedDict()  # key -> (stored_at, json_value)
+        self.lock = threading.Lock()  # Memory tier and counters
+        self.db_lock = threading.Lock()  # Disk tier connection
+        self.last_disk_trim = 0.0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        # Open the optional disk tier (the shared tier replaces it)
+        self.db = None
+        if db_path and not shared:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+            self.db.commit()
+
+    def get(self, key: str):
+        """
+        Looks up a cached value, checking memory first and then the shared or disk tier. Hits
+        there are promoted into memory. Expired entries count as misses.
+
+        Parameter values:
+            - key<str> = cache key from `make_cache_key`.
+
+        Return value<dict or None>:
+            - A fresh copy of the cached value, or None on a miss.
+        """
+
+        now = time.time()
+        with self.lock:
+            # Memory tier
+            entry = self.memory.get(key)
+            if entry and now - entry[0] <= self.ttl_seconds:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return json.loads(entry[1])
+            if entry:
+                del self.memory[key]
+
+        # Shared or disk tier, outside the memory lock so their I/O never holds up memory hits
+        found = None
+        if self.shared:
+            serialized = shared_state.get_backend().cache_get(self.table, key, self.ttl_seconds)
+            if serialized is not None:
+                found = (now, serialized)
+        elif self.db:
+            found = self.read_disk(key, now)
+
+        with self.lock:
+            if found is None:
+                self.stats["misses"] += 1
+                return None
+            self._remember(key, found[0], found[1])
+            self.stats["disk_hits"] += 1
+            return json.loads(found[1])
+
+    def read_disk(self, key: str, now: float):
+        # (stored_at, serialized) of a fresh disk row, refreshing its LRU position; expired rows are deleted
+        with self.db_lock:
+            row = self.db.execute(
+                f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                self.db.execute(
+                    f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self.db.commit()
+                return row[1], row[0]
+            if row:
+                self.db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.db.commit()
+            return None
+
+    async def get_async(self, key: str):
+        # `get` in a worker thread when a miss in memory would reach the shared or disk tier, which block on I/O
+        if self.shared or self.db:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    def set(self, key: str, value: dict) -> None:
+        """
+        Stores a value in memory, evicting the least recently used entries over the size limit,
+        and hands the shared or disk tier write to a worker thread. That tier drops its expired
+        and excess rows at most once per CACHE_DISK_TRIM_INTERVAL_SECONDS.
+
+        Parameter values:
+            - key<str> = cache key from `make_cache_key`.
+            - value<dict> = JSON-serializable value to cache.
+
+        Return value<None>
+        """
+
+        now = time.time()
+        serialized = json.dumps(value)
+        with self.lock:
+            self._remember(key, now, serialized)
+            self.stats["stores"] += 1
+
+        if self.shared:
+            shared_state.submit_write(shared_state.get_backend().cache_set, self.table, key, serialized, self.ttl_seconds)
+        elif self.db:
+            shared_state.submit_write(self.write_disk, key, serialized, now)
+
+    def write_disk(self, key: str, serialized: str, now: float) -> None:
+        # Store a row in the disk tier (runs in a worker thread via submit_write)
+        with self.db_lock:
+            self.db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, serialized, now, now),
+            )
+
+            # Trimming scans the whole table, so it runs once per interval rather than on every write
+            if now - self.last_disk_trim >= CACHE_DISK_TRIM_INTERVAL_SECONDS:
+                self.last_disk_trim = now
+                self.db.execute(f"DELETE FROM {self.table} WHERE stored_at < ?", (now - self.ttl_seconds,))
+                self.db.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                )
+            self.db.commit()
+
+    def _remember(self, key: str, stored_at: float, serialized: str) -> None:
+        # Insert into the memory LRU and evict the oldest entries over the limit
+        self.memory[key] = (stored_at, serialized)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_max_entries:
+            self.memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> dict:
+        """
+        Returns hit/miss counters and the current hit rate.
+
+        Return value<dict>:
+            - Counters plus 'hit_rate' and 'memory_entries'.
+        """
+
+        with self.lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+            }
+
+    def clear(self) -> None:
+        # Remove every entry from both tiers (counters are kept)
+        with self.lock:
+            self.memory.clear()
+        if self.shared:
+            shared_state.get_backend().cache_clear(self.table)
+        elif self.db:
+            with self.db_lock:
+                self.db.execute(f"DELETE FROM {self.table}")
+                self.db.commit()
+
+
+# Shared by every /verify and /verify-batch call in this process
+verification_cache = ResultCache()  # (image, application) -> verification result
+extraction_cache = ResultCache(table="extractions")  # image hash -> raw label extraction
@@ -0,0 +1,480 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from abc import ABC, abstractmethod
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import observability
+
+### Constants
+# Where API workers share their concurrency limit, rate budget and result cache. Empty keeps
+# everything inside each process; otherwise "sqlite:///path/to/file.db" (workers on one host)
+# or "redis://host:6379/0" (workers on several hosts, needs the redis package)
+SHARED_STATE_URL = os.environ.get("SHARED_STATE_URL", "")
+SHARED_MAX_CONCURRENT_REQUESTS = int(os.environ.get("SHARED_MAX_CONCURRENT_REQUESTS", 5))  # Vision calls in flight across all workers
+SHARED_SLOT_LEASE_SECONDS = float(os.environ.get("SHARED_SLOT_LEASE_SECONDS", 300))  # Slots of a crashed worker free up after this
+SHARED_SLOT_POLL_SECONDS = 0.05  # Wait between attempts to take a slot when all are in use
+SHARED_SQLITE_BUSY_TIMEOUT_SECONDS = 10.0
+SHARED_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_DISK_MAX_ENTRIES", 100000))  # Per cache table (SQLite only)
+SHARED_CACHE_TRIM_INTERVAL_SECONDS = 60.0  # How often a worker drops expired and excess cache rows (SQLite only)
+VISION_SLOT_NAME = "vision"
+SQLITE_URL_PREFIX = "sqlite:///"
+REDIS_URL_PREFIXES = ("redis://", "rediss://", "unix://")
+
+backend = None
+backend_pid = None  # Process the backend was opened in; connections are not shared across fork()
+backend_lock = threading.Lock()
+pending_writes = set()  # Backend writes running in worker threads, kept referenced until they finish
+
+
+class SharedStateBackend(ABC):
+    """
+    Storage for state every API worker must agree on. Budgets are token buckets stored as
+    (available, updated_at) per bucket; the capacity and refill period are passed in with every
+    call, so each worker's limiter (which follows the x-ratelimit-* headers) stays the authority
+    on the budget size. Every method is atomic across processes and blocks on I/O, so async code
+    calls them through `asyncio.to_thread` or `submit_write`.
+    """
+
+    @abstractmethod
+    def take_budget(self, name: str, amounts: dict) -> float:
+        """
+        Reserves budget from every listed bucket at once, or from none of them.
+
+        Parameter values:
+            - name<str> = budget name (one per rate limiter).
+            - amounts<dict> = bucket name -> (capacity, period_seconds, amount).
+
+        Return value<float>:
+            - 0.0 if the budget was reserved, otherwise seconds until it could be (including any pause).
+        """
+
+        ...
+
+    @abstractmethod
+    def adjust_budget(self, name: str, bucket: str, capacity: float, period_seconds: float, consumed: float = 0.0, remaining: float = None) -> None:
+        """
+        Charges `consumed` units to a bucket and/or lowers it to `remaining` (the server's count).
+
+        Parameter values:
+            - name<str> = budget name.
+            - bucket<str> = bucket name.
+            - capacity<float> = bucket capacity.
+            - period_seconds<float> = time for the bucket to refill completely.
+            - consumed<float> = units to charge (may leave the bucket below zero).
+            - remaining<float or None> = server-reported remaining units, if known.
+
+        Return value<None>
+        """
+
+        ...
+
+    @abstractmethod
+    def pause(self, name: str, seconds: float) -> None:
+        # Stop every worker from taking budget `name` for at least `seconds`
+        ...
+
+    @abstractmethod
+    def try_acquire_slot(self, name: str, limit: int, lease_seconds: float):
+        # Take one of `limit` slots; returns a token for release_slot, or None if all are in use
+        ...
+
+    @abstractmethod
+    def release_slot(self, name: str, token: str) -> None:
+        ...
+
+    @abstractmethod
+    def cache_get(self, table: str, key: str, ttl_seconds: float):
+        # Serialized value stored under `key`, or None if missing or older than ttl_seconds
+        ...
+
+    @abstractmethod
+    def cache_set(self, table: str, key: str, serialized: str, ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    def cache_clear(self, table: str) -> None:
+        ...
+
+
+def refilled(available: float, updated_at: float, capacity: float, period_seconds: float, now: float) -> float:
+    # Bucket level after refilling since updated_at, never above capacity (same as rate_limiter.TokenBucket)
+    return min(capacity, available + max(now - updated_at, 0.0) * capacity / period_seconds)
+
+
+class SQLiteSharedState(SharedStateBackend):
+    """
+    Shared state in one SQLite file, for several workers on the same host. Each operation runs
+    in an IMMEDIATE transaction, so SQLite's file lock serializes the workers.
+    """
+
+    def __init__(self, db_path: str):
+        self.db = sqlite3.connect(
+            db_path, timeout=SHARED_SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False
+        )
+        self.lock = threading.Lock()
+        self.last_cache_trim = {}  # table -> time this worker last trimmed it
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS budgets "
+            "(name TEXT, bucket TEXT, available REAL NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (name, bucket));"
+            "CREATE TABLE IF NOT EXISTS pauses (name TEXT PRIMARY KEY, paused_until REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS slots "
+            "(name TEXT, token TEXT, expires_at REAL NOT NULL, PRIMARY KEY (name, token));"
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(tbl TEXT, key TEXT, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "PRIMARY KEY (tbl, key));"
+            "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (tbl, accessed_at);"
+        )
+
+    def transaction(self, operation):
+        # Run operation(db, now) inside one write transaction
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(self.db, time.time())
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+            return result
+
+    def bucket_level(self, db, name: str, bucket: str, capacity: float, period_seconds: float, now: float) -> float:
+        # Current level of a bucket; a bucket seen for the first time starts full
+        row = db.execute("SELECT available, updated_at FROM budgets WHERE name = ? AND bucket = ?", (name, bucket)).fetchone()
+        return capacity if row is None else refilled(row[0], row[1], capacity, period_seconds, now)
+
+    def store_bucket(self, db, name: str, bucket: str, available: float, now: float) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO budgets (name, bucket, available, updated_at) VALUES (?, ?, ?, ?)",
+            (name, bucket, available, now),
+        )
+
+    def take_budget(self, name: str, amounts: dict) -> float:
+        def operation(db, now):
+            row = db.execute("SELECT paused_until FROM pauses WHERE name = ?", (name,)).fetchone()
+            wait_time = row[0] - now if row else 0.0
+            levels = {}
+            for bucket, (capacity, period_seconds, amount) in amounts.items():
+                levels[bucket] = self.bucket_level(db, name, bucket, capacity, period_seconds, now)
+                deficit = min(amount, capacity) - levels[bucket]
+                wait_time = max(wait_time, deficit * period_seconds / capacity)
+            if wait_time > 0:
+                return wait_time
+            for bucket, (_, _, amount) in amounts.items():
+                self.store_bucket(db, name, bucket, levels[bucket] - amount, now)
+            return 0.0
+
+        return self.transaction(operation)
+
+    def adjust_budget(self, name, bucket, capacity, period_seconds, consumed=0.0, remaining=None) -> None:
+        def operation(db, now):
+            level = self.bucket_level(db, name, bucket, capacity, period_seconds, now) - consumed
+            if remaining is not None:
+                level = min(level, remaining)
+            self.store_bucket(db, name, bucket, level, now)
+
+        self.transaction(operation)
+
+    def pause(self, name: str, seconds: float) -> None:
+        def operation(db, now):
+            db.execute(
+                "INSERT INTO pauses (name, paused_until) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET paused_until = MAX(paused_until, excluded.paused_until)",
+                (name, now + seconds),
+            )
+
+        self.transaction(operation)
+
+    def try_acquire_slot(self, name: str, limit: int, lease_seconds: float):
+        def operation(db, now):
+            # Expired leases belong to workers that died mid-request
+            db.execute("DELETE FROM slots WHERE name = ? AND expires_at < ?", (name, now))
+            in_use = db.execute("SELECT COUNT(*) FROM slots WHERE name = ?", (name,)).fetchone()[0]
+            if in_use >= limit:
+                return None
+            token = uuid.uuid4().hex
+            db.execute("INSERT INTO slots (name, token, expires_at) VALUES (?, ?, ?)", (name, token, now + lease_seconds))
+            return token
+
+        return self.transaction(operation)
+
+    def release_slot(self, name: str, token: str) -> None:
+        self.transaction(lambda db, now: db.execute("DELETE FROM slots WHERE name = ? AND token = ?", (name, token)))
+
+    def cache_get(self, table: str, key: str, ttl_seconds: float):
+        def operation(db, now):
+            row = db.execute("SELECT value, stored_at FROM cache WHERE tbl = ? AND key = ?", (table, key)).fetchone()
+            if row and now - row[1] <= ttl_seconds:
+                db.execute("UPDATE cache SET accessed_at = ? WHERE tbl = ? AND key = ?", (now, table, key))
+                return row[0]
+            if row:
+                db.execute("DELETE FROM cache WHERE tbl = ? AND key = ?", (table, key))
+            return None
+
+        return self.transaction(operation)
+
+    def cache_set(self, table: str, key: str, serialized: str, ttl_seconds: float) -> None:
+        self.transaction(
+            lambda db, now: db.execute(
+                "INSERT OR REPLACE INTO cache (tbl, key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (table, key, serialized, now, now),
+            )
+        )
+
+        # Trimming scans the whole table, so it runs once per interval rather than on every write
+        if time.time() - self.last_cache_trim.get(table, 0.0) >= SHARED_CACHE_TRIM_INTERVAL_SECONDS:
+            self.last_cache_trim[table] = time.time()
+            self.trim_cache(table, ttl_seconds)
+
+    def trim_cache(self, table: str, ttl_seconds: float) -> None:
+        def operation(db, now):
+            # Drop expired rows, then the least recently used rows beyond the size limit
+            db.execute("DELETE FROM cache WHERE tbl = ? AND stored_at < ?", (table, now - ttl_seconds))
+            db.execute(
+                "DELETE FROM cache WHERE tbl = ? AND key IN "
+                "(SELECT key FROM cache WHERE tbl = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (table, table, SHARED_CACHE_MAX_ENTRIES),
+            )
+
+        self.transaction(operation)
+
+    def cache_clear(self, table: str) -> None:
+        self.transaction(lambda db, now: db.execute("DELETE FROM cache WHERE tbl = ?", (table,)))
+
+
+# Redis versions of the same operations; each script runs atomically on the server, using the
+# server's clock so workers on different hosts agree on time
+REDIS_TAKE_BUDGET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local wait = (tonumber(redis.call('GET', KEYS[1]) or '0')) - now
+local levels = {}
+for i = 2, #KEYS do
+    local capacity, period, amount = tonumber(ARGV[3*i-5]), tonumber(ARGV[3*i-4]), tonumber(ARGV[3*i-3])
+    local state = redis.call('HMGET', KEYS[i], 'available', 'updated_at')
+    local level = capacity
+    if state[1] then
+        level = math.min(capacity, tonumber(state[1]) + math.max(now - tonumber(state[2]), 0) * capacity / period)
+    end
+    levels[i] = level
+    wait = math.max(wait, (math.min(amount, capacity) - level) * period / capacity)
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i = 2, #KEYS do
+    redis.call('HSET', KEYS[i], 'available', tostring(levels[i] - tonumber(ARGV[3*i-3])), 'updated_at', tostring(now))
+end
+return '0'
+"""
+REDIS_ADJUST_BUDGET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local capacity, period, consumed = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'available', 'updated_at')
+local level = capacity
+if state[1] then
+    level = math.min(capacity, tonumber(state[1]) + math.max(now - tonumber(state[2]), 0) * capacity / period)
+end
+level = level - consumed
+if ARGV[4] ~= '' then
+    level = math.min(level, tonumber(ARGV[4]))
+end
+redis.call('HSET', KEYS[1], 'available', tostring(level), 'updated_at', tostring(now))
+"""
+REDIS_PAUSE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local until_time = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000 + tonumber(ARGV[1])
+if until_time > tonumber(redis.call('GET', KEYS[1]) or '0') then
+    redis.call('SET', KEYS[1], tostring(until_time), 'PX', math.ceil(tonumber(ARGV[1]) * 1000) + 1000)
+end
+"""
+REDIS_ACQUIRE_SLOT_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+return 1
+"""
+
+
+class RedisSharedState(SharedStateBackend):
+    """
+    Shared state in Redis (or a Redis-compatible server), for workers spread over several hosts
+    or pods. Needs the optional redis package (pip install redis). Cache entries expire through
+    Redis TTLs, so the server's maxmemory policy bounds the cache size.
+    """
+
+    def __init__(self, url: str, prefix: str = "label_verification:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SHARED_STATE_URL points at Redis but the redis package is not installed (pip install redis)")
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.take_budget_script = self.client.register_script(REDIS_TAKE_BUDGET_SCRIPT)
+        self.adjust_budget_script = self.client.register_script(REDIS_ADJUST_BUDGET_SCRIPT)
+        self.pause_script = self.client.register_script(REDIS_PAUSE_SCRIPT)
+        self.acquire_slot_script = self.client.register_script(REDIS_ACQUIRE_SLOT_SCRIPT)
+
+    def take_budget(self, name: str, amounts: dict) -> float:
+        keys = [f"{self.prefix}pause:{name}"] + [f"{self.prefix}budget:{name}:{bucket}" for bucket in amounts]
+        args = [str(value) for bucket_args in amounts.values() for value in bucket_args]
+        return float(self.take_budget_script(keys=keys, args=args))
+
+    def adjust_budget(self, name, bucket, capacity, period_seconds, consumed=0.0, remaining=None) -> None:
+        self.adjust_budget_script(
+            keys=[f"{self.prefix}budget:{name}:{bucket}"],
+            args=[capacity, period_seconds, consumed, "" if remaining is None else remaining],
+        )
+
+    def pause(self, name: str, seconds: float) -> None:
+        self.pause_script(keys=[f"{self.prefix}pause:{name}"], args=[seconds])
+
+    def try_acquire_slot(self, name: str, limit: int, lease_seconds: float):
+        token = uuid.uuid4().hex
+        taken = self.acquire_slot_script(keys=[f"{self.prefix}slots:{name}"], args=[limit, lease_seconds, token])
+        return token if taken else None
+
+    def release_slot(self, name: str, token: str) -> None:
+        self.client.zrem(f"{self.prefix}slots:{name}", token)
+
+    def cache_get(self, table: str, key: str, ttl_seconds: float):
+        value = self.client.get(f"{self.prefix}cache:{table}:{key}")
+        return None if value is None else value.decode("utf-8")
+
+    def cache_set(self, table: str, key: str, serialized: str, ttl_seconds: float) -> None:
+        self.client.set(f"{self.prefix}cache:{table}:{key}", serialized, px=int(ttl_seconds * 1000))
+
+    def cache_clear(self, table: str) -> None:
+        for key in self.client.scan_iter(match=f"{self.prefix}cache:{table}:*"):
+            self.client.delete(key)
+
+
+def create_backend(url: str) -> SharedStateBackend:
+    """
+    Opens the shared state backend named by a SHARED_STATE_URL-style URL.
+
+    Parameter values:
+        - url<str> = "sqlite:///path/to/file.db" or "redis://host:port/db".
+
+    Return value<SharedStateBackend>:
+        - The backend. Raises ValueError for an unknown URL scheme.
+    """
+
+    if url.startswith(SQLITE_URL_PREFIX):
+        return SQLiteSharedState(url[len(SQLITE_URL_PREFIX) :])
+    if url.startswith(REDIS_URL_PREFIXES):
+        return RedisSharedState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url!r} (expected sqlite:///... or redis://...)")
+
+
+def get_backend():
+    """
+    Returns this process's connection to the shared state, opening it on first use (and again
+    in a forked child).
+
+    Return value<SharedStateBackend or None>:
+        - The backend, or None when SHARED_STATE_URL is empty (single-process mode).
+    """
+
+    global backend, backend_pid
+    if not SHARED_STATE_URL:
+        return None
+    with backend_lock:
+        if backend is None or backend_pid != os.getpid():
+            backend = create_backend(SHARED_STATE_URL)
+            backend_pid = os.getpid()
+            observability.log("INFO", "Shared state backend opened", url=SHARED_STATE_URL.split("@")[-1])
+        return backend
+
+
+async def acquire_slot(name: str = VISION_SLOT_NAME, limit: int = SHARED_MAX_CONCURRENT_REQUESTS):
+    """
+    Waits for one of the `limit` slots shared by every worker. A no-op in single-process mode,
+    where batch_processor's per-batch semaphore bounds concurrency instead.
+
+    Parameter values:
+        - name<str> = slot pool name.
+        - limit<int> = slots in the pool.
+
+    Return value<str or None>:
+        - Token to pass to `release_slot`, or None in single-process mode.
+    """
+
+    shared = get_backend()
+    if shared is None:
+        return None
+    while True:
+        token = await asyncio.to_thread(shared.try_acquire_slot, name, limit, SHARED_SLOT_LEASE_SECONDS)
+        if token is not None:
+            return token
+        await asyncio.sleep(SHARED_SLOT_POLL_SECONDS)
+
+
+async def try_acquire_slot(name: str = VISION_SLOT_NAME, limit: int = SHARED_MAX_CONCURRENT_REQUESTS) -> tuple:
+    """
+    Takes one of the `limit` slots shared by every worker only if one is free right now, for
+    optional calls (hedges) that should never wait for one.
+
+    Parameter values:
+        - name<str> = slot pool name.
+        - limit<int> = slots in the pool.
+
+    Return value<tuple>:
+        - Tuple of (taken, token): taken is False if every slot is in use; token goes to
+          `release_slot` (None in single-process mode, where nothing is shared).
+    """
+
+    shared = get_backend()
+    if shared is None:
+        return True, None
+    token = await asyncio.to_thread(shared.try_acquire_slot, name, limit, SHARED_SLOT_LEASE_SECONDS)
+    return token is not None, token
+
+
+def release_slot(token, name: str = VISION_SLOT_NAME) -> None:
+    # Give back a slot taken with acquire_slot (None tokens come from single-process mode)
+    if token is not None:
+        submit_write(get_backend().release_slot, name, token)
+
+
+def submit_write(method, *args, **kwargs) -> None:
+    """
+    Runs a backend write that nobody waits on (a budget correction, a pause, a slot release, a
+    cache store) in a worker thread, so SQLite locks and Redis round trips never block the event
+    loop. Outside an event loop the write runs directly.
+
+    Parameter values:
+        - method<callable> = bound SharedStateBackend method (or another blocking write, e.g. a cache disk tier's).
+        - args, kwargs = its arguments.
+
+    Return value<None>
+    """
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        method(*args, **kwargs)
+        return
+    future = loop.run_in_executor(None, functools.partial(method, *args, **kwargs))
+    pending_writes.add(future)
+    future.add_done_callback(finish_write)
+
+
+def finish_write(future) -> None:
+    # Drop a finished write from pending_writes and log it if it failed
+    pending_writes.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        observability.log("WARNING", "Shared state write failed", error=repr(future.exception()))
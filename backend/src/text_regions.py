@@ -0,0 +1,348 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+import asyncio
+import io
+import os
+import time
+import numpy as np
+import image_preprocessor
+import observability
+
+### Constants
+TEXT_REGIONS_ENABLED = os.environ.get("TEXT_REGIONS_ENABLED", "0") == "1"
+TEXT_REGIONS_WORKERS = int(os.environ.get("TEXT_REGIONS_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Smallest estimated image-token saving worth replacing the whole image for (one 512px tile)
+TEXT_REGIONS_MIN_TOKENS_SAVED = int(os.environ.get("TEXT_REGIONS_MIN_TOKENS_SAVED", 170))
+TEXT_CELL_SIZE = 8  # Text is detected on a grid of 8x8 pixel cells (at the model's resolution)
+TEXT_CELL_MIN_DENSITY = 0.12  # Share of strong-edge pixels that makes a cell look like print
+TEXT_GRADIENT_FLOOR = 24  # Lowest edge threshold, so flat images do not turn noise into "text"
+TEXT_BLOCK_MIN_CELLS = 6  # Smaller clusters of text cells are specks, not print
+COLLAGE_GAP = 8  # White pixels between the crops of a collage
+COLLAGE_WIDTHS = (512, 1024, 1536, 2048)  # Collage widths tried; tile multiples waste no tile space
+OVERVIEW_SIDE = 512  # "low" detail sees the image at 512x512 for a flat VISION_BASE_TOKENS
+
+LAYOUT_WHOLE = "whole"
+LAYOUT_CROP = "crop"
+LAYOUT_COLLAGE = "collage"
+
+# Sent between the low-detail overview and the high-detail crop of a label
+CLOSE_UP_TEXT = "Close-up of the printed text on this label:"
+
+region_executor = None
+text_region_layouts_total = observability.register(
+    observability.Counter(
+        "text_region_layouts_total",
+        "Label images sent to the vision model, by layout (whole image, text crop or text collage).",
+        ("layout",),
+    )
+)
+
+
+def otsu_threshold(values: np.ndarray) -> int:
+    # Threshold (0-255) that best splits an 8-bit histogram in two classes
+    histogram = np.bincount(values.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(histogram) / histogram.sum()
+    mean = np.cumsum(histogram * np.arange(256)) / histogram.sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean[-1] * weight - mean) ** 2 / (weight * (1 - weight))
+    return int(np.nanargmax(between))
+
+
+def local_range(gray: np.ndarray) -> np.ndarray:
+    # Morphological gradient: max minus min over each pixel's 3x3 neighbourhood (separable, in numpy)
+    padded = np.pad(gray, 1, mode="edge")
+    row_max = np.maximum(np.maximum(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+    row_min = np.minimum(np.minimum(padded[:, :-2], padded[:, 1:-1]), padded[:, 2:])
+    high = np.maximum(np.maximum(row_max[:-2], row_max[1:-1]), row_max[2:])
+    low = np.minimum(np.minimum(row_min[:-2], row_min[1:-1]), row_min[2:])
+    return high - low
+
+
+def mask_components(mask: np.ndarray) -> list:
+    """
+    Bounding boxes of the 4-connected components of a boolean grid, found by joining runs of
+    set cells that touch a run on the row above (union-find over runs, not cells).
+
+    Parameter values:
+        - mask<np.ndarray> = 2D boolean grid.
+
+    Return value<list>:
+        - List of [left, top, right, bottom, cell_count], right/bottom exclusive.
+    """
+
+    parents = []
+    boxes = []
+
+    def find(run: int) -> int:
+        while parents[run] != run:
+            parents[run] = parents[parents[run]]
+            run = parents[run]
+        return run
+
+    previous_runs = []
+    for y, row in enumerate(mask):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], row.astype(np.int8), [0]))))
+        runs = []
+        for start, end in zip(edges[::2], edges[1::2]):
+            run = len(parents)
+            parents.append(run)
+            boxes.append([int(start), y, int(end), y + 1, int(end - start)])
+            for previous_start, previous_end, previous_run in previous_runs:
+                if previous_start < end and start < previous_end:
+                    root, other = find(previous_run), find(run)
+                    if root != other:
+                        parents[other] = root
+            runs.append((start, end, run))
+        previous_runs = runs
+
+    components = {}
+    for run, box in enumerate(boxes):
+        root = find(run)
+        if root not in components:
+            components[root] = box
+            continue
+        component = components[root]
+        component[0], component[1] = min(component[0], box[0]), min(component[1], box[1])
+        component[2], component[3] = max(component[2], box[2]), max(component[3], box[3])
+        component[4] += box[4]
+    return list(components.values())
+
+
+def merge_overlapping(boxes: list) -> list:
+    # Merge boxes until none overlap, so a crop never holds the same print twice
+    boxes = [list(box) for box in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def find_text_blocks(image: Image.Image) -> list:
+    """
+    Finds the blocks of an image that look like print: 8x8 cells dense in strong edges (a
+    morphological gradient above the image's own Otsu threshold), grown by one cell and grouped
+    into connected blocks. Errs toward including artwork, which only costs tokens, rather than
+    missing small print.
+
+    Parameter values:
+        - image<Image.Image> = RGB label image at the resolution the model sees.
+
+    Return value<list>:
+        - Non-overlapping (left, top, right, bottom) pixel boxes, in reading order.
+    """
+
+    gradient = local_range(np.asarray(image.convert("L")))
+    edges = gradient > max(TEXT_GRADIENT_FLOOR, otsu_threshold(gradient))
+
+    # Edge density per cell, then grow text cells by one cell so neighbouring lines join up
+    rows, columns = edges.shape[0] // TEXT_CELL_SIZE, edges.shape[1] // TEXT_CELL_SIZE
+    density = (
+        edges[: rows * TEXT_CELL_SIZE, : columns * TEXT_CELL_SIZE]
+        .reshape(rows, TEXT_CELL_SIZE, columns, TEXT_CELL_SIZE)
+        .mean(axis=(1, 3))
+    )
+    cells = density >= TEXT_CELL_MIN_DENSITY
+    grown = cells.copy()
+    grown[1:] |= cells[:-1]
+    grown[:-1] |= cells[1:]
+    grown[:, 1:] |= cells[:, :-1]
+    grown[:, :-1] |= cells[:, 1:]
+
+    blocks = [
+        (
+            left * TEXT_CELL_SIZE,
+            top * TEXT_CELL_SIZE,
+            min(image.width, right * TEXT_CELL_SIZE),
+            min(image.height, bottom * TEXT_CELL_SIZE),
+        )
+        for left, top, right, bottom, cell_count in mask_components(grown)
+        if cell_count >= TEXT_BLOCK_MIN_CELLS
+    ]
+    return sorted((tuple(block) for block in merge_overlapping(blocks)), key=lambda block: (block[1], block[0]))
+
+
+def pack_collage(blocks: list, width: int) -> tuple:
+    """
+    Lays blocks out in reading order on shelves (rows) of a canvas of the given width.
+
+    Parameter values:
+        - blocks<list> = (left, top, right, bottom) boxes, in reading order.
+        - width<int> = canvas width; every block must fit in it.
+
+    Return value<tuple>:
+        - Tuple of (used_width<int>, height<int>, positions<list>) with the (x, y) of each block.
+    """
+
+    x = y = row_height = used_width = 0
+    positions = []
+    for left, top, right, bottom in blocks:
+        if x and x + right - left > width:
+            y += row_height + COLLAGE_GAP
+            x = row_height = 0
+        positions.append((x, y))
+        used_width = max(used_width, x + right - left)
+        row_height = max(row_height, bottom - top)
+        x += right - left + COLLAGE_GAP
+    return used_width, y + row_height, positions
+
+
+def encode_image(image: Image.Image) -> bytes:
+    # Re-encode like the preprocessor does (format, quality, no metadata)
+    output = io.BytesIO()
+    image.save(
+        output,
+        format=image_preprocessor.PREPROCESS_OUTPUT_FORMAT,
+        quality=image_preprocessor.PREPROCESS_QUALITY,
+        optimize=True,
+    )
+    return output.getvalue()
+
+
+def plan_text_regions(image_bytes: bytes) -> tuple:
+    """
+    Replaces a label image by a low-detail overview plus one high-detail image of just its print:
+    either a crop around all the text blocks, or a collage of the blocks when they are spread out
+    over artwork. Crops keep the pixel density the model would see in the whole image, so small
+    print stays as legible as before. Executed in a worker process, so it only uses picklable
+    arguments and return values.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image.
+
+    Return value<tuple>:
+        - Tuple of (parts, report). parts is a list of (image_bytes, mime_type, detail) tuples, or
+          None when the whole image should be sent (no print found, or less than
+          TEXT_REGIONS_MIN_TOKENS_SAVED estimated tokens to save). report has the layout, block
+          count, estimated tokens of the whole image as preprocessed (tokens_whole), and, for a
+          crop or collage, bytes and estimated tokens before and after.
+    """
+
+    try:
+        image = image_preprocessor.flatten_to_rgb(ImageOps.exif_transpose(Image.open(io.BytesIO(image_bytes))))
+    except Exception:
+        return None, {"layout": LAYOUT_WHOLE, "blocks": 0}
+
+    # Find the print at the resolution the model uses, and cost the whole image as the preprocessor would send it
+    original_width, original_height = image.size
+    view_width, view_height = image_preprocessor.vision_target_size(original_width, original_height)
+    scale = original_width / view_width
+    blocks = find_text_blocks(image.resize((view_width, view_height), Image.BILINEAR))
+    whole_tokens = image_preprocessor.estimate_image_tokens(
+        *image_preprocessor.tile_aligned_size(original_width, original_height)
+    )
+    report = {"layout": LAYOUT_WHOLE, "blocks": len(blocks), "tokens_whole": whole_tokens}
+    if not blocks:
+        return None, report
+
+    # Candidate 1: one crop around every block, snapped to tile boundaries like the whole image
+    union = (
+        min(block[0] for block in blocks),
+        min(block[1] for block in blocks),
+        max(block[2] for block in blocks),
+        max(block[3] for block in blocks),
+    )
+    crop_size = image_preprocessor.tile_aligned_size(union[2] - union[0], union[3] - union[1])
+    candidates = [(image_preprocessor.estimate_image_tokens(*crop_size), LAYOUT_CROP, crop_size, None)]
+
+    # Candidate 2: the blocks on shelves, at the first width the model takes without downscaling
+    if len(blocks) > 1:
+        for width in COLLAGE_WIDTHS:
+            if width < max(block[2] - block[0] for block in blocks):
+                continue
+            used_width, height, positions = pack_collage(blocks, width)
+            if image_preprocessor.vision_target_size(used_width, height) == (used_width, height):
+                candidates.append(
+                    (image_preprocessor.estimate_image_tokens(used_width, height), LAYOUT_COLLAGE, (used_width, height), positions)
+                )
+                break
+
+    detail_tokens, layout, size, positions = min(candidates, key=lambda candidate: candidate[0])
+    if whole_tokens - (detail_tokens + image_preprocessor.VISION_BASE_TOKENS) < TEXT_REGIONS_MIN_TOKENS_SAVED:
+        return None, report
+
+    # Cut the regions from the original pixels, straight to their final size
+    def source_box(box: tuple) -> tuple:
+        return tuple(coordinate * scale for coordinate in box)
+
+    if layout == LAYOUT_CROP:
+        detail_image = image.resize(size, Image.LANCZOS, box=source_box(union))
+    else:
+        detail_image = Image.new("RGB", size, (255, 255, 255))
+        for block, position in zip(blocks, positions):
+            block_size = (block[2] - block[0], block[3] - block[1])
+            detail_image.paste(image.resize(block_size, Image.LANCZOS, box=source_box(block)), position)
+
+    overview = image.copy()
+    overview.thumbnail((OVERVIEW_SIDE, OVERVIEW_SIDE), Image.LANCZOS)
+    mime_type = image_preprocessor.IMAGE_MIME_TYPES[image_preprocessor.PREPROCESS_OUTPUT_FORMAT.upper()]
+    parts = [(encode_image(overview), mime_type, "low"), (encode_image(detail_image), mime_type, "high")]
+
+    report.update(
+        {
+            "layout": layout,
+            "format": image_preprocessor.detect_image_format(image_bytes),
+            "original_size": [original_width, original_height],
+            "processed_size": list(size),
+            "bytes_in": len(image_bytes),
+            "bytes_out": sum(len(part[0]) for part in parts),
+            "tokens_in": image_preprocessor.estimate_image_tokens(original_width, original_height),
+            "tokens_out": detail_tokens + image_preprocessor.VISION_BASE_TOKENS,
+        }
+    )
+    return parts, report
+
+
+async def prepare_label_images(image_bytes: bytes) -> list:
+    """
+    Prepares one label image for the vision model. With TEXT_REGIONS_ENABLED, the text regions
+    are planned in the region process pool and, when that saves enough tokens, the label is sent
+    as a low-detail overview plus a high-detail crop or collage of its print. Otherwise the
+    (preprocessed) whole image is sent at high detail.
+
+    Parameter values:
+        - image_bytes<bytes> = raw label image uploaded from frontend.
+
+    Return value<list>:
+        - List of (image_bytes, mime_type, detail) tuples, in the order they are sent.
+    """
+
+    global region_executor
+    if TEXT_REGIONS_ENABLED:
+        if region_executor is None:
+            region_executor = ProcessPoolExecutor(max_workers=TEXT_REGIONS_WORKERS)
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        parts, report = await loop.run_in_executor(region_executor, plan_text_regions, image_bytes)
+        if parts is not None:
+            image_preprocessor.record_preprocess_report(report)
+            text_region_layouts_total.inc(layout=report["layout"])
+            observability.log(
+                "INFO",
+                "Label text regions cropped",
+                layout=report["layout"],
+                blocks=report["blocks"],
+                bytes_in=report["bytes_in"],
+                bytes_out=report["bytes_out"],
+                tokens_saved=report["tokens_in"] - report["tokens_out"],
+                seconds=round(time.perf_counter() - start, 3),
+            )
+            return parts
+
+    text_region_layouts_total.inc(layout=LAYOUT_WHOLE)
+    upload_bytes, mime_type = await image_preprocessor.prepare_image_for_vision(image_bytes)
+    return [(upload_bytes, mime_type, "high")]
@@ -0,0 +1,209 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
+import functools
+import numpy as np
+import re
+
+### Constants
+CLAUSE_MARKER_PATTERN = re.compile(r"\(\s*(\d)\s*\)")  # "(1)", "( 2 )", ...
+HEADING_CLAUSE_STR = "heading"
+CLAUSE_MISSING_SCORE = 30  # A clause aligning worse than this is reported as missing
+WARNING_DIAGNOSE_CACHE_SIZE = 4096  # Distinct warning texts whose diagnostics are kept
+WARNING_NOTE_MAX_DIFFERENCES = 3  # Differences spelled out in a reviewer note
+WARNING_NOTE_MAX_QUOTE_CHARS = 60  # Longer spans are shortened in notes (diagnostics keep them whole)
+
+
+def normalize_warning_text(text: str) -> str:
+    # Upper case with runs of whitespace collapsed, as the clauses are compared
+    return " ".join(text.upper().split())
+
+
+def split_clauses(text: str) -> list:
+    """
+    Splits a warning statement into its heading ("GOVERNMENT WARNING:") and numbered clauses.
+
+    Parameter values:
+        - text<str> = normalized warning text.
+
+    Return value<list>:
+        - List of (clause_label, clause_text) tuples, e.g. ("heading", "GOVERNMENT WARNING:"),
+          ("(1)", "(1) ACCORDING TO ...").
+    """
+
+    markers = list(CLAUSE_MARKER_PATTERN.finditer(text))
+    if not markers:
+        return [(HEADING_CLAUSE_STR, text)]
+
+    clauses = []
+    if text[: markers[0].start()].strip():
+        clauses.append((HEADING_CLAUSE_STR, text[: markers[0].start()].strip()))
+    for marker, next_marker in zip(markers, markers[1:] + [None]):
+        end = next_marker.start() if next_marker else len(text)
+        clauses.append((f"({marker.group(1)})", text[marker.start() : end].strip()))
+    return clauses
+
+
+def word_differences(expected_words: list, found_words: list) -> list:
+    # Word-level edit script between a clause and its aligned text, without the equal runs
+    differences = []
+    for opcode in Levenshtein.opcodes(expected_words, found_words):
+        if opcode.tag == "equal":
+            continue
+        differences.append(
+            {
+                "type": {"replace": "replace", "delete": "missing", "insert": "extra"}[opcode.tag],
+                "expected": " ".join(expected_words[opcode.src_start : opcode.src_end]),
+                "found": " ".join(found_words[opcode.dest_start : opcode.dest_end]),
+            }
+        )
+    return differences
+
+
+def describe_differences(differences: list, limit: int = WARNING_NOTE_MAX_DIFFERENCES) -> str:
+    """
+    Short reviewer-facing summary of warning differences, e.g.
+    '(1) "PREGNANCV" instead of "PREGNANCY"; (2) missing "OR OPERATE MACHINERY,"'.
+
+    Parameter values:
+        - differences<list> = differences from `WarningMatcher.diagnose`.
+        - limit<int> = differences to spell out before summarizing the rest as a count.
+
+    Return value<str>:
+        - Summary, or an empty string when there are no word differences.
+    """
+
+    def quote(span: str) -> str:
+        if len(span) > WARNING_NOTE_MAX_QUOTE_CHARS:
+            span = span[: WARNING_NOTE_MAX_QUOTE_CHARS - 3] + "..."
+        return f'"{span}"'
+
+    parts = []
+    for difference in differences[:limit]:
+        clause = "" if difference["clause"] == HEADING_CLAUSE_STR else f'{difference["clause"]} '
+        if difference["type"] == "replace":
+            parts.append(f'{clause}{quote(difference["found"])} instead of {quote(difference["expected"])}')
+        elif difference["type"] == "missing":
+            parts.append(f'{clause}missing {quote(difference["expected"])}')
+        else:
+            parts.append(f'{clause}unexpected {quote(difference["found"])}')
+    if len(differences) > limit:
+        parts.append(f"{len(differences) - limit} more")
+    return "; ".join(parts)
+
+
+class WarningMatcher:
+    """
+    Compares extracted warning text against a canonical statement that is normalized and split
+    into clauses once, up front. `similarity` gives the whole-statement score the pass/warning/fail
+    thresholds use; `diagnose` aligns the text clause by clause and returns the exact words that
+    differ.
+    """
+
+    def __init__(self, canonical: str, cache_size: int = WARNING_DIAGNOSE_CACHE_SIZE):
+        self.canonical_upper = canonical.upper()
+        self.clauses = [
+            (label, clause_text, clause_text.split())
+            for label, clause_text in split_clauses(normalize_warning_text(canonical))
+        ]
+        # Flagged texts are often re-checked (re-scoring, re-submissions), so keep their diagnostics
+        self.diagnose = functools.lru_cache(maxsize=cache_size)(self.compute_diagnostics)
+
+    def similarity(self, text: str) -> float:
+        """
+        Whole-statement similarity (0-100) of `text` to the canonical statement, case-insensitive.
+        Same value as `fuzz.ratio(text.upper(), canonical.upper())`.
+
+        Parameter values:
+            - text<str> = extracted warning text.
+
+        Return value<float>:
+            - Similarity score.
+        """
+
+        upper = text.upper()
+        if upper == self.canonical_upper:
+            return 100.0
+        return fuzz.ratio(upper, self.canonical_upper)
+
+    def similarities(self, texts: list) -> list:
+        """
+        `similarity` for many texts at once: each distinct text is scored once, in parallel, against
+        the canonical statement, which rapidfuzz preprocesses a single time for the whole run.
+
+        Parameter values:
+            - texts<list> = extracted warning texts.
+
+        Return value<list>:
+            - Similarity score per text.
+        """
+
+        uppers = [text.upper() for text in texts]
+        unique_uppers = list(dict.fromkeys(uppers))
+        if not unique_uppers:
+            return []
+        scores = process.cdist(
+            [self.canonical_upper], unique_uppers, scorer=fuzz.ratio, dtype=np.float64, workers=-1
+        )[0].tolist()
+        by_text = dict(zip(unique_uppers, scores))
+        return [by_text[upper] for upper in uppers]
+
+    def locate_clauses(self, text: str) -> list:
+        # Span of `text` that each canonical clause corresponds to: it starts at the clause's "(n)"
+        # marker (or, if OCR lost it, where the clause aligns best) and runs to the next clause
+        markers = {}
+        for marker in CLAUSE_MARKER_PATTERN.finditer(text):
+            markers.setdefault(f"({marker.group(1)})", marker.start())
+
+        starts = []
+        ends = []
+        for label, clause_text, _ in self.clauses:
+            if label == HEADING_CLAUSE_STR:
+                starts.append(0)
+                ends.append(None)
+            elif label in markers:
+                starts.append(markers[label])
+                ends.append(None)
+            else:
+                alignment = fuzz.partial_ratio_alignment(clause_text, text)
+                starts.append(alignment.dest_start)
+                ends.append(alignment.dest_end)
+
+        segments = []
+        for i, start in enumerate(starts):
+            later = [other for j, other in enumerate(starts) if j != i and other > start]
+            end = min(later) if later else (ends[i] if ends[i] is not None else len(text))
+            segments.append(text[start:end].strip())
+        return segments
+
+    def compute_diagnostics(self, text: str) -> dict:
+        """
+        Aligns `text` against the canonical statement clause by clause (use the cached `diagnose`).
+
+        Parameter values:
+            - text<str> = extracted warning text.
+
+        Return value<dict>:
+            - "clauses": per clause, its label, similarity and the text it was aligned with.
+            - "differences": every differing word span, as {"clause", "type" ('replace',
+              'missing' or 'extra'), "expected", "found"}.
+        """
+
+        normalized = normalize_warning_text(text)
+        clauses = []
+        differences = []
+        for (label, clause_text, clause_words), segment in zip(self.clauses, self.locate_clauses(normalized)):
+            similarity = fuzz.ratio(clause_text, segment)
+            clauses.append({"clause": label, "similarity": round(similarity, 1), "found": segment})
+
+            # A clause that barely aligns is missing rather than misspelled
+            if similarity < CLAUSE_MISSING_SCORE:
+                differences.append({"clause": label, "type": "missing", "expected": clause_text, "found": ""})
+                continue
+            for difference in word_differences(clause_words, segment.split()):
+                differences.append({"clause": label, **difference})
+
+        return {"clauses": clauses, "differences": differences}
@@ -0,0 +1,12 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import os
+import sys
+
+# The backend modules import each other as top-level modules from backend/src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# label_classifier reads the key at import; tests only ever talk to the fake OpenAI server
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,89 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import asyncio
+import pytest
+import batch_checkpoints
+import batch_processor
+
+
+def make_batch(size: int) -> list:
+    return [[f"checkpoint-test-{i}".encode(), {"brand_name": f"Brand {i}"}] for i in range(size)]
+
+
+def approved(index: int) -> dict:
+    return {"overallStatus": "approved", "summary": f"label {index}", "fields": []}
+
+
+def test_checkpoint_restores_only_unchanged_items(tmp_path):
+    store = batch_checkpoints.BatchCheckpointStore(str(tmp_path / "checkpoints.db"))
+    batch = make_batch(3)
+
+    async def run():
+        first = batch_checkpoints.BatchCheckpoint("batch-a", store)
+        await first.load()
+        for index in (0, 1):
+            await first.record(index, *batch[index], approved(index))
+
+        second = batch_checkpoints.BatchCheckpoint("batch-a", store)
+        await second.load()
+        changed_image = b"a different image"
+        return [
+            await second.restore(0, *batch[0]),
+            await second.restore(1, changed_image, batch[1][1]),
+            await second.restore(2, *batch[2]),
+            second.restored,
+        ]
+
+    restored_0, restored_1, restored_2, restored_count = asyncio.run(run())
+    assert restored_0 == approved(0)
+    assert restored_1 is None
+    assert restored_2 is None
+    assert restored_count == 1
+
+
+def test_error_results_are_not_checkpointed(tmp_path):
+    store = batch_checkpoints.BatchCheckpointStore(str(tmp_path / "checkpoints.db"))
+    batch = make_batch(1)
+
+    async def run():
+        checkpoint = batch_checkpoints.BatchCheckpoint("batch-b", store)
+        await checkpoint.record(0, *batch[0], {"overallStatus": "error", "summary": "Processing failed", "fields": []})
+
+    asyncio.run(run())
+    assert store.load_batch("batch-b") == {}
+
+
+@pytest.mark.parametrize("pack_size", [1, 3])
+def test_process_batch_resumes_and_clears_finished_batch(tmp_path, monkeypatch, pack_size):
+    store = batch_checkpoints.BatchCheckpointStore(str(tmp_path / "checkpoints.db"))
+    monkeypatch.setattr(batch_checkpoints, "checkpoint_store", store)
+    batch = make_batch(6)
+    verified = []
+
+    async def fake_verify(image, app_data, batch_img_id):
+        verified.append(batch_img_id)
+        return approved(batch_img_id)
+
+    async def fake_verify_group(images, app_data_list, batch_img_id):
+        indices = [batch.index([image, app_data]) for image, app_data in zip(images, app_data_list)]
+        verified.extend(indices)
+        return [approved(index) for index in indices], True
+
+    monkeypatch.setattr(batch_processor, "verify_with_retry", fake_verify)
+    monkeypatch.setattr(batch_processor, "verify_group_with_retry", fake_verify_group)
+
+    async def run():
+        # An interrupted earlier run finished labels 0, 2 and 5
+        interrupted = batch_checkpoints.BatchCheckpoint("batch-c", store)
+        for index in (0, 2, 5):
+            await interrupted.record(index, *batch[index], approved(index))
+        return await batch_processor.process_batch(batch, max_concurrent_jobs=2, pack_size=pack_size, batch_id="batch-c")
+
+    results = asyncio.run(run())
+    assert results == [approved(i) for i in range(6)]
+    assert sorted(verified) == [1, 3, 4]
+
+    # A completed batch leaves nothing to resume
+    assert store.load_batch("batch-c") == {}
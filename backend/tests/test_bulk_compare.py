@@ -0,0 +1,60 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import pytest
+import benchmarks
+import bulk_compare
+import label_classifier
+
+
+def scalar_and_column_results(extracted_rows: list, application_rows: list) -> tuple:
+    scalar = [
+        label_classifier.compare_extracted_fields(extracted, application)
+        for extracted, application in zip(extracted_rows, application_rows)
+    ]
+    columns = bulk_compare.compare_columns(*bulk_compare.rows_to_columns(extracted_rows, application_rows))
+    return scalar, columns
+
+
+def assert_same_results(scalar: list, columns: dict) -> None:
+    for i, result in enumerate(scalar):
+        assert columns["overallStatus"][i] == result["overallStatus"], f"row {i}"
+        for field in result["fields"]:
+            assert columns[field["field"]][i] == (field["status"], field["note"]), f"row {i}, {field['field']}"
+
+
+def test_compare_columns_matches_scalar_comparison():
+    extracted_rows, application_rows = benchmarks.make_compare_rows(5000)
+    scalar, columns = scalar_and_column_results(extracted_rows, application_rows)
+
+    # The synthetic history covers every overall outcome
+    assert {result["overallStatus"] for result in scalar} == {"approved", "review", "rejected"}
+    assert_same_results(scalar, columns)
+
+
+@pytest.mark.parametrize(
+    "present, all_caps, text, matches",
+    [
+        (False, True, label_classifier.GOV_WARNING_STR_MAIN_BODY, True),
+        (True, False, label_classifier.GOV_WARNING_STR_MAIN_BODY, True),
+        (True, True, label_classifier.GOV_WARNING_STR_MAIN_BODY, True),
+        (True, True, label_classifier.GOV_WARNING_STR_MAIN_BODY, False),
+        (True, True, "", False),
+        (True, True, label_classifier.GOV_WARNING_STR[:80], False),
+        (True, True, label_classifier.GOV_WARNING_STR.replace("pregnancy", "pregnacy"), False),
+    ],
+)
+def test_government_warning_screening_is_shared(present, all_caps, text, matches):
+    expected = label_classifier.check_government_warning(present, all_caps, text, matches)
+    assert bulk_compare.check_government_warnings([(present, all_caps, text, matches)]) == [expected]
+
+
+def test_missing_values_match_scalar_comparison():
+    extracted_rows, application_rows = benchmarks.make_compare_rows(4)
+    extracted_rows[0][label_classifier.BRAND_NAME_STR] = ""
+    application_rows[1][label_classifier.CLASS_TYPE_STR] = ""
+    extracted_rows[2][label_classifier.ALC_CONTENT_STR] = ""
+    application_rows[3][label_classifier.NET_CONTENT_STR] = ""
+
+    assert_same_results(*scalar_and_column_results(extracted_rows, application_rows))
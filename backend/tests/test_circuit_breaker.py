@@ -0,0 +1,124 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import asyncio
+import time
+import pytest
+from openai import InternalServerError
+import adaptive_concurrency
+import admission
+import batch_processor
+import benchmarks
+import circuit_breaker
+import label_classifier
+import rate_limiter
+import result_cache
+
+FAKE_SERVER_PORT = 8142
+OPEN_SECONDS = 0.2
+
+
+def make_breaker(threshold: int = 3) -> circuit_breaker.CircuitBreaker:
+    return circuit_breaker.CircuitBreaker(failure_threshold=threshold, open_seconds=OPEN_SECONDS, enabled=True)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record(circuit_breaker.FAILURE_TIMEOUT)
+    breaker.check()  # Still closed below the threshold
+
+    breaker.record(circuit_breaker.FAILURE_UNAVAILABLE)
+    assert breaker.state == circuit_breaker.CIRCUIT_OPEN
+    with pytest.raises(circuit_breaker.CircuitOpenError) as raised:
+        breaker.check()
+    assert 0 < raised.value.retry_after <= OPEN_SECONDS
+
+
+def test_success_resets_the_failure_count():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record(circuit_breaker.FAILURE_TIMEOUT)
+    breaker.record(None)
+    for _ in range(2):
+        breaker.record(circuit_breaker.FAILURE_TIMEOUT)
+    assert breaker.state == circuit_breaker.CIRCUIT_CLOSED
+
+
+def test_rate_limits_never_open_the_breaker():
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record(circuit_breaker.FAILURE_RATE_LIMITED)
+    assert breaker.state == circuit_breaker.CIRCUIT_CLOSED
+
+
+@pytest.mark.parametrize(
+    "probe_failure, final_state",
+    [
+        (None, circuit_breaker.CIRCUIT_CLOSED),
+        (circuit_breaker.FAILURE_RATE_LIMITED, circuit_breaker.CIRCUIT_CLOSED),
+        (circuit_breaker.FAILURE_TIMEOUT, circuit_breaker.CIRCUIT_OPEN),
+    ],
+)
+def test_half_open_lets_one_probe_through(probe_failure, final_state):
+    breaker = make_breaker(threshold=1)
+    breaker.record(circuit_breaker.FAILURE_TIMEOUT)
+    time.sleep(OPEN_SECONDS)
+
+    # One probe goes through; every other call fails fast until it reports back
+    breaker.check()
+    assert breaker.state == circuit_breaker.CIRCUIT_HALF_OPEN
+    with pytest.raises(circuit_breaker.CircuitOpenError):
+        breaker.check()
+
+    breaker.record(probe_failure)
+    assert breaker.state == final_state
+
+
+@pytest.fixture
+def failing_server(monkeypatch):
+    # Fake server answering every call with a 5xx; caches off and limits fresh
+    monkeypatch.setattr(result_cache, "verification_cache", result_cache.ResultCache(0, db_path="", shared=False))
+    monkeypatch.setattr(
+        result_cache, "extraction_cache", result_cache.ResultCache(0, db_path="", table="extractions", shared=False)
+    )
+    monkeypatch.setattr(rate_limiter, "shared_limiter", rate_limiter.RateLimiter(10**6, 10**9, shared=False))
+    queue = admission.AdmissionQueue()
+    monkeypatch.setattr(admission, "admission_queue", queue)
+    monkeypatch.setattr(
+        adaptive_concurrency, "concurrency_controller", adaptive_concurrency.AdaptiveConcurrencyLimit(queue)
+    )
+    monkeypatch.setattr(batch_processor, "SERVER_ERROR_RETRY_SECONDS", 0.01)
+    stop_server = benchmarks.use_fake_openai_server(
+        port=FAKE_SERVER_PORT, requests_per_minute=10**6, tokens_per_minute=10**9, server_error_fraction=1.0
+    )
+    yield stop_server.app.state.stats
+    stop_server()
+
+
+def test_server_errors_are_raised_not_graded(monkeypatch, failing_server):
+    monkeypatch.setattr(circuit_breaker, "vision_breaker", make_breaker(threshold=100))
+    image = b"breaker-test-single"
+
+    with pytest.raises(InternalServerError):
+        asyncio.run(label_classifier.extract_fields_with_vision(image, dict(benchmarks.BENCH_APP_DATA)))
+
+    # Retried, then reported as an API error rather than a rejected label
+    result = asyncio.run(batch_processor.process_batch([[image, dict(benchmarks.BENCH_APP_DATA)]], pack_size=1))[0]
+    assert result["overallStatus"] == "error"
+    assert result["summary"] == "Vision API error"
+
+
+def test_outage_opens_breaker_and_fails_fast(monkeypatch, failing_server):
+    breaker = make_breaker(threshold=3)
+    breaker.open_seconds = 60
+    monkeypatch.setattr(circuit_breaker, "vision_breaker", breaker)
+    batch = [[f"breaker-test-{i}".encode(), dict(benchmarks.BENCH_APP_DATA)] for i in range(20)]
+
+    results = asyncio.run(batch_processor.process_batch(batch, max_concurrent_jobs=2, pack_size=1))
+
+    assert breaker.state == circuit_breaker.CIRCUIT_OPEN
+    assert all(result["overallStatus"] == "error" for result in results)
+    assert sum(result["summary"] == "Vision API unavailable" for result in results) >= 15
+    assert failing_server["server_errors"] < len(batch)
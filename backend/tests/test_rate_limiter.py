@@ -0,0 +1,107 @@
+# MIT License
+# Copyright (c) 2026 Mark Biegel
+# LICENSE file for full license text.
+
+import asyncio
+import time
+import pytest
+import adaptive_concurrency
+import admission
+import batch_processor
+import benchmarks
+import circuit_breaker
+import rate_limiter
+import result_cache
+
+FAKE_SERVER_PORT = 8141
+SERVER_RPM = 20  # Requests the fake server allows per SERVER_PERIOD_SECONDS
+SERVER_PERIOD_SECONDS = 2.0
+CLIENT_OVERESTIMATE = 3  # The client starts with this multiple of the server's budget
+
+
+def timed_acquires(limiter: rate_limiter.RateLimiter, count: int, estimated_tokens: int = 100) -> float:
+    async def run():
+        start = time.perf_counter()
+        for _ in range(count):
+            await limiter.acquire(estimated_tokens)
+        return time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def test_limiter_paces_requests_beyond_the_budget():
+    limiter = rate_limiter.RateLimiter(10, 10**9, period_seconds=1.0, shared=False)
+
+    # The first 10 fit in the budget; the other 5 wait for the bucket to refill at 10 per second
+    assert timed_acquires(limiter, 10) < 0.1
+    assert timed_acquires(limiter, 5) >= 0.4
+
+
+def test_retry_after_pauses_every_caller():
+    limiter = rate_limiter.RateLimiter(1000, 10**9, shared=False)
+    limiter.update_from_headers({rate_limiter.HEADER_RETRY_AFTER: "0.3"})
+    assert timed_acquires(limiter, 1) >= 0.25
+
+
+def test_headers_shrink_an_overestimated_budget():
+    limiter = rate_limiter.RateLimiter(100, 10**9, period_seconds=1.0, shared=False)
+    limiter.update_from_headers(
+        {
+            rate_limiter.HEADER_LIMIT_REQUESTS: "10",
+            rate_limiter.HEADER_REMAINING_REQUESTS: "0",
+            rate_limiter.HEADER_RESET_REQUESTS: "500ms",
+        }
+    )
+    assert limiter.requests.capacity == 10
+    assert limiter.reserve(100) > 0
+
+
+@pytest.fixture
+def fresh_vision_state(monkeypatch):
+    # Caches off so every label is sent; limits and breaker start clean for each run
+    monkeypatch.setattr(result_cache, "verification_cache", result_cache.ResultCache(0, db_path="", shared=False))
+    monkeypatch.setattr(
+        result_cache, "extraction_cache", result_cache.ResultCache(0, db_path="", table="extractions", shared=False)
+    )
+    queue = admission.AdmissionQueue()
+    monkeypatch.setattr(admission, "admission_queue", queue)
+    monkeypatch.setattr(
+        adaptive_concurrency, "concurrency_controller", adaptive_concurrency.AdaptiveConcurrencyLimit(queue)
+    )
+    monkeypatch.setattr(circuit_breaker, "vision_breaker", circuit_breaker.CircuitBreaker())
+
+
+def run_batch_against_fake_server(monkeypatch, use_headers: bool) -> tuple:
+    limiter = rate_limiter.RateLimiter(
+        SERVER_RPM * CLIENT_OVERESTIMATE, 10**9, SERVER_PERIOD_SECONDS, shared=False
+    )
+    if not use_headers:
+        monkeypatch.setattr(limiter, "update_from_headers", lambda headers: None)
+    monkeypatch.setattr(rate_limiter, "shared_limiter", limiter)
+
+    stop_server = benchmarks.use_fake_openai_server(
+        port=FAKE_SERVER_PORT,
+        requests_per_minute=SERVER_RPM,
+        tokens_per_minute=10**9,
+        period_seconds=SERVER_PERIOD_SECONDS,
+    )
+    try:
+        batch = [[f"limiter-test-{use_headers}-{i}".encode(), dict(benchmarks.BENCH_APP_DATA)] for i in range(60)]
+        results = asyncio.run(batch_processor.process_batch(batch, max_concurrent_jobs=10, pack_size=1))
+    finally:
+        stop_server()
+    return results, stop_server.app.state.stats
+
+
+def test_header_corrected_limiter_avoids_429s(monkeypatch, fresh_vision_state):
+    ignored_results, ignored_stats = run_batch_against_fake_server(monkeypatch, use_headers=False)
+    corrected_results, corrected_stats = run_batch_against_fake_server(monkeypatch, use_headers=True)
+
+    # Every label is verified either way; 429s are retried, never turned into results
+    for results, stats in ((ignored_results, ignored_stats), (corrected_results, corrected_stats)):
+        assert all(result["overallStatus"] != "error" for result in results)
+        assert stats["accepted"] == len(results)
+
+    # Trusting its own overestimated budget the client keeps hitting 429s; the headers fix that
+    assert ignored_stats["rate_limited"] > 0
+    assert corrected_stats["rate_limited"] < ignored_stats["rate_limited"]